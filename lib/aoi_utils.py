@@ -0,0 +1,217 @@
+"""
+aoi_utils.py
+
+Non-rectangular areas of interest: arbitrary polygons and route corridors
+(a GPX / GeoJSON line buffered by N km). A BoundingBox remains the fast
+path everywhere; a PolygonAOI is used for true geometry intersection when
+selecting tiles / quads and as a cutline when clipping the DEM.
+"""
+
+import json
+import hashlib
+import xml.etree.ElementTree as ET
+
+from .bbox import BoundingBox
+
+
+def _ogr():
+    from osgeo import ogr
+    ogr.UseExceptions()
+    return ogr
+
+
+def _wgs84():
+    from osgeo import osr
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    # Keep (lon, lat) order regardless of the EPSG axis definition
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+
+class PolygonAOI:
+    """
+    A WGS84 (Lon/Lat) polygon area of interest.
+
+    Stored as WKT so it can be pickled into worker processes; the OGR
+    geometry is built lazily.
+    """
+    def __init__(self, wkt, name=None):
+        self.wkt = wkt
+        self.name = name
+        self._geometry = None
+        minx, maxx, miny, maxy = self.geometry.GetEnvelope()
+        self.bbox = BoundingBox(minx, miny, maxx, maxy)
+
+    def __getstate__(self):
+        return {"wkt": self.wkt, "name": self.name, "bbox": self.bbox}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._geometry = None
+
+    def __repr__(self):
+        return f"PolygonAOI(name={self.name!r}, bbox={tuple(self.bbox)})"
+
+    @property
+    def geometry(self):
+        if self._geometry is None:
+            self._geometry = _ogr().CreateGeometryFromWkt(self.wkt)
+        return self._geometry
+
+    @property
+    def key(self):
+        """Short stable hash of the geometry, used in output file names."""
+        return hashlib.sha1(self.wkt.encode()).hexdigest()[:8]
+
+    @classmethod
+    def from_geojson(cls, geometry, name=None):
+        """Build from a GeoJSON geometry dict (Polygon / MultiPolygon)."""
+        geom = _ogr().CreateGeometryFromJson(json.dumps(geometry))
+        return cls(geom.ExportToWkt(), name=name)
+
+    def intersects_rect(self, xmin, ymin, xmax, ymax):
+        """True if the polygon intersects the given lon/lat rectangle."""
+        if xmax < self.bbox.xmin or xmin > self.bbox.xmax or \
+           ymax < self.bbox.ymin or ymin > self.bbox.ymax:
+            return False
+        return self.geometry.Intersects(_rect(xmin, ymin, xmax, ymax))
+
+    def to_geojson(self):
+        """A GeoJSON FeatureCollection string, usable as a GDAL cutline."""
+        return json.dumps({
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {},
+                "geometry": json.loads(self.geometry.ExportToJson()),
+            }],
+        })
+
+
+def _rect(xmin, ymin, xmax, ymax):
+    ring = _ogr().Geometry(_ogr().wkbLinearRing)
+    for x, y in ((xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax), (xmin, ymin)):
+        ring.AddPoint_2D(x, y)
+    poly = _ogr().Geometry(_ogr().wkbPolygon)
+    poly.AddGeometry(ring)
+    return poly
+
+
+def aoi_bbox(aoi):
+    """Envelope of a BoundingBox or PolygonAOI."""
+    return aoi if isinstance(aoi, BoundingBox) else aoi.bbox
+
+
+def aoi_intersects_rect(aoi, xmin, ymin, xmax, ymax):
+    """Intersection test that works for both AOI types."""
+    if isinstance(aoi, BoundingBox):
+        return not (xmax < aoi.xmin or xmin > aoi.xmax or ymax < aoi.ymin or ymin > aoi.ymax)
+    return aoi.intersects_rect(xmin, ymin, xmax, ymax)
+
+
+# ---------------------------------------------------------
+# Route corridors
+# ---------------------------------------------------------
+
+def read_line(path):
+    """
+    Read a route as a list of line parts, each a list of (lon, lat), from a
+    GPX file (tracks and routes) or a GeoJSON LineString / MultiLineString
+    (bare geometry, Feature or FeatureCollection).
+    """
+    if path.lower().endswith(".gpx"):
+        root = ET.parse(path).getroot()
+        parts = []
+        for elem in root.iter():
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag in ("trkseg", "rte"):
+                pts = [
+                    (float(p.get("lon")), float(p.get("lat")))
+                    for p in elem
+                    if p.tag.rsplit("}", 1)[-1] in ("trkpt", "rtept")
+                ]
+                if len(pts) >= 2:
+                    parts.append(pts)
+        return parts
+
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        geometries = [feat["geometry"] for feat in data["features"]]
+    elif data.get("type") == "Feature":
+        geometries = [data["geometry"]]
+    else:
+        geometries = [data]
+
+    parts = []
+    for g in geometries:
+        if g["type"] == "LineString":
+            parts.append([tuple(c[:2]) for c in g["coordinates"]])
+        elif g["type"] == "MultiLineString":
+            parts.extend([tuple(c[:2]) for c in line] for line in g["coordinates"])
+    return parts
+
+
+def corridor_from_line(parts, buffer_km, name=None):
+    """
+    Buffer a route (list of (lon, lat) line parts) by buffer_km on each side.
+
+    The buffer is computed in an azimuthal equidistant projection centred
+    on the route, so the width is in true kilometres.
+    """
+    from osgeo import osr
+    ogr = _ogr()
+
+    line = ogr.Geometry(ogr.wkbMultiLineString)
+    for part in parts:
+        ls = ogr.Geometry(ogr.wkbLineString)
+        for lon, lat in part:
+            ls.AddPoint_2D(lon, lat)
+        line.AddGeometry(ls)
+    if line.GetGeometryCount() == 0:
+        raise ValueError("Route has no line geometry to buffer.")
+
+    centroid = line.Centroid()
+    local = osr.SpatialReference()
+    local.ImportFromProj4(
+        f"+proj=aeqd +lat_0={centroid.GetY()} +lon_0={centroid.GetX()} "
+        f"+datum=WGS84 +units=m +no_defs"
+    )
+    wgs84 = _wgs84()
+
+    line.AssignSpatialReference(wgs84)
+    line.TransformTo(local)
+    corridor = line.Buffer(buffer_km * 1000.0, 8)
+    corridor.AssignSpatialReference(local)
+    corridor.TransformTo(wgs84)
+    return PolygonAOI(corridor.ExportToWkt(), name=name)
+
+
+def load_aoi(path, buffer_km=None):
+    """
+    Load a single AOI from a file: a GeoJSON polygon (the union of all
+    polygon features) or, with buffer_km, a GPX / GeoJSON route corridor.
+    """
+    if buffer_km is not None:
+        return corridor_from_line(read_line(path), buffer_km, name=path)
+
+    ogr = _ogr()
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        geometries = [feat["geometry"] for feat in data["features"]]
+    elif data.get("type") == "Feature":
+        geometries = [data["geometry"]]
+    else:
+        geometries = [data]
+
+    union = None
+    for g in geometries:
+        if g["type"] not in ("Polygon", "MultiPolygon"):
+            continue
+        geom = ogr.CreateGeometryFromJson(json.dumps(g))
+        union = geom if union is None else union.Union(geom)
+    if union is None:
+        raise ValueError(f"No Polygon / MultiPolygon geometry found in {path}")
+    return PolygonAOI(union.ExportToWkt(), name=path)
@@ -0,0 +1,261 @@
+"""
+batch_utils.py
+
+Multi-AOI batch processing. Reads many areas of interest from a GeoJSON or
+CSV file, fetches the union of their DEM tiles and 7.5-minute quads exactly
+once, then fans the per-AOI merge_and_clip jobs out across a process pool
+and writes a per-AOI result manifest.
+"""
+
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .bbox import BoundingBox
+from .aoi_utils import PolygonAOI, aoi_bbox, corridor_from_line
+from .metrics_utils import record
+from .dem_utils import (
+    download_tiles, merge_and_clip, get_product, select_product, set_gdal_cache,
+    DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR, DEFAULT_RESAMPLING
+)
+
+
+# ---------------------------------------------------------
+# AOI input
+# ---------------------------------------------------------
+
+def _coordinates_bounds(coords, bounds=None):
+    """Expand bounds [xmin, ymin, xmax, ymax] over nested GeoJSON coordinates."""
+    if coords and isinstance(coords[0], (int, float)):
+        x, y = coords[0], coords[1]
+        if bounds is None:
+            return [x, y, x, y]
+        return [min(bounds[0], x), min(bounds[1], y), max(bounds[2], x), max(bounds[3], y)]
+    for c in coords:
+        bounds = _coordinates_bounds(c, bounds)
+    return bounds
+
+
+def _geometry_bounds(geometry):
+    if geometry.get("type") == "GeometryCollection":
+        bounds = None
+        for g in geometry.get("geometries", []):
+            gb = _geometry_bounds(g)
+            bounds = gb if bounds is None else [
+                min(bounds[0], gb[0]), min(bounds[1], gb[1]),
+                max(bounds[2], gb[2]), max(bounds[3], gb[3])
+            ]
+        return bounds
+    return _coordinates_bounds(geometry["coordinates"])
+
+
+def _feature_aoi(geometry, aoi_id, exact, buffer_km):
+    """BoundingBox envelope, or a PolygonAOI / corridor when requested."""
+    gtype = geometry.get("type")
+    if exact and gtype in ("Polygon", "MultiPolygon"):
+        return PolygonAOI.from_geojson(geometry, name=aoi_id)
+    if buffer_km is not None and gtype in ("LineString", "MultiLineString"):
+        lines = [geometry["coordinates"]] if gtype == "LineString" else geometry["coordinates"]
+        parts = [[tuple(c[:2]) for c in line] for line in lines]
+        return corridor_from_line(parts, buffer_km, name=aoi_id)
+    return BoundingBox(*_geometry_bounds(geometry))
+
+
+def read_aois(path, exact=False, buffer_km=None):
+    """
+    Read AOIs from a GeoJSON FeatureCollection (each feature's geometry
+    envelope is used) or a CSV with columns xmin, ymin, xmax, ymax and an
+    optional id column.
+
+    Args:
+        path (str): GeoJSON or CSV file.
+        exact (bool, optional): Keep polygon features as PolygonAOIs so tile /
+            quad selection and clipping follow the true outline. Defaults to False.
+        buffer_km (float, optional): Turn line features into route corridors
+            of this half-width. Defaults to None (lines use their envelope).
+
+    Returns:
+        list: (aoi_id, BoundingBox or PolygonAOI) tuples in file order.
+    """
+    aois = []
+    if path.lower().endswith((".geojson", ".json")):
+        with open(path) as f:
+            data = json.load(f)
+        features = data.get("features", [data] if data.get("type") == "Feature" else [])
+        for i, feature in enumerate(features):
+            props = feature.get("properties") or {}
+            aoi_id = str(feature.get("id") or props.get("id") or props.get("name") or i)
+            aois.append((aoi_id, _feature_aoi(feature["geometry"], aoi_id, exact, buffer_km)))
+    else:
+        with open(path, newline="") as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                aoi_id = str(row.get("id") or row.get("name") or i)
+                aois.append((aoi_id, BoundingBox(
+                    float(row["xmin"]), float(row["ymin"]),
+                    float(row["xmax"]), float(row["ymax"])
+                )))
+
+    # Keep ids unique so they can key the manifest
+    seen = set()
+    for i, (aoi_id, bbox) in enumerate(aois):
+        if aoi_id in seen:
+            aoi_id = f"{aoi_id}_{i}"
+            aois[i] = (aoi_id, bbox)
+        seen.add(aoi_id)
+    return aois
+
+
+def union_bbox(bboxes):
+    """Envelope of several BoundingBoxes (or PolygonAOI envelopes)."""
+    bboxes = [aoi_bbox(b) for b in bboxes]
+    return BoundingBox(
+        min(b.xmin for b in bboxes), min(b.ymin for b in bboxes),
+        max(b.xmax for b in bboxes), max(b.ymax for b in bboxes)
+    )
+
+
+# ---------------------------------------------------------
+# Batch run
+# ---------------------------------------------------------
+
+def _clip_job(aoi_id, tile_paths, bbox, out_dir, clip_options):
+    """
+    Process-pool entry point: clip one AOI. Returns (aoi_id, path, error, seconds);
+    the timing is returned so the parent can record it in its metrics.
+    """
+    start = time.perf_counter()
+    try:
+        path = merge_and_clip(tile_paths, bbox, out_dir=out_dir, **clip_options)
+        return aoi_id, path, None, time.perf_counter() - start
+    except Exception as e:
+        return aoi_id, None, str(e), time.perf_counter() - start
+
+
+def run_batch(aois, cache_dir=DEFAULT_CACHE_DIR, out_dir=DEFAULT_OUT_DIR,
+              jobs=8, processes=None, dem=True, gpkg=True, gdb_path=None,
+              manifest_path=None, engine="auto", cache_mb=512, cog=False,
+              product=None, resolution_m=None, resampling=DEFAULT_RESAMPLING):
+    """
+    Process many AOIs in one run.
+
+    1. Resolves the union of DEM tiles and 7.5-minute quads over all AOIs
+    2. Fetches each tile / quad exactly once (`jobs` concurrent downloads)
+    3. Clips each AOI's DEM in a pool of `processes` worker processes
+    4. Writes a JSON manifest with per-AOI tiles, quads, outputs and errors
+
+    Args:
+        aois (list): (aoi_id, BoundingBox or PolygonAOI) tuples, e.g. from read_aois().
+        cache_dir (str, optional): DEM tile cache directory.
+        out_dir (str, optional): Directory for clipped DEMs.
+        jobs (int, optional): Concurrent downloads. Defaults to 8.
+        processes (int, optional): Clip worker processes. Defaults to os.cpu_count().
+        dem (bool, optional): Fetch and clip DEMs. Defaults to True.
+        gpkg (bool, optional): Fetch Topo GPKG quads. Defaults to True.
+        gdb_path (str, optional): Path to the national map index GDB.
+        manifest_path (str, optional): Defaults to '<out_dir>/batch_manifest.json'.
+        engine, cache_mb, cog: Passed to merge_and_clip; each clip process also
+            sizes its GDAL block cache to cache_mb (see set_gdal_cache).
+        product, resolution_m, resampling: As for dem_utils.fetch_and_clip_dem;
+            an automatic product choice is made once, for the union of the AOIs.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(out_dir, "batch_manifest.json")
+    processes = max(1, processes or os.cpu_count() or 1)
+    start = time.time()
+
+    results = {
+        aoi_id: {"id": aoi_id, "bbox": list(aoi_bbox(bbox)), "status": "SUCCESS", "errors": []}
+        for aoi_id, bbox in aois
+    }
+    manifest = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "aoi_count": len(aois)}
+
+    # --- GPKG quads: one query pass, one download pipeline ---
+    if gpkg:
+        # Imported here so DEM-only batches do not need osgeo
+        from .gpkg_utils import USGSTopoDownloader, resolve_quads, GDB_FILE
+
+        gdb_path = gdb_path or GDB_FILE
+        per_aoi_quads = resolve_quads([bbox for _, bbox in aois], gdb_path=gdb_path)
+        union_quads = []
+        seen = set()
+        for quads in per_aoi_quads:
+            for q in quads:
+                if q not in seen:
+                    seen.add(q)
+                    union_quads.append(q)
+        print(f"[BATCH] {len(union_quads)} unique quads across {len(aois)} AOIs "
+              f"({sum(len(q) for q in per_aoi_quads)} before dedup)")
+
+        topo = USGSTopoDownloader(
+            bbox=union_bbox([bbox for _, bbox in aois]), gdb_path=gdb_path,
+            download_workers=jobs
+        )
+        manifest["gpkg"] = topo.download_quads(union_quads)
+
+        for (aoi_id, _), quads in zip(aois, per_aoi_quads):
+            paths = [topo._quad_paths(*q)[1] for q in quads]
+            missing = [p for p in paths if not os.path.exists(p)]
+            results[aoi_id]["quads"] = paths
+            if missing:
+                results[aoi_id]["status"] = "PARTIAL"
+                results[aoi_id]["errors"].append(f"{len(missing)} quads unavailable")
+
+    # --- DEM tiles: one download pass, then parallel clips ---
+    if dem:
+        if product == "auto" or (product is None and resolution_m):
+            product = select_product(resolution_m, aoi=union_bbox([bbox for _, bbox in aois]))
+        product = get_product(product)
+        per_aoi_tiles = [product.tiles(bbox) for _, bbox in aois]
+        union_tiles = list(dict.fromkeys(t for tiles in per_aoi_tiles for t in tiles))
+        print(f"[BATCH] {len(union_tiles)} unique {product.label} DEM tiles across {len(aois)} AOIs "
+              f"({sum(len(t) for t in per_aoi_tiles)} before dedup)")
+
+        tile_paths, failures = download_tiles(union_tiles, cache_dir=cache_dir, jobs=jobs,
+                                              product=product)
+        path_by_tile = dict(zip([t for t in union_tiles if t not in failures], tile_paths))
+        manifest["dem"] = {"product": product.name, "tiles": len(union_tiles), "failed": failures}
+
+        # Leave GDAL threads to split the cores between clip processes
+        clip_options = {
+            "engine": engine, "cache_mb": cache_mb, "cog": cog, "product": product.name,
+            "resolution_m": resolution_m, "resampling": resampling,
+            "num_threads": max(1, (os.cpu_count() or 1) // processes),
+        }
+        with ProcessPoolExecutor(max_workers=processes, initializer=set_gdal_cache,
+                                 initargs=(cache_mb,)) as pool:
+            futures = []
+            for (aoi_id, bbox), tiles in zip(aois, per_aoi_tiles):
+                results[aoi_id]["tiles"] = tiles
+                bad = [t for t in tiles if t in failures]
+                if bad:
+                    results[aoi_id]["status"] = "FAILED"
+                    results[aoi_id]["errors"].append(f"DEM tiles failed: {bad}")
+                    continue
+                futures.append(pool.submit(
+                    _clip_job, aoi_id, [path_by_tile[t] for t in tiles], bbox, out_dir, clip_options
+                ))
+            for future in as_completed(futures):
+                aoi_id, dem_path, error, seconds = future.result()
+                record("warp", seconds, os.path.getsize(dem_path) if dem_path else 0, bool(error))
+                results[aoi_id]["dem_path"] = dem_path
+                if error:
+                    results[aoi_id]["status"] = "FAILED"
+                    results[aoi_id]["errors"].append(f"Clip failed: {error}")
+
+    manifest["elapsed_s"] = round(time.time() - start, 3)
+    manifest["aois"] = [results[aoi_id] for aoi_id, _ in aois]
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    failed = sum(1 for r in manifest["aois"] if r["status"] != "SUCCESS")
+    print(f"[BATCH] Done: {len(aois) - failed}/{len(aois)} AOIs succeeded. "
+          f"Manifest: {manifest_path}")
+    return manifest
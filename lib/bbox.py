@@ -1,5 +1,11 @@
 from typing import NamedTuple
 
+# Mean earth radius (m), for great-circle distances and degree-to-metre scaling
+EARTH_RADIUS_M = 6371008.8
+
+# Radius of the Web Mercator sphere (m): the WGS84 semi-major axis
+WEB_MERCATOR_RADIUS_M = 6378137.0
+
 class BoundingBox(NamedTuple):
     """
     Represents a WGS84 bounding box.
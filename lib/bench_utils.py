@@ -0,0 +1,856 @@
+"""
+bench_utils.py
+
+Offline, reproducible benchmarks for the download / extract / clip / quad
+lookup stages.
+
+StandInServer is a local HTTP server laid out like prd-tnm.s3.amazonaws.com
+(the paths built by dem_utils.tile_url and gpkg_utils.BASE_URL). It
+generates deterministic synthetic 1 and 1/3 arc-second GeoTIFF tiles and
+Topo GPKG zips on first request, and can inject per-request latency, a
+per-connection bandwidth cap, missing Range support, HTTP 503s and dropped
+connections. use_stand_in() points the library at it for the duration of
+a benchmark.
+
+run_benchmarks() times fetch_and_clip_dem, merge_and_clip, the quad
+download pipeline, extract_zip_and_rename and the quad lookup over AOIs
+from small to large and returns a JSON-serialisable result; compare()
+diffs two results so regressions can be tracked between commits.
+Cases that need GDAL or the national GDB are reported as skipped when
+those are not available.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import sqlite3
+import struct
+import zipfile
+import hashlib
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import contextlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from . import metrics_utils
+from .bbox import BoundingBox
+from .download_utils import Downloader, SingleFlight, get_downloader, set_downloader
+
+# Centre of the benchmark AOIs (lon, lat) and their half-widths in degrees
+DEFAULT_CENTER = (-105.55, 40.05)
+AOI_SIZES = {
+    "small": 0.05,
+    "medium": 0.25,
+    "large": 0.75,
+    "xlarge": 1.5,
+}
+
+# Synthetic DEM pixels per degree (real 1 arc-second tiles use 3600)
+DEFAULT_DEM_PX = 900
+# Overlap pixels on each tile edge, as in the USGS tiles
+DEM_OVERLAP_PX = 6
+DEM_NODATA = -999999.0
+
+# Line features per layer in each synthetic quad GPKG
+DEFAULT_QUAD_FEATURES = 400
+
+# Synthetic quads stand in for the GDB when it is not available
+SYNTHETIC_STATE = "ZZ"
+_SYNTHETIC_QUAD = re.compile(r"^Bench_(m?\d+)_(m?\d+)$")
+
+_DEM_PATH = re.compile(r"^/StagedProducts/Elevation/(1|13)/TIFF/current/(\w+)/USGS_\1_(\w+)\.tif$")
+_QUAD_PATH = re.compile(r"^/StagedProducts/TopoMapVector/(\w+)/GPKG/(VECTOR_(.+)_(\w+)_7_5_Min_GPKG)\.zip$")
+
+
+# ---------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------
+
+def synthetic_elevation(lons, lats):
+    """Smooth, deterministic terrain (metres) as a function of absolute lon/lat."""
+    return (2500.0
+            + 700.0 * np.sin(lons * 7.1) * np.cos(lats * 5.3)
+            + 180.0 * np.sin(lons * 41.0 + lats * 29.0)
+            + 35.0 * np.cos(lons * 173.0) * np.sin(lats * 151.0)).astype(np.float32)
+
+
+def write_geotiff(path, z, west, north, res, nodata=DEM_NODATA, epsg=4269, rows_per_strip=16):
+    """
+    Write a float32 array as an uncompressed, stripped GeoTIFF in a lon/lat
+    CRS (no GDAL needed). west / north are the outer edges of the top-left
+    pixel; res is the pixel size in degrees.
+    """
+    rows, cols = z.shape
+    z = np.ascontiguousarray(z, dtype="<f4")
+    n_strips = math.ceil(rows / rows_per_strip)
+    strip_bytes = [min(rows_per_strip, rows - i * rows_per_strip) * cols * 4 for i in range(n_strips)]
+
+    geokeys = [1, 1, 0, 3,
+               1024, 0, 1, 2,      # GTModelType: geographic
+               1025, 0, 1, 1,      # GTRasterType: pixel is area
+               2048, 0, 1, epsg]   # GeographicType
+    nodata_str = f"{nodata:g}".encode() + b"\0"
+
+    # (tag, type, values): type 3 SHORT, 4 LONG, 12 DOUBLE, 2 ASCII
+    entries = [
+        (256, 4, [cols]), (257, 4, [rows]), (258, 3, [32]), (259, 3, [1]),
+        (262, 3, [1]), (273, 4, None), (277, 3, [1]), (278, 4, [rows_per_strip]),
+        (279, 4, strip_bytes), (284, 3, [1]), (339, 3, [3]),
+        (33550, 12, [res, res, 0.0]),
+        (33922, 12, [0.0, 0.0, 0.0, west, north, 0.0]),
+        (34735, 3, geokeys),
+        (42113, 2, nodata_str),
+    ]
+    fmt = {3: "H", 4: "I", 12: "d"}
+
+    def pack(typ, values):
+        return values if typ == 2 else struct.pack(f"<{len(values)}{fmt[typ]}", *values)
+
+    # Layout: header, IFD, out-of-line tag values, strips
+    ifd_offset = 8
+    extra_offset = ifd_offset + 2 + 12 * len(entries) + 4
+    extra_len = sum(len(pack(t, v or [0] * n_strips)) for _, t, v in entries
+                    if len(pack(t, v or [0] * n_strips)) > 4)
+    data_offset = extra_offset + extra_len + (extra_len % 2)
+    offsets = [data_offset + sum(strip_bytes[:i]) for i in range(n_strips)]
+
+    ifd = [struct.pack("<H", len(entries))]
+    extra = []
+    cursor = extra_offset
+    for tag, typ, values in entries:
+        raw = pack(typ, offsets if tag == 273 else values)
+        n = len(raw) if typ == 2 else len(raw) // struct.calcsize(fmt[typ])
+        if len(raw) <= 4:
+            ifd.append(struct.pack("<HHI", tag, typ, n) + raw.ljust(4, b"\0"))
+        else:
+            ifd.append(struct.pack("<HHII", tag, typ, n, cursor))
+            extra.append(raw)
+            cursor += len(raw)
+    ifd.append(struct.pack("<I", 0))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"II*\0" + struct.pack("<I", ifd_offset))
+        f.write(b"".join(ifd))
+        f.write(b"".join(extra))
+        f.write(b"\0" * (data_offset - cursor))
+        f.write(z.tobytes())
+    os.replace(tmp_path, path)
+
+
+def tile_bounds(tile_key):
+    """(west, south) integer corner of a USGS tile key like 'n41w106' (named by its NW corner)."""
+    lat = int(tile_key[1:3]) * (1 if tile_key[0] == "n" else -1)
+    lon = int(tile_key[4:7]) * (1 if tile_key[3] == "e" else -1)
+    return lon, lat - 1
+
+
+def make_dem_tile(path, tile_key, px_per_deg=DEFAULT_DEM_PX):
+    """Write a synthetic DEM tile for tile_key, with USGS-style edge overlap."""
+    west, south = tile_bounds(tile_key)
+    res = 1.0 / px_per_deg
+    n = px_per_deg + 2 * DEM_OVERLAP_PX
+    x0 = west - DEM_OVERLAP_PX * res
+    y0 = south + 1 + DEM_OVERLAP_PX * res
+    lons = x0 + (np.arange(n) + 0.5) * res
+    lats = y0 - (np.arange(n) + 0.5) * res
+    z = synthetic_elevation(lons[None, :], lats[:, None])
+    write_geotiff(path, z, x0, y0, res)
+
+
+def synthetic_quads(bbox: BoundingBox):
+    """(quad_name, state) pairs for the 7.5-minute cells covering bbox, named by cell index."""
+    def name(i):
+        return f"m{-i}" if i < 0 else str(i)
+
+    quads = []
+    for row in range(math.floor(bbox.ymin * 8), math.ceil(bbox.ymax * 8)):
+        for col in range(math.floor(bbox.xmin * 8), math.ceil(bbox.xmax * 8)):
+            quads.append((f"Bench_{name(row)}_{name(col)}", SYNTHETIC_STATE))
+    return quads
+
+
+def _quad_bounds(quad_name):
+    """Cell bounds for a synthetic quad name; other names get a hashed cell near DEFAULT_CENTER."""
+    m = _SYNTHETIC_QUAD.match(quad_name)
+    if m:
+        row, col = (-int(v[1:]) if v.startswith("m") else int(v) for v in m.groups())
+    else:
+        h = int(hashlib.sha1(quad_name.encode()).hexdigest()[:8], 16)
+        row = math.floor(DEFAULT_CENTER[1] * 8) + h % 16 - 8
+        col = math.floor(DEFAULT_CENTER[0] * 8) + (h >> 8) % 16 - 8
+    return col / 8.0, row / 8.0, (col + 1) / 8.0, (row + 1) / 8.0
+
+
+def _gpkg_line(coords, srs_id=4326):
+    """GeoPackage binary geometry (header + envelope + WKB) for a LineString."""
+    xs, ys = coords[:, 0], coords[:, 1]
+    header = b"GP" + bytes([0, 0b00000011]) + struct.pack(
+        "<i4d", srs_id, xs.min(), xs.max(), ys.min(), ys.max())
+    wkb = struct.pack("<BII", 1, 2, len(coords)) + coords.astype("<f8").tobytes()
+    return header + wkb
+
+
+_WGS84_WKT = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+              'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]')
+
+_GPKG_LAYERS = {
+    "Trans_TrailSegment": ("trailtype", ["Foot Trail", "Pack Trail", "Cross-Country Ski Trail"]),
+    "Trans_RoadSegment": ("tnmfrc", [1, 2, 3, 4, 5]),
+}
+
+
+def make_quad_gpkg(path, quad_name, features=DEFAULT_QUAD_FEATURES):
+    """
+    Write a minimal, valid GeoPackage (plain sqlite3) with trail and road
+    line layers of random-walk features inside the quad's cell.
+    """
+    xmin, ymin, xmax, ymax = _quad_bounds(quad_name)
+    rng = np.random.default_rng(int(hashlib.sha1(quad_name.encode()).hexdigest()[:8], 16))
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        PRAGMA application_id = 1196444487;
+        PRAGMA user_version = 10200;
+        CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY,
+            organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL,
+            definition TEXT NOT NULL, description TEXT);
+        CREATE TABLE gpkg_contents (table_name TEXT PRIMARY KEY, data_type TEXT NOT NULL,
+            identifier TEXT UNIQUE, description TEXT DEFAULT '', last_change DATETIME NOT NULL,
+            min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);
+        CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+            geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL,
+            m TINYINT NOT NULL, PRIMARY KEY (table_name, column_name));
+        INSERT INTO gpkg_spatial_ref_sys VALUES
+            ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', NULL),
+            ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', NULL),
+            ('WGS 84 geodetic', 4326, 'EPSG', 4326, '{_WGS84_WKT}', NULL);
+    """)
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(0))
+    for layer, (field, values) in _GPKG_LAYERS.items():
+        field_type = "TEXT" if isinstance(values[0], str) else "INTEGER"
+        conn.execute(f'CREATE TABLE "{layer}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, '
+                     f'geom LINESTRING, permanent_identifier TEXT, "{field}" {field_type})')
+        conn.execute("INSERT INTO gpkg_contents VALUES (?, 'features', ?, '', ?, ?, ?, ?, ?, 4326)",
+                     (layer, layer, stamp, xmin, ymin, xmax, ymax))
+        conn.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'LINESTRING', 4326, 0, 0)",
+                     (layer,))
+        rows = []
+        for i in range(features):
+            n = int(rng.integers(8, 40))
+            start = rng.uniform((xmin, ymin), (xmax, ymax))
+            steps = rng.normal(0.0, (xmax - xmin) / 200.0, size=(n - 1, 2))
+            coords = np.vstack([start, start + np.cumsum(steps, axis=0)])
+            coords[:, 0] = coords[:, 0].clip(xmin, xmax)
+            coords[:, 1] = coords[:, 1].clip(ymin, ymax)
+            rows.append((_gpkg_line(coords), f"{quad_name}-{layer}-{i}",
+                         values[int(rng.integers(len(values)))]))
+        conn.executemany(f'INSERT INTO "{layer}" (geom, permanent_identifier, "{field}") '
+                         f'VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def make_quad_zip(path, quad_name, features=DEFAULT_QUAD_FEATURES):
+    """Zip a synthetic quad GPKG the way the staged products are packaged."""
+    member = os.path.splitext(os.path.basename(path))[0] + ".gpkg"
+    gpkg_path = path + ".gpkg.tmp"
+    make_quad_gpkg(gpkg_path, quad_name, features)
+    try:
+        with zipfile.ZipFile(path + ".tmp", "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(gpkg_path, member)
+        os.replace(path + ".tmp", path)
+    finally:
+        os.remove(gpkg_path)
+
+
+# ---------------------------------------------------------
+# Stand-in server
+# ---------------------------------------------------------
+
+class StandInServer:
+    """
+    Local HTTP server mimicking the prd-tnm.s3.amazonaws.com layout, with
+    fault injection. Files are generated into root_dir on first request.
+    Use as a context manager; .url is the base URL.
+    """
+    def __init__(self, root_dir, latency_s=0.0, bandwidth_mbps=None, range_support=True,
+                 fail_rate=0.0, drop_rate=0.0, seed=0, dem_px=DEFAULT_DEM_PX,
+                 quad_features=DEFAULT_QUAD_FEATURES, port=0):
+        """
+        Args:
+            root_dir (str): Where generated files are kept (reused between runs).
+            latency_s (float, optional): Delay before every response.
+            bandwidth_mbps (float, optional): Per-connection cap in MB/s. Defaults to unlimited.
+            range_support (bool, optional): Honour Range requests. Defaults to True.
+            fail_rate (float, optional): Fraction of GETs answered with HTTP 503.
+            drop_rate (float, optional): Fraction of GETs cut off half way through the body.
+            seed (int, optional): Seed for the failure / drop draws.
+            dem_px (int, optional): Synthetic DEM pixels per degree.
+            quad_features (int, optional): Line features per layer in each quad.
+            port (int, optional): Port to bind on 127.0.0.1. Defaults to any free port.
+        """
+        self.root_dir = root_dir
+        self.latency_s = latency_s
+        self.bandwidth = bandwidth_mbps * 1024 ** 2 if bandwidth_mbps else None
+        self.range_support = range_support
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.seed = seed
+        self.dem_px = dem_px
+        self.quad_features = quad_features
+        self.port = port
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._generate = SingleFlight("standin_generate")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "ranged": 0, "not_modified": 0,
+                      "injected_failures": 0, "dropped": 0, "not_found": 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def config(self):
+        return {
+            "latency_s": self.latency_s,
+            "bandwidth_mbps": self.bandwidth / 1024 ** 2 if self.bandwidth else None,
+            "range_support": self.range_support,
+            "fail_rate": self.fail_rate,
+            "drop_rate": self.drop_rate,
+            "seed": self.seed,
+            "dem_px": self.dem_px,
+            "quad_features": self.quad_features,
+        }
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _draw(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def file_for(self, url_path):
+        """Local file for a request path, generating it if needed; None if unknown."""
+        local = os.path.join(self.root_dir, url_path.lstrip("/"))
+        if os.path.exists(local):
+            return local
+        m = _DEM_PATH.match(url_path)
+        if m and m.group(2) == m.group(3):
+            # 1/3 arc-second tiles have 3x the pixels per degree
+            px = self.dem_px * (3 if m.group(1) == "13" else 1)
+            make = lambda: make_dem_tile(local, m.group(2), px)
+        else:
+            m = _QUAD_PATH.match(url_path)
+            if not m:
+                return None
+            make = lambda: make_quad_zip(local, m.group(3), self.quad_features)
+
+        def generate():
+            if not os.path.exists(local):
+                os.makedirs(os.path.dirname(local), exist_ok=True)
+                make()
+        self._generate.do(local, generate)
+        return local
+
+    def pregenerate(self, url_paths):
+        """Generate files up front so generation time stays out of the timings."""
+        for url_path in url_paths:
+            self.file_for(url_path)
+
+    def start(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        handler = type("Handler", (_StandInHandler,), {"standin": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like S3
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _empty(self, code, headers=()):
+        self.send_response(code)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head):
+        s = self.standin
+        s._count("requests")
+        if s.latency_s:
+            time.sleep(s.latency_s)
+
+        path = s.file_for(self.path.split("?", 1)[0])
+        if path is None:
+            s._count("not_found")
+            self._empty(404)
+            return
+        if not head and s.fail_rate and s._draw() < s.fail_rate:
+            s._count("injected_failures")
+            self._empty(503)
+            return
+
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+        validators = [("ETag", etag), ("Last-Modified", last_modified)]
+        if self.headers.get("If-None-Match") == etag:
+            s._count("not_modified")
+            self._empty(304, validators)
+            return
+
+        start, end = 0, size - 1
+        ranged = False
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if (s.range_support and range_header and "," not in range_header
+                and (if_range is None or if_range in (etag, last_modified))):
+            m = re.match(r"bytes=(\d*)-(\d*)$", range_header.strip())
+            if m and (m.group(1) or m.group(2)):
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+                else:
+                    start = max(size - int(m.group(2)), 0)
+                if start >= size:
+                    self._empty(416, [("Content-Range", f"bytes */{size}")])
+                    return
+                ranged = True
+
+        length = end - start + 1
+        self.send_response(206 if ranged else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        if s.range_support:
+            self.send_header("Accept-Ranges", "bytes")
+        if ranged:
+            s._count("ranged")
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        for k, v in validators:
+            self.send_header(k, v)
+        self.end_headers()
+        if head:
+            return
+
+        # A dropped transfer stops half way and closes the connection
+        stop = length
+        if s.drop_rate and s._draw() < s.drop_rate:
+            s._count("dropped")
+            stop = length // 2
+            self.close_connection = True
+
+        chunk = 64 * 1024
+        sent = 0
+        t0 = time.perf_counter()
+        with open(path, "rb") as f:
+            f.seek(start)
+            while sent < stop:
+                data = f.read(min(chunk, stop - sent))
+                if not data:
+                    break
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    break
+                sent += len(data)
+                if s.bandwidth:
+                    ahead = sent / s.bandwidth - (time.perf_counter() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        s._count("bytes_sent", sent)
+
+
+@contextlib.contextmanager
+def use_stand_in(server, max_in_flight=16):
+    """
+    Point dem_utils / gpkg_utils at a StandInServer: swaps the base URLs and
+    installs a Downloader without the politeness rate limit for it.
+    """
+    from . import dem_utils
+    gpkg_utils = None
+    if _osgeo_available():
+        from . import gpkg_utils
+
+    saved_dem = dem_utils.ELEVATION_BASE
+    saved_gpkg = gpkg_utils.BASE_URL if gpkg_utils else None
+    saved_downloader = get_downloader()
+    host = server.url.split("://", 1)[1]
+    dem_utils.ELEVATION_BASE = f"{server.url}/StagedProducts/Elevation"
+    if gpkg_utils:
+        gpkg_utils.BASE_URL = f"{server.url}/StagedProducts/TopoMapVector/"
+    set_downloader(Downloader(rate_limits={host: (0, max_in_flight)}, pool_size=max_in_flight))
+    try:
+        yield server
+    finally:
+        dem_utils.ELEVATION_BASE = saved_dem
+        if gpkg_utils:
+            gpkg_utils.BASE_URL = saved_gpkg
+        set_downloader(saved_downloader)
+
+
+def _osgeo_available():
+    try:
+        import osgeo  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _gdal_tools_available():
+    return shutil.which("gdalwarp") is not None and shutil.which("gdalbuildvrt") is not None
+
+
+# ---------------------------------------------------------
+# Cases
+# ---------------------------------------------------------
+
+def aoi_for(size, center=DEFAULT_CENTER):
+    """Square BoundingBox of the named AOI_SIZES size around center."""
+    half = AOI_SIZES[size]
+    return BoundingBox(center[0] - half, center[1] - half, center[0] + half, center[1] + half)
+
+
+def _time_case(name, aoi_name, repeat, setup, run, bytes_of=None):
+    """
+    Run a case `repeat` times (setup() before each run is not timed) and
+    collect wall times plus the metrics_utils report of the last run.
+    """
+    runs = []
+    result = None
+    nbytes = 0
+    for _ in range(repeat):
+        state = setup() if setup else None
+        metrics_utils.enable()
+        start = time.perf_counter()
+        result = run(state)
+        runs.append(time.perf_counter() - start)
+        nbytes = bytes_of(result, state) if bytes_of else 0
+    report = metrics_utils.report()
+    metrics_utils.disable()
+    median = statistics.median(runs)
+    entry = {
+        "case": name,
+        "aoi": aoi_name,
+        "runs_s": [round(r, 4) for r in runs],
+        "min_s": round(min(runs), 4),
+        "median_s": round(median, 4),
+        "bytes": nbytes,
+        "mb_per_s": round(nbytes / 1024 ** 2 / median, 3) if nbytes and median > 0 else None,
+        "stages": report["stages"],
+        "counters": report["counters"],
+    }
+    print(f"[BENCH] {name:<28} {aoi_name:<7} median {median:8.3f} s"
+          + (f"  {entry['mb_per_s']:.1f} MB/s" if entry["mb_per_s"] else ""))
+    return entry
+
+
+def _skipped(name, aoi_name, reason):
+    print(f"[BENCH] {name:<28} {aoi_name:<7} skipped: {reason}")
+    return {"case": name, "aoi": aoi_name, "skipped": reason}
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def _without(path):
+    """Setup for _time_case that deletes a previous run's output."""
+    def setup():
+        if os.path.exists(path):
+            os.remove(path)
+        return {}
+    return setup
+
+
+def _dem_cases(aoi_name, aoi, work_dir, repeat, jobs, engine):
+    from .dem_utils import (
+        tiles_for_aoi, download_tiles, merge_and_clip, fetch_and_clip_dem, clip_path
+    )
+
+    cases = []
+    can_clip = _osgeo_available() or _gdal_tools_available()
+
+    def cold():
+        d = tempfile.mkdtemp(dir=work_dir)
+        return {"cache": os.path.join(d, "cache"), "out": os.path.join(d, "out")}
+
+    tiles = tiles_for_aoi(aoi)
+    cases.append(_time_case(
+        "dem.download_tiles.cold", aoi_name, repeat, cold,
+        lambda s: download_tiles(tiles, cache_dir=s["cache"], jobs=jobs),
+        lambda r, s: sum(os.path.getsize(p) for p in r[0])))
+
+    if not can_clip:
+        cases.append(_skipped("dem.merge_and_clip", aoi_name, "GDAL not available"))
+        cases.append(_skipped("dem.fetch_and_clip.cold", aoi_name, "GDAL not available"))
+        cases.append(_skipped("dem.fetch_and_clip.warm", aoi_name, "GDAL not available"))
+        cases.append(_skipped("dem.clip_reuse.contained", aoi_name, "GDAL not available"))
+        cases.append(_skipped("dem.clip_reuse.nudged", aoi_name, "GDAL not available"))
+        return cases
+
+    warm = cold()
+    tile_paths, failures = download_tiles(tiles, cache_dir=warm["cache"], jobs=jobs)
+    if failures:
+        cases.append(_skipped("dem.merge_and_clip", aoi_name, f"{len(failures)} tiles failed"))
+    else:
+        cases.append(_time_case(
+            "dem.merge_and_clip", aoi_name, repeat, None,
+            lambda s: merge_and_clip(tile_paths, aoi, out_dir=warm["out"], engine=engine,
+                                     reuse_clips=False),
+            lambda r, s: os.path.getsize(r)))
+
+        # An AOI shrunk inside, and one nudged ~300 m east of, an earlier clip
+        reuse_dir = os.path.join(warm["out"], "reuse")
+        merge_and_clip(tile_paths, aoi, out_dir=reuse_dir, engine=engine)
+        inset = (aoi.xmax - aoi.xmin) / 8
+        for name, target in (
+            ("dem.clip_reuse.contained", BoundingBox(aoi.xmin + inset, aoi.ymin + inset,
+                                                     aoi.xmax - inset, aoi.ymax - inset)),
+            ("dem.clip_reuse.nudged", BoundingBox(aoi.xmin + 0.0035, aoi.ymin,
+                                                  aoi.xmax + 0.0035, aoi.ymax)),
+        ):
+            target_path = clip_path(target, reuse_dir)
+            cases.append(_time_case(
+                name, aoi_name, repeat,
+                _without(target_path),
+                lambda s, t=target: merge_and_clip(tile_paths, t, out_dir=reuse_dir, engine=engine),
+                lambda r, s: os.path.getsize(r)))
+
+    cases.append(_time_case(
+        "dem.fetch_and_clip.cold", aoi_name, repeat, cold,
+        lambda s: fetch_and_clip_dem(aoi, cache_dir=s["cache"], out_dir=s["out"],
+                                     jobs=jobs, engine=engine)))
+    cases.append(_time_case(
+        "dem.fetch_and_clip.warm", aoi_name, repeat, None,
+        lambda s: fetch_and_clip_dem(aoi, cache_dir=warm["cache"], out_dir=warm["out"],
+                                     jobs=jobs, engine=engine, reuse_clips=False)))
+    return cases
+
+
+def _gpkg_cases(aoi_name, aoi, work_dir, repeat, jobs, gdb_path):
+    from .download_utils import extract_zip_and_rename
+    cases = []
+    if not _osgeo_available():
+        reason = "osgeo not available"
+        for name in ("quad_lookup.index", "quad_lookup.gdb", "gpkg.download.stream",
+                     "gpkg.download.zip", "gpkg.download.warm", "gpkg.extract_zip_and_rename"):
+            cases.append(_skipped(name, aoi_name, reason))
+        return cases
+
+    from .gpkg_utils import USGSTopoDownloader, QuadResolver
+    from .cache_utils import get_cache
+
+    have_gdb = bool(gdb_path) and os.path.exists(gdb_path)
+    if have_gdb:
+        for name, use_index in (("quad_lookup.index", True), ("quad_lookup.gdb", False)):
+            resolver = QuadResolver(gdb_path, use_index=use_index)
+            if use_index and resolver.source != "index":
+                cases.append(_skipped(name, aoi_name, "quad index sidecar missing or stale"))
+            else:
+                cases.append(_time_case(name, aoi_name, repeat, None,
+                                        lambda s, r=resolver: r.resolve(aoi)))
+            resolver.close()
+    else:
+        reason = "GDB not available; synthetic quads used"
+        cases.append(_skipped("quad_lookup.index", aoi_name, reason))
+        cases.append(_skipped("quad_lookup.gdb", aoi_name, reason))
+
+    def topo_in(d, stream):
+        topo = USGSTopoDownloader(aoi, gdb_path=gdb_path or "", download_workers=jobs,
+                                  stream_extract=stream, keep_zip=True)
+        # Keep benchmark data out of the real caches
+        topo.raw_dir = os.path.join(d, "raw")
+        topo.extracted_dir = os.path.join(d, "extracted")
+        os.makedirs(topo.raw_dir, exist_ok=True)
+        topo.cache = get_cache(topo.extracted_dir)
+        return topo
+
+    def run_pipeline(topo):
+        if have_gdb:
+            return topo.download_by_bbox()
+        return topo.download_quads(synthetic_quads(aoi))
+
+    for name, stream in (("gpkg.download.stream", True), ("gpkg.download.zip", False)):
+        cases.append(_time_case(
+            name, aoi_name, repeat,
+            lambda stream=stream: topo_in(tempfile.mkdtemp(dir=work_dir), stream),
+            run_pipeline,
+            lambda r, topo: _dir_bytes(topo.extracted_dir)))
+
+    warm = topo_in(tempfile.mkdtemp(dir=work_dir), True)
+    run_pipeline(warm)
+    cases.append(_time_case("gpkg.download.warm", aoi_name, repeat, lambda: warm, run_pipeline))
+
+    zips = [os.path.join(warm.raw_dir, f) for f in sorted(os.listdir(warm.raw_dir)) if f.endswith(".zip")]
+    if not zips:
+        # Stream mode keeps no zips; fetch them explicitly for the extract case
+        zip_topo = topo_in(tempfile.mkdtemp(dir=work_dir), False)
+        run_pipeline(zip_topo)
+        zips = [os.path.join(zip_topo.raw_dir, f) for f in sorted(os.listdir(zip_topo.raw_dir))
+                if f.endswith(".zip")]
+
+    def extract_all(out_dir):
+        for z in zips:
+            extract_zip_and_rename(z, out_dir, keep_zip=True)
+        return out_dir
+
+    cases.append(_time_case(
+        "gpkg.extract_zip_and_rename", aoi_name, repeat,
+        lambda: tempfile.mkdtemp(dir=work_dir), extract_all,
+        lambda r, out_dir: _dir_bytes(out_dir)))
+    return cases
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(sizes=("small", "medium", "large"), work_dir=None, repeat=3, jobs=8,
+                   groups=("dem", "gpkg"), gdb_path=None, engine="auto", center=DEFAULT_CENTER,
+                   server_options=None):
+    """
+    Run the benchmark cases against a StandInServer.
+
+    Args:
+        sizes (tuple, optional): AOI_SIZES keys, small to large.
+        work_dir (str, optional): Scratch directory (generated server files are
+            kept under '<work_dir>/standin' and reused). Defaults to a temp dir.
+        repeat (int, optional): Timed runs per case. Defaults to 3.
+        jobs (int, optional): Concurrent downloads. Defaults to 8.
+        groups (tuple, optional): "dem" and / or "gpkg" cases.
+        gdb_path (str, optional): National map index GDB for the quad lookup and
+            download_by_bbox cases; without it synthetic quads are used.
+        engine (str, optional): merge_and_clip engine.
+        center (tuple, optional): (lon, lat) centre of the AOIs.
+        server_options (dict, optional): StandInServer keyword arguments.
+
+    Returns:
+        dict: Environment, server settings and stats, and one entry per case.
+    """
+    work_dir = work_dir or tempfile.mkdtemp(prefix="bmt_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=work_dir, prefix="run_")
+    server = StandInServer(os.path.join(work_dir, "standin"), **(server_options or {}))
+    aois = {size: aoi_for(size, center) for size in sizes}
+
+    from .dem_utils import tiles_for_aoi
+    cases = []
+    start = time.time()
+    try:
+        with server, use_stand_in(server, max_in_flight=max(jobs, 1)):
+            # Generate every file up front so generation is not timed
+            print(f"[BENCH] Stand-in server at {server.url}; generating data in {server.root_dir}")
+            pregen = []
+            for aoi in aois.values():
+                if "dem" in groups:
+                    pregen += [f"/StagedProducts/Elevation/1/TIFF/current/{t}/USGS_1_{t}.tif"
+                               for t in tiles_for_aoi(aoi)]
+                if "gpkg" in groups and not (gdb_path and os.path.exists(gdb_path)):
+                    pregen += [f"/StagedProducts/TopoMapVector/{st}/GPKG/VECTOR_{q}_{st}_7_5_Min_GPKG.zip"
+                               for q, st in synthetic_quads(aoi)]
+            server.pregenerate(dict.fromkeys(pregen))
+
+            for size, aoi in aois.items():
+                if "dem" in groups:
+                    cases += _dem_cases(size, aoi, scratch, repeat, jobs, engine)
+                if "gpkg" in groups:
+                    cases += _gpkg_cases(size, aoi, scratch, repeat, jobs, gdb_path)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "gdal": _osgeo_available() or _gdal_tools_available(),
+        "elapsed_s": round(time.time() - start, 3),
+        "repeat": repeat,
+        "jobs": jobs,
+        "aois": {size: list(aoi) for size, aoi in aois.items()},
+        "server": server.config(),
+        "server_stats": server.stats,
+        "cases": cases,
+    }
+
+
+def write_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Wrote benchmark results to: {path}")
+    return path
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare the median times of two run_benchmarks() results.
+
+    Returns:
+        list: (case, aoi, baseline_s, current_s, ratio, flag) for cases timed in
+            both, where flag is "REGRESSION" / "IMPROVEMENT" beyond threshold.
+    """
+    def timed(results):
+        return {(c["case"], c["aoi"]): c["median_s"] for c in results["cases"] if "median_s" in c}
+
+    old, new = timed(baseline), timed(current)
+    rows = []
+    for key in [k for k in new if k in old]:
+        ratio = new[key] / old[key] if old[key] > 0 else math.inf
+        flag = ("REGRESSION" if ratio > 1 + threshold else
+                "IMPROVEMENT" if ratio < 1 - threshold else "")
+        rows.append((key[0], key[1], old[key], new[key], ratio, flag))
+    return rows
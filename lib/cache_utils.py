@@ -0,0 +1,263 @@
+"""
+cache_utils.py
+
+Size-bounded, manifest-backed cache for downloaded DEM tiles and extracted
+GPKG quads.
+
+Each cache directory gets a SQLite manifest recording, per entry, the source
+URL, size, ETag / Last-Modified, SHA-256 and last-access time. A disk budget
+is enforced with LRU eviction; pinned entries are never evicted, and
+neither are entries a job in this process holds (see CacheManager.hold).
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import contextlib
+from collections import Counter
+
+from .metrics_utils import count
+
+MANIFEST_NAME = ".cache_manifest.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name          TEXT PRIMARY KEY,
+    url           TEXT,
+    size          INTEGER NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    sha256        TEXT,
+    created       REAL NOT NULL,
+    last_access   REAL NOT NULL,
+    pinned        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (pinned, last_access);
+"""
+
+
+class CacheManager:
+    """
+    Manifest-backed view of one cache directory. Entries are addressed by
+    file name relative to cache_dir. Safe to share between threads.
+
+    Jobs sharing a cache hold the names they use (hold / acquire) from
+    before their lookup or download until they are done reading the files,
+    so another job's evict() cannot delete them in between.
+    """
+    def __init__(self, cache_dir, budget_bytes=None, manifest_path=None):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached files.
+            budget_bytes (int, optional): Disk budget enforced by evict(). None means unbounded.
+            manifest_path (str, optional): SQLite manifest path. Defaults to
+                '<cache_dir>/.cache_manifest.sqlite'.
+        """
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.manifest_path = manifest_path or os.path.join(cache_dir, MANIFEST_NAME)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.manifest_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+        # In-use refcounts: name -> number of holders in this process
+        self._held = Counter()
+        self._held_lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, name):
+        """Return the manifest row for name as a dict, or None."""
+        rows = self._execute("SELECT * FROM entries WHERE name = ?", (name,))
+        return dict(rows[0]) if rows else None
+
+    def lookup(self, name):
+        """
+        Return the cached file path if name is a valid cache hit, else None.
+
+        A hit refreshes the entry's last-access time. Files that are on disk
+        but missing from the manifest (caches created before the manifest
+        existed) are adopted. Manifest rows whose file is gone or has the
+        wrong size are dropped.
+        """
+        path = self.path(name)
+        entry = self.get(name)
+        if not os.path.exists(path):
+            if entry:
+                self.remove(name, delete_file=False)
+            count("cache_miss")
+            return None
+
+        size = os.path.getsize(path)
+        if entry is None:
+            self.record(name, size=size)
+            count("cache_hit")
+            count("cache_adopted")
+            return path
+        if entry["size"] != size:
+            self.remove(name)
+            count("cache_miss")
+            count("cache_size_mismatch")
+            return None
+
+        self.touch(name)
+        count("cache_hit")
+        return path
+
+    def contains(self, name):
+        """
+        Read-only cache check for planning: True if name is on disk and its
+        size matches the manifest (or it is not in the manifest yet, like
+        lookup() would adopt it). Unlike lookup() nothing is touched, adopted
+        or dropped.
+        """
+        path = self.path(name)
+        if not os.path.exists(path):
+            return False
+        entry = self.get(name)
+        return entry is None or entry["size"] == os.path.getsize(path)
+
+    def record(self, name, url=None, size=None, etag=None, last_modified=None, sha256=None):
+        """Insert or replace the manifest entry for a file now present in the cache."""
+        if size is None:
+            size = os.path.getsize(self.path(name))
+        now = time.time()
+        self._execute(
+            """
+            INSERT INTO entries (name, url, size, etag, last_modified, sha256, created, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                url = excluded.url, size = excluded.size, etag = excluded.etag,
+                last_modified = excluded.last_modified, sha256 = excluded.sha256,
+                created = excluded.created, last_access = excluded.last_access
+            """,
+            (name, url, size, etag, last_modified, sha256, now, now)
+        )
+
+    def touch(self, name):
+        self._execute("UPDATE entries SET last_access = ? WHERE name = ?", (time.time(), name))
+
+    def pin(self, name, pinned=True):
+        """Pin (or unpin) an entry so evict() never removes it."""
+        self._execute("UPDATE entries SET pinned = ? WHERE name = ?", (int(bool(pinned)), name))
+
+    def acquire(self, names):
+        """Mark names as in use so evict() skips them until release()d."""
+        with self._held_lock:
+            self._held.update(names)
+
+    def release(self, names):
+        """Drop one hold on each of names (see acquire)."""
+        with self._held_lock:
+            self._held.subtract(names)
+            for name in [n for n, c in self._held.items() if c <= 0]:
+                del self._held[name]
+
+    @contextlib.contextmanager
+    def hold(self, names):
+        """Context manager holding names (acquire / release) for the block."""
+        names = list(names)
+        self.acquire(names)
+        try:
+            yield
+        finally:
+            self.release(names)
+
+    def remove(self, name, delete_file=True):
+        """Drop an entry from the manifest and (by default) delete its file."""
+        self._execute("DELETE FROM entries WHERE name = ?", (name,))
+        if delete_file and os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+    def entries(self):
+        """Return all manifest entries as dicts, least recently used first."""
+        rows = self._execute("SELECT * FROM entries ORDER BY last_access ASC")
+        return [dict(r) for r in rows]
+
+    def total_size(self):
+        rows = self._execute("SELECT COALESCE(SUM(size), 0) AS total FROM entries")
+        return rows[0]["total"]
+
+    def evict(self, budget_bytes=None, protect=()):
+        """
+        Delete least recently used, unpinned entries until the cache fits in
+        budget_bytes (defaults to the instance budget). Names in `protect`
+        (e.g. the files the current job is about to use) and names held by
+        any job (see hold) are skipped.
+
+        Returns:
+            list: Names of the evicted entries.
+        """
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        if budget is None:
+            return []
+
+        total = self.total_size()
+        if total <= budget:
+            return []
+
+        protect = set(protect)
+        evicted = []
+        candidates = self._execute(
+            "SELECT name, size FROM entries WHERE pinned = 0 ORDER BY last_access ASC"
+        )
+        for row in candidates:
+            if total <= budget:
+                break
+            if row["name"] in protect:
+                continue
+            # Checked and removed under the hold lock, so a job acquiring the
+            # name either sees it gone (and re-fetches) or keeps it
+            with self._held_lock:
+                if self._held[row["name"]] > 0:
+                    continue
+                self.remove(row["name"])
+            total -= row["size"]
+            evicted.append(row["name"])
+
+        if evicted:
+            print(f"[CACHE] Evicted {len(evicted)} entries from {self.cache_dir} "
+                  f"({total/1024**3:.2f} GB of {budget/1024**3:.2f} GB budget used)")
+        if total > budget:
+            print(f"[WARN] Cache {self.cache_dir} is still over budget "
+                  f"({total/1024**3:.2f} GB); remaining entries are pinned or in use.")
+        return evicted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def gb_to_bytes(gb):
+    """Convert a (possibly None) size in GB to bytes."""
+    return None if gb is None else int(gb * 1024**3)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cache_dir, budget_bytes=None):
+    """
+    Return the shared CacheManager for cache_dir, creating it on first use.
+    A budget_bytes given here replaces the cache's current budget.
+    """
+    key = os.path.abspath(cache_dir)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = CacheManager(cache_dir, budget_bytes=budget_bytes)
+            _caches[key] = cache
+        elif budget_bytes is not None:
+            cache.budget_bytes = budget_bytes
+        return cache
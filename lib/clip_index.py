@@ -0,0 +1,202 @@
+"""
+clip_index.py
+
+Index of the clipped DEMs merge_and_clip has written to an output
+directory, so a new bounding box can be served from an earlier clip
+instead of re-warping the tile mosaic.
+
+Each clip is stored with its actual raster bounds, pixel size and a grid
+key (product / output resolution / resampling); only clips with the same
+grid key are ever combined. The files themselves are tracked in the
+directory's cache_utils manifest, which gives them LRU eviction under a
+size budget; index rows whose file has been evicted are dropped lazily.
+
+The geometry helpers here are pure Python: snapping a bbox outward onto a
+clip's pixel grid, and splitting a bbox into the strips an overlapping
+clip does not cover.
+"""
+
+import os
+import math
+import sqlite3
+import threading
+
+from .bbox import BoundingBox
+
+INDEX_NAME = ".clip_index.sqlite"
+
+# A partly overlapping clip is only reused when it covers at least this
+# fraction of the new bbox; below that, warping the strips costs about as
+# much as warping the whole bbox
+MIN_REUSE_OVERLAP = 0.5
+
+# Tolerance, in pixels, when snapping to a grid or comparing bounds
+_EPS = 1e-6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    name  TEXT PRIMARY KEY,
+    grid  TEXT NOT NULL,
+    xmin  REAL NOT NULL,
+    ymin  REAL NOT NULL,
+    xmax  REAL NOT NULL,
+    ymax  REAL NOT NULL,
+    xres  REAL NOT NULL,
+    yres  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clips_grid ON clips (grid, xmin, xmax);
+"""
+
+
+# ---------------------------------------------------------
+# Grid geometry
+# ---------------------------------------------------------
+
+def grid_key(product_name, resolution_m=None, resampling=None):
+    """Clips with equal keys have the same source data and pixel size."""
+    return f"{product_name}|{resolution_m or 'native'}|{resampling or ''}"
+
+
+def snap_to_grid(bbox, origin, res):
+    """
+    Expand bbox outward to whole pixels of the grid with top-left corner
+    origin (x, y) and pixel size res (xres, yres), both positive.
+    """
+    x0, y0 = origin
+    xres, yres = res
+    return BoundingBox(
+        x0 + math.floor((bbox.xmin - x0) / xres + _EPS) * xres,
+        y0 - math.ceil((y0 - bbox.ymin) / yres - _EPS) * yres,
+        x0 + math.ceil((bbox.xmax - x0) / xres - _EPS) * xres,
+        y0 - math.floor((y0 - bbox.ymax) / yres + _EPS) * yres,
+    )
+
+
+def _contains(outer, inner, res):
+    tol_x, tol_y = res[0] * _EPS, res[1] * _EPS
+    return (outer.xmin <= inner.xmin + tol_x and outer.ymin <= inner.ymin + tol_y and
+            outer.xmax >= inner.xmax - tol_x and outer.ymax >= inner.ymax - tol_y)
+
+
+def overlap_fraction(bbox, other):
+    """Fraction of bbox's area that other covers."""
+    w = min(bbox.xmax, other.xmax) - max(bbox.xmin, other.xmin)
+    h = min(bbox.ymax, other.ymax) - max(bbox.ymin, other.ymin)
+    area = (bbox.xmax - bbox.xmin) * (bbox.ymax - bbox.ymin)
+    if w <= 0 or h <= 0 or area <= 0:
+        return 0.0
+    return w * h / area
+
+
+def missing_strips(bbox, covered):
+    """
+    Up to four rectangles covering bbox minus covered: full-width strips
+    above and below, then left / right strips in the band between.
+    """
+    strips = []
+    y0, y1 = max(bbox.ymin, covered.ymin), min(bbox.ymax, covered.ymax)
+    if bbox.ymax > covered.ymax:
+        strips.append(BoundingBox(bbox.xmin, covered.ymax, bbox.xmax, bbox.ymax))
+    if bbox.ymin < covered.ymin:
+        strips.append(BoundingBox(bbox.xmin, bbox.ymin, bbox.xmax, covered.ymin))
+    if bbox.xmin < covered.xmin:
+        strips.append(BoundingBox(bbox.xmin, y0, covered.xmin, y1))
+    if bbox.xmax > covered.xmax:
+        strips.append(BoundingBox(covered.xmax, y0, bbox.xmax, y1))
+    return strips
+
+
+# ---------------------------------------------------------
+# Index
+# ---------------------------------------------------------
+
+class ClipIndex:
+    """
+    SQLite index of clip bounds in one output directory. Safe to share
+    between threads; several processes may use the same directory.
+    """
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(out_dir, INDEX_NAME), timeout=30,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add(self, name, grid, geotransform, cols, rows):
+        """Record (or replace) a clip from its GDAL geotransform and size."""
+        x0, xres, _, y0, _, yres = geotransform
+        self._execute(
+            "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, grid, x0, y0 + rows * yres, x0 + cols * xres, y0, xres, abs(yres))
+        )
+
+    def remove(self, name):
+        self._execute("DELETE FROM clips WHERE name = ?", (name,))
+
+    def candidates(self, bbox, grid):
+        """
+        Clips on grid intersecting bbox whose file still exists, as dicts
+        with "name", "path", "bounds" (BoundingBox) and "res" (xres, yres).
+        """
+        rows = self._execute(
+            "SELECT * FROM clips WHERE grid = ? AND xmin < ? AND xmax > ? AND ymin < ? AND ymax > ?",
+            (grid, bbox.xmax, bbox.xmin, bbox.ymax, bbox.ymin)
+        )
+        found = []
+        for row in rows:
+            path = os.path.join(self.out_dir, row["name"])
+            if not os.path.exists(path):
+                self.remove(row["name"])
+                continue
+            found.append({
+                "name": row["name"],
+                "path": path,
+                "bounds": BoundingBox(row["xmin"], row["ymin"], row["xmax"], row["ymax"]),
+                "res": (row["xres"], row["yres"]),
+            })
+        return found
+
+    def best_source(self, bbox, grid, exclude=None):
+        """
+        The clip to build bbox from: ("contained", clip) when one clip
+        covers bbox, ("partial", clip) for the clip covering most of it if
+        that is at least MIN_REUSE_OVERLAP, else (None, None). exclude is
+        a clip name to ignore (e.g. the output being rebuilt).
+        """
+        best, best_fraction = None, 0.0
+        for clip in self.candidates(bbox, grid):
+            if clip["name"] == exclude:
+                continue
+            if _contains(clip["bounds"], bbox, clip["res"]):
+                return "contained", clip
+            fraction = overlap_fraction(bbox, clip["bounds"])
+            if fraction > best_fraction:
+                best, best_fraction = clip, fraction
+        if best is not None and best_fraction >= MIN_REUSE_OVERLAP:
+            return "partial", best
+        return None, None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_clip_index(out_dir):
+    """Return the shared ClipIndex for out_dir, creating it on first use."""
+    key = os.path.abspath(out_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ClipIndex(out_dir)
+        return index
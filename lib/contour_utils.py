@@ -0,0 +1,367 @@
+"""
+contour_utils.py
+
+Contour lines from a clipped DEM, generated tile by tile in a process pool
+and streamed into a GeoPackage.
+
+Tiles overlap by one pixel column / row, so a contour leaving one tile ends
+on exactly the same point where it enters the next. Lines that stay inside
+a tile are simplified in the worker and written straight away; lines that
+end on a tile seam are held back and stitched with their neighbours before
+being written. Features go into the GPKG in large transactions, and the
+layer gets an R-tree spatial index.
+"""
+
+import os
+import math
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from .dem_utils import read_elevation
+
+# Tile edge in pixels for contouring
+DEFAULT_TILE_SIZE = 2048
+
+# Features per GPKG transaction
+DEFAULT_BATCH_SIZE = 100000
+
+FEET_PER_METRE = 3.280839895
+
+# Value written for nodata before contouring (read_elevation yields NaN)
+_NODATA = -1.0e30
+
+_METRES_PER_DEGREE = 111320.0
+
+
+# ---------------------------------------------------------
+# Per-tile contouring (worker processes)
+# ---------------------------------------------------------
+
+_worker_ds = None
+
+
+def _init_worker(dem_path):
+    """Each worker opens its own handle on the DEM."""
+    global _worker_ds
+    from osgeo import gdal
+    gdal.UseExceptions()
+    _worker_ds = gdal.Open(dem_path)
+
+
+def _contour_tile(window, interval, base, z_scale, simplify_tol, geographic):
+    """
+    Contour one tile. Returns (lines, seam_lines): lists of (elev, coords)
+    with coords an (N x 2) array. seam_lines end on an internal tile edge
+    and are left unsimplified for stitching. simplify_tol is in y units
+    (degrees of latitude for a geographic DEM), scaled east-west at the
+    tile's centre latitude.
+    """
+    from osgeo import gdal, ogr
+
+    x0, y0, w, h = window
+    ds = _worker_ds
+    cols, rows = ds.RasterXSize, ds.RasterYSize
+    gt = ds.GetGeoTransform()
+
+    # One pixel of overlap with the next tile to the east / south
+    rw, rh = min(w + 1, cols - x0), min(h + 1, rows - y0)
+    z = read_elevation(ds, x0, y0, rw, rh)
+    if z_scale != 1.0:
+        z *= z_scale
+    z[~np.isfinite(z)] = _NODATA
+
+    mem = gdal.GetDriverByName("MEM").Create("", rw, rh, 1, gdal.GDT_Float32)
+    mem.SetGeoTransform((gt[0] + x0 * gt[1], gt[1], 0.0, gt[3] + y0 * gt[5], 0.0, gt[5]))
+    band = mem.GetRasterBand(1)
+    band.WriteArray(z)
+    band.SetNoDataValue(_NODATA)
+
+    vec = ogr.GetDriverByName("Memory").CreateDataSource("")
+    layer = vec.CreateLayer("contours", geom_type=ogr.wkbLineString)
+    layer.CreateField(ogr.FieldDefn("elev", ogr.OFTReal))
+    gdal.ContourGenerateEx(band, layer, options=[
+        f"LEVEL_INTERVAL={interval}", f"LEVEL_BASE={base}",
+        "ELEV_FIELD=elev", f"NODATA={_NODATA}",
+    ])
+
+    # Pixel-centre coordinates of the internal tile edges
+    tol = abs(gt[1]) * 1e-3
+    seam_x = [gt[0] + (x + 0.5) * gt[1] for x in (x0, x0 + rw - 1)
+              if 0 < x < cols - 1]
+    seam_y = [gt[3] + (y + 0.5) * gt[5] for y in (y0, y0 + rh - 1)
+              if 0 < y < rows - 1]
+
+    def on_seam(pt):
+        return (any(abs(pt[0] - sx) < tol for sx in seam_x) or
+                any(abs(pt[1] - sy) < tol for sy in seam_y))
+
+    kx = _lon_scale(gt[3] + (y0 + rh / 2.0) * gt[5], geographic)
+    lines, seam_lines = [], []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        elev = feature.GetFieldAsDouble(0)
+        coords = np.asarray(geom.GetPoints(), dtype=np.float64)[:, :2]
+        if len(coords) < 2:
+            continue
+        if on_seam(coords[0]) or on_seam(coords[-1]):
+            seam_lines.append((elev, coords))
+            continue
+        if simplify_tol:
+            coords = _simplify(coords, simplify_tol, kx)
+        lines.append((elev, coords))
+
+    layer = vec = mem = None
+    return lines, seam_lines
+
+
+def _simplify(coords, tolerance, kx=1.0):
+    """
+    Douglas-Peucker on coords with x scaled by kx, so a tolerance in
+    degrees of latitude applies equally east-west (kx = cos(latitude)).
+    """
+    scaled = np.array(coords, dtype=np.float64)
+    scaled[:, 0] *= kx
+    simplified = _line_geometry(scaled).SimplifyPreserveTopology(tolerance)
+    out = np.asarray(simplified.GetPoints(), dtype=np.float64)[:, :2]
+    out[:, 0] /= kx
+    return out
+
+
+def _lon_scale(lat, geographic):
+    """East-west scale factor for _simplify at a latitude (1 for projected rasters)."""
+    return max(math.cos(math.radians(lat)), 0.01) if geographic else 1.0
+
+
+# ---------------------------------------------------------
+# Seam stitching
+# ---------------------------------------------------------
+
+def stitch_lines(lines, tolerance):
+    """
+    Join polylines of equal elevation whose endpoints coincide (within
+    tolerance). lines is a list of (elev, coords); returns the same form.
+    """
+    def cell(pt):
+        return math.floor(pt[0] / tolerance), math.floor(pt[1] / tolerance)
+
+    def close(a, b):
+        return abs(a[0] - b[0]) <= tolerance and abs(a[1] - b[1]) <= tolerance
+
+    # Endpoints bucketed on a tolerance-sized grid; a match can sit in a
+    # neighbouring cell when the two points straddle a cell edge
+    ends = defaultdict(list)
+    for i, (elev, coords) in enumerate(lines):
+        for pt in (coords[0], coords[-1]):
+            ends[(elev, *cell(pt))].append(i)
+
+    used = [False] * len(lines)
+
+    def take(elev, pt):
+        cx, cy = cell(pt)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in ends.get((elev, cx + dx, cy + dy), ()):
+                    coords = lines[j][1]
+                    if not used[j] and (close(coords[0], pt) or close(coords[-1], pt)):
+                        used[j] = True
+                        return j
+        return None
+
+    merged = []
+    for i, (elev, coords) in enumerate(lines):
+        if used[i]:
+            continue
+        used[i] = True
+        chain = [coords]
+
+        # Extend from the tail, then from the head
+        for at_tail in (True, False):
+            while True:
+                end_pt = chain[-1][-1] if at_tail else chain[0][0]
+                j = take(elev, end_pt)
+                if j is None:
+                    break
+                nxt = lines[j][1]
+                if at_tail:
+                    nxt = nxt if close(nxt[0], end_pt) else nxt[::-1]
+                    chain.append(nxt[1:])
+                else:
+                    nxt = nxt if close(nxt[-1], end_pt) else nxt[::-1]
+                    chain.insert(0, nxt[:-1])
+        merged.append((elev, np.concatenate(chain)))
+    return merged
+
+
+# ---------------------------------------------------------
+# GPKG output
+# ---------------------------------------------------------
+
+class _ContourWriter:
+    """Streams contour features into a GPKG layer in batched transactions."""
+    def __init__(self, path, srs_wkt, index_interval, batch_size):
+        from osgeo import ogr, osr
+        ogr.UseExceptions()
+        self.ogr = ogr
+        self.ds = ogr.GetDriverByName("GPKG").CreateDataSource(path)
+        srs = osr.SpatialReference()
+        if srs_wkt:
+            srs.ImportFromWkt(srs_wkt)
+        else:
+            srs.ImportFromEPSG(4326)
+        self.layer = self.ds.CreateLayer("contours", srs, ogr.wkbLineString,
+                                         options=["SPATIAL_INDEX=YES"])
+        self.layer.CreateField(ogr.FieldDefn("elev", ogr.OFTReal))
+        index_field = ogr.FieldDefn("is_index", ogr.OFTInteger)
+        index_field.SetSubType(ogr.OFSTBoolean)
+        self.layer.CreateField(index_field)
+        self.defn = self.layer.GetLayerDefn()
+        self.index_interval = index_interval
+        self.batch_size = batch_size
+        self.in_batch = 0
+        self.count = 0
+        self.layer.StartTransaction()
+
+    def write(self, elev, coords):
+        ogr = self.ogr
+        line = ogr.Geometry(ogr.wkbLineString)
+        for x, y in coords:
+            line.AddPoint_2D(float(x), float(y))
+        feature = ogr.Feature(self.defn)
+        feature.SetField(0, float(elev))
+        is_index = bool(self.index_interval) and \
+            math.isclose(math.remainder(elev, self.index_interval), 0.0, abs_tol=1e-6)
+        feature.SetField(1, int(is_index))
+        feature.SetGeometryDirectly(line)
+        self.layer.CreateFeature(feature)
+
+        self.count += 1
+        self.in_batch += 1
+        if self.in_batch >= self.batch_size:
+            self.layer.CommitTransaction()
+            self.layer.StartTransaction()
+            self.in_batch = 0
+
+    def close(self):
+        self.layer.CommitTransaction()
+        self.layer = self.defn = None
+        self.ds = None
+
+
+# ---------------------------------------------------------
+# Driver
+# ---------------------------------------------------------
+
+def contour_path(dem_path, out_dir=None, interval=None, units="m"):
+    """Output path: '<out_dir>/<dem name>_contours_<interval><units>.gpkg'."""
+    out_dir = out_dir or os.path.dirname(os.path.abspath(dem_path))
+    stem = os.path.splitext(os.path.basename(dem_path))[0]
+    return os.path.join(out_dir, f"{stem}_contours_{interval:g}{units}.gpkg")
+
+
+def generate_contours(dem_path, interval=20.0, index_interval=100.0, out_path=None,
+                      units="m", base=0.0, simplify_m=None, processes=None,
+                      tile_size=DEFAULT_TILE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate contour lines for a DEM into a GeoPackage.
+
+    Args:
+        dem_path (str): Clipped DEM (e.g. from fetch_and_clip_dem), elevations in metres.
+        interval (float, optional): Contour interval, in `units`. Defaults to 20.
+        index_interval (float, optional): Every contour at a multiple of this is
+            flagged is_index=1 (drawn bold). None / 0 disables. Defaults to 100.
+        out_path (str, optional): Output .gpkg. Defaults to contour_path().
+        units (str, optional): "m" or "ft" for the contour levels. Defaults to "m".
+        base (float, optional): Level offset. Defaults to 0.
+        simplify_m (float, optional): Douglas-Peucker tolerance in metres. On a
+            geographic DEM it is converted to degrees of latitude, with
+            longitudes scaled by cos(latitude) per tile (per line for stitched
+            seam lines). Defaults to off.
+        processes (int, optional): Worker processes. Defaults to os.cpu_count().
+        tile_size (int, optional): Tile edge in pixels. Defaults to 2048.
+        batch_size (int, optional): Features per GPKG transaction.
+
+    Returns:
+        str: The GPKG path.
+    """
+    from osgeo import gdal, osr
+    gdal.UseExceptions()
+
+    if units not in ("m", "ft"):
+        raise ValueError(f"Unknown contour units: {units}")
+    z_scale = FEET_PER_METRE if units == "ft" else 1.0
+    out_path = out_path or contour_path(dem_path, interval=interval, units=units)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    processes = max(1, processes or os.cpu_count() or 1)
+
+    src = gdal.Open(dem_path)
+    cols, rows = src.RasterXSize, src.RasterYSize
+    srs_wkt = src.GetProjection()
+    pixel = abs(src.GetGeoTransform()[1])
+    src = None
+
+    geographic = not srs_wkt or bool(osr.SpatialReference(wkt=srs_wkt).IsGeographic())
+    simplify_tol = 0.0
+    if simplify_m:
+        simplify_tol = simplify_m / _METRES_PER_DEGREE if geographic else simplify_m
+
+    windows = [(x, y, min(tile_size, cols - x), min(tile_size, rows - y))
+               for y in range(0, rows, tile_size) for x in range(0, cols, tile_size)]
+
+    tmp_path = out_path + ".tmp.gpkg"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    writer = _ContourWriter(tmp_path, srs_wkt, index_interval, batch_size)
+    seam_lines = []
+    start = time.perf_counter()
+
+    def drain(finished):
+        for future in finished:
+            lines, seams = future.result()
+            for elev, coords in lines:
+                writer.write(elev, coords)
+            seam_lines.extend(seams)
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(dem_path,)) as pool:
+            # Bound the number of tiles in flight to keep memory flat
+            pending = set()
+            for window in windows:
+                pending.add(pool.submit(_contour_tile, window, interval, base, z_scale,
+                                        simplify_tol, geographic))
+                if len(pending) >= 2 * processes:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    drain(finished)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(finished)
+
+        stitched = stitch_lines(seam_lines, pixel * 1e-3)
+        for elev, coords in stitched:
+            if simplify_tol and len(coords) > 2:
+                kx = _lon_scale(float(coords[:, 1].mean()), geographic)
+                coords = _simplify(coords, simplify_tol, kx)
+            writer.write(elev, coords)
+        writer.close()
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            writer.layer = writer.defn = writer.ds = None
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"[DONE] Wrote {writer.count} contours ({interval:g} {units}, "
+          f"{len(seam_lines)} seam pieces stitched into {len(stitched)}) to {out_path} "
+          f"({len(windows)} tiles, {processes} processes, {elapsed:.2f} s)")
+    return out_path
+
+
+def _line_geometry(coords):
+    from osgeo import ogr
+    line = ogr.Geometry(ogr.wkbLineString)
+    for x, y in coords:
+        line.AddPoint_2D(float(x), float(y))
+    return line
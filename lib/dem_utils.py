@@ -1,19 +1,34 @@
 """
 dem_utils.py
 
-Library for downloading USGS 1 arc-second DEM tiles, caching them locally,
-and generating a clipped DEM using GDAL.
+Library for downloading USGS 3DEP DEM tiles (1 arc-second, 1/3 arc-second
+or 1 m), caching them locally, and generating a clipped DEM using GDAL.
 """
 
 import os
+import re
+import abc
 import math
+import time
+import json
+import uuid
+import threading
+import contextlib
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 
 # Import from our new library modules
-from .download_utils import download_file
+from .download_utils import get_downloader, SingleFlight
+from .cache_utils import get_cache
 from .bbox import BoundingBox
+from .aoi_utils import aoi_bbox, aoi_intersects_rect
+from .metrics_utils import timer, count
+from .plan_utils import build_plan
+from .clip_index import get_clip_index, grid_key, snap_to_grid, missing_strips, INDEX_NAME
 
-USGS_BASE = "https://prd-tnm.s3.amazonaws.com/StagedProducts/Elevation/1/TIFF/current"
+ELEVATION_BASE = "https://prd-tnm.s3.amazonaws.com/StagedProducts/Elevation"
 
 # --- FIXED PATHS ---
 # Get the directory of this file (proj/lib)
@@ -42,10 +57,9 @@ def tile_name(lat, lon):
     return f"{lat_prefix}{abs(lat):02d}{lon_prefix}{abs(lon):03d}"
 
 
-def tile_url(tile_key):
-    """Return full HTTPS URL for a tile."""
-    # Note: The file on server is USGS_1_{tile_key}.tif
-    return f"{USGS_BASE}/{tile_key}/USGS_1_{tile_key}.tif"
+def tile_url(tile_key, product=None):
+    """Return full HTTPS URL for a tile of product (default: 1 arc-second)."""
+    return get_product(product).url(tile_key)
 
 
 # ---------------------------------------------------------
@@ -55,7 +69,8 @@ def tile_url(tile_key):
 def tiles_for_bbox(bbox: BoundingBox):
     """
     Return a list of tile keys required to cover a bounding box.
-    USGS 1 arc-second tiles are 1° × 1°.
+    USGS 1 arc-second tiles are 1° × 1° and named by their north-west
+    corner: 'n41w106' spans 40-41°N, 106-105°W.
     """
     lon_start = math.floor(bbox.xmin)
     lon_end = math.floor(bbox.xmax)
@@ -66,83 +81,960 @@ def tiles_for_bbox(bbox: BoundingBox):
     tiles = []
     for lat in range(lat_start, lat_end + 1):
         for lon in range(lon_start, lon_end + 1):
-            tiles.append(tile_name(lat, lon))
+            tiles.append(tile_name(lat + 1, lon))
+
+    return tiles
+
 
+def tiles_for_aoi(aoi):
+    """
+    Return the tile keys that actually intersect an AOI.
+    For a BoundingBox this is tiles_for_bbox; for a polygon or route
+    corridor, tiles in its envelope that miss the geometry are dropped.
+    """
+    bbox = aoi_bbox(aoi)
+    tiles = []
+    for lat in range(math.floor(bbox.ymin), math.floor(bbox.ymax) + 1):
+        for lon in range(math.floor(bbox.xmin), math.floor(bbox.xmax) + 1):
+            if aoi_intersects_rect(aoi, lon, lat, lon + 1, lat + 1):
+                tiles.append(tile_name(lat + 1, lon))
     return tiles
 
 
+# ---------------------------------------------------------
+# Products and resolution policy
+# ---------------------------------------------------------
+
+# 1 m project tiles are in UTM; clipped DEMs are always written in the
+# geographic CRS of the arc-second products so DEMSampler & co. keep working
+OUTPUT_SRS = "EPSG:4269"
+
+# TNM Access product search, the footprint source for 1 m tiles: each item
+# carries a tile's downloadURL and its geographic boundingBox
+TNM_ACCESS_URL = "https://tnmaccess.nationalmap.gov/api/v1/products"
+ONE_METER_DATASET = "Digital Elevation Model (DEM) 1 meter"
+TNM_PAGE_SIZE = 500
+
+# Fraction of the AOI the 1 m tiles must cover for auto selection to use them
+ONE_METER_MIN_COVERAGE = 0.99
+
+DEFAULT_PRODUCT = "1"
+DEFAULT_RESAMPLING = "bilinear"
+RESAMPLING_METHODS = ("near", "bilinear", "cubic", "cubicspline", "lanczos",
+                      "average", "min", "max", "med")
+
+# Metres per degree of latitude (and of longitude at the equator)
+_M_PER_DEG = 111320.0
+
+
+class DEMProduct(abc.ABC):
+    """
+    A 3DEP elevation product: its nominal ground resolution, how the AOI
+    maps to tile keys, and where each tile lives on the server. Subclasses
+    implement tiles() and url().
+    """
+    name = None
+    label = None
+    resolution_m = None
+    projected = False
+
+    @abc.abstractmethod
+    def tiles(self, aoi):
+        """Tile keys covering the AOI (a BoundingBox or PolygonAOI)."""
+
+    @abc.abstractmethod
+    def url(self, tile_key):
+        """Download URL of a tile."""
+
+    def cache_name(self, tile_key):
+        return f"{tile_key}.tif"
+
+    def available(self):
+        return True
+
+    def coverage(self, aoi):
+        """Fraction of the AOI covered by the product's tiles."""
+        return 1.0
+
+    def __repr__(self):
+        return f"<DEMProduct {self.name}: {self.label}>"
+
+
+class ArcSecondProduct(DEMProduct):
+    """
+    Seamless 1 arc-second (~30 m) or 1/3 arc-second (~10 m) product,
+    tiled in 1° × 1° cells (see tiles_for_bbox).
+    """
+    def __init__(self, code, label, resolution_m):
+        self.name = code
+        self.label = label
+        self.resolution_m = resolution_m
+
+    def tiles(self, aoi):
+        return tiles_for_aoi(aoi)
+
+    def url(self, tile_key):
+        # e.g. .../Elevation/13/TIFF/current/n41w106/USGS_13_n41w106.tif
+        return f"{ELEVATION_BASE}/{self.name}/TIFF/current/{tile_key}/USGS_{self.name}_{tile_key}.tif"
+
+    def cache_name(self, tile_key):
+        # 1 arc-second tiles keep their historical bare '{tile_key}.tif' name
+        if self.name == DEFAULT_PRODUCT:
+            return f"{tile_key}.tif"
+        return f"USGS_{self.name}_{tile_key}.tif"
+
+
+class OneMeterProduct(DEMProduct):
+    """
+    1 m lidar DEMs, published per acquisition project as 10 km × 10 km UTM
+    tiles. There is no fixed grid to enumerate, so tile footprints come
+    from a TNM Access product search; a tile key is the file stem,
+    USGS_1M_{zone}_x{east}y{north}_{project}.
+    """
+    name = "1m"
+    label = "1 meter"
+    resolution_m = 1.0
+    projected = True
+
+    def __init__(self, api_url=TNM_ACCESS_URL, dataset=ONE_METER_DATASET, downloader=None):
+        self.api_url = api_url
+        self.dataset = dataset
+        self.downloader = downloader
+        self._urls = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def _search(self, bbox):
+        """All TNM Access items for the dataset intersecting bbox, paging through results."""
+        downloader = self.downloader or get_downloader()
+        items = []
+        while True:
+            params = {
+                "datasets": self.dataset,
+                "bbox": f"{bbox.xmin},{bbox.ymin},{bbox.xmax},{bbox.ymax}",
+                "prodFormats": "GeoTIFF",
+                "outputFormat": "JSON",
+                "max": TNM_PAGE_SIZE,
+                "offset": len(items),
+            }
+            try:
+                with downloader.limiter_for(self.api_url):
+                    r = downloader.session.get(self.api_url, params=params,
+                                               timeout=downloader.timeout)
+                r.raise_for_status()
+                page = r.json()
+            except Exception as e:
+                raise RuntimeError(f"1 m tile search at {self.api_url} failed: {e}") from e
+            batch = page.get("items") or []
+            items.extend(batch)
+            if not batch or len(items) >= int(page.get("total") or 0):
+                return items
+
+    def _query(self, aoi):
+        """(tile_key, (xmin, ymin, xmax, ymax) footprint) for 1 m tiles intersecting aoi."""
+        bbox = aoi_bbox(aoi)
+        with self._lock:
+            items = self._queries.get(bbox)
+        if items is None:
+            items = self._search(bbox)
+            with self._lock:
+                self._queries[bbox] = items
+
+        found = []
+        for item in items:
+            url = item.get("downloadURL") or ""
+            name = os.path.basename(url.split("?", 1)[0])
+            if name.lower().endswith(".tif"):
+                name = name[:-4]
+            extent = item.get("boundingBox") or {}
+            try:
+                rect = tuple(float(extent[k]) for k in ("minX", "minY", "maxX", "maxY"))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not name.upper().startswith("USGS_1M_") or not aoi_intersects_rect(aoi, *rect):
+                continue
+            with self._lock:
+                self._urls[name] = url
+            found.append((name, rect))
+        return found
+
+    @staticmethod
+    def _cell_and_vintage(tile_key):
+        # USGS_1M_13_x45y445_CO_DRCOG_2020_B20 -> ("13_x45y445", (2020, project))
+        _, _, zone, cell, project = tile_key.split("_", 4)
+        years = [int(y) for y in re.findall(r"(?:19|20)\d{2}", project)]
+        return f"{zone}_{cell}", (max(years, default=0), project)
+
+    def tiles(self, aoi):
+        """
+        Tile keys intersecting aoi. Where several projects cover the same
+        10 km cell only the most recent acquisition is kept.
+        """
+        best = {}
+        for tile_key, _ in self._query(aoi):
+            cell, vintage = self._cell_and_vintage(tile_key)
+            if cell not in best or vintage > best[cell][0]:
+                best[cell] = (vintage, tile_key)
+        return sorted(tile_key for _, tile_key in best.values())
+
+    def url(self, tile_key):
+        """The downloadURL found by the search, else the StagedProducts project path."""
+        with self._lock:
+            url = self._urls.get(tile_key)
+        if url:
+            return url
+        project = tile_key.split("_", 4)[4]
+        return f"{ELEVATION_BASE}/1m/Projects/{project}/TIFF/{tile_key}.tif"
+
+    def coverage(self, aoi):
+        from osgeo import ogr
+
+        try:
+            footprints = [rect for _, rect in self._query(aoi)]
+        except RuntimeError as e:
+            print(f"[WARN] {e}")
+            return 0.0
+        if not footprints:
+            return 0.0
+
+        def polygon(xmin, ymin, xmax, ymax):
+            return ogr.CreateGeometryFromWkt(
+                f"POLYGON(({xmin} {ymin},{xmax} {ymin},{xmax} {ymax},"
+                f"{xmin} {ymax},{xmin} {ymin}))"
+            )
+
+        union = polygon(*footprints[0])
+        for rect in footprints[1:]:
+            union = union.Union(polygon(*rect))
+        area = polygon(*aoi) if isinstance(aoi, BoundingBox) else aoi.geometry
+        if area.GetArea() == 0:
+            return 0.0
+        return union.Intersection(area).GetArea() / area.GetArea()
+
+
+PRODUCTS = {
+    "1": ArcSecondProduct("1", "1 arc-second", 30.0),
+    "13": ArcSecondProduct("13", "1/3 arc-second", 10.0),
+    "1m": OneMeterProduct(),
+}
+
+
+def get_product(product=None):
+    """Resolve a product name (or None for the default) to its DEMProduct."""
+    if isinstance(product, DEMProduct):
+        return product
+    name = DEFAULT_PRODUCT if product is None else str(product)
+    if name not in PRODUCTS:
+        raise ValueError(f"Unknown DEM product: {name} (choose from {sorted(PRODUCTS)})")
+    return PRODUCTS[name]
+
+
+def select_product(resolution_m, aoi=None, products=None):
+    """
+    Resolution policy: the coarsest product whose nominal resolution meets
+    resolution_m (metres per pixel), so fine data is only transferred and
+    warped when it is actually needed.
+
+    With an aoi, the 1 m product is only chosen when the TNM Access search
+    finds tiles covering it; otherwise the next finer arc-second product
+    is used. If no product is fine enough, the finest
+    available one is returned with a warning.
+    """
+    candidates = sorted(
+        (get_product(p) for p in (products or PRODUCTS)),
+        key=lambda p: p.resolution_m, reverse=True
+    )
+    usable = []
+    for product in candidates:
+        if not product.available():
+            continue
+        if aoi is not None and product.projected:
+            coverage = product.coverage(aoi)
+            if coverage < ONE_METER_MIN_COVERAGE:
+                print(f"[INFO] {product.label} covers {coverage:.0%} of the AOI; not using it.")
+                continue
+        usable.append(product)
+        if product.resolution_m <= resolution_m:
+            print(f"[INFO] Using {product.label} DEM for {resolution_m:g} m requested resolution.")
+            return product
+    if not usable:
+        raise RuntimeError("No DEM product is available.")
+    print(f"[WARN] No DEM product reaches {resolution_m:g} m; "
+          f"using the finest available, {usable[-1].label}.")
+    return usable[-1]
+
+
+def output_resolution(resolution_m, aoi):
+    """
+    (xres, yres) in degrees of OUTPUT_SRS for a ground resolution in metres
+    at the AOI's centre latitude.
+    """
+    bbox = aoi_bbox(aoi)
+    lat = (bbox.ymin + bbox.ymax) / 2.0
+    yres = resolution_m / _M_PER_DEG
+    xres = resolution_m / (_M_PER_DEG * max(math.cos(math.radians(lat)), 0.01))
+    return xres, yres
+
+
 # ---------------------------------------------------------
 # Download + cache
 # ---------------------------------------------------------
 
-def download_tile(tile_key, cache_dir=DEFAULT_CACHE_DIR):
+_tile_flights = SingleFlight("tile")
+
+
+def download_tile(tile_key, cache_dir=DEFAULT_CACHE_DIR, downloader=None, cache=None,
+                  product=None):
     """
     Download tile into the cache directory unless already present.
     Returns the path to the .tif file.
     
-    Note: Saves the file as '{tile_key}.tif', not the longer server name.
+    Note: 1 arc-second tiles are saved as '{tile_key}.tif', not the longer
+    server name (see DEMProduct.cache_name for the other products).
+    `downloader` defaults to the shared download_utils.Downloader and
+    `cache` to the shared cache_utils.CacheManager for cache_dir.
     """
-    os.makedirs(cache_dir, exist_ok=True)
+    product = get_product(product)
+    cache = cache or get_cache(cache_dir)
+    name = product.cache_name(tile_key)
+    # Concurrent requests for the same tile (e.g. overlapping AOIs in the
+    # service) share one lookup + download
+    return _tile_flights.do(cache.path(name), _cached_or_fetch, tile_key, name, cache,
+                            downloader, product)
 
-    # The local cache path is named after the key
-    out_path = os.path.join(cache_dir, f"{tile_key}.tif")
-    
-    if os.path.exists(out_path):
-        print(f"[CACHE] {tile_key}.tif already exists.")
-        return out_path
 
-    url = tile_url(tile_key)
+def _cached_or_fetch(tile_key, name, cache, downloader, product=None):
+    cached_path = cache.lookup(name)
+    if cached_path:
+        print(f"[CACHE] {name} already exists.")
+        return cached_path
+
+    return _fetch_tile(tile_key, cache, downloader or get_downloader(), product)
+
+
+def _fetch_tile(tile_key, cache, downloader, product=None):
+    """
+    Download a tile into the cache (atomically replacing any cached copy)
+    and record it in the manifest. Returns the path to the .tif file.
+    """
+    product = get_product(product)
+    name = product.cache_name(tile_key)
+    url = product.url(tile_key)
+    out_path = cache.path(name)
     print(f"[DOWNLOAD] Fetching {tile_key} from {url}")
 
-    success, msg = download_file(url, out_path)
+    result = downloader.fetch(url, out_path)
 
-    if not success:
-        raise RuntimeError(f"Failed to download {url}: {msg}")
+    if not result["success"]:
+        raise RuntimeError(f"Failed to download {url}: {result['message']}")
 
+    cache.record(
+        name, url=url, size=result["bytes"], etag=result["etag"],
+        last_modified=result["last_modified"], sha256=result["sha256"]
+    )
     return out_path
 
 
+def download_tiles(tiles, cache_dir=DEFAULT_CACHE_DIR, jobs=4, downloader=None, cache=None,
+                   product=None):
+    """
+    Download several tiles concurrently using a bounded thread pool, then
+    evict least recently used tiles if the cache is over its budget (the
+    tiles of this request are never evicted).
+
+    Returns (tile_paths, failures):
+      - tile_paths: paths of the tiles that are available locally, in the
+        same order as `tiles` (deterministic input for merge_and_clip).
+      - failures: dict mapping tile_key -> error message for tiles that
+        could not be downloaded. Tiles that finished are kept regardless.
+    """
+    jobs = max(1, int(jobs))
+    product = get_product(product)
+    downloader = downloader or get_downloader()
+    cache = cache or get_cache(cache_dir)
+    results = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(tiles)) or 1) as pool:
+        futures = {
+            pool.submit(download_tile, tile_key, cache_dir, downloader, cache, product): tile_key
+            for tile_key in tiles
+        }
+        for future in as_completed(futures):
+            tile_key = futures[future]
+            try:
+                results[tile_key] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Tile {tile_key} failed: {e}")
+                failures[tile_key] = str(e)
+
+    cache.evict(protect={product.cache_name(tile_key) for tile_key in tiles})
+
+    tile_paths = [results[tile_key] for tile_key in tiles if tile_key in results]
+    return tile_paths, failures
+
+
+def refresh_tiles(tiles, cache_dir=DEFAULT_CACHE_DIR, jobs=8, downloader=None, cache=None,
+                  product=None):
+    """
+    Revalidate every cached tile in `tiles` with a conditional request and
+    re-download only the ones that changed upstream. Tiles that are not
+    cached are left for download_tiles.
+
+    Cached tiles with no recorded ETag/Last-Modified (e.g. adopted from an
+    older cache) are kept if the remote Content-Length matches the local
+    size, and the remote validators are recorded for next time.
+
+    Returns a report dict with lists of tile keys under "fresh", "stale",
+    "refreshed", "adopted", "missing" and a dict of "failed" messages.
+    """
+    product = get_product(product)
+    downloader = downloader or get_downloader()
+    cache = cache or get_cache(cache_dir)
+    report = {"checked": 0, "fresh": [], "stale": [], "refreshed": [],
+              "adopted": [], "missing": [], "failed": {}}
+
+    cached = [t for t in tiles if cache.lookup(product.cache_name(t))]
+    report["checked"] = len(cached)
+    if not cached:
+        return report
+
+    def check(tile_key):
+        entry = cache.get(product.cache_name(tile_key)) or {}
+        return downloader.revalidate(
+            entry.get("url") or product.url(tile_key),
+            etag=entry.get("etag"), last_modified=entry.get("last_modified")
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(int(jobs), len(cached)))) as pool:
+        checks = dict(zip(cached, pool.map(check, cached)))
+
+    for tile_key in cached:
+        name = product.cache_name(tile_key)
+        result = checks[tile_key]
+        status = result["status"]
+        if status == "UNKNOWN":
+            entry = cache.get(name)
+            if entry and result["content_length"] == entry["size"]:
+                cache.record(name, url=product.url(tile_key), size=entry["size"],
+                             etag=result["etag"], last_modified=result["last_modified"],
+                             sha256=entry["sha256"])
+                report["adopted"].append(tile_key)
+                continue
+            status = "STALE"
+        if status == "FRESH":
+            report["fresh"].append(tile_key)
+        elif status == "STALE":
+            report["stale"].append(tile_key)
+        elif status == "MISSING":
+            report["missing"].append(tile_key)
+        else:
+            report["failed"][tile_key] = result["message"]
+
+    if report["stale"]:
+        with ThreadPoolExecutor(max_workers=max(1, min(int(jobs), len(report["stale"])))) as pool:
+            futures = {
+                pool.submit(_fetch_tile, tile_key, cache, downloader, product): tile_key
+                for tile_key in report["stale"]
+            }
+            for future in as_completed(futures):
+                tile_key = futures[future]
+                try:
+                    future.result()
+                    report["refreshed"].append(tile_key)
+                except Exception as e:
+                    report["failed"][tile_key] = str(e)
+        report["refreshed"].sort(key=tiles.index)
+
+    print(f"[REFRESH] Checked {report['checked']} cached tiles: "
+          f"{len(report['fresh'])} fresh, {len(report['stale'])} stale, "
+          f"{len(report['refreshed'])} re-downloaded")
+    for key in ("stale", "adopted", "missing"):
+        if report[key]:
+            print(f"[REFRESH] {key.capitalize()}: {report[key]}")
+    if report["failed"]:
+        print(f"[REFRESH] Failed: {report['failed']}")
+    return report
+
+
+def plan_tiles(bbox, cache_dir=DEFAULT_CACHE_DIR, jobs=4, downloader=None, product=None,
+               resolution_m=None, remote=False, out_dir=DEFAULT_OUT_DIR,
+               resampling=DEFAULT_RESAMPLING, reuse_clips=True, **plan_options):
+    """
+    Dry run of fetch_and_clip_dem's download step: resolve the tiles,
+    split them into cache hits and misses (without touching the cache),
+    and size the misses with HEAD requests. See plan_utils.build_plan for
+    the plan fields and plan_options.
+
+    remote, out_dir, resampling and reuse_clips mirror fetch_and_clip_dem:
+    with remote=True the tiles are only checked to exist, since GDAL reads
+    them in place, and with reuse_clips a bbox inside an earlier clip in
+    out_dir needs no tiles at all ("reuse_clip" names it). Neither costs
+    any transfer or disk.
+    """
+    if product == "auto" or (product is None and resolution_m):
+        product = select_product(resolution_m, aoi=bbox)
+    product = get_product(product)
+    extra = {"product": product.name, "remote": bool(remote), "reuse_clip": None}
+
+    # Only look for earlier clips where merge_and_clip has indexed some;
+    # a dry run should not create the output directory
+    if (reuse_clips and isinstance(bbox, BoundingBox)
+            and os.path.exists(os.path.join(out_dir, INDEX_NAME))):
+        kind, source = get_clip_index(out_dir).best_source(
+            bbox, _clip_grid(product, resolution_m, resampling)
+        )
+        if kind == "contained":
+            extra["reuse_clip"] = source["name"]
+            return build_plan("dem", bbox, [], cache_dir, downloader=downloader, jobs=jobs,
+                              extra=extra, **plan_options)
+
+    # Remote reads never use the tile cache
+    cache = None if remote else get_cache(cache_dir)
+    items = [
+        {"key": tile_key, "url": product.url(tile_key),
+         "cached": cache is not None and cache.contains(product.cache_name(tile_key))}
+        for tile_key in product.tiles(bbox)
+    ]
+    return build_plan(
+        "dem", bbox, items, cache_dir, downloader=downloader, jobs=jobs,
+        transfer=not remote, extra=extra, **plan_options
+    )
+
+
+# ---------------------------------------------------------
+# Remote (windowed) access
+# ---------------------------------------------------------
+
+def remote_config(cache_mb=256):
+    """
+    GDAL config options for reading tiles through /vsicurl/: no directory
+    listing, merged multi-range requests, and a VSI_CACHE_SIZE read cache
+    of cache_mb for each opened tile.
+
+    CPL_VSIL_CURL_CACHE_SIZE, the global /vsicurl/ block cache, is only read
+    when GDAL first creates that cache, so it only applies to the subprocess
+    engine (a fresh gdalwarp per clip); in-process it is sized once per
+    process with set_remote_cache.
+    """
+    return {
+        "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+        "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif",
+        "GDAL_HTTP_MULTIRANGE": "YES",
+        "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+        "VSI_CACHE": "TRUE",
+        "VSI_CACHE_SIZE": str(int(cache_mb) * 1024 * 1024),
+        "CPL_VSIL_CURL_CACHE_SIZE": str(int(cache_mb) * 1024 * 1024),
+    }
+
+
+def remote_tile_paths(tiles, jobs=8, downloader=None, product=None):
+    """
+    Build /vsicurl/ paths for tiles so GDAL reads only the internal blocks
+    it needs via HTTP range requests. Each tile is checked with a HEAD
+    request first (concurrently, through the shared rate limiter).
+
+    Returns (tile_paths, failures) like download_tiles.
+    """
+    product = get_product(product)
+    downloader = downloader or get_downloader()
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(int(jobs), len(tiles)))) as pool:
+        checks = dict(zip(tiles, pool.map(lambda t: downloader.revalidate(product.url(t)), tiles)))
+
+    tile_paths = []
+    for tile_key in tiles:
+        status = checks[tile_key]["status"]
+        if status in ("MISSING", "ERROR"):
+            message = checks[tile_key]["message"] or status
+            print(f"[ERROR] Tile {tile_key} failed: {message}")
+            failures[tile_key] = message
+            continue
+        tile_paths.append(f"/vsicurl/{product.url(tile_key)}")
+    return tile_paths, failures
+
+
 # ---------------------------------------------------------
 # GDAL mosaic + clip
 # ---------------------------------------------------------
 
-def merge_and_clip(tile_paths, bbox: BoundingBox, out_dir=DEFAULT_OUT_DIR):
+# Creation options for the clipped DEM (Float32 elevations + alpha band);
+# PREDICTOR=3 is the floating-point predictor, which only applies to float data
+GTIFF_CREATION_OPTIONS = ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512",
+                          "COMPRESS=DEFLATE", "PREDICTOR=3", "BIGTIFF=IF_SAFER"]
+COG_CREATION_OPTIONS = ["BLOCKSIZE=512", "COMPRESS=DEFLATE", "PREDICTOR=YES",
+                        "OVERVIEWS=AUTO", "BIGTIFF=IF_SAFER"]
+
+
+# Config options GDAL only reads once per process; set_remote_cache sets
+# them in-process, so per-clip values only reach subprocess warps
+PROCESS_CONFIG_OPTIONS = ("CPL_VSIL_CURL_CACHE_SIZE",)
+
+
+def _gdal_available():
+    try:
+        from osgeo import gdal  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def set_gdal_cache(cache_mb):
     """
-    Create a VRT mosaic of the supplied tiles, then clip to bounding box.
-    Returns the output .tif path.
+    Size GDAL's block cache to cache_mb MB. The cache is process-wide, so
+    this is called once per process at startup (CLI main, batch clip
+    workers, the service) rather than per clip. No-op without the bindings.
     """
-    os.makedirs(out_dir, exist_ok=True)
+    if not cache_mb or not _gdal_available():
+        return
+    from osgeo import gdal
+    gdal.SetCacheMax(int(cache_mb) * 1024 * 1024)
+
 
-    vrt_path = os.path.join(out_dir, "_tmp_mosaic.vrt")
-    out_path = os.path.join(
+def set_remote_cache(cache_mb):
+    """
+    Size GDAL's global /vsicurl/ block cache to cache_mb MB. GDAL reads the
+    setting once, when the first remote file is opened, so this is called
+    once per process at startup (CLI main, the service) like set_gdal_cache.
+    No-op without the bindings.
+    """
+    if not cache_mb or not _gdal_available():
+        return
+    from osgeo import gdal
+    gdal.SetConfigOption("CPL_VSIL_CURL_CACHE_SIZE", str(int(cache_mb) * 1024 * 1024))
+
+
+def clip_path(bbox, out_dir=DEFAULT_OUT_DIR, product=None, resolution_m=None,
+              resampling=DEFAULT_RESAMPLING, cog=False):
+    """
+    Output path merge_and_clip uses for a bounding box or PolygonAOI
+    (polygon clips get a short geometry hash appended). Clips of another
+    product than 1 arc-second, or resampled to resolution_m, get the
+    product name / resolution (and a non-default resampling) appended;
+    Cloud-Optimized GeoTIFFs get "_cog".
+    """
+    suffix = ""
+    product = get_product(product)
+    if product.name != DEFAULT_PRODUCT:
+        suffix += f"_{product.name}"
+    if resolution_m:
+        suffix += f"_{resolution_m:g}m"
+        if resampling != DEFAULT_RESAMPLING:
+            suffix += f"_{resampling}"
+    if cog:
+        suffix += "_cog"
+    if isinstance(bbox, BoundingBox):
+        return os.path.join(
+            out_dir,
+            f"DEM_{bbox.xmin}_{bbox.ymin}_{bbox.xmax}_{bbox.ymax}{suffix}.tif"
+        )
+    env = bbox.bbox
+    return os.path.join(
         out_dir,
-        f"DEM_{bbox.xmin}_{bbox.ymin}_{bbox.xmax}_{bbox.ymax}.tif"
+        f"DEM_{env.xmin}_{env.ymin}_{env.xmax}_{env.ymax}_{bbox.key}{suffix}.tif"
     )
 
-    # Build mosaic VRT
-    subprocess.run(
-        ["gdalbuildvrt", vrt_path, *tile_paths],
-        check=True
-    )
 
-    # Clip to bounding box using gdalwarp
-    subprocess.run(
-        [
+def _warp_in_process(tile_paths, bbox, tmp_path, num_threads, cache_mb, cog, config,
+                     cutline=None, dst_srs=None, xy_res=None, resampling=None):
+    """
+    Mosaic and clip with the GDAL Python bindings, using an in-memory
+    (/vsimem/) VRT and multithreaded warping. cutline is an optional
+    GeoJSON polygon string; pixels outside it are masked.
+
+    With dst_srs the tiles are reprojected (and warped directly, since a
+    VRT cannot mix UTM zones); xy_res is the output pixel size and
+    resampling the GDAL resampling method.
+    """
+    from osgeo import gdal
+    gdal.UseExceptions()
+
+    # Config options are set thread-locally so concurrent clips (and other
+    # GDAL users in this process) never see each other's settings. The block
+    # caches are process-wide (see set_gdal_cache / set_remote_cache);
+    # cache_mb bounds the warp memory.
+    config = {key: value for key, value in config.items() if key not in PROCESS_CONFIG_OPTIONS}
+    previous = {key: gdal.GetThreadLocalConfigOption(key) for key in config}
+    for key, value in config.items():
+        gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        _build_and_warp(gdal, tile_paths, bbox, tmp_path, num_threads, cache_mb, cog, cutline,
+                        dst_srs, xy_res, resampling)
+    finally:
+        for key, value in previous.items():
+            gdal.SetThreadLocalConfigOption(key, value)
+
+
+def _build_and_warp(gdal, tile_paths, bbox, tmp_path, num_threads, cache_mb, cog, cutline,
+                    dst_srs=None, xy_res=None, resampling=None):
+    vrt_path = None if dst_srs else f"/vsimem/mosaic_{uuid.uuid4().hex}.vrt"
+    cutline_path = None
+    vrt = gdal.BuildVRT(vrt_path, list(tile_paths)) if vrt_path else None
+    try:
+        extra_kwargs = {}
+        if cutline:
+            cutline_path = f"/vsimem/cutline_{uuid.uuid4().hex}.geojson"
+            gdal.FileFromMemBuffer(cutline_path, cutline.encode())
+            extra_kwargs.update(cutlineDSName=cutline_path, cutlineSRS="EPSG:4326")
+        if dst_srs:
+            extra_kwargs["dstSRS"] = dst_srs
+        if xy_res:
+            extra_kwargs.update(xRes=xy_res[0], yRes=xy_res[1])
+        if resampling:
+            extra_kwargs["resampleAlg"] = resampling
+        options = gdal.WarpOptions(
+            format="COG" if cog else "GTiff",
+            outputBounds=(bbox.xmin, bbox.ymin, bbox.xmax, bbox.ymax),
+            outputBoundsSRS="EPSG:4326", # Specify BBOX coordinate system
+            dstAlpha=True, # Add an alpha band for areas with no data
+            multithread=True,
+            warpOptions=[f"NUM_THREADS={num_threads}"],
+            warpMemoryLimit=max(64, int(cache_mb or 0) // 2) * 1024 * 1024,
+            creationOptions=(COG_CREATION_OPTIONS + [f"NUM_THREADS={num_threads}"]
+                             if cog else GTIFF_CREATION_OPTIONS + [f"NUM_THREADS={num_threads}"]),
+            **extra_kwargs,
+        )
+        out_ds = gdal.Warp(tmp_path, vrt if vrt is not None else list(tile_paths), options=options)
+        out_ds = None # Flush and close
+    finally:
+        vrt = None
+        if vrt_path:
+            gdal.Unlink(vrt_path)
+        if cutline_path:
+            gdal.Unlink(cutline_path)
+
+
+def _warp_subprocess(tile_paths, bbox, tmp_path, num_threads, cache_mb, cog, config,
+                     cutline=None, dst_srs=None, xy_res=None, resampling=None):
+    """
+    Mosaic and clip by shelling out to gdalbuildvrt / gdalwarp (or gdalwarp
+    alone over all tiles when reprojecting to dst_srs).
+    """
+    vrt_path = tmp_path + ".vrt"
+    cutline_path = tmp_path + ".cutline.geojson"
+    env = {**os.environ, **config} # GDAL reads config options from the environment
+    creation_options = COG_CREATION_OPTIONS if cog else GTIFF_CREATION_OPTIONS
+    try:
+        # Build mosaic VRT
+        if dst_srs:
+            sources = list(tile_paths)
+        else:
+            subprocess.run(
+                ["gdalbuildvrt", vrt_path, *tile_paths],
+                check=True, env=env
+            )
+            sources = [vrt_path]
+
+        # Clip to bounding box using gdalwarp
+        cmd = [
             "gdalwarp",
             "-te", str(bbox.xmin), str(bbox.ymin), str(bbox.xmax), str(bbox.ymax),
             "-te_srs", "EPSG:4326", # Specify BBOX coordinate system
             "-dstalpha", # Add an alpha band for areas with no data
-            vrt_path,
-            out_path
-        ],
-        check=True
-    )
+            "-multi", "-wo", f"NUM_THREADS={num_threads}",
+            "-of", "COG" if cog else "GTiff",
+        ]
+        if cutline:
+            with open(cutline_path, "w") as f:
+                f.write(cutline)
+            cmd += ["-cutline", cutline_path, "-cutline_srs", "EPSG:4326"]
+        if dst_srs:
+            cmd += ["-t_srs", dst_srs]
+        if xy_res:
+            cmd += ["-tr", repr(xy_res[0]), repr(xy_res[1])]
+        if resampling:
+            cmd += ["-r", resampling]
+        if cache_mb:
+            cmd += ["--config", "GDAL_CACHEMAX", str(int(cache_mb)),
+                    "-wm", str(max(64, int(cache_mb) // 2))]
+        for co in creation_options + [f"NUM_THREADS={num_threads}"]:
+            cmd += ["-co", co]
+        subprocess.run([*cmd, *sources, tmp_path], check=True, env=env)
+    finally:
+        # Clean up the temporary VRT and cutline files
+        for path in (vrt_path, cutline_path):
+            if os.path.exists(path):
+                os.remove(path)
 
-    # Clean up the temporary VRT file
-    if os.path.exists(vrt_path):
-        os.remove(vrt_path)
-        
-    print(f"[DONE] Wrote clipped DEM to: {out_path}")
+
+# ---------------------------------------------------------
+# Clip reuse
+# ---------------------------------------------------------
+
+def _clip_grid(product, resolution_m, resampling):
+    """clip_index grid key of the clips merge_and_clip writes with these options."""
+    return grid_key(product.name, resolution_m,
+                    resampling if (resolution_m or product.projected) else None)
+
+
+def _raster_grid(path, engine):
+    """(geotransform, cols, rows) of a raster, via the bindings or gdalinfo -json."""
+    if engine == "gdal":
+        from osgeo import gdal
+        ds = gdal.Open(path)
+        try:
+            return ds.GetGeoTransform(), ds.RasterXSize, ds.RasterYSize
+        finally:
+            ds = None
+    info = json.loads(subprocess.run(
+        ["gdalinfo", "-json", path], check=True, capture_output=True, text=True
+    ).stdout)
+    return info["geoTransform"], info["size"][0], info["size"][1]
+
+
+def _register_clip(out_path, out_dir, grid, clip_budget_bytes, grid_info=None):
+    """
+    Record a finished clip in the output directory's cache manifest (for
+    the LRU size budget) and, for bbox clips (grid given), in its clip
+    index; then evict old clips if the directory is over budget.
+    """
+    name = os.path.basename(out_path)
+    if grid:
+        get_clip_index(out_dir).add(name, grid, *grid_info)
+    cache = get_cache(out_dir, budget_bytes=clip_budget_bytes)
+    cache.record(name)
+    for evicted in cache.evict(protect={name}):
+        # DEMSampler's elevation sidecars are not in the manifest
+        for sidecar in (ELEVATION_SIDECAR, ELEVATION_SIDECAR + ".json"):
+            path = cache.path(evicted) + sidecar
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _reuse_clip(kind, source, tile_paths, bbox, out_path, out_dir, warp, num_threads,
+                cache_mb, cog, config, product, resolution_m, resampling):
+    """
+    Build the clip for bbox from an earlier clip on the same grid: a
+    windowed copy when source contains bbox, otherwise the missing strips
+    are warped from the tiles onto the source's pixel grid and mosaicked
+    with it. The output is bbox snapped outward to that grid (at most one
+    pixel larger per side). Returns the grid info for the clip index.
+    """
+    res = source["res"]
+    target = snap_to_grid(bbox, (source["bounds"].xmin, source["bounds"].ymax), res)
+    tmp_path = os.path.join(out_dir, f"_tmp_{uuid.uuid4().hex}.tif")
+    strip_paths = []
+    try:
+        with timer("clip_reuse") as t:
+            if kind == "partial":
+                for strip in missing_strips(target, source["bounds"]):
+                    strip_path = f"{tmp_path}.strip{len(strip_paths)}.tif"
+                    warp(tile_paths, strip, strip_path, num_threads, cache_mb, False, config,
+                         dst_srs=OUTPUT_SRS if product.projected else None, xy_res=res,
+                         resampling=resampling if (resolution_m or product.projected) else None)
+                    strip_paths.append(strip_path)
+            # Same grid, so nearest neighbour is an exact pixel copy
+            warp([source["path"], *strip_paths], target, tmp_path, num_threads, cache_mb, cog,
+                 {}, xy_res=res, resampling="near")
+            t.add_bytes(os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_path)
+    finally:
+        for path in [tmp_path, *strip_paths]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    count(f"clip_reused_{kind}")
+    get_cache(out_dir).touch(source["name"])
+    cols = round((target.xmax - target.xmin) / res[0])
+    rows = round((target.ymax - target.ymin) / res[1])
+    return (target.xmin, res[0], 0.0, target.ymax, 0.0, -res[1]), cols, rows
+
+
+def merge_and_clip(tile_paths, bbox, out_dir=DEFAULT_OUT_DIR,
+                   engine="auto", num_threads="ALL_CPUS", cache_mb=512, cog=False,
+                   config_options=None, product=None, resolution_m=None,
+                   resampling=DEFAULT_RESAMPLING, reuse_clips=True, clip_budget_bytes=None):
+    """
+    Create a VRT mosaic of the supplied tiles, then clip to bounding box.
+    Returns the output .tif path.
+
+    engine selects how GDAL is driven: "gdal" (in-process bindings with an
+    in-memory VRT), "subprocess" (gdalbuildvrt + gdalwarp) or "auto" (the
+    bindings when importable). Warping uses num_threads worker threads and
+    cache_mb / 2 MB of warp memory; the subprocess engine also gets a
+    cache_mb MB block cache, while in-process the block cache is sized
+    once per process with set_gdal_cache. Output is a tiled, DEFLATE-compressed
+    GeoTIFF, or a Cloud-Optimized GeoTIFF with internal overviews when cog
+    is set. The result is written to a unique temp file and renamed into
+    place, so concurrent clips never share intermediate files.
+
+    tile_paths may be local files or GDAL virtual paths (e.g. /vsicurl/);
+    config_options are GDAL config options applied for the duration of
+    the clip (see remote_config).
+
+    bbox may also be a PolygonAOI (aoi_utils): the output covers its
+    envelope and the polygon is applied as a cutline, so pixels outside
+    it become nodata / transparent.
+
+    product names the DEMProduct the tiles belong to; projected (1 m)
+    tiles are reprojected to OUTPUT_SRS. With resolution_m the output is
+    resampled to that ground resolution (in metres, at the AOI's centre
+    latitude) using resampling, one of RESAMPLING_METHODS.
+
+    With reuse_clips, a BoundingBox clip is served from earlier clips in
+    out_dir where possible (see clip_index): cut out of a clip that
+    contains it, or, if a clip covers most of it, built from that clip
+    plus only the missing strips warped from tile_paths. Clips in out_dir
+    are kept within clip_budget_bytes by LRU eviction.
+    """
+    if resampling not in RESAMPLING_METHODS:
+        raise ValueError(f"Unknown resampling method: {resampling}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    product = get_product(product)
+    out_path = clip_path(bbox, out_dir, product, resolution_m, resampling, cog)
+    tmp_path = os.path.join(out_dir, f"_tmp_{uuid.uuid4().hex}.tif")
+
+    if engine == "auto":
+        engine = "gdal" if _gdal_available() else "subprocess"
+    if engine not in ("gdal", "subprocess"):
+        raise ValueError(f"Unknown merge_and_clip engine: {engine}")
+
+    warp = _warp_in_process if engine == "gdal" else _warp_subprocess
+    grid = _clip_grid(product, resolution_m, resampling) if isinstance(bbox, BoundingBox) else None
+    start = time.perf_counter()
+
+    if reuse_clips and grid:
+        kind, source = get_clip_index(out_dir).best_source(bbox, grid)
+        if kind == "contained" and source["path"] == out_path:
+            print(f"[CACHE] {os.path.basename(out_path)} already exists.")
+            get_cache(out_dir).touch(source["name"])
+            return out_path
+        if kind == "partial" and not tile_paths:
+            kind = None
+        if kind:
+            # Keep the source clip from being evicted by a concurrent clip
+            with get_cache(out_dir).hold([source["name"]]):
+                grid_info = _reuse_clip(kind, source, tile_paths, bbox, out_path, out_dir,
+                                        warp, num_threads, cache_mb, cog, config_options or {},
+                                        product, resolution_m, resampling)
+            _register_clip(out_path, out_dir, grid, clip_budget_bytes, grid_info)
+            print(f"[DONE] Wrote clipped DEM to: {out_path} ({kind} reuse of "
+                  f"{source['name']}, {time.perf_counter() - start:.2f} s)")
+            return out_path
+    if not tile_paths:
+        raise ValueError("No tiles to clip, and no earlier clip contains the bounding box.")
+
+    try:
+        cutline = None if isinstance(bbox, BoundingBox) else bbox.to_geojson()
+        with timer("warp") as t:
+            warp(tile_paths, aoi_bbox(bbox), tmp_path, num_threads, cache_mb, cog,
+                 config_options or {}, cutline=cutline,
+                 dst_srs=OUTPUT_SRS if product.projected else None,
+                 xy_res=output_resolution(resolution_m, bbox) if resolution_m else None,
+                 resampling=resampling if (resolution_m or product.projected) else None)
+            t.add_bytes(os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    elapsed = time.perf_counter() - start
+    _register_clip(out_path, out_dir, grid, clip_budget_bytes,
+                   _raster_grid(out_path, engine) if grid else None)
+
+    print(f"[DONE] Wrote clipped DEM to: {out_path} "
+          f"({engine} engine, {len(tile_paths)} tiles of {product.label}, {elapsed:.2f} s)")
     return out_path
 
 
@@ -150,31 +1042,290 @@ def merge_and_clip(tile_paths, bbox: BoundingBox, out_dir=DEFAULT_OUT_DIR):
 # High-level entry point for external scripts
 # ---------------------------------------------------------
 
-def fetch_and_clip_dem(bbox: BoundingBox,
+def fetch_and_clip_dem(bbox,
                        cache_dir=DEFAULT_CACHE_DIR,
-                       out_dir=DEFAULT_OUT_DIR):
+                       out_dir=DEFAULT_OUT_DIR,
+                       jobs=4,
+                       downloader=None,
+                       cache_budget_bytes=None,
+                       refresh=False,
+                       engine="auto",
+                       num_threads="ALL_CPUS",
+                       cache_mb=512,
+                       cog=False,
+                       remote=False,
+                       remote_cache_mb=256,
+                       product=None,
+                       resolution_m=None,
+                       resampling=DEFAULT_RESAMPLING,
+                       reuse_clips=True,
+                       clip_budget_bytes=None):
     """
     High-level utility that:
     1. Finds all tiles for the bounding box
-    2. Downloads them (using cache)
-    3. Mosaics + clips them
+       (and, with refresh=True, revalidates the cached ones upstream)
+    2. Downloads them concurrently (using cache, `jobs` workers), keeping the
+       cache within cache_budget_bytes if given. With remote=True nothing is
+       downloaded: GDAL reads only the blocks overlapping the bbox through
+       /vsicurl/ range requests, with a remote_cache_mb read cache per
+       tile (the global /vsicurl/ cache is sized by set_remote_cache).
+    3. Mosaics + clips them (see merge_and_clip for engine / threads / COG)
     4. Returns output DEM path
+
+    bbox may be a BoundingBox (fast path) or a PolygonAOI, in which case only
+    tiles intersecting the polygon are fetched and the clip uses it as a
+    cutline.
+
+    product is a PRODUCTS name ("1", "13", "1m") or "auto". With "auto",
+    or no product but a resolution_m, select_product picks the coarsest
+    product meeting resolution_m; no product and no resolution means the
+    1 arc-second product at its native resolution. resolution_m and
+    resampling also set the output pixel size (see merge_and_clip).
+
+    With reuse_clips (ignored when refreshing), a bbox contained in an
+    earlier clip is cut from it without resolving or downloading tiles;
+    see merge_and_clip for partial reuse and clip_budget_bytes.
     """
-    tiles = tiles_for_bbox(bbox)
+    if product == "auto" or (product is None and resolution_m):
+        if not resolution_m:
+            raise ValueError("Automatic product selection needs a resolution_m.")
+        product = select_product(resolution_m, aoi=bbox)
+    product = get_product(product)
+    reuse_clips = reuse_clips and not refresh
+
+    if reuse_clips and isinstance(bbox, BoundingBox):
+        kind, source = get_clip_index(out_dir).best_source(
+            bbox, _clip_grid(product, resolution_m, resampling)
+        )
+        if kind == "contained":
+            print(f"[CACHE] Bounding box is inside {source['name']}; no tiles needed.")
+            try:
+                return merge_and_clip(
+                    [], bbox, out_dir=out_dir, engine=engine, num_threads=num_threads,
+                    cache_mb=cache_mb, cog=cog, product=product, resolution_m=resolution_m,
+                    resampling=resampling, clip_budget_bytes=clip_budget_bytes
+                )
+            except ValueError:
+                # The clip was evicted (or replaced) in the meantime
+                print(f"[WARN] {source['name']} is no longer usable; resolving tiles.")
+
+    tiles = product.tiles(bbox)
     if not tiles:
         print("[WARN] No tiles found for the given bounding box.")
         return None
         
-    print(f"[INFO] Tiles needed: {tiles}")
+    print(f"[INFO] {product.label} tiles needed: {tiles}")
 
-    tile_paths = []
+    config_options = None
+    if remote:
+        tile_paths, failures = remote_tile_paths(tiles, jobs=jobs, downloader=downloader,
+                                                 product=product)
+        config_options = remote_config(remote_cache_mb)
+        held = contextlib.nullcontext()
+    else:
+        cache = get_cache(cache_dir, budget_bytes=cache_budget_bytes)
+        # Hold this request's tiles until the clip is written, so a
+        # concurrent job's eviction cannot delete them mid-warp
+        held = cache.hold(product.cache_name(tile_key) for tile_key in tiles)
+
+    with held:
+        if not remote:
+            if refresh:
+                refresh_tiles(tiles, cache_dir=cache_dir, jobs=jobs, downloader=downloader,
+                              cache=cache, product=product)
+
+            tile_paths, failures = download_tiles(
+                tiles, cache_dir=cache_dir, jobs=jobs, downloader=downloader, cache=cache,
+                product=product
+            )
+        if failures:
+            print(f"[ERROR] Failed to {'open' if remote else 'download'} {len(failures)} of "
+                  f"{len(tiles)} tiles: {sorted(failures)}")
+            if not remote:
+                print(f"[INFO] {len(tile_paths)} tiles were downloaded and remain cached.")
+            return None
+
+        return merge_and_clip(
+            tile_paths, bbox, out_dir=out_dir, engine=engine,
+            num_threads=num_threads, cache_mb=cache_mb, cog=cog,
+            config_options=config_options, product=product,
+            resolution_m=resolution_m, resampling=resampling,
+            reuse_clips=reuse_clips, clip_budget_bytes=clip_budget_bytes
+        )
+
+
+# ---------------------------------------------------------
+# Reading the DEM back
+# ---------------------------------------------------------
+
+# Points per vectorized batch in DEMSampler.sample, bounding temporaries
+SAMPLE_BATCH = 1 << 21
+
+# Suffix of the uncompressed elevation cache DEMSampler keeps next to a DEM
+ELEVATION_SIDECAR = ".elev.npy"
+
+
+class DEMSampler:
+    """
+    Vectorized point sampler over a DEM held as a float32 array (usually a
+    read-only memory map), with NaN marking nodata / alpha-masked pixels.
+
+    DEMSampler.open builds (once) an uncompressed .elev.npy sidecar next to
+    the GeoTIFF, so later samples only page in the parts of the raster the
+    points actually touch, with no GDAL decompression.
+    """
+    def __init__(self, data, geotransform):
+        self.data = data
+        self.geotransform = tuple(geotransform)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @classmethod
+    def open(cls, dem_path, cache_path=None):
+        """
+        Memory-map the elevation sidecar for dem_path, (re)building it from
+        the GeoTIFF when missing or older than the DEM.
+        """
+        cache_path = cache_path or dem_path + ELEVATION_SIDECAR
+        meta_path = cache_path + ".json"
+        stat = os.stat(dem_path)
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        meta = None
+        if os.path.exists(cache_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("source") != signature:
+                meta = None
+        if meta is None:
+            meta = _build_elevation_cache(dem_path, cache_path, signature)
+
+        return cls(np.load(cache_path, mmap_mode="r"), meta["geotransform"])
+
+    def sample(self, lons, lats, method="bilinear"):
+        """
+        Elevations at arrays of lon/lat, as float32 with NaN for points off
+        the raster or on nodata. method is "nearest" or "bilinear"; bilinear
+        samples next to a nodata pixel are NaN too.
+        """
+        if method not in ("nearest", "bilinear"):
+            raise ValueError(f"Unknown sampling method: {method}")
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        out = np.empty(lons.shape, dtype=np.float32)
+        flat_lon, flat_lat, flat_out = lons.ravel(), lats.ravel(), out.reshape(-1)
+
+        for start in range(0, flat_out.size, SAMPLE_BATCH):
+            end = start + SAMPLE_BATCH
+            flat_out[start:end] = self._sample_batch(flat_lon[start:end], flat_lat[start:end], method)
+        return out
+
+    def _sample_batch(self, lons, lats, method):
+        gt = self.geotransform
+        data = self.data
+        rows, cols = data.shape
+
+        # Fractional pixel coordinates (north-up rasters, no rotation terms)
+        col = (lons - gt[0]) / gt[1]
+        row = (lats - gt[3]) / gt[5]
+        out = np.full(lons.shape, np.nan, dtype=np.float32)
+
+        if method == "nearest":
+            ok = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+            out[ok] = data[row[ok].astype(np.int64), col[ok].astype(np.int64)]
+            return out
+
+        # Interpolate between the four surrounding pixel centres
+        ok = (col >= 0) & (col <= cols) & (row >= 0) & (row <= rows)
+        x, y = col[ok] - 0.5, row[ok] - 0.5
+        c0 = np.clip(np.floor(x).astype(np.int64), 0, max(cols - 2, 0))
+        r0 = np.clip(np.floor(y).astype(np.int64), 0, max(rows - 2, 0))
+        c1, r1 = np.minimum(c0 + 1, cols - 1), np.minimum(r0 + 1, rows - 1)
+        fx = np.clip(x - c0, 0.0, 1.0).astype(np.float32)
+        fy = np.clip(y - r0, 0.0, 1.0).astype(np.float32)
+        top = data[r0, c0] * (1 - fx) + data[r0, c1] * fx
+        bottom = data[r1, c0] * (1 - fx) + data[r1, c1] * fx
+        out[ok] = top * (1 - fy) + bottom * fy
+        return out
+
+
+def read_elevation(ds, xoff, yoff, xsize, ysize):
+    """
+    Read a window of a DEM dataset's elevation band as float32, with nodata
+    and pixels masked by an alpha band (merge_and_clip's -dstalpha) as NaN.
+    """
+    from osgeo import gdal
+
+    band = ds.GetRasterBand(1)
+    chunk = band.ReadAsArray(xoff, yoff, xsize, ysize).astype(np.float32)
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        chunk[chunk == nodata] = np.nan
+    for i in range(2, ds.RasterCount + 1):
+        alpha = ds.GetRasterBand(i)
+        if alpha.GetColorInterpretation() == gdal.GCI_AlphaBand:
+            chunk[alpha.ReadAsArray(xoff, yoff, xsize, ysize) == 0] = np.nan
+            break
+    return chunk
+
+
+def _build_elevation_cache(dem_path, cache_path, signature):
+    """
+    Stream the DEM's elevation band block row by block row into a float32
+    .npy memory map, folding nodata and the alpha band into NaN.
+    """
+    from osgeo import gdal
+    gdal.UseExceptions()
+
+    ds = gdal.Open(dem_path)
     try:
-        for tile_key in tiles:
-            tile_paths.append(download_tile(tile_key, cache_dir=cache_dir))
-    except RuntimeError as e:
-        print(f"[ERROR] Failed during tile download: {e}")
-        return None
+        cols, rows = ds.RasterXSize, ds.RasterYSize
+        block_rows = max(ds.GetRasterBand(1).GetBlockSize()[1], 256)
+        tmp_path = cache_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(rows, cols))
+        for y in range(0, rows, block_rows):
+            n = min(block_rows, rows - y)
+            out[y:y + n] = read_elevation(ds, 0, y, cols, n)
+        out.flush()
+        del out
+        geotransform = ds.GetGeoTransform()
+    finally:
+        ds = None
 
-    return merge_and_clip(
-        tile_paths, bbox, out_dir=out_dir
-    )
+    os.replace(tmp_path, cache_path)
+    meta = {"source": signature, "geotransform": list(geotransform), "shape": [rows, cols]}
+    # The metadata is written last so an interrupted build is rebuilt next time
+    with open(cache_path + ".json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(cache_path + ".json.tmp", cache_path + ".json")
+    print(f"[INFO] Built elevation cache {cache_path} ({rows}x{cols})")
+    return meta
+
+
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+def get_sampler(dem_path):
+    """Return a shared DEMSampler for dem_path, reopening it if the DEM changed."""
+    key = os.path.abspath(dem_path)
+    mtime = os.stat(dem_path).st_mtime_ns
+    with _samplers_lock:
+        cached = _samplers.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, DEMSampler.open(dem_path))
+            _samplers[key] = cached
+        return cached[1]
+
+
+def sample_dem(dem_path, lons, lats, method="bilinear"):
+    """
+    Sample elevations from a (clipped) DEM at arrays of lon/lat.
+
+    method is "nearest" or "bilinear". Points outside the raster, on nodata
+    or on pixels masked by the alpha band (see merge_and_clip) come back as
+    NaN. See DEMSampler for the memory-mapped cache this reads through.
+    """
+    return get_sampler(dem_path).sample(lons, lats, method)
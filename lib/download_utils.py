@@ -1,10 +1,785 @@
 import os
+import json
 import time
+import hashlib
+import struct
+import zlib
+import threading
 import requests
 import zipfile
 import shutil
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 
-def download_file(url, local_filepath, stream=True, timeout=30, chunk_size=8192):
+from .metrics_utils import timed, count
+
+# Per-host politeness limits: host -> (requests_per_second, max_in_flight)
+DEFAULT_RATE_LIMITS = {
+    "prd-tnm.s3.amazonaws.com": (5.0, 8),
+}
+DEFAULT_RATE = 2.0
+DEFAULT_MAX_IN_FLIGHT = 4
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def adaptive_chunk_size(total_size):
+    """
+    Pick a streaming chunk size for a download of total_size bytes:
+    roughly 1/256th of the file, clamped to [64 KiB, 4 MiB].
+    """
+    size = MIN_CHUNK_SIZE
+    while size < MAX_CHUNK_SIZE and size * 256 < total_size:
+        size *= 2
+    return size
+
+
+def _content_range_start(content_range):
+    """Parse the first byte offset from a 'bytes START-END/TOTAL' header."""
+    try:
+        return int(content_range.split()[1].split('-')[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _hash_file_into(path, hasher, chunk_size=MAX_CHUNK_SIZE):
+    """Feed the existing contents of path into hasher."""
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+
+
+def _validators_path(part_path):
+    """Sidecar holding the ETag / Last-Modified a .part file was fetched with."""
+    return part_path + ".json"
+
+
+def _load_validators(part_path):
+    """(etag, last_modified) recorded for part_path, or (None, None)."""
+    try:
+        with open(_validators_path(part_path)) as f:
+            meta = json.load(f)
+        return meta.get("etag"), meta.get("last_modified")
+    except (OSError, ValueError, AttributeError):
+        return None, None
+
+
+def _save_validators(part_path, etag, last_modified):
+    tmp_path = _validators_path(part_path) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"etag": etag, "last_modified": last_modified}, f)
+    os.replace(tmp_path, _validators_path(part_path))
+
+
+def _discard_part(part_path):
+    """Remove a partial download and its validators sidecar."""
+    for path in (part_path, _validators_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class TokenBucket:
+    """
+    Simple thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `burst`. Each
+    acquire() consumes one token, blocking until one is available.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """
+    Combines a request-rate token bucket with a cap on in-flight requests.
+    Use as a context manager around a single request.
+    """
+    def __init__(self, rate, max_in_flight):
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(rate)
+        self._slots = threading.BoundedSemaphore(max(1, int(max_in_flight)))
+
+    def __enter__(self):
+        self._slots.acquire()
+        try:
+            self.bucket.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        """Block until the leader finishes; return its result or re-raise its error."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent work on the same key (e.g. a cache file path):
+    the first caller (the leader) does the work and every caller that
+    arrives while it is in flight waits for and shares its outcome, so
+    overlapping requests never download the same file twice.
+
+    do() covers work done in one call; begin() / end() let the leader
+    finish on another thread (e.g. after a separate extract stage).
+    """
+    def __init__(self, name="flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def begin(self, key):
+        """Return (flight, is_leader). The leader must call end(key, ...)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                count(f"{self.name}_coalesced")
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def end(self, key, result=None, error=None):
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight.result, flight.error = result, error
+        flight.done.set()
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs) once for all concurrent callers with this key."""
+        flight, leader = self.begin(key)
+        if not leader:
+            return flight.wait()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.end(key, error=e)
+            raise
+        self.end(key, result=result)
+        return result
+
+
+class Downloader:
+    """
+    Reusable HTTP downloader backed by a pooled, keep-alive requests.Session
+    and per-host rate limiting.
+
+    A single instance is safe to share between threads; dem_utils and
+    gpkg_utils share the module default returned by get_downloader().
+    """
+    def __init__(self, rate_limits=None, default_rate=DEFAULT_RATE,
+                 default_max_in_flight=DEFAULT_MAX_IN_FLIGHT, pool_size=16,
+                 timeout=30, chunk_size=None, retries=3):
+        """
+        Args:
+            rate_limits (dict, optional): host -> (requests_per_second, max_in_flight).
+                Defaults to DEFAULT_RATE_LIMITS.
+            default_rate (float, optional): Requests/sec for hosts not in rate_limits.
+            default_max_in_flight (int, optional): In-flight cap for hosts not in rate_limits.
+            pool_size (int, optional): Keep-alive connections kept per host. Defaults to 16.
+            timeout (int, optional): Request timeout. Defaults to 30.
+            chunk_size (int, optional): Download chunk size. Defaults to adaptive.
+            retries (int, optional): Resume attempts per download. Defaults to 3.
+        """
+        self.default_rate = default_rate
+        self.default_max_in_flight = default_max_in_flight
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.retries = retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+        limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        for host, (rate, max_in_flight) in limits.items():
+            self.set_rate_limit(host, rate, max_in_flight)
+
+    def set_rate_limit(self, host, rate, max_in_flight):
+        """Configure (or replace) the limiter for a host (e.g. 'localhost:8000')."""
+        with self._limiters_lock:
+            self._limiters[host.lower()] = HostLimiter(rate, max_in_flight)
+
+    def limiter_for(self, url):
+        """Return the HostLimiter for the URL's host, creating a default one if needed."""
+        host = urlsplit(url).netloc.lower()
+        with self._limiters_lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostLimiter(self.default_rate, self.default_max_in_flight)
+                self._limiters[host] = limiter
+            return limiter
+
+    @timed("download", nbytes=lambda r: r["bytes"], ok=lambda r: r["success"])
+    def fetch(self, url, local_filepath, timeout=None, chunk_size=None,
+              expected_sha256=None, retries=None):
+        """
+        Downloads a file from a URL to a local path, safely.
+
+        Data is written to '<local_filepath>.part' and only renamed onto
+        local_filepath (atomically) once its length matches Content-Length
+        and, if given, its SHA-256 matches expected_sha256. An existing
+        .part file from an interrupted run is resumed with an HTTP Range
+        request, guarded by If-Range with the validators saved in
+        '<local_filepath>.part.json', so a changed remote file restarts from
+        byte 0; a .part with no known validator is discarded. Connection
+        errors mid-transfer are retried by resuming.
+
+        Args:
+            url (str): The URL to download from.
+            local_filepath (str): The local path to save the file.
+            timeout (int, optional): Request timeout. Defaults to the instance timeout.
+            chunk_size (int, optional): Download chunk size. Defaults to an
+                adaptive size based on Content-Length.
+            expected_sha256 (str, optional): Hex digest the file must match.
+            retries (int, optional): Resume attempts after a dropped connection.
+                Defaults to the instance retries.
+
+        Returns:
+            dict: {"success", "message", "path", "bytes", "sha256", "resumed",
+                   "etag", "last_modified"}
+        """
+        timeout = self.timeout if timeout is None else timeout
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        retries = self.retries if retries is None else retries
+        part_path = local_filepath + ".part"
+        result = {
+            "success": False, "message": None, "path": local_filepath,
+            "bytes": 0, "sha256": None, "resumed": False,
+            "etag": None, "last_modified": None,
+        }
+
+        # Ensure the target directory exists
+        os.makedirs(os.path.dirname(local_filepath), exist_ok=True)
+
+        attempt = 0
+        while True:
+            try:
+                done, message = self._fetch_once(
+                    url, part_path, result, timeout, chunk_size
+                )
+                if not done and message is None:
+                    continue # Partial file was discarded; restart from byte 0
+                if not done:
+                    result["message"] = message
+                    return result
+                break
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout) as err:
+                attempt += 1
+                if attempt > retries:
+                    result["message"] = f"An unexpected error occurred for {url}: {err}"
+                    return result
+                print(f"  [WARN] Transfer interrupted ({err}); resuming "
+                      f"(attempt {attempt}/{retries})")
+            except requests.exceptions.HTTPError as errh:
+                result["message"] = f"HTTP Error for {url}: {errh}"
+                return result
+            except requests.exceptions.RequestException as err:
+                result["message"] = f"An unexpected error occurred for {url}: {err}"
+                return result
+
+        if expected_sha256 and result["sha256"] != expected_sha256.lower():
+            _discard_part(part_path)
+            result["message"] = (f"Checksum mismatch for {url}: expected "
+                                 f"{expected_sha256}, got {result['sha256']}")
+            return result
+
+        os.replace(part_path, local_filepath)
+        _discard_part(part_path)
+        result["success"] = True
+        print(f"  [SUCCESS] Downloaded to: {local_filepath}")
+        return result
+
+    def _fetch_once(self, url, part_path, result, timeout, chunk_size):
+        """
+        One request/stream pass of fetch(). Returns (done, error_message);
+        (False, None) means the partial file was discarded and fetch() should
+        restart. Raises requests exceptions on transport errors so fetch() can resume.
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and not (result["etag"] or result["last_modified"]):
+            # Left by an earlier run: resume only with the validators it was fetched with
+            result["etag"], result["last_modified"] = _load_validators(part_path)
+            if not (result["etag"] or result["last_modified"]):
+                print(f"  [WARN] No validator recorded for {part_path}; restarting download.")
+                _discard_part(part_path)
+                offset = 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = result["etag"] or result["last_modified"]
+
+        # Wait for a rate-limit token and an in-flight slot for this host
+        with self.limiter_for(url):
+            with self.session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+                if r.status_code == 416 and offset:
+                    # Our partial file is not a valid prefix any more; start over
+                    _discard_part(part_path)
+                    result["etag"] = result["last_modified"] = None
+                    return False, None
+
+                r.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+
+                result["etag"] = r.headers.get("ETag")
+                result["last_modified"] = r.headers.get("Last-Modified")
+                content_length = int(r.headers.get('content-length', 0))
+
+                if r.status_code == 206 and offset:
+                    start = _content_range_start(r.headers.get("Content-Range"))
+                    if start != offset:
+                        _discard_part(part_path)
+                        return False, f"Server returned unexpected range for {url}"
+                    mode = 'ab'
+                    total_size = offset + content_length
+                    result["resumed"] = True
+                else:
+                    # Full response: either a fresh download or the server
+                    # ignored / invalidated our Range request.
+                    offset = 0
+                    mode = 'wb'
+                    total_size = content_length
+
+                if total_size == 0:
+                    return False, f"File size is 0 bytes at {url}"
+
+                if offset:
+                    print(f"  [INFO] Resuming {url} at {offset/1024**2:.2f} of "
+                          f"{total_size/1024**2:.2f} MB")
+                else:
+                    print(f"  [INFO] Downloading {url} ({total_size/1024**2:.2f} MB)")
+
+                if not offset:
+                    _save_validators(part_path, result["etag"], result["last_modified"])
+
+                hasher = hashlib.sha256()
+                if offset:
+                    _hash_file_into(part_path, hasher)
+
+                size = chunk_size or adaptive_chunk_size(total_size)
+                written = offset
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=size):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        result["bytes"] = written
+        if written < total_size:
+            # Keep the .part file so the next attempt resumes from here
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Connection closed after {written} of {total_size} bytes"
+            )
+        if written > total_size:
+            _discard_part(part_path)
+            return False, f"Received {written} bytes but expected {total_size} from {url}"
+
+        result["sha256"] = hasher.hexdigest()
+        return True, None
+
+    @timed("revalidate")
+    def revalidate(self, url, etag=None, last_modified=None, timeout=None):
+        """
+        Cheaply checks whether a cached copy of url is still current using a
+        conditional HEAD request (If-None-Match / If-Modified-Since).
+
+        Args:
+            url (str): The URL the cached file came from.
+            etag (str, optional): ETag recorded when the file was downloaded.
+            last_modified (str, optional): Last-Modified recorded when the file was downloaded.
+            timeout (int, optional): Request timeout. Defaults to the instance timeout.
+
+        Returns:
+            dict: {"status", "message", "etag", "last_modified", "content_length"}
+                  where status is "FRESH", "STALE", "UNKNOWN" (nothing recorded to
+                  compare against), "MISSING" (404) or "ERROR".
+        """
+        timeout = self.timeout if timeout is None else timeout
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        result = {"status": "ERROR", "message": None, "etag": etag,
+                  "last_modified": last_modified, "content_length": None}
+
+        try:
+            with self.limiter_for(url):
+                r = self.session.head(url, headers=headers, timeout=timeout,
+                                      allow_redirects=True)
+        except requests.exceptions.RequestException as err:
+            result["message"] = f"An unexpected error occurred for {url}: {err}"
+            return result
+
+        if r.status_code == 304:
+            result["status"] = "FRESH"
+            return result
+        if r.status_code == 404:
+            result.update(status="MISSING", message=f"{url} no longer exists")
+            return result
+        if r.status_code >= 400:
+            result["message"] = f"HTTP Error for {url}: {r.status_code}"
+            return result
+
+        remote_etag = r.headers.get("ETag")
+        remote_modified = r.headers.get("Last-Modified")
+        result.update(etag=remote_etag, last_modified=remote_modified,
+                      content_length=int(r.headers.get("content-length", 0)) or None)
+
+        # Servers that ignore conditional headers still let us compare validators
+        if etag and remote_etag:
+            result["status"] = "FRESH" if remote_etag == etag else "STALE"
+        elif last_modified and remote_modified:
+            result["status"] = "FRESH" if remote_modified == last_modified else "STALE"
+        else:
+            result["status"] = "UNKNOWN"
+        return result
+
+    def download_file(self, url, local_filepath, stream=True, timeout=None, chunk_size=None):
+        """
+        Downloads a file from a URL to a local path. See fetch().
+
+        Returns:
+            tuple: (bool, str) indicating (success, message_or_None)
+        """
+        result = self.fetch(url, local_filepath, timeout=timeout, chunk_size=chunk_size)
+        return result["success"], result["message"]
+
+    @timed("stream_extract", nbytes=lambda r: r["bytes"], ok=lambda r: r["status"] == "SUCCESS")
+    def stream_extract(self, url, target_path, file_extension=".gpkg",
+                       keep_zip_path=None, timeout=None):
+        """
+        Downloads a zip and inflates the first member ending in file_extension
+        straight from the HTTP response into target_path, without writing the
+        zip to disk. The member is written to '<target_path>.part', its CRC-32
+        is checked, and it is atomically renamed onto target_path.
+
+        This relies on the zip's local file headers, so it cannot handle
+        every archive (e.g. a stored member with a trailing data descriptor).
+        In those cases, and on a dropped connection, "FALLBACK" is returned
+        and the caller should use download_file + extract_zip_and_rename.
+
+        Args:
+            url (str): URL of the .zip file.
+            target_path (str): Final path of the extracted member.
+            file_extension (str, optional): The extension to look for. Defaults to ".gpkg".
+            keep_zip_path (str, optional): If given, the raw zip is also saved here.
+            timeout (int, optional): Request timeout. Defaults to the instance timeout.
+
+        Returns:
+            dict: {"status", "message", "path", "bytes", "sha256", "etag",
+                   "last_modified"} where status is "SUCCESS", "FAILED"
+                   (e.g. HTTP 404) or "FALLBACK". bytes and sha256 describe
+                   the extracted member; etag/last_modified the zip.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        part_path = target_path + ".part"
+        zip_part_path = keep_zip_path + ".part" if keep_zip_path else None
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if keep_zip_path:
+            os.makedirs(os.path.dirname(keep_zip_path), exist_ok=True)
+        result = {
+            "status": "FALLBACK", "message": None, "path": target_path,
+            "bytes": 0, "sha256": None, "etag": None, "last_modified": None,
+        }
+
+        tee = None
+        try:
+            with self.limiter_for(url):
+                with self.session.get(url, stream=True, timeout=timeout) as r:
+                    r.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+
+                    result["etag"] = r.headers.get("ETag")
+                    result["last_modified"] = r.headers.get("Last-Modified")
+                    total_size = int(r.headers.get('content-length', 0))
+                    print(f"  [INFO] Streaming {url} ({total_size/1024**2:.2f} MB)")
+
+                    if zip_part_path:
+                        tee = open(zip_part_path, 'wb')
+                    reader = _ChunkReader(
+                        r.iter_content(chunk_size=adaptive_chunk_size(total_size)), tee
+                    )
+                    ok, msg, out = _inflate_zip_member(reader, part_path, file_extension)
+                    if not ok:
+                        _remove_if_exists(part_path)
+                        result["message"] = msg
+                        return result
+
+                    if tee:
+                        reader.drain()
+                        tee.close()
+                        tee = None
+                        os.replace(zip_part_path, keep_zip_path)
+
+            os.replace(part_path, target_path)
+            print(f"  [SUCCESS] Extracted and saved to: {target_path}")
+            result.update(status="SUCCESS", bytes=out.bytes, sha256=out.hexdigest())
+            return result
+
+        except requests.exceptions.HTTPError as errh:
+            result.update(status="FAILED", message=f"HTTP Error for {url}: {errh}")
+            return result
+        except requests.exceptions.RequestException as err:
+            _remove_if_exists(part_path)
+            result["message"] = f"Streaming interrupted for {url}: {err}"
+            return result
+        except (EOFError, zlib.error) as err:
+            _remove_if_exists(part_path)
+            result["message"] = f"Could not stream-extract {url}: {err}"
+            return result
+        finally:
+            if tee:
+                tee.close()
+                _remove_if_exists(zip_part_path)
+
+    def close(self):
+        self.session.close()
+
+
+# ---------------------------------------------------------
+# Streaming zip extraction helpers
+# ---------------------------------------------------------
+
+_LOCAL_HEADER_SIG = b"PK\x03\x04"
+_DATA_DESCRIPTOR_SIG = b"PK\x07\x08"
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+
+class _ChunkReader:
+    """
+    Byte reader over an iterator of chunks, with push-back. Every chunk
+    pulled from the iterator is also written to `tee` if given.
+    """
+    def __init__(self, chunks, tee=None):
+        self._chunks = iter(chunks)
+        self._buf = bytearray()
+        self._tee = tee
+
+    def _pull(self):
+        for chunk in self._chunks:
+            if chunk:
+                if self._tee:
+                    self._tee.write(chunk)
+                return chunk
+        return b""
+
+    def read_some(self):
+        """Return the next available bytes, or b'' at end of stream."""
+        if self._buf:
+            data = bytes(self._buf)
+            self._buf.clear()
+            return data
+        return self._pull()
+
+    def read_exact(self, n):
+        while len(self._buf) < n:
+            chunk = self._pull()
+            if not chunk:
+                raise EOFError(f"Stream ended {n - len(self._buf)} bytes early")
+            self._buf += chunk
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def unread(self, data):
+        self._buf[:0] = data
+
+    def drain(self):
+        """Consume the rest of the stream (so a tee sees every byte)."""
+        self._buf.clear()
+        while self._pull():
+            pass
+
+
+class _HashingWriter:
+    """File wrapper that tracks the SHA-256 and length of everything written."""
+    def __init__(self, f):
+        self.f = f
+        self.hasher = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.bytes += len(data)
+        return self.f.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+def _zip64_sizes(extra, csize, usize):
+    """Read 64-bit sizes from a zip64 extra field when the header holds 0xFFFFFFFF."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack_from("<HH", extra, pos)
+        if tag == 0x0001:
+            values = extra[pos + 4:pos + 4 + size]
+            vpos = 0
+            if usize == 0xFFFFFFFF:
+                usize = struct.unpack_from("<Q", values, vpos)[0]
+                vpos += 8
+            if csize == 0xFFFFFFFF:
+                csize = struct.unpack_from("<Q", values, vpos)[0]
+            return csize, usize, True
+        pos += 4 + size
+    return csize, usize, False
+
+
+def _inflate_stream(reader, out=None):
+    """
+    Inflate one raw-deflate member from reader, writing to `out` if given.
+    Bytes after the end of the deflate stream are pushed back into reader.
+    Returns the CRC-32 of the inflated data.
+    """
+    d = zlib.decompressobj(-zlib.MAX_WBITS)
+    crc = 0
+    while not d.eof:
+        chunk = reader.read_some()
+        if not chunk:
+            raise EOFError("Stream ended inside a deflate member")
+        data = d.decompress(chunk)
+        if data:
+            crc = zlib.crc32(data, crc)
+            if out:
+                out.write(data)
+    if d.unused_data:
+        reader.unread(d.unused_data)
+    return crc
+
+
+def _copy_stored(reader, size, out=None):
+    """Copy (or skip) a stored member of known size. Returns its CRC-32."""
+    crc = 0
+    remaining = size
+    while remaining:
+        chunk = reader.read_some()
+        if not chunk:
+            raise EOFError("Stream ended inside a stored member")
+        if len(chunk) > remaining:
+            reader.unread(chunk[remaining:])
+            chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        crc = zlib.crc32(chunk, crc)
+        if out:
+            out.write(chunk)
+    return crc
+
+
+def _inflate_zip_member(reader, part_path, file_extension):
+    """
+    Walk the local file headers of a zip stream and inflate the first member
+    ending in file_extension into part_path.
+
+    Returns (ok, message_or_None, writer) where writer is a _HashingWriter
+    holding the member's length and SHA-256.
+    """
+    while True:
+        header = reader.read_exact(4)
+        if header != _LOCAL_HEADER_SIG:
+            # Reached the central directory (or junk) without a match
+            return False, f"No '{file_extension}' member found in local headers", None
+        fields = _LOCAL_HEADER.unpack(header + reader.read_exact(_LOCAL_HEADER.size - 4))
+        _, _, flags, method, _, _, crc, csize, usize, name_len, extra_len = fields
+        name = reader.read_exact(name_len).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = reader.read_exact(extra_len)
+        csize, usize, zip64 = _zip64_sizes(extra, csize, usize)
+        has_descriptor = bool(flags & 0x08)
+
+        if flags & 0x01:
+            return False, f"Encrypted member {name} cannot be streamed", None
+        if method not in (0, 8):
+            return False, f"Unsupported compression method {method} for {name}", None
+        if method == 0 and has_descriptor:
+            return False, f"Stored member {name} has no size in its local header", None
+
+        is_target = name.endswith(file_extension)
+        f = open(part_path, 'wb') if is_target else None
+        out = _HashingWriter(f) if f else None
+        try:
+            if method == 8:
+                actual_crc = _inflate_stream(reader, out)
+            else:
+                actual_crc = _copy_stored(reader, csize, out)
+            if f:
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            if f:
+                f.close()
+
+        if has_descriptor:
+            sig = reader.read_exact(4)
+            if sig != _DATA_DESCRIPTOR_SIG:
+                reader.unread(sig)
+            crc = struct.unpack("<I", reader.read_exact(4))[0]
+            reader.read_exact(16 if zip64 else 8)
+
+        if is_target:
+            if actual_crc != crc:
+                return False, f"CRC mismatch for {name}", None
+            return True, None, out
+
+
+_default_downloader = None
+_default_downloader_lock = threading.Lock()
+
+
+def get_downloader():
+    """Return the process-wide shared Downloader, creating it on first use."""
+    global _default_downloader
+    with _default_downloader_lock:
+        if _default_downloader is None:
+            _default_downloader = Downloader()
+        return _default_downloader
+
+
+def set_downloader(downloader):
+    """Replace the process-wide shared Downloader (e.g. to point at a test server)."""
+    global _default_downloader
+    with _default_downloader_lock:
+        _default_downloader = downloader
+
+
+def download_file(url, local_filepath, stream=True, timeout=30, chunk_size=None, downloader=None):
     """
     Downloads a file from a URL to a local path.
 
@@ -13,49 +788,45 @@ def download_file(url, local_filepath, stream=True, timeout=30, chunk_size=8192)
         local_filepath (str): The local path to save the file.
         stream (bool, optional): Whether to stream the download. Defaults to True.
         timeout (int, optional): Request timeout. Defaults to 30.
-        chunk_size (int, optional): Download chunk size. Defaults to 8192.
+        chunk_size (int, optional): Download chunk size. Defaults to adaptive.
+        downloader (Downloader, optional): Downloader to use. Defaults to the shared instance.
 
     Returns:
         tuple: (bool, str) indicating (success, message_or_None)
     """
-    try:
-        # Ensure the target directory exists
-        os.makedirs(os.path.dirname(local_filepath), exist_ok=True)
-            
-        with requests.get(url, stream=stream, timeout=timeout) as r:
-            # Short pause to be polite to the server
-            time.sleep(0.5) 
-            
-            r.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            
-            total_size = int(r.headers.get('content-length', 0))
-            if total_size == 0:
-                return False, f"File size is 0 bytes at {url}"
-
-            print(f"  [INFO] Downloading {url} ({total_size/1024**2:.2f} MB)")
-            
-            with open(local_filepath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=chunk_size): 
-                    f.write(chunk)
+    downloader = downloader or get_downloader()
+    return downloader.download_file(
+        url, local_filepath, stream=stream, timeout=timeout, chunk_size=chunk_size
+    )
 
-            print(f"  [SUCCESS] Downloaded to: {local_filepath}")
-            return True, None
+def stream_extract(url, target_path, file_extension=".gpkg", keep_zip_path=None,
+                   timeout=30, downloader=None):
+    """
+    Inflates the first file_extension member of a remote zip straight into
+    target_path without an intermediate zip on disk. See Downloader.stream_extract.
 
-    except requests.exceptions.HTTPError as errh:
-        return False, f"HTTP Error for {url}: {errh}"
-    except requests.exceptions.RequestException as err:
-        return False, f"An unexpected error occurred for {url}: {err}"
+    Returns:
+        tuple: (status, message_or_None) where status is "SUCCESS", "FAILED" or "FALLBACK"
+    """
+    downloader = downloader or get_downloader()
+    result = downloader.stream_extract(
+        url, target_path, file_extension=file_extension,
+        keep_zip_path=keep_zip_path, timeout=timeout
+    )
+    return result["status"], result["message"]
 
-def extract_zip_and_rename(zip_path, extract_dir, file_extension=".gpkg"):
+@timed("extract", nbytes=lambda r: os.path.getsize(r[1]), ok=lambda r: r[0])
+def extract_zip_and_rename(zip_path, extract_dir, file_extension=".gpkg", keep_zip=False):
     """
     Extracts the first file with file_extension from a zip, renames it to
     match the zip's basename (with new extension), saves it to extract_dir,
-    and deletes the zip.
+    and deletes the zip (unless keep_zip is set).
 
     Args:
         zip_path (str): Path to the .zip file.
         extract_dir (str): Directory to extract to.
         file_extension (str, optional): The extension to look for. Defaults to ".gpkg".
+        keep_zip (bool, optional): Keep the zip after a successful extract. Defaults to False.
 
     Returns:
         tuple: (bool, str) indicating (success, path_to_extracted_file_or_error_msg)
@@ -79,28 +850,37 @@ def extract_zip_and_rename(zip_path, extract_dir, file_extension=".gpkg"):
             if not target_file_info:
                 return False, f"No '{file_extension}' file found in {zip_path}"
 
-            # 2. Extract the file, ensuring it's flat in the extract_dir
-            # This prevents files zipped with internal paths (e.g., 'folder/file.gpkg')
-            # from creating 'extract_dir/folder/file.gpkg'.
-            original_filename = target_file_info.filename
-            target_file_info.filename = os.path.basename(original_filename)
-            
-            extracted_file_path = zip_ref.extract(target_file_info, path=extract_dir)
+            # 2. Stream the member to a temp file next to the target, then
+            # atomically rename it. Writing flat into extract_dir avoids internal
+            # zip paths (e.g., 'folder/file.gpkg'), and a killed extraction
+            # never leaves a truncated file at target_path.
+            tmp_path = target_path + ".part"
+            with zip_ref.open(target_file_info) as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, MAX_CHUNK_SIZE)
+                dst.flush()
+                os.fsync(dst.fileno())
 
             # 3. Rename extracted file to our standard target_path
-            if extracted_file_path != target_path:
-                shutil.move(extracted_file_path, target_path)
+            os.replace(tmp_path, target_path)
             
             print(f"  [SUCCESS] Extracted and saved to: {target_path}")
 
         # 4. Cleanup the zip file
-        os.remove(zip_path)
-        print(f"  [INFO] Cleaned up zip: {zip_path}")
+        if not keep_zip:
+            os.remove(zip_path)
+            print(f"  [INFO] Cleaned up zip: {zip_path}")
         
         return True, target_path
 
     except zipfile.BadZipFile:
+        _remove_if_exists(target_path + ".part")
         os.remove(zip_path) # Clean up corrupted zip
         return False, f"Bad zip file (deleted): {zip_path}"
     except Exception as e:
-        return False, f"Failed to extract/cleanup {zip_path}: {e}"
\ No newline at end of file
+        _remove_if_exists(target_path + ".part")
+        return False, f"Failed to extract/cleanup {zip_path}: {e}"
+
+
+def _remove_if_exists(path):
+    if os.path.exists(path):
+        os.remove(path)
\ No newline at end of file
@@ -1,10 +1,19 @@
 import os
 import time
-from osgeo import ogr
+import uuid
+import queue
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from osgeo import gdal, ogr, osr
 
 # Import from our new library modules
-from .download_utils import download_file, extract_zip_and_rename
+from .download_utils import extract_zip_and_rename, get_downloader, SingleFlight
+from .cache_utils import get_cache
 from .bbox import BoundingBox
+from .quad_index import QuadIndex, INDEX_DIR
+from .metrics_utils import timer, timed_iter
+from .plan_utils import build_plan
 
 # Base URL for the staged USGS Topo Map Vector products
 BASE_URL = "https://prd-tnm.s3.amazonaws.com/StagedProducts/TopoMapVector/"
@@ -20,22 +29,48 @@ DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
 GDB_FILE = os.path.join(DATA_DIR, "MapIndices_National_GDB.gdb")
 RAW_DIR = os.path.join(DATA_DIR, "raw", "gpkg")
 EXTRACTED_DIR = os.path.join(DATA_DIR, "extracted", "gpkg")
+MERGED_DIR = os.path.join(DATA_DIR, "processed", "gpkg")
 # --- END FIXED PATHS ---
 
+# Quads being fetched by any pipeline in this process, keyed by GPKG path
+_quad_flights = SingleFlight("quad")
+
+# Planning estimate of extracted GPKG size per byte of zip (the size of the
+# member is only known once the zip is read)
+GPKG_EXPANSION = 3.0
+
 
 class USGSTopoDownloader:
     """
     Queries the national USGS Map Index GDB for 7.5-minute quadrangle
     data intersecting a bounding box and downloads/extracts the GPKG files.
     """
-    def __init__(self, bbox: BoundingBox, download_format="GPKG", gdb_path: str = GDB_FILE):
+    def __init__(self, bbox: BoundingBox, download_format="GPKG", gdb_path: str = GDB_FILE,
+                 download_workers: int = 8, extract_workers: int = 2, downloader=None,
+                 use_index: bool = True, index_dir: str = INDEX_DIR,
+                 stream_extract: bool = True, keep_zip: bool = False,
+                 cache_budget_bytes: int = None, refresh: bool = False):
         """
         Initializes the downloader.
 
         Args:
             gdb_path (str): Path to the national map index GDB (e.g., "MapIndices_National_GDB.gdb").
-            bbox (BoundingBox): The target BoundingBox object (WGS84 Lon/Lat).
+            bbox (BoundingBox): The target BoundingBox object (WGS84 Lon/Lat), or a
+                PolygonAOI to select only quads intersecting the polygon / corridor.
             download_format (str, optional): The file format. Defaults to "GPKG".
+            download_workers (int, optional): Concurrent zip downloads. Defaults to 8.
+            extract_workers (int, optional): Concurrent zip extractions. Defaults to 2.
+            downloader (Downloader, optional): HTTP downloader. Defaults to the shared instance.
+            use_index (bool, optional): Query the precompiled quad index sidecar when it is
+                present and up to date. Defaults to True.
+            index_dir (str, optional): Location of the quad index sidecar.
+            stream_extract (bool, optional): Inflate the member straight from the HTTP
+                response instead of saving the zip first. Defaults to True.
+            keep_zip (bool, optional): Keep the downloaded zip in raw_dir. Defaults to False.
+            cache_budget_bytes (int, optional): Disk budget for the extracted GPKG cache,
+                enforced with LRU eviction after each run. Defaults to unbounded.
+            refresh (bool, optional): Revalidate cached quads with conditional requests and
+                re-download the ones that changed upstream. Defaults to False.
         """
         self.gdb_path = gdb_path
         self.bbox = bbox
@@ -43,10 +78,22 @@ class USGSTopoDownloader:
         self.extracted_dir = EXTRACTED_DIR
         self.download_format = download_format
         self.layer_name = "CellGrid_7_5Minute"
+        self.download_workers = max(1, int(download_workers))
+        self.extract_workers = max(1, int(extract_workers))
+        self.downloader = downloader or get_downloader()
+        self.use_index = use_index
+        self.index_dir = index_dir
+        self.stream_extract = stream_extract
+        self.keep_zip = keep_zip
         
         # Ensure the data directories exist
         os.makedirs(self.raw_dir, exist_ok=True)
         os.makedirs(self.extracted_dir, exist_ok=True)
+
+        self.cache = get_cache(self.extracted_dir, budget_bytes=cache_budget_bytes)
+        self.refresh = refresh
+        self._refresh_report = {"fresh": [], "stale": [], "unverified": [], "failed": {}}
+        self._refresh_lock = threading.Lock()
         
         # Configure OGR to raise exceptions on errors
         ogr.UseExceptions()
@@ -65,56 +112,168 @@ class USGSTopoDownloader:
 
         return quad_name_for_url, state_abbr
 
-    def _process_quad(self, quad_name, state_abbr):
+    def _query_index(self):
         """
-        Constructs URLs, checks cache, downloads, and extracts the file.
+        Returns a list of (CELL_NAME, STATE_ALPHA) from the quad index sidecar,
+        or None if the sidecar is disabled, missing or stale.
+        """
+        if not self.use_index:
+            return None
+        index = QuadIndex.load(self.layer_name, index_dir=self.index_dir, gdb_path=self.gdb_path)
+        if index is None:
+            print(f"[INFO] Quad index missing or stale in {self.index_dir}; querying GDB.")
+            return None
+        print(f"[INFO] Using quad index sidecar: {self.index_dir}")
+        with timer("index_query"):
+            return index.query(self.bbox)
+
+    def _is_stale(self, cache_name, full_url):
+        """
+        Revalidates a cached quad against its source zip with a conditional
+        request and records the outcome in the refresh report. Quads with no
+        recorded ETag/Last-Modified cannot be compared and are kept.
+        """
+        entry = self.cache.get(cache_name) or {}
+        result = self.downloader.revalidate(
+            entry.get("url") or full_url,
+            etag=entry.get("etag"), last_modified=entry.get("last_modified")
+        )
+        status = result["status"]
+        with self._refresh_lock:
+            if status == "STALE":
+                self._refresh_report["stale"].append(cache_name)
+            elif status == "FRESH":
+                self._refresh_report["fresh"].append(cache_name)
+            elif status == "UNKNOWN":
+                self._refresh_report["unverified"].append(cache_name)
+            else:
+                self._refresh_report["failed"][cache_name] = result["message"] or status
+        return status == "STALE"
+
+    def _quad_paths(self, quad_name, state_abbr):
+        """
+        Returns (zip_filepath, gpkg_filepath, full_url) for a quad.
         """
-        # 1. Define filenames and paths
         zip_filename = f"VECTOR_{quad_name}_{state_abbr}_7_5_Min_{self.download_format}.zip"
-        gpkg_filename = f"VECTOR_{quad_name}_{state_abbr}_7_5_Min_{self.download_format}.gpkg"
-        
+        gpkg_filename = f"VECTOR_{quad_name}_{state_abbr}_7_5_Min_{self.download_format}{self._file_extension()}"
+
         zip_filepath = os.path.join(self.raw_dir, zip_filename)
         gpkg_filepath = os.path.join(self.extracted_dir, gpkg_filename)
-        
+
         full_url = f"{BASE_URL}{state_abbr.upper()}/{self.download_format}/{zip_filename}"
-        
+        return zip_filepath, gpkg_filepath, full_url
+
+    def _download_quad(self, quad_name, state_abbr):
+        """
+        Checks cache and downloads the zip for a quad. In stream_extract mode
+        the member is inflated straight from the response, falling back to
+        the zip-on-disk path if the archive cannot be streamed.
+
+        Returns:
+            tuple: (status, zip_filepath, meta) where status is "CACHED",
+                   "EXTRACTED", "DOWNLOADED" or "FAILED", and meta holds the
+                   source URL / ETag / Last-Modified for the cache manifest.
+        """
+        zip_filepath, gpkg_filepath, full_url = self._quad_paths(quad_name, state_abbr)
+        cache_name = os.path.basename(gpkg_filepath)
+
         print(f"\nAttempting to process: {quad_name} ({state_abbr})")
 
-        # 2. Check for cache (in the extracted directory)
-        if os.path.exists(gpkg_filepath):
-            print(f"  [INFO] File already exists, skipping download (Cached).")
-            print(f"  Path: {gpkg_filepath}")
-            return True
+        # Check for cache (in the extracted directory)
+        if self.cache.lookup(cache_name):
+            if not (self.refresh and self._is_stale(cache_name, full_url)):
+                print(f"  [INFO] File already exists, skipping download (Cached).")
+                print(f"  Path: {gpkg_filepath}")
+                return "CACHED", None, None
+            print(f"  [REFRESH] Cached copy is stale; re-downloading.")
 
         print(f"  URL: {full_url}")
 
-        # 3. Attempt Download
-        download_success, dl_msg = download_file(full_url, zip_filepath)
-        
-        if not download_success:
-            print(f"  [ERROR] Download failed: {dl_msg}")
+        if self.stream_extract:
+            result = self.downloader.stream_extract(
+                full_url,
+                gpkg_filepath,
+                file_extension=self._file_extension(),
+                keep_zip_path=zip_filepath if self.keep_zip else None
+            )
+            if result["status"] == "SUCCESS":
+                self.cache.record(
+                    cache_name, url=full_url, size=result["bytes"], etag=result["etag"],
+                    last_modified=result["last_modified"], sha256=result["sha256"]
+                )
+                return "EXTRACTED", None, None
+            if result["status"] == "FAILED":
+                print(f"  [ERROR] Download failed: {result['message']}")
+                return "FAILED", None, None
+            print(f"  [WARN] {result['message']}; falling back to zip on disk.")
+
+        result = self.downloader.fetch(full_url, zip_filepath)
+
+        if not result["success"]:
+            print(f"  [ERROR] Download failed: {result['message']}")
             # If the zip exists but is bad, clean it up
             if os.path.exists(zip_filepath):
                 os.remove(zip_filepath)
-            return False
+            return "FAILED", None, None
+
+        meta = {
+            "url": full_url,
+            "etag": result["etag"],
+            "last_modified": result["last_modified"],
+        }
+        return "DOWNLOADED", zip_filepath, meta
+
+    def _file_extension(self):
+        return f".{self.download_format.lower()}"
 
-        # 4. Attempt Extract and Cleanup
+    def _extract_quad(self, zip_filepath, meta=None):
+        """
+        Extracts a downloaded quad zip into the extracted directory and
+        records the result in the cache manifest.
+        """
         extract_success, ext_msg = extract_zip_and_rename(
-            zip_filepath, 
-            self.extracted_dir, 
-            file_extension=f".{self.download_format.lower()}"
+            zip_filepath,
+            self.extracted_dir,
+            file_extension=self._file_extension(),
+            keep_zip=self.keep_zip
         )
 
         if not extract_success:
             print(f"  [ERROR] Extraction failed: {ext_msg}")
             return False
-        
+
+        meta = meta or {}
+        hasher = hashlib.sha256()
+        with open(ext_msg, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        self.cache.record(
+            os.path.basename(ext_msg), url=meta.get("url"), size=os.path.getsize(ext_msg),
+            etag=meta.get("etag"), last_modified=meta.get("last_modified"),
+            sha256=hasher.hexdigest()
+        )
         return True
 
+    def _process_quad(self, quad_name, state_abbr):
+        """
+        Constructs URLs, checks cache, downloads, and extracts the file.
+        """
+        status, zip_filepath, meta = self._download_quad(quad_name, state_abbr)
+        if status in ("CACHED", "EXTRACTED"):
+            return True
+        if status == "FAILED":
+            return False
+        return self._extract_quad(zip_filepath, meta)
+
     def download_by_bbox(self):
         """
         Reads the GDB, applies the spatial filter, and triggers downloads.
-        
+
+        The layer scan, downloads and extractions run as a pipeline: the scan
+        enqueues each unique quad, a pool of download workers fetches the zips,
+        and a separate pool of extract workers unpacks each zip as soon as it
+        lands.
+
         Returns:
             dict: Summary of the operation.
         """
@@ -126,68 +285,677 @@ class USGSTopoDownloader:
 
         dataSource = None
         try:
-            driver = ogr.GetDriverByName("OpenFileGDB")
-            dataSource = driver.Open(self.gdb_path, 0)
+            # 1. Resolve intersecting cells, preferring the precompiled sidecar
+            cells = self._query_index()
 
-            if dataSource is None:
-                return {"status": "FAILED", "message": f"Could not open {self.gdb_path}."}
+            if cells is None:
+                driver = ogr.GetDriverByName("OpenFileGDB")
+                dataSource = driver.Open(self.gdb_path, 0)
 
-            layer = dataSource.GetLayer(self.layer_name)
-            if layer is None:
-                return {"status": "FAILED", "message": f"Could not find layer {self.layer_name}."}
-                
-            # 1. Set Spatial Filter (BBOX)
-            # The BoundingBox NamedTuple unpacks in the correct order
-            layer.SetSpatialFilterRect(*self.bbox) 
-            
-            srs = layer.GetSpatialRef()
-            srs_info = srs.ExportToWkt().splitlines()[0] if srs else "UNKNOWN"
-            print(f"[INFO] GDB Layer SRS: {srs_info}")
+                if dataSource is None:
+                    return {"status": "FAILED", "message": f"Could not open {self.gdb_path}."}
+
+                layer = dataSource.GetLayer(self.layer_name)
+                if layer is None:
+                    return {"status": "FAILED", "message": f"Could not find layer {self.layer_name}."}
+
+                # Set Spatial Filter (BBOX, or the polygon for a PolygonAOI)
+                _set_spatial_filter(layer, self.bbox)
+
+                srs = layer.GetSpatialRef()
+                srs_info = srs.ExportToWkt().splitlines()[0] if srs else "UNKNOWN"
+                print(f"[INFO] GDB Layer SRS: {srs_info}")
+
+                # Lazy, so the scan overlaps the downloads; only time spent
+                # inside the layer iterator is recorded
+                cells = timed_iter("gdb_scan", (
+                    (feature.GetField("CELL_NAME"), feature.GetField("STATE_ALPHA"))
+                    for feature in layer
+                ), event="gdb_features")
             
-            # 2. Iterate over filtered features
+            return self._run_pipeline(cells)
+
+        except Exception as e:
+            print(f"\n[CRITICAL ERROR] A geospatial or file error occurred: {e}")
+            return {"status": "CRITICAL_ERROR", "message": str(e)}
+        finally:
+            if dataSource:
+                del dataSource
+
+    def plan(self, quads=None, **plan_options):
+        """
+        Dry run of download_by_bbox: resolve the quads (or take an explicit
+        list of (quad_name, state_abbr) pairs), split them into cache hits
+        and misses without touching the cache, and size the missing zips
+        with HEAD requests. See plan_utils.build_plan for the plan fields
+        and plan_options.
+
+        Returns:
+            dict: The plan.
+        """
+        if quads is None:
+            resolver = QuadResolver(self.gdb_path, layer_name=self.layer_name,
+                                    use_index=self.use_index, index_dir=self.index_dir)
+            try:
+                quads = resolver.resolve(self.bbox)
+            finally:
+                resolver.close()
+
+        items = []
+        for quad_name, state_abbr in quads:
+            _, gpkg_filepath, full_url = self._quad_paths(quad_name, state_abbr)
+            items.append({
+                "key": f"{quad_name}_{state_abbr}", "url": full_url,
+                "cached": self.cache.contains(os.path.basename(gpkg_filepath)),
+            })
+        # The zip only touches the disk when it is not streamed, or is kept
+        zip_on_disk = not self.stream_extract or self.keep_zip
+        plan_options.setdefault("disk_factor", GPKG_EXPANSION + (1.0 if zip_on_disk else 0.0))
+        return build_plan(
+            "gpkg", self.bbox, items, self.extracted_dir, downloader=self.downloader,
+            jobs=self.download_workers, **plan_options
+        )
+
+    def download_quads(self, quads):
+        """
+        Downloads/extracts an explicit list of (quad_name, state_abbr) pairs
+        through the same pipeline as download_by_bbox, skipping the GDB query.
+
+        Returns:
+            dict: Summary of the operation.
+        """
+        print(f"[INFO] GPKG cache directory: {self.extracted_dir}")
+        try:
+            return self._run_pipeline(quads)
+        except Exception as e:
+            print(f"\n[CRITICAL ERROR] A geospatial or file error occurred: {e}")
+            return {"status": "CRITICAL_ERROR", "message": str(e)}
+
+    def _run_pipeline(self, cells):
+        """
+        Feeds (CELL_NAME, STATE_ALPHA) pairs through the download/extract
+        pipeline and returns the summary dict.
+        """
+        pipeline = None
+        try:
+            # 2. Start the download/extract worker pools
+            pipeline = _QuadPipeline(self)
+            pipeline.start()
+
+            # 3. Iterate over filtered features, enqueueing unique quads
             processed_quads = set()
             features_found = 0
-            downloads_successful = 0
 
-            print("\n--- Starting Query and Download Loop ---")
-            for feature in layer:
+            print("\n--- Starting Query and Download Pipeline ---")
+            for cell_name, state_alpha_field in cells:
                 features_found += 1
-                
-                cell_name = feature.GetField("CELL_NAME")
-                state_alpha_field = feature.GetField("STATE_ALPHA")
-                
+            
                 quad_info = self._get_quad_info(cell_name, state_alpha_field)
-                
+            
                 if quad_info:
                     quad_name, state_abbr = quad_info
-                    quad_key = f"{quad_name}_{state_abbr}"
-                    
+                    quad_key = (quad_name, state_abbr)
+                
                     if quad_key in processed_quads:
                         continue
                     processed_quads.add(quad_key)
-                    
-                    # 4. Download, Extract, and Cache
-                    if self._process_quad(quad_name, state_abbr):
-                        downloads_successful += 1
-                    
+                
+                    # 4. Hand off to the Download -> Extract pipeline
+                    pipeline.submit(quad_name, state_abbr)
+
+            stats = pipeline.join()
+            pipeline = None
+
+            # 5. Keep the GPKG cache within its budget, sparing this request's quads
+            self.cache.evict(protect={
+                os.path.basename(self._quad_paths(*key)[1]) for key in processed_quads
+            })
+
             # --- Summary ---
             summary = {
                 "status": "SUCCESS",
                 "features_found": features_found,
                 "unique_quads_identified": len(processed_quads),
-                "downloads_successful": downloads_successful
+                "downloads_successful": stats["cached"] + stats["extracted"],
+                "cached": stats["cached"],
+                "coalesced": stats["coalesced"],
+                "downloads_failed": stats["download_failed"],
+                "extractions_failed": stats["extract_failed"],
+                "queue_depths": stats["queue_depths"],
+                "gpkg_paths": [
+                    path for path in (self._quad_paths(*key)[1] for key in sorted(processed_quads))
+                    if os.path.exists(path)
+                ],
             }
+            if self.refresh:
+                summary["refresh"] = self._refresh_report
+                print(f"[REFRESH] {len(self._refresh_report['fresh'])} fresh, "
+                      f"{len(self._refresh_report['stale'])} stale: {self._refresh_report['stale']}")
+                if self._refresh_report["unverified"]:
+                    print(f"[REFRESH] No validators recorded (kept): "
+                          f"{self._refresh_report['unverified']}")
             print("\n--- Process Complete ---")
             print(f"Features found intersecting BBOX in GDB: {summary['features_found']}")
             print(f"Unique 7.5-minute Quads identified: {summary['unique_quads_identified']}")
             print(f"Total Quads successfully downloaded/cached: {summary['downloads_successful']}")
             return summary
-
-        except Exception as e:
-            print(f"\n[CRITICAL ERROR] A geospatial or file error occurred: {e}")
-            return {"status": "CRITICAL_ERROR", "message": str(e)}
         finally:
-            if dataSource:
-                del dataSource
-                
-# ... (if __name__ == "__main__" block remains the same) ...
\ No newline at end of file
+            if pipeline:
+                pipeline.join()
+
+
+class _QuadPipeline:
+    """
+    Producer/consumer pipeline used by USGSTopoDownloader.download_by_bbox.
+
+    Quads are submitted to a download queue served by `download_workers`
+    threads. Downloaded zips are passed on to an extract queue served by
+    `extract_workers` threads. The maximum depth reached by each queue is
+    recorded so callers can see which stage is the bottleneck.
+    """
+    _STOP = object()
+
+    def __init__(self, topo: USGSTopoDownloader):
+        self.topo = topo
+        self.download_queue = queue.Queue()
+        self.extract_queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._download_threads = []
+        self._extract_threads = []
+        self._joined = False
+        self.stats = {
+            "cached": 0,
+            "downloaded": 0,
+            "extracted": 0,
+            "download_failed": 0,
+            "extract_failed": 0,
+            "coalesced": 0,
+            "queue_depths": {
+                "download": {"submitted": 0, "max_depth": 0},
+                "extract": {"submitted": 0, "max_depth": 0},
+            },
+        }
+
+    def _record_put(self, stage, q):
+        with self._lock:
+            depth = self.stats["queue_depths"][stage]
+            depth["submitted"] += 1
+            depth["max_depth"] = max(depth["max_depth"], q.qsize())
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self):
+        for i in range(self.topo.download_workers):
+            t = threading.Thread(target=self._download_worker, name=f"quad-download-{i}", daemon=True)
+            t.start()
+            self._download_threads.append(t)
+        for i in range(self.topo.extract_workers):
+            t = threading.Thread(target=self._extract_worker, name=f"quad-extract-{i}", daemon=True)
+            t.start()
+            self._extract_threads.append(t)
+
+    def submit(self, quad_name, state_abbr):
+        self.download_queue.put((quad_name, state_abbr))
+        self._record_put("download", self.download_queue)
+
+    def _download_worker(self):
+        while True:
+            item = self.download_queue.get()
+            if item is self._STOP:
+                break
+
+            # Another pipeline (e.g. a concurrent service job) is already
+            # fetching this quad: wait for it instead of downloading again
+            key = self.topo._quad_paths(*item)[1]
+            flight, leader = _quad_flights.begin(key)
+            if not leader:
+                ok = flight.wait()
+                self._count("coalesced")
+                self._count("cached" if ok else "download_failed")
+                continue
+
+            try:
+                status, zip_filepath, meta = self.topo._download_quad(*item)
+            except Exception as e:
+                print(f"  [ERROR] Download worker failed for {item[0]}: {e}")
+                status, zip_filepath, meta = "FAILED", None, None
+
+            if status == "CACHED":
+                self._count("cached")
+            elif status == "EXTRACTED":
+                # Streamed straight from the response; no extract stage needed
+                self._count("downloaded")
+                self._count("extracted")
+            elif status == "DOWNLOADED":
+                self._count("downloaded")
+                self.extract_queue.put((zip_filepath, meta, key))
+                self._record_put("extract", self.extract_queue)
+                continue  # the extract worker ends the flight
+            else:
+                self._count("download_failed")
+            _quad_flights.end(key, result=status != "FAILED")
+
+    def _extract_worker(self):
+        while True:
+            item = self.extract_queue.get()
+            if item is self._STOP:
+                break
+            zip_filepath, meta, key = item
+            try:
+                ok = self.topo._extract_quad(zip_filepath, meta)
+            except Exception as e:
+                print(f"  [ERROR] Extract worker failed for {zip_filepath}: {e}")
+                ok = False
+            self._count("extracted" if ok else "extract_failed")
+            _quad_flights.end(key, result=ok)
+
+    def join(self):
+        """
+        Drains both stages, stops the workers and returns the stats dict.
+        """
+        if self._joined:
+            return self.stats
+        self._joined = True
+
+        for _ in self._download_threads:
+            self.download_queue.put(self._STOP)
+        for t in self._download_threads:
+            t.join()
+
+        # All downloads are finished, so nothing else will be enqueued
+        for _ in self._extract_threads:
+            self.extract_queue.put(self._STOP)
+        for t in self._extract_threads:
+            t.join()
+
+        return self.stats
+
+
+def _set_spatial_filter(layer, aoi):
+    """Filter a layer by a BoundingBox (rectangle) or PolygonAOI (true geometry)."""
+    if isinstance(aoi, BoundingBox):
+        # The BoundingBox NamedTuple unpacks in the correct order
+        layer.SetSpatialFilterRect(*aoi)
+    else:
+        layer.SetSpatialFilter(aoi.geometry)
+
+
+class QuadResolver:
+    """
+    Resolves AOIs to their unique 7.5-minute quads through one quad index
+    sidecar or, when that is disabled / missing / stale, one open GDB
+    handle. Keeping an instance around (as the preprocessing service does)
+    avoids reopening the index or the GDB for every query. Safe to share
+    between threads: GDB queries are serialised, since an OGR layer's
+    spatial filter and read cursor are not thread-safe.
+    """
+    def __init__(self, gdb_path: str = GDB_FILE, layer_name="CellGrid_7_5Minute",
+                 use_index: bool = True, index_dir: str = INDEX_DIR):
+        """
+        Args:
+            gdb_path (str, optional): Path to the national map index GDB.
+            layer_name (str, optional): Grid layer to query. Defaults to "CellGrid_7_5Minute".
+            use_index (bool, optional): Prefer the quad index sidecar. Defaults to True.
+            index_dir (str, optional): Location of the quad index sidecar.
+        """
+        self.index = QuadIndex.load(layer_name, index_dir=index_dir, gdb_path=gdb_path) if use_index else None
+        self.dataSource = None
+        self.layer = None
+        self._lock = threading.Lock()
+        if self.index is None:
+            ogr.UseExceptions()
+            self.dataSource = ogr.GetDriverByName("OpenFileGDB").Open(gdb_path, 0)
+            if self.dataSource is None:
+                raise RuntimeError(f"Could not open {gdb_path}.")
+            self.layer = self.dataSource.GetLayer(layer_name)
+            if self.layer is None:
+                raise RuntimeError(f"Could not find layer {layer_name}.")
+
+    @property
+    def source(self):
+        """"index" or "gdb"."""
+        return "index" if self.index is not None else "gdb"
+
+    def cells(self, bbox):
+        """(CELL_NAME, STATE_ALPHA) pairs for cells intersecting a BoundingBox / PolygonAOI."""
+        if self.index is not None:
+            with timer("index_query"):
+                return self.index.query(bbox)
+        with self._lock:
+            _set_spatial_filter(self.layer, bbox)
+            return list(timed_iter("gdb_scan", (
+                (f.GetField("CELL_NAME"), f.GetField("STATE_ALPHA")) for f in self.layer
+            ), event="gdb_features"))
+
+    def resolve(self, bbox):
+        """Unique (quad_name, state_abbr) pairs for bbox, in query order."""
+        quads = []
+        seen = set()
+        for cell_name, state_alpha_field in self.cells(bbox):
+            quad_info = USGSTopoDownloader._get_quad_info(cell_name, state_alpha_field)
+            if quad_info and quad_info not in seen:
+                seen.add(quad_info)
+                quads.append(quad_info)
+        return quads
+
+    def close(self):
+        self.layer = None
+        self.dataSource = None
+
+
+def resolve_quads(bboxes, gdb_path: str = GDB_FILE, layer_name="CellGrid_7_5Minute",
+                  use_index: bool = True, index_dir: str = INDEX_DIR):
+    """
+    Resolves the unique 7.5-minute quads for each of several bounding boxes,
+    using the quad index sidecar when available and otherwise a single open
+    GDB handle for all queries.
+
+    Args:
+        bboxes (list): BoundingBox or PolygonAOI objects (WGS84 Lon/Lat).
+        gdb_path (str, optional): Path to the national map index GDB.
+        layer_name (str, optional): Grid layer to query. Defaults to "CellGrid_7_5Minute".
+        use_index (bool, optional): Prefer the quad index sidecar. Defaults to True.
+        index_dir (str, optional): Location of the quad index sidecar.
+
+    Returns:
+        list: One list of (quad_name, state_abbr) per bbox, in query order.
+    """
+    resolver = QuadResolver(gdb_path, layer_name, use_index, index_dir)
+    try:
+        return [resolver.resolve(bbox) for bbox in bboxes]
+    finally:
+        resolver.close()
+
+
+# ---------------------------------------------------------
+# Merging per-quad GPKGs
+# ---------------------------------------------------------
+
+# Single geometry types promoted to their multi type, since clipping can
+# split a feature into several parts
+_MULTI_TYPES = {
+    ogr.wkbLineString: ogr.wkbMultiLineString,
+    ogr.wkbPolygon: ogr.wkbMultiPolygon,
+}
+
+# Layer geometry types by dimension, and the multi type holding parts of each
+_TYPE_DIMENSION = {
+    ogr.wkbPoint: 0, ogr.wkbMultiPoint: 0,
+    ogr.wkbLineString: 1, ogr.wkbMultiLineString: 1,
+    ogr.wkbPolygon: 2, ogr.wkbMultiPolygon: 2,
+}
+_DIMENSION_MULTI = {0: ogr.wkbMultiPoint, 1: ogr.wkbMultiLineString, 2: ogr.wkbMultiPolygon}
+
+
+def _aoi_clip_geometry(aoi):
+    """OGR geometry to filter and clip by: the rectangle or the AOI polygon."""
+    if aoi is None:
+        return None
+    if isinstance(aoi, BoundingBox):
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+        for x, y in ((aoi.xmin, aoi.ymin), (aoi.xmax, aoi.ymin), (aoi.xmax, aoi.ymax),
+                     (aoi.xmin, aoi.ymax), (aoi.xmin, aoi.ymin)):
+            ring.AddPoint_2D(x, y)
+        poly = ogr.Geometry(ogr.wkbPolygon)
+        poly.AddGeometry(ring)
+        return poly
+    return aoi.geometry
+
+
+def _parts_of_dimension(geom, dimension):
+    """Non-empty simple parts of geom (recursing into collections) of the given dimension."""
+    if ogr.GT_IsSubClassOf(ogr.GT_Flatten(geom.GetGeometryType()), ogr.wkbGeometryCollection):
+        for i in range(geom.GetGeometryCount()):
+            yield from _parts_of_dimension(geom.GetGeometryRef(i), dimension)
+    elif not geom.IsEmpty() and geom.GetDimension() == dimension:
+        yield geom
+
+
+def _conform_geometry(geom, out_type):
+    """
+    geom as the layer type out_type, keeping only the parts of its
+    dimension: clipping a line or polygon that only touches the AOI edge
+    leaves points or a GeometryCollection, which ForceTo cannot turn into a
+    line / polygon type. Returns None if no part matches.
+    """
+    dimension = _TYPE_DIMENSION.get(ogr.GT_Flatten(out_type))
+    if dimension is None:
+        return geom
+    multi = ogr.Geometry(_DIMENSION_MULTI[dimension])
+    for part in _parts_of_dimension(geom, dimension):
+        multi.AddGeometry(part)
+    if multi.IsEmpty():
+        return None
+    return multi if multi.GetGeometryType() == out_type else ogr.ForceTo(multi, out_type)
+
+
+def _sql_literal(text):
+    """text as a quoted SQLite string literal."""
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _read_quad_layer(gpkg_path, layer_name, aoi):
+    """
+    Process-pool reader: return one quad layer's features, clipped to the
+    AOI, as (schema, rows) where rows are (dedupe_key, wkb, field values).
+    """
+    ogr.UseExceptions()
+    dataSource = None
+    try:
+        dataSource = ogr.Open(gpkg_path, 0)
+        layer = dataSource.GetLayerByName(layer_name)
+        if layer is None:
+            return None, []
+        defn = layer.GetLayerDefn()
+        fields = [(defn.GetFieldDefn(i).GetName(), defn.GetFieldDefn(i).GetType())
+                  for i in range(defn.GetFieldCount())]
+        lower = [name.lower() for name, _ in fields]
+        id_idx = lower.index("permanent_identifier") if "permanent_identifier" in lower else -1
+
+        geom_type = ogr.GT_Flatten(layer.GetGeomType())
+        out_type = _MULTI_TYPES.get(geom_type, layer.GetGeomType())
+        srs = layer.GetSpatialRef()
+        schema = {
+            "fields": fields,
+            "geom_type": out_type,
+            "srs_wkt": srs.ExportToWkt() if srs else None,
+        }
+
+        clip = _aoi_clip_geometry(aoi)
+        if clip is not None:
+            layer.SetSpatialFilter(clip)
+            clip_env = clip.GetEnvelope()
+
+        rows = []
+        for feature in layer:
+            geom = feature.GetGeometryRef()
+            if geom is not None:
+                if clip is not None:
+                    minx, maxx, miny, maxy = geom.GetEnvelope()
+                    inside = (minx >= clip_env[0] and maxx <= clip_env[1] and
+                              miny >= clip_env[2] and maxy <= clip_env[3])
+                    # Features wholly inside a rectangular AOI need no clipping
+                    if not (inside and isinstance(aoi, BoundingBox)):
+                        geom = geom.Intersection(clip)
+                        if geom is None or geom.IsEmpty():
+                            continue
+                if geom.GetGeometryType() != out_type:
+                    geom = _conform_geometry(geom, out_type)
+                    if geom is None:
+                        continue
+                wkb = bytes(geom.ExportToWkb())
+            else:
+                wkb = None
+
+            values = [feature.GetField(i) if feature.IsFieldSetAndNotNull(i) else None
+                      for i in range(len(fields))]
+            if id_idx >= 0 and values[id_idx]:
+                key = values[id_idx]
+            else:
+                # No identifier: only exact copies (geometry and attributes) are duplicates
+                digest = hashlib.blake2b(wkb or b"", digest_size=16)
+                digest.update(repr(values).encode())
+                key = digest.digest()
+            rows.append((key, wkb, values))
+        return schema, rows
+    finally:
+        dataSource = None
+
+
+def _gpkg_layers(gpkg_paths):
+    """Vector layer names found in the given GPKGs, in first-seen order."""
+    names = {}
+    for path in gpkg_paths:
+        dataSource = ogr.Open(path, 0)
+        if dataSource is None:
+            continue
+        for i in range(dataSource.GetLayerCount()):
+            names.setdefault(dataSource.GetLayerByIndex(i).GetName(), None)
+        del dataSource
+    return list(names)
+
+
+def merged_path(bbox, out_dir=MERGED_DIR):
+    """Default output path for merge_gpkgs."""
+    env = bbox if isinstance(bbox, BoundingBox) else bbox.bbox
+    suffix = "" if isinstance(bbox, BoundingBox) else f"_{bbox.key}"
+    return os.path.join(out_dir, f"Topo_{env.xmin}_{env.ymin}_{env.xmax}_{env.ymax}{suffix}.gpkg")
+
+
+def merge_gpkgs(gpkg_paths, out_path, aoi=None, layers=None, readers=4, batch_size=100000):
+    """
+    Merges the layers of many per-quad GPKGs into a single GeoPackage.
+
+    Quad layers are read (and clipped to the AOI) in a pool of reader
+    processes; the parent writes features in large transactions, skipping
+    any Permanent_Identifier already written to the layer (features on quad
+    edges appear in both quads); features without one are only skipped when
+    their geometry and attributes repeat exactly. Spatial indexes are built once per layer
+    after all features are loaded.
+
+    Args:
+        gpkg_paths (list): Per-quad GPKG files, e.g. the 'gpkg_paths' of a download summary.
+        out_path (str): Output GPKG path.
+        aoi (BoundingBox or PolygonAOI, optional): Clip features to this area. Defaults to no clip.
+        layers (list, optional): Layer names to merge. Defaults to every layer found.
+        readers (int, optional): Reader processes. Defaults to 4.
+        batch_size (int, optional): Features per transaction. Defaults to 100000.
+
+    Returns:
+        dict: Summary with per-layer feature counts and duplicates skipped.
+    """
+    ogr.UseExceptions()
+    start = time.time()
+    layers = layers or _gpkg_layers(gpkg_paths)
+    readers = max(1, int(readers))
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    # Unique temp file, so concurrent merges into the same output never collide
+    tmp_path = f"{out_path}.{uuid.uuid4().hex}.tmp.gpkg"
+
+    # Bulk-load settings: no fsync per commit (set for this thread only), no
+    # per-feature R-tree updates
+    previous = gdal.GetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS")
+    gdal.SetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS", "OFF")
+
+    out_ds = ogr.GetDriverByName("GPKG").CreateDataSource(tmp_path)
+    out_layers = {}      # layer name -> (layer, {field name: index})
+    seen = {name: set() for name in layers}
+    counts = {name: 0 for name in layers}
+    duplicates = 0
+    in_transaction = 0
+
+    def write(layer_name, schema, rows):
+        nonlocal duplicates, in_transaction
+        if layer_name not in out_layers:
+            srs = None
+            if schema["srs_wkt"]:
+                srs = osr.SpatialReference()
+                srs.ImportFromWkt(schema["srs_wkt"])
+            # Layers are created outside the bulk transaction
+            out_ds.CommitTransaction()
+            layer = out_ds.CreateLayer(layer_name, srs, schema["geom_type"],
+                                       options=["SPATIAL_INDEX=NO"])
+            for name, field_type in schema["fields"]:
+                layer.CreateField(ogr.FieldDefn(name, field_type))
+            defn = layer.GetLayerDefn()
+            out_layers[layer_name] = (layer, {
+                defn.GetFieldDefn(i).GetName(): i for i in range(defn.GetFieldCount())
+            })
+            out_ds.StartTransaction()
+        layer, field_index = out_layers[layer_name]
+        mapping = [field_index.get(name) for name, _ in schema["fields"]]
+        defn = layer.GetLayerDefn()
+
+        for key, wkb, values in rows:
+            if key in seen[layer_name]:
+                duplicates += 1
+                continue
+            seen[layer_name].add(key)
+            feature = ogr.Feature(defn)
+            for idx, value in zip(mapping, values):
+                if idx is not None and value is not None:
+                    feature.SetField(idx, value)
+            if wkb is not None:
+                feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+            layer.CreateFeature(feature)
+            counts[layer_name] += 1
+            in_transaction += 1
+            if in_transaction >= batch_size:
+                out_ds.CommitTransaction()
+                out_ds.StartTransaction()
+                in_transaction = 0
+
+    try:
+        out_ds.StartTransaction()
+        tasks = [(path, layer_name) for layer_name in layers for path in gpkg_paths]
+        with ProcessPoolExecutor(max_workers=readers) as pool:
+            # Keep at most two quad layers per reader in flight to bound memory
+            pending = {}
+            for task in tasks:
+                pending[pool.submit(_read_quad_layer, *task, aoi)] = task
+                if len(pending) >= 2 * readers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        _, layer_name = pending.pop(future)
+                        schema, rows = future.result()
+                        if schema:
+                            write(layer_name, schema, rows)
+            for future in list(pending):
+                _, layer_name = pending.pop(future)
+                schema, rows = future.result()
+                if schema:
+                    write(layer_name, schema, rows)
+        out_ds.CommitTransaction()
+
+        # Build each layer's R-tree once, after the bulk load
+        for layer_name, (layer, _) in out_layers.items():
+            geom_column = layer.GetGeometryColumn()
+            if geom_column:
+                result = out_ds.ExecuteSQL(f"SELECT CreateSpatialIndex({_sql_literal(layer_name)}, "
+                                           f"{_sql_literal(geom_column)})")
+                if result is not None:
+                    out_ds.ReleaseResultSet(result)
+        out_layers.clear()
+        out_ds = None
+        os.replace(tmp_path, out_path)
+    finally:
+        out_layers.clear()
+        out_ds = None
+        gdal.SetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS", previous)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.time() - start
+    written = {name: count for name, count in counts.items() if count}
+    print(f"[DONE] Merged {len(gpkg_paths)} GPKGs into {out_path}: "
+          f"{sum(written.values())} features in {len(written)} layers, "
+          f"{duplicates} duplicates skipped ({elapsed:.2f} s)")
+    return {
+        "status": "SUCCESS",
+        "path": out_path,
+        "layers": written,
+        "duplicates_skipped": duplicates,
+        "elapsed_s": round(elapsed, 3),
+    }
@@ -0,0 +1,365 @@
+"""
+graph_utils.py
+
+Trail / road network graph built from the extracted USGS Topo GPKGs.
+
+build_graph streams the transportation segment layers of every GPKG in the
+extracted cache, snaps line endpoints that meet across quad boundaries onto
+shared nodes, drops features duplicated in neighbouring quads, and stores
+the result as flat NumPy arrays:
+  - node_xy (N x 2 float64 lon/lat)
+  - CSR adjacency (indptr, adj_node, adj_edge); every edge is traversable
+    in both directions
+  - per-edge attributes: endpoints, length in metres, layer and class
+    (trail type / road class) codes, and offsets into a shared vertex
+    array holding each edge's geometry
+
+The arrays can be saved to a directory of .npy files and memory-mapped back
+with TrailGraph.load.
+"""
+
+import os
+import json
+import glob
+import hashlib
+from array import array
+
+import numpy as np
+
+from .bbox import EARTH_RADIUS_M
+
+# --- FIXED PATHS ---
+# Get the directory of this file (proj/lib)
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+# Get the project root directory (proj)
+PROJECT_ROOT = os.path.abspath(os.path.join(LIB_DIR, '..'))
+# Define data paths based on the project root
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+
+EXTRACTED_DIR = os.path.join(DATA_DIR, "extracted", "gpkg")
+GRAPH_DIR = os.path.join(DATA_DIR, "processed", "graph")
+# --- END FIXED PATHS ---
+
+GRAPH_VERSION = 1
+
+# Segment layers read from each Topo GPKG, and the attribute used as the
+# edge class (trail type / road functional class) for each.
+DEFAULT_LAYERS = {
+    "Trans_TrailSegment": "trailtype",
+    "Trans_RoadSegment": "tnmfrc",
+}
+
+# Endpoints closer than this (degrees, ~1 m) are merged into one node
+SNAP_TOLERANCE_DEG = 1e-5
+
+_ARRAYS = ("node_xy", "indptr", "adj_node", "adj_edge", "edge_u", "edge_v",
+           "edge_length", "edge_layer", "edge_class", "geom_offsets", "geom_xy")
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Vectorized great-circle distance in metres."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+# ---------------------------------------------------------
+# Graph container
+# ---------------------------------------------------------
+
+class TrailGraph:
+    """
+    Array-backed, undirected trail graph in CSR form.
+
+    The arcs leaving node n are adj_node[indptr[n]:indptr[n + 1]] (the
+    neighbouring nodes) and adj_edge[...] (the edge ids used to reach them).
+    """
+    def __init__(self, arrays, classes, layers, meta=None):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes = list(classes)
+        self.layers = list(layers)
+        self.meta = meta or {}
+
+    @property
+    def num_nodes(self):
+        return len(self.node_xy)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_u)
+
+    def __repr__(self):
+        return f"TrailGraph(nodes={self.num_nodes}, edges={self.num_edges})"
+
+    def neighbors(self, node):
+        """Return (neighbour node ids, edge ids) for a node."""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.adj_node[start:end], self.adj_edge[start:end]
+
+    def edge_geometry(self, edge):
+        """Return the (K x 2) lon/lat vertices of an edge, from edge_u to edge_v."""
+        return self.geom_xy[self.geom_offsets[edge]:self.geom_offsets[edge + 1]]
+
+    def edge_class_name(self, edge):
+        return self.classes[self.edge_class[edge]]
+
+    def edge_layer_name(self, edge):
+        return self.layers[self.edge_layer[edge]]
+
+    def save(self, graph_dir=GRAPH_DIR):
+        """Write the arrays and a meta.json to graph_dir."""
+        os.makedirs(graph_dir, exist_ok=True)
+        for name in _ARRAYS:
+            tmp_path = os.path.join(graph_dir, f"{name}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(graph_dir, f"{name}.npy"))
+
+        meta = {
+            **self.meta,
+            "version": GRAPH_VERSION,
+            "nodes": int(self.num_nodes),
+            "edges": int(self.num_edges),
+            "classes": self.classes,
+            "layers": self.layers,
+        }
+        # meta.json is written last so a partially saved graph does not load
+        tmp_meta = os.path.join(graph_dir, "meta.json.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta, os.path.join(graph_dir, "meta.json"))
+        return graph_dir
+
+    @classmethod
+    def load(cls, graph_dir=GRAPH_DIR, mmap=True):
+        """
+        Load a saved graph, memory-mapping the arrays by default. Returns
+        None if graph_dir holds no (current) graph.
+        """
+        try:
+            with open(os.path.join(graph_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != GRAPH_VERSION:
+            return None
+        try:
+            arrays = {
+                name: np.load(os.path.join(graph_dir, f"{name}.npy"),
+                              mmap_mode="r" if mmap else None)
+                for name in _ARRAYS
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(arrays, meta["classes"], meta["layers"], meta)
+
+
+# ---------------------------------------------------------
+# Build (requires osgeo)
+# ---------------------------------------------------------
+
+class _GraphBuilder:
+    """
+    Accumulates edges into flat typed arrays while features are streamed,
+    so no OGR objects are kept alive between features.
+    """
+    def __init__(self, snap_tolerance):
+        self.tol = snap_tolerance
+        self.node_keys = {}          # quantized (ix, iy) -> node id
+        self.node_x = array("d")
+        self.node_y = array("d")
+        self.edge_u = array("i")
+        self.edge_v = array("i")
+        self.edge_layer = array("h")
+        self.edge_class = array("h")
+        self.geom_x = array("d")
+        self.geom_y = array("d")
+        self.geom_offsets = array("q", [0])
+        self.seen = set()            # digests of already-added geometries
+        self.classes = {}
+        self.layers = {}
+        self.duplicates = 0
+
+    def _node(self, x, y):
+        """
+        Return the node for an endpoint, reusing any existing node within
+        the snap tolerance (the 3x3 neighbouring buckets are checked so
+        points straddling a bucket edge still merge).
+        """
+        ix, iy = int(round(x / self.tol)), int(round(y / self.tol))
+        key = (ix, iy)
+        node = self.node_keys.get(key)
+        if node is not None:
+            return node
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                node = self.node_keys.get((ix + dx, iy + dy))
+                if node is not None and \
+                   abs(self.node_x[node] - x) <= self.tol and abs(self.node_y[node] - y) <= self.tol:
+                    self.node_keys[key] = node
+                    return node
+        node = len(self.node_x)
+        self.node_keys[key] = node
+        self.node_x.append(x)
+        self.node_y.append(y)
+        return node
+
+    def _digest(self, points):
+        """Direction-independent fingerprint of a line, at snap precision."""
+        q = np.round(np.asarray(points, dtype=np.float64) / self.tol).astype(np.int64)
+        forward, backward = q.tobytes(), q[::-1].tobytes()
+        return hashlib.blake2b(min(forward, backward), digest_size=16).digest()
+
+    def add_line(self, points, layer_name, class_name):
+        """Add one polyline (sequence of (lon, lat)) as an edge."""
+        if len(points) < 2:
+            return
+        digest = self._digest(points)
+        if digest in self.seen:
+            self.duplicates += 1
+            return
+        self.seen.add(digest)
+
+        u = self._node(*points[0])
+        v = self._node(*points[-1])
+        self.edge_u.append(u)
+        self.edge_v.append(v)
+        self.edge_layer.append(self.layers.setdefault(layer_name, len(self.layers)))
+        self.edge_class.append(self.classes.setdefault(class_name, len(self.classes)))
+
+        # Store the geometry with its ends moved onto the (snapped) nodes
+        self.geom_x.append(self.node_x[u])
+        self.geom_y.append(self.node_y[u])
+        for x, y in points[1:-1]:
+            self.geom_x.append(x)
+            self.geom_y.append(y)
+        self.geom_x.append(self.node_x[v])
+        self.geom_y.append(self.node_y[v])
+        self.geom_offsets.append(len(self.geom_x))
+
+    def finish(self, meta):
+        n = len(self.node_x)
+        node_xy = np.column_stack([np.frombuffer(self.node_x, dtype=np.float64),
+                                   np.frombuffer(self.node_y, dtype=np.float64)]).reshape(n, 2)
+        geom_xy = np.column_stack([np.frombuffer(self.geom_x, dtype=np.float64),
+                                   np.frombuffer(self.geom_y, dtype=np.float64)]).reshape(-1, 2)
+        geom_offsets = np.frombuffer(self.geom_offsets, dtype=np.int64).copy()
+        edge_u = np.frombuffer(self.edge_u, dtype=np.int32).copy()
+        edge_v = np.frombuffer(self.edge_v, dtype=np.int32).copy()
+
+        # Edge length: sum of vertex-to-vertex distances within each edge
+        if len(geom_xy) > 1:
+            seg = haversine_m(geom_xy[:-1, 0], geom_xy[:-1, 1], geom_xy[1:, 0], geom_xy[1:, 1])
+            seg[geom_offsets[1:-1] - 1] = 0.0  # pairs that span two edges
+            cum = np.concatenate([[0.0], np.cumsum(seg)])
+            edge_length = (cum[geom_offsets[1:] - 1] - cum[geom_offsets[:-1]]).astype(np.float32)
+        else:
+            edge_length = np.zeros(len(edge_u), dtype=np.float32)
+
+        # CSR adjacency over both directions of every edge
+        edge_ids = np.arange(len(edge_u), dtype=np.int32)
+        src = np.concatenate([edge_u, edge_v])
+        dst = np.concatenate([edge_v, edge_u])
+        arc_edge = np.concatenate([edge_ids, edge_ids])
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        arrays = {
+            "node_xy": node_xy,
+            "indptr": indptr,
+            "adj_node": dst[order].astype(np.int32),
+            "adj_edge": arc_edge[order],
+            "edge_u": edge_u,
+            "edge_v": edge_v,
+            "edge_length": edge_length,
+            "edge_layer": np.frombuffer(self.edge_layer, dtype=np.int16).copy(),
+            "edge_class": np.frombuffer(self.edge_class, dtype=np.int16).copy(),
+            "geom_offsets": geom_offsets,
+            "geom_xy": geom_xy,
+        }
+        meta = {**meta, "snap_tolerance": self.tol, "duplicates_dropped": self.duplicates}
+        return TrailGraph(arrays, list(self.classes), list(self.layers), meta)
+
+
+def _line_parts(geom, ogr):
+    """Yield the point lists of a (Multi)LineString geometry."""
+    flat = ogr.GT_Flatten(geom.GetGeometryType())
+    if flat == ogr.wkbLineString:
+        yield [p[:2] for p in geom.GetPoints() or []]
+    elif flat == ogr.wkbMultiLineString:
+        for i in range(geom.GetGeometryCount()):
+            yield [p[:2] for p in geom.GetGeometryRef(i).GetPoints() or []]
+
+
+def _to_wgs84(layer, osr):
+    """Coordinate transformation for projected layers, None for geographic ones."""
+    srs = layer.GetSpatialRef()
+    if srs is None or srs.IsGeographic():
+        return None
+    wgs84 = osr.SpatialReference()
+    wgs84.ImportFromEPSG(4326)
+    wgs84.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    srs = srs.Clone()
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return osr.CoordinateTransformation(srs, wgs84)
+
+
+def build_graph(gpkg_dir=EXTRACTED_DIR, layers=None, snap_tolerance=SNAP_TOLERANCE_DEG,
+                gpkg_paths=None):
+    """
+    Build a TrailGraph from the segment layers of every GPKG in gpkg_dir.
+
+    Features are streamed one at a time; only their coordinates are kept.
+    A line that shows up in more than one quad (identical geometry at snap
+    precision, in either direction) is added once.
+
+    Args:
+        gpkg_dir (str, optional): Directory of extracted Topo GPKGs.
+        layers (dict, optional): Layer name -> class attribute. Defaults to DEFAULT_LAYERS.
+        snap_tolerance (float, optional): Endpoint snap distance in degrees.
+        gpkg_paths (list, optional): Explicit GPKG files, instead of globbing gpkg_dir.
+
+    Returns:
+        TrailGraph: The built graph.
+    """
+    from osgeo import ogr, osr
+    ogr.UseExceptions()
+
+    layers = layers or DEFAULT_LAYERS
+    paths = sorted(gpkg_paths or glob.glob(os.path.join(gpkg_dir, "*.gpkg")))
+    builder = _GraphBuilder(snap_tolerance)
+
+    for path in paths:
+        dataSource = ogr.Open(path, 0)
+        if dataSource is None:
+            print(f"[WARN] Could not open {path}; skipping.")
+            continue
+        try:
+            for layer_name, class_field in layers.items():
+                layer = dataSource.GetLayer(layer_name)
+                if layer is None:
+                    continue
+                defn = layer.GetLayerDefn()
+                class_idx = defn.GetFieldIndex(class_field) if class_field else -1
+                transform = _to_wgs84(layer, osr)
+
+                for feature in layer:
+                    geom = feature.GetGeometryRef()
+                    if geom is None:
+                        continue
+                    if transform is not None:
+                        geom = geom.Clone()
+                        geom.Transform(transform)
+                    value = feature.GetFieldAsString(class_idx) if class_idx >= 0 else ""
+                    for points in _line_parts(geom, ogr):
+                        builder.add_line(points, layer_name, value or "")
+                layer = None
+        finally:
+            del dataSource
+
+    graph = builder.finish({"gpkg_count": len(paths), "source_layers": list(layers)})
+    print(f"[INFO] Built trail graph from {len(paths)} GPKGs: {graph.num_nodes} nodes, "
+          f"{graph.num_edges} edges ({builder.duplicates} duplicate features dropped)")
+    return graph
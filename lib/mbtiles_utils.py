@@ -0,0 +1,359 @@
+"""
+mbtiles_utils.py
+
+Offline raster tile pyramid (MBTiles) export of a clipped DEM: hillshade,
+optionally blended with a hypsometric colour ramp, as 256 px web-mercator
+PNG tiles.
+
+Work is split into metatiles (up to 8 x 8 tiles) rendered in a process
+pool. Each metatile is warped from the DEM once at its highest zoom; the
+next lower zooms inside the same metatile are produced by 2x2 downsampling
+of that image instead of going back to the DEM. Tiles are stored with the
+MBTiles map/images layout, so identical tiles (in particular the empty /
+all-nodata ones) are stored once, and inserts are batched in large
+transactions.
+"""
+
+import os
+import math
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from .bbox import BoundingBox, WEB_MERCATOR_RADIUS_M
+from .dem_utils import read_elevation
+from .terrain_utils import terrain_kernels
+
+TILE_SIZE = 256
+
+# Metatile edge in tiles at the top zoom of each band (must be a power of two)
+METATILE = 8
+
+# Tiles per SQLite transaction
+DEFAULT_BATCH_SIZE = 5000
+
+WEB_MERCATOR_HALF = 20037508.342789244
+
+# Hypsometric tint: elevation (m) -> RGB
+HYPSOMETRIC_RAMP = [
+    (0, (112, 147, 141)),
+    (500, (120, 172, 149)),
+    (1000, (202, 205, 157)),
+    (1500, (232, 215, 166)),
+    (2000, (206, 169, 134)),
+    (2500, (172, 140, 115)),
+    (3000, (165, 156, 150)),
+    (3500, (230, 230, 230)),
+    (4500, (255, 255, 255)),
+]
+
+
+# ---------------------------------------------------------
+# Tile math
+# ---------------------------------------------------------
+
+def lonlat_to_tile(lon, lat, zoom):
+    """XYZ tile containing lon/lat at zoom."""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox: BoundingBox, zoom):
+    """Inclusive (xmin, ymin, xmax, ymax) XYZ tile range covering bbox at zoom."""
+    x0, y0 = lonlat_to_tile(bbox.xmin, bbox.ymax, zoom)
+    x1, y1 = lonlat_to_tile(bbox.xmax, bbox.ymin, zoom)
+    return x0, y0, x1, y1
+
+
+def tile_bounds_mercator(x, y, zoom, span=1):
+    """EPSG:3857 bounds (xmin, ymin, xmax, ymax) of a span x span block of tiles."""
+    size = 2 * WEB_MERCATOR_HALF / 2 ** zoom
+    xmin = -WEB_MERCATOR_HALF + x * size
+    ymax = WEB_MERCATOR_HALF - y * size
+    return xmin, ymax - span * size, xmin + span * size, ymax
+
+
+def metatile_bounds(mx, my, zoom, span):
+    """EPSG:3857 bounds of metatile (mx, my), i.e. tiles mx*span.. x my*span.. at zoom."""
+    return tile_bounds_mercator(mx * span, my * span, zoom, span)
+
+
+# ---------------------------------------------------------
+# Rendering (worker processes)
+# ---------------------------------------------------------
+
+def _png(rgba):
+    """Encode an H x W x 4 uint8 array as PNG (no dependencies beyond zlib)."""
+    h, w, _ = rgba.shape
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8), rgba.reshape(h, w * 4)], axis=1)
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) +
+            chunk(b"IEND", b""))
+
+
+def _colorize(z, shade, color_ramp):
+    """Blend hillshade with an optional colour ramp; alpha marks valid pixels."""
+    valid = np.isfinite(z) & (shade > 0)
+    rgba = np.zeros(z.shape + (4,), dtype=np.float32)
+    light = shade.astype(np.float32) / 255.0
+    if color_ramp:
+        stops = np.array([s[0] for s in color_ramp], dtype=np.float32)
+        colors = np.array([s[1] for s in color_ramp], dtype=np.float32)
+        zf = np.nan_to_num(z, nan=stops[0])
+        for c in range(3):
+            # Multiply blend, keeping shadows from going fully black
+            rgba[..., c] = np.interp(zf, stops, colors[:, c]) * (0.35 + 0.65 * light)
+    else:
+        rgba[..., :3] = (255.0 * light)[..., None]
+    rgba[..., 3] = np.where(valid, 255.0, 0.0)
+    rgba[..., :3] *= valid[..., None]
+    return rgba
+
+
+def _downsample(rgba):
+    """Halve an RGBA float image, averaging colour weighted by alpha."""
+    h, w = rgba.shape[0] // 2, rgba.shape[1] // 2
+    blocks = rgba[:2 * h, :2 * w].reshape(h, 2, w, 2, 4)
+    alpha = blocks[..., 3]
+    weight = alpha.sum(axis=(1, 3))
+    out = np.empty((h, w, 4), dtype=np.float32)
+    for c in range(3):
+        total = (blocks[..., c] * alpha).sum(axis=(1, 3))
+        out[..., c] = np.divide(total, weight, out=np.zeros_like(total), where=weight > 0)
+    out[..., 3] = weight / 4.0
+    return out
+
+
+def _render_metatile(dem_path, zoom, mx, my, span, levels, ranges, options):
+    """
+    Render one span x span metatile at zoom, plus `levels` lower zooms by
+    downsampling. Returns a list of (z, x, y, png) for tiles inside `ranges`
+    (zoom -> inclusive tile range).
+    """
+    from osgeo import gdal
+    gdal.UseExceptions()
+
+    px = span * TILE_SIZE
+    xmin, ymin, xmax, ymax = metatile_bounds(mx, my, zoom, span)
+    res = (xmax - xmin) / px
+
+    # Warp with a one-pixel halo for the hillshade kernel
+    warped = gdal.Warp("", dem_path, format="MEM", dstSRS="EPSG:3857",
+                       outputBounds=(xmin - res, ymin - res, xmax + res, ymax + res),
+                       width=px + 2, height=px + 2, resampleAlg="bilinear",
+                       dstAlpha=True, multithread=False)
+    z = read_elevation(warped, 0, 0, px + 2, px + 2)
+    warped = None
+
+    tiles = []
+    if not np.isfinite(z).any():
+        empty = _png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+        for level in range(levels + 1):
+            zl, s = zoom - level, span >> level
+            tiles.extend(_tiles_in_range(zl, mx * s, my * s, s, ranges, lambda ty, tx: empty))
+        return tiles
+
+    # Web-mercator pixels shrink on the ground by cos(latitude)
+    row_y = ymax - (np.arange(px) + 0.5) * res
+    lat = np.degrees(np.arctan(np.sinh(row_y / WEB_MERCATOR_RADIUS_M)))
+    ground = (res * np.cos(np.radians(lat)))[:, None]
+    shade = terrain_kernels(z, ground, ground, ("hillshade",),
+                            azimuth=options["azimuth"], altitude=options["altitude"],
+                            z_factor=options["z_factor"])["hillshade"]
+    rgba = _colorize(z[1:-1, 1:-1], shade, options["color_ramp"])
+
+    for level in range(levels + 1):
+        zl, s = zoom - level, span >> level
+
+        def encode(ty, tx, img=rgba):
+            tile = img[ty * TILE_SIZE:(ty + 1) * TILE_SIZE, tx * TILE_SIZE:(tx + 1) * TILE_SIZE]
+            return _png(np.clip(np.rint(tile), 0, 255).astype(np.uint8))
+
+        tiles.extend(_tiles_in_range(zl, mx * s, my * s, s, ranges, encode))
+        if level < levels:
+            rgba = _downsample(rgba)
+    return tiles
+
+
+def _tiles_in_range(zoom, x0, y0, span, ranges, encode):
+    if zoom not in ranges:
+        return []
+    rx0, ry0, rx1, ry1 = ranges[zoom]
+    out = []
+    for ty in range(span):
+        for tx in range(span):
+            x, y = x0 + tx, y0 + ty
+            if rx0 <= x <= rx1 and ry0 <= y <= ry1:
+                out.append((zoom, x, y, encode(ty, tx)))
+    return out
+
+
+# ---------------------------------------------------------
+# MBTiles output
+# ---------------------------------------------------------
+
+_MBTILES_SCHEMA = """
+CREATE TABLE metadata (name TEXT, value TEXT);
+CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+CREATE VIEW tiles AS
+    SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+           map.tile_row AS tile_row, images.tile_data AS tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+"""
+
+
+def _band_plan(minzoom, maxzoom):
+    """
+    Split [minzoom, maxzoom] into bands rendered from the DEM at their top
+    zoom: yields (top_zoom, levels_derived_by_downsampling).
+    """
+    top = maxzoom
+    max_levels = int(math.log2(METATILE))
+    while top >= minzoom:
+        levels = min(max_levels, top - minzoom, top)
+        yield top, levels
+        top -= levels + 1
+
+
+def export_mbtiles(dem_path, out_path, bbox: BoundingBox = None, minzoom=8, maxzoom=14,
+                   color_ramp=False, processes=None, azimuth=315.0, altitude=45.0,
+                   z_factor=1.0, name=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Render a DEM to an MBTiles pyramid of hillshade (optionally colour
+    ramped) PNG tiles.
+
+    Args:
+        dem_path (str): Clipped DEM (e.g. from fetch_and_clip_dem).
+        out_path (str): Output .mbtiles path.
+        bbox (BoundingBox, optional): Area to tile. Defaults to the DEM extent.
+        minzoom, maxzoom (int, optional): Zoom range. Defaults to 8-14.
+        color_ramp (bool or list, optional): True for HYPSOMETRIC_RAMP, or a list
+            of (elevation, (r, g, b)) stops. Defaults to plain hillshade.
+        processes (int, optional): Render processes. Defaults to os.cpu_count().
+        azimuth, altitude, z_factor (float, optional): Hillshade parameters.
+        name (str, optional): Tileset name for the metadata.
+        batch_size (int, optional): Tiles per SQLite transaction.
+
+    Returns:
+        dict: Summary with tile counts per zoom and unique image count.
+    """
+    if bbox is None:
+        from osgeo import gdal
+        ds = gdal.Open(dem_path)
+        gt = ds.GetGeoTransform()
+        bbox = BoundingBox(gt[0], gt[3] + ds.RasterYSize * gt[5],
+                           gt[0] + ds.RasterXSize * gt[1], gt[3])
+        ds = None
+
+    options = {
+        "azimuth": azimuth, "altitude": altitude, "z_factor": z_factor,
+        "color_ramp": HYPSOMETRIC_RAMP if color_ramp is True else (color_ramp or None),
+    }
+    ranges = {z: tile_range(bbox, z) for z in range(minzoom, maxzoom + 1)}
+    processes = max(1, processes or os.cpu_count() or 1)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.executescript(_MBTILES_SCHEMA)
+
+    jobs = []
+    for top, levels in _band_plan(minzoom, maxzoom):
+        span = 2 ** levels
+        x0, y0, x1, y1 = ranges[top]
+        for my in range(y0 // span, y1 // span + 1):
+            for mx in range(x0 // span, x1 // span + 1):
+                jobs.append((top, mx, my, span, levels))
+
+    counts = {z: 0 for z in ranges}
+    images = set()
+    pending_rows = []
+    start = time.perf_counter()
+
+    def flush():
+        if pending_rows:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO images VALUES (?, ?)",
+                                 [(tid, data) for _, _, _, tid, data in pending_rows if data is not None])
+                conn.executemany("INSERT INTO map VALUES (?, ?, ?, ?)",
+                                 [(z, x, row, tid) for z, x, row, tid, _ in pending_rows])
+            pending_rows.clear()
+
+    def collect(finished):
+        for future in finished:
+            for z, x, y, png in future.result():
+                tile_id = hashlib.md5(png).hexdigest()
+                # Identical tiles (e.g. empty / nodata) share one image row
+                data = None if tile_id in images else png
+                images.add(tile_id)
+                pending_rows.append((z, x, 2 ** z - 1 - y, tile_id, data))  # TMS row order
+                counts[z] += 1
+            if len(pending_rows) >= batch_size:
+                flush()
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            pending = set()
+            for job in jobs:
+                pending.add(pool.submit(_render_metatile, dem_path, *job, ranges, options))
+                if len(pending) >= 2 * processes:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        flush()
+
+        conn.execute("CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row)")
+        metadata = {
+            "name": name or os.path.splitext(os.path.basename(out_path))[0],
+            "format": "png",
+            "type": "baselayer",
+            "bounds": f"{bbox.xmin},{bbox.ymin},{bbox.xmax},{bbox.ymax}",
+            "center": f"{(bbox.xmin + bbox.xmax) / 2},{(bbox.ymin + bbox.ymax) / 2},{minzoom}",
+            "minzoom": str(minzoom),
+            "maxzoom": str(maxzoom),
+        }
+        with conn:
+            conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+        conn.close()
+        conn = None
+        os.replace(tmp_path, out_path)
+    finally:
+        if conn is not None:
+            conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"[DONE] Wrote {total} tiles ({len(images)} unique images) for zooms "
+          f"{minzoom}-{maxzoom} to {out_path} ({len(jobs)} metatiles, "
+          f"{processes} processes, {elapsed:.2f} s)")
+    return {
+        "status": "SUCCESS",
+        "path": out_path,
+        "tiles": total,
+        "unique_images": len(images),
+        "tiles_per_zoom": counts,
+        "elapsed_s": round(elapsed, 3),
+    }
@@ -0,0 +1,334 @@
+"""
+metrics_utils.py
+
+Per-stage timing and throughput instrumentation for the download, extract,
+index query and clip stages, with a JSON or Prometheus textfile report.
+
+Instrumentation is process-wide and off by default. While disabled, timer()
+returns a shared no-op object, timed() wrappers call straight through and
+count() returns immediately, so the instrumented code pays only a global
+flag check. Scripts call enable() when --metrics-json / --metrics-prom is
+given and write the report once the run finishes.
+
+Stages collect one sample per call (duration, bytes, error flag); events
+are plain counters (e.g. cache hits and misses).
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import functools
+
+# Prefix for Prometheus metric names
+PROM_PREFIX = "bmt"
+
+PERCENTILES = (50, 90, 99)
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_started = None
+
+
+# ---------------------------------------------------------
+# Switch
+# ---------------------------------------------------------
+
+def enable():
+    """Start collecting metrics (clearing anything collected so far)."""
+    global _enabled, _started
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.time()
+        _enabled = True
+
+
+def disable():
+    """Stop collecting metrics. Collected data is kept for report()."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+# ---------------------------------------------------------
+# Recording
+# ---------------------------------------------------------
+
+class _Stage:
+    __slots__ = ("durations", "bytes", "errors", "first_start", "last_end")
+
+    def __init__(self):
+        self.durations = []
+        self.bytes = 0
+        self.errors = 0
+        self.first_start = None
+        self.last_end = None
+
+
+def record(stage, seconds, nbytes=0, error=False):
+    """Record one completed call of stage taking seconds and moving nbytes."""
+    if not _enabled:
+        return
+    end = time.perf_counter()
+    with _lock:
+        s = _stages.get(stage)
+        if s is None:
+            s = _stages[stage] = _Stage()
+        s.durations.append(seconds)
+        s.bytes += nbytes or 0
+        s.errors += bool(error)
+        if s.first_start is None or end - seconds < s.first_start:
+            s.first_start = end - seconds
+        if s.last_end is None or end > s.last_end:
+            s.last_end = end
+
+
+def count(event, n=1):
+    """Increment the counter for event by n."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + n
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, n):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("stage", "bytes", "start")
+
+    def __init__(self, stage, nbytes=0):
+        self.stage = stage
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start, self.bytes, exc_type is not None)
+        return False
+
+    def add_bytes(self, n):
+        self.bytes += n
+
+
+def timer(stage, nbytes=0):
+    """
+    Context manager timing one call of stage. The yielded object's
+    add_bytes(n) attributes bytes to the sample; an exception marks it
+    as an error.
+    """
+    return _Timer(stage, nbytes) if _enabled else _NULL_TIMER
+
+
+def timed(stage, nbytes=None, ok=None):
+    """
+    Decorator timing every call of a function as one sample of stage.
+
+    Args:
+        stage (str): Stage name.
+        nbytes (callable, optional): result -> bytes moved by the call.
+        ok (callable, optional): result -> False if the call reported failure
+            through its return value rather than an exception.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                record(stage, time.perf_counter() - start, 0, True)
+                raise
+            success = ok(result) if ok else True
+            size = nbytes(result) if (nbytes and success) else 0
+            record(stage, time.perf_counter() - start, size, not success)
+            return result
+        return wrapper
+    return decorator
+
+
+def timed_iter(stage, iterable, event=None):
+    """
+    Wrap a lazy iterable (e.g. an OGR layer scan) so the time spent producing
+    items is recorded as one sample of stage. Time the consumer spends
+    between items is not counted. Items are counted under event, if given.
+    """
+    if not _enabled:
+        return iterable
+    return _timed_iter(stage, iter(iterable), event)
+
+
+def _timed_iter(stage, it, event):
+    busy = 0.0
+    items = 0
+    failed = True
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                busy += time.perf_counter() - t0
+                failed = False
+                return
+            busy += time.perf_counter() - t0
+            items += 1
+            yield item
+    finally:
+        record(stage, busy, 0, failed)
+        if event:
+            count(event, items)
+
+
+# ---------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------
+
+def _percentile(sorted_values, pct):
+    """Linearly interpolated percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def report():
+    """
+    Summarise collected metrics.
+
+    Returns:
+        dict: {"started", "elapsed_s", "stages": {stage: {...}}, "counters": {...}}.
+            Per stage: calls, errors, total_s (summed call time), wall_s (first
+            start to last end), mean / p50 / p90 / p99 / max latency in ms,
+            bytes, and mb_per_s (bytes over wall_s, i.e. aggregate throughput
+            of concurrent calls).
+    """
+    with _lock:
+        stages = {}
+        for name, s in sorted(_stages.items()):
+            durations = sorted(s.durations)
+            total = sum(durations)
+            wall = (s.last_end - s.first_start) if durations else 0.0
+            entry = {
+                "calls": len(durations),
+                "errors": s.errors,
+                "total_s": round(total, 6),
+                "wall_s": round(wall, 6),
+                "mean_ms": round(1000 * total / len(durations), 3) if durations else 0.0,
+            }
+            for pct in PERCENTILES:
+                entry[f"p{pct}_ms"] = round(1000 * _percentile(durations, pct), 3)
+            entry["max_ms"] = round(1000 * durations[-1], 3) if durations else 0.0
+            entry["bytes"] = s.bytes
+            entry["mb_per_s"] = round(s.bytes / 1024 ** 2 / wall, 3) if wall > 0 and s.bytes else None
+            stages[name] = entry
+        counters = dict(sorted(_counters.items()))
+
+    return {
+        "started": _started,
+        "elapsed_s": round(time.time() - _started, 3) if _started else 0.0,
+        "stages": stages,
+        "counters": counters,
+    }
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_json(path, extra=None):
+    """Write report() (plus any extra top-level fields) as JSON to path."""
+    data = report()
+    data["argv"] = sys.argv
+    if extra:
+        data.update(extra)
+    _write_atomic(path, json.dumps(data, indent=2) + "\n")
+    print(f"[INFO] Wrote metrics to: {path}")
+    return path
+
+
+def prometheus_text(data=None):
+    """Render a report in the Prometheus text exposition format."""
+    data = data or report()
+    p = PROM_PREFIX
+    lines = [
+        f"# HELP {p}_stage_duration_seconds Duration of instrumented pipeline stage calls.",
+        f"# TYPE {p}_stage_duration_seconds summary",
+    ]
+    for stage, s in data["stages"].items():
+        for pct in PERCENTILES:
+            lines.append(f'{p}_stage_duration_seconds{{stage="{stage}",quantile="{pct / 100:g}"}} '
+                         f'{s[f"p{pct}_ms"] / 1000:.6f}')
+        lines.append(f'{p}_stage_duration_seconds_sum{{stage="{stage}"}} {s["total_s"]:.6f}')
+        lines.append(f'{p}_stage_duration_seconds_count{{stage="{stage}"}} {s["calls"]}')
+
+    for metric, key, help_text in (
+        ("stage_bytes_total", "bytes", "Bytes moved by instrumented stages."),
+        ("stage_errors_total", "errors", "Failed calls of instrumented stages."),
+    ):
+        lines.append(f"# HELP {p}_{metric} {help_text}")
+        lines.append(f"# TYPE {p}_{metric} counter")
+        for stage, s in data["stages"].items():
+            lines.append(f'{p}_{metric}{{stage="{stage}"}} {s[key]}')
+
+    lines.append(f"# HELP {p}_stage_throughput_mb_per_second Aggregate throughput of a stage.")
+    lines.append(f"# TYPE {p}_stage_throughput_mb_per_second gauge")
+    for stage, s in data["stages"].items():
+        if s["mb_per_s"] is not None:
+            lines.append(f'{p}_stage_throughput_mb_per_second{{stage="{stage}"}} {s["mb_per_s"]}')
+
+    lines.append(f"# HELP {p}_events_total Counted pipeline events (e.g. cache hits).")
+    lines.append(f"# TYPE {p}_events_total counter")
+    for event, n in data["counters"].items():
+        lines.append(f'{p}_events_total{{event="{event}"}} {n}')
+
+    lines.append(f"# HELP {p}_run_duration_seconds Wall time of the instrumented run.")
+    lines.append(f"# TYPE {p}_run_duration_seconds gauge")
+    lines.append(f"{p}_run_duration_seconds {data['elapsed_s']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """
+    Write the report as a Prometheus textfile (e.g. for node_exporter's
+    textfile collector). The file is replaced atomically.
+    """
+    _write_atomic(path, prometheus_text())
+    print(f"[INFO] Wrote Prometheus metrics to: {path}")
+    return path
+
+
+def write_reports(json_path=None, prom_path=None, extra=None):
+    """Write whichever of the JSON / Prometheus reports were requested."""
+    if json_path:
+        write_json(json_path, extra)
+    if prom_path:
+        write_prometheus(prom_path)
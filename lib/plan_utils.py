@@ -0,0 +1,180 @@
+"""
+plan_utils.py
+
+Dry-run planning for DEM tile and GPKG quad requests. A plan splits the
+files a request needs into cache hits and misses, sizes the misses with
+concurrent HEAD requests (through the shared downloader, so the per-host
+rate limits apply), estimates the transfer time at the configured rate
+limit, and checks that the target disk has room before anything is
+downloaded. Plans are plain dicts, written as JSON so a scheduler can pack
+jobs by cost.
+"""
+
+import os
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from .aoi_utils import aoi_bbox
+from .download_utils import get_downloader
+
+# Assumed sustained throughput of one connection to the download host (MB/s)
+DEFAULT_CONNECTION_MBPS = 10.0
+
+# Free space kept back beyond the planned downloads (outputs, manifests, temp files)
+DEFAULT_RESERVE_BYTES = 512 * 1024**2
+
+# Exit status of the CLI scripts when a plan does not fit on disk
+EXIT_INSUFFICIENT_DISK = 3
+
+
+def probe_sizes(urls, downloader=None, jobs=8):
+    """
+    HEAD every URL concurrently (rate limited per host by the downloader).
+
+    Returns:
+        dict: url -> downloader.revalidate() result; "content_length" is
+            None when the server did not report a size.
+    """
+    downloader = downloader or get_downloader()
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(int(jobs), len(urls)))) as pool:
+        return dict(zip(urls, pool.map(downloader.revalidate, urls)))
+
+
+def estimate_seconds(urls, total_bytes, downloader=None, jobs=8,
+                     connection_mbps=DEFAULT_CONNECTION_MBPS):
+    """
+    Lower-bound transfer time for GETting urls: the larger of the time the
+    host's request-rate limit allows and the time total_bytes takes over
+    min(jobs, max_in_flight) connections of connection_mbps each.
+    """
+    downloader = downloader or get_downloader()
+    by_host = {}
+    for url in urls:
+        limiter = downloader.limiter_for(url)
+        by_host.setdefault(id(limiter), [limiter, 0])[1] += 1
+
+    rate_s = 0.0
+    connections = max(1, int(jobs))
+    for limiter, n in by_host.values():
+        if limiter.rate > 0:
+            rate_s = max(rate_s, n / limiter.rate)
+        connections = min(connections, max(1, int(limiter.max_in_flight)))
+    transfer_s = total_bytes / (connection_mbps * 1e6 * connections) if connection_mbps else 0.0
+    return round(max(rate_s, transfer_s), 1)
+
+
+def free_bytes(path):
+    """Free space on the filesystem that holds path (or its nearest existing parent)."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def build_plan(kind, aoi, items, disk_path, downloader=None, jobs=8,
+               disk_factor=1.0, connection_mbps=DEFAULT_CONNECTION_MBPS,
+               reserve_bytes=DEFAULT_RESERVE_BYTES, transfer=True, extra=None):
+    """
+    Build a plan for a request.
+
+    Args:
+        kind (str): "dem" or "gpkg".
+        aoi: BoundingBox or PolygonAOI of the request.
+        items (list): One dict per needed file with "key", "url" and
+            "cached" (a read-only cache check, see CacheManager.contains).
+        disk_path (str): Directory the downloads land in.
+        downloader (Downloader, optional): Defaults to the shared instance.
+        jobs (int, optional): Concurrent downloads the real run would use.
+        disk_factor (float, optional): Disk bytes needed per transferred
+            byte (e.g. zipped GPKGs expand when extracted). Defaults to 1.
+        connection_mbps (float, optional): Assumed per-connection MB/s.
+        reserve_bytes (int, optional): Free space to keep back.
+        transfer (bool, optional): False when the files are read in place
+            rather than downloaded (remote /vsicurl/ reads): misses are
+            still probed, so missing files show up, but cost no transfer
+            or disk. Defaults to True.
+        extra (dict, optional): Extra fields merged into the plan.
+
+    Returns:
+        dict: The plan. plan["ok"] is False when the disk check fails.
+    """
+    downloader = downloader or get_downloader()
+    hits = [item["key"] for item in items if item["cached"]]
+    misses = [item for item in items if not item["cached"]]
+
+    probes = probe_sizes([item["url"] for item in misses], downloader, jobs)
+    sizes = {}
+    unknown, missing, errors = [], [], {}
+    for item in misses:
+        result = probes[item["url"]]
+        if result["status"] == "MISSING":
+            missing.append(item["key"])
+        elif result["status"] == "ERROR":
+            errors[item["key"]] = result["message"]
+        elif result["content_length"] is None:
+            unknown.append(item["key"])
+        else:
+            sizes[item["key"]] = result["content_length"]
+
+    transfer_bytes = sum(sizes.values())
+    # Unsized misses are costed at the mean of the sized ones
+    if unknown and sizes:
+        transfer_bytes += len(unknown) * transfer_bytes // len(sizes)
+    if not transfer:
+        transfer_bytes = 0
+    required = int(transfer_bytes * disk_factor) + int(reserve_bytes)
+    free = free_bytes(disk_path)
+    urls = [item["url"] for item in misses if item["key"] not in missing]
+
+    plan = {
+        "kind": kind,
+        "bbox": list(aoi_bbox(aoi)),
+        "items": len(items),
+        "cache_hits": hits,
+        "cache_misses": [item["key"] for item in misses],
+        "sizes": sizes,
+        "unknown_size": unknown,
+        "missing": missing,
+        "errors": errors,
+        "transfer_bytes": transfer_bytes,
+        "requests": len(urls),
+        "estimated_seconds": estimate_seconds(urls, transfer_bytes, downloader, jobs, connection_mbps),
+        "disk": {
+            "path": os.path.abspath(disk_path),
+            "free_bytes": free,
+            "required_bytes": required,
+            "reserve_bytes": int(reserve_bytes),
+        },
+        "ok": free >= required,
+    }
+    plan.update(extra or {})
+    return plan
+
+
+def summarize(plan):
+    """One-line human summary of a plan, for logs."""
+    return (f"{plan['kind']}: {plan['items']} files, {len(plan['cache_hits'])} cached, "
+            f"{len(plan['cache_misses'])} to fetch ({plan['transfer_bytes']/1024**2:.1f} MB, "
+            f"~{plan['estimated_seconds']:.0f} s); disk needs "
+            f"{plan['disk']['required_bytes']/1024**3:.2f} GB of "
+            f"{plan['disk']['free_bytes']/1024**3:.2f} GB free")
+
+
+def write_plan(plan, path=None):
+    """Write a plan as JSON to path (atomically), or to stdout when path is None / '-'."""
+    text = json.dumps(plan, indent=2) + "\n"
+    if not path or path == "-":
+        print(text, end="")
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
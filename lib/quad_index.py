@@ -0,0 +1,362 @@
+"""
+quad_index.py
+
+Precompiled, memory-mappable sidecar index for the CellGrid layers of
+MapIndices_National_GDB.gdb.
+
+A one-time build step (build_index, which needs osgeo) reads each grid layer
+and stores, per layer:
+  - envelopes (N x 4 float64: xmin, ymin, xmax, ymax)
+  - interned CELL_NAME / STATE_ALPHA strings plus int32 indices into them
+  - a uniform-grid bucket index in CSR form (offsets + item ids)
+
+Queries (QuadIndex.query) only need NumPy and run in microseconds. The
+sidecar records a signature of the GDB and is treated as stale when the GDB
+changes, so callers can fall back to querying the GDB directly.
+"""
+
+import os
+import json
+import math
+
+import numpy as np
+
+from .bbox import BoundingBox
+
+# --- FIXED PATHS ---
+# Get the directory of this file (proj/lib)
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+# Get the project root directory (proj)
+PROJECT_ROOT = os.path.abspath(os.path.join(LIB_DIR, '..'))
+# Define data paths based on the project root
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+
+GDB_FILE = os.path.join(DATA_DIR, "MapIndices_National_GDB.gdb")
+INDEX_DIR = os.path.join(DATA_DIR, "MapIndices_National_GDB.qidx")
+# --- END FIXED PATHS ---
+
+INDEX_VERSION = 1
+
+# Grid layers available in MapIndices_National_GDB.gdb
+INDEX_LAYERS = [
+    "CellGrid_3_75Minute",
+    "CellGrid_7_5Minute",
+    "CellGrid_15Minute",
+    "CellGrid_30X60Minute",
+    "CellGrid_1X1Degree",
+    "CellGrid_1X2Degree",
+]
+
+_ARRAYS = ("envelopes", "name_idx", "state_idx", "names", "states",
+           "grid_offsets", "grid_items")
+
+
+# ---------------------------------------------------------
+# GDB signature (staleness check)
+# ---------------------------------------------------------
+
+def gdb_signature(gdb_path=GDB_FILE):
+    """
+    Return a cheap signature of a FileGDB directory: file count, total size
+    and newest mtime. Returns None if the GDB does not exist.
+    """
+    if not os.path.isdir(gdb_path):
+        return None
+    count = 0
+    total = 0
+    newest = 0
+    for entry in os.scandir(gdb_path):
+        if entry.is_file():
+            st = entry.stat()
+            count += 1
+            total += st.st_size
+            newest = max(newest, st.st_mtime_ns)
+    return {"files": count, "bytes": total, "mtime_ns": newest}
+
+
+def _meta_path(index_dir):
+    return os.path.join(index_dir, "meta.json")
+
+
+def _array_path(index_dir, layer_name, array_name):
+    return os.path.join(index_dir, f"{layer_name}.{array_name}.npy")
+
+
+def _read_meta(index_dir):
+    try:
+        with open(_meta_path(index_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(index_dir=INDEX_DIR, gdb_path=GDB_FILE, layer_name=None):
+    """
+    True if the sidecar is missing, from another index version, built from a
+    different GDB state, or (if given) does not contain layer_name.
+    """
+    meta = _read_meta(index_dir)
+    if not meta or meta.get("version") != INDEX_VERSION:
+        return True
+    if meta.get("gdb_signature") != gdb_signature(gdb_path):
+        return True
+    if layer_name and layer_name not in meta.get("layers", {}):
+        return True
+    return False
+
+
+# ---------------------------------------------------------
+# Build (requires osgeo)
+# ---------------------------------------------------------
+
+def _build_grid(envelopes):
+    """
+    Bucket envelopes into a uniform grid. Returns (grid_meta, offsets, items)
+    where items[offsets[c]:offsets[c + 1]] are the feature ids touching cell c.
+    """
+    n = len(envelopes)
+    if n == 0:
+        grid = {"origin_x": 0.0, "origin_y": 0.0, "cell_size": 1.0, "nx": 1, "ny": 1}
+        return grid, np.zeros(2, dtype=np.int64), np.zeros(0, dtype=np.int32)
+
+    xmin, ymin = envelopes[:, 0].min(), envelopes[:, 1].min()
+    xmax, ymax = envelopes[:, 2].max(), envelopes[:, 3].max()
+
+    # Start at ~2x the typical feature size, then coarsen until the grid
+    # has no more than ~4 cells per feature.
+    typical = float(np.median(np.maximum(envelopes[:, 2] - envelopes[:, 0],
+                                         envelopes[:, 3] - envelopes[:, 1])))
+    cell_size = max(typical * 2, 1e-6)
+    while True:
+        nx = max(1, math.ceil((xmax - xmin) / cell_size))
+        ny = max(1, math.ceil((ymax - ymin) / cell_size))
+        if nx * ny <= 4 * n:
+            break
+        cell_size *= 2
+
+    ix0 = np.clip(((envelopes[:, 0] - xmin) // cell_size).astype(np.int64), 0, nx - 1)
+    ix1 = np.clip(((envelopes[:, 2] - xmin) // cell_size).astype(np.int64), 0, nx - 1)
+    iy0 = np.clip(((envelopes[:, 1] - ymin) // cell_size).astype(np.int64), 0, ny - 1)
+    iy1 = np.clip(((envelopes[:, 3] - ymin) // cell_size).astype(np.int64), 0, ny - 1)
+
+    cell_ids = []
+    feature_ids = []
+    for fid in range(n):
+        for iy in range(iy0[fid], iy1[fid] + 1):
+            for ix in range(ix0[fid], ix1[fid] + 1):
+                cell_ids.append(iy * nx + ix)
+                feature_ids.append(fid)
+
+    cell_ids = np.asarray(cell_ids, dtype=np.int64)
+    feature_ids = np.asarray(feature_ids, dtype=np.int32)
+    order = np.argsort(cell_ids, kind="stable")
+    items = feature_ids[order]
+    counts = np.bincount(cell_ids, minlength=nx * ny)
+    offsets = np.zeros(nx * ny + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    grid = {"origin_x": float(xmin), "origin_y": float(ymin),
+            "cell_size": float(cell_size), "nx": int(nx), "ny": int(ny)}
+    return grid, offsets, items
+
+
+def _intern(values):
+    """Return (unique_strings_array, int32 index array)."""
+    table = {}
+    idx = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        idx[i] = table.setdefault(v, len(table))
+    strings = np.array(list(table) or [""], dtype=str)
+    return strings, idx
+
+
+def build_index(gdb_path=GDB_FILE, index_dir=INDEX_DIR, layers=None):
+    """
+    Compile the GDB grid layers into a memory-mappable sidecar in index_dir.
+
+    Args:
+        gdb_path (str): Path to MapIndices_National_GDB.gdb.
+        index_dir (str): Output directory for the sidecar.
+        layers (list, optional): Layer names to (re)build. Defaults to INDEX_LAYERS.
+            Other layers already indexed from the same GDB state are kept.
+
+    Returns:
+        dict: The metadata written to meta.json.
+    """
+    from osgeo import ogr
+    ogr.UseExceptions()
+
+    layers = layers or INDEX_LAYERS
+    os.makedirs(index_dir, exist_ok=True)
+
+    driver = ogr.GetDriverByName("OpenFileGDB")
+    dataSource = driver.Open(gdb_path, 0)
+    if dataSource is None:
+        raise RuntimeError(f"Could not open {gdb_path}.")
+
+    meta = {
+        "version": INDEX_VERSION,
+        "gdb_path": os.path.abspath(gdb_path),
+        "gdb_signature": gdb_signature(gdb_path),
+        "layers": {},
+    }
+
+    # Building a subset keeps the other layers, if built from this GDB state
+    previous = _read_meta(index_dir)
+    if (previous and previous.get("version") == INDEX_VERSION
+            and previous.get("gdb_path") == meta["gdb_path"]
+            and previous.get("gdb_signature") == meta["gdb_signature"]):
+        meta["layers"].update(
+            (name, info) for name, info in previous.get("layers", {}).items()
+            if name not in layers
+        )
+
+    try:
+        for layer_name in layers:
+            layer = dataSource.GetLayer(layer_name)
+            if layer is None:
+                print(f"[WARN] Layer {layer_name} not found in {gdb_path}; skipping.")
+                continue
+
+            defn = layer.GetLayerDefn()
+            fields = {defn.GetFieldDefn(i).GetName() for i in range(defn.GetFieldCount())}
+            has_name = "CELL_NAME" in fields
+            has_state = "STATE_ALPHA" in fields
+
+            envelopes = []
+            names = []
+            states = []
+            for feature in layer:
+                geom = feature.GetGeometryRef()
+                if geom is None:
+                    continue
+                minx, maxx, miny, maxy = geom.GetEnvelope()
+                envelopes.append((minx, miny, maxx, maxy))
+                names.append((feature.GetField("CELL_NAME") if has_name else None) or "")
+                states.append((feature.GetField("STATE_ALPHA") if has_state else None) or "")
+
+            envelopes = np.asarray(envelopes, dtype=np.float64).reshape(-1, 4)
+            name_table, name_idx = _intern(names)
+            state_table, state_idx = _intern(states)
+            grid, offsets, items = _build_grid(envelopes)
+
+            arrays = {
+                "envelopes": envelopes,
+                "name_idx": name_idx,
+                "state_idx": state_idx,
+                "names": name_table,
+                "states": state_table,
+                "grid_offsets": offsets,
+                "grid_items": items,
+            }
+            for array_name, arr in arrays.items():
+                tmp_path = _array_path(index_dir, layer_name, array_name) + ".tmp.npy"
+                np.save(tmp_path, arr)
+                os.replace(tmp_path, _array_path(index_dir, layer_name, array_name))
+
+            meta["layers"][layer_name] = {"count": int(len(envelopes)), "grid": grid}
+            print(f"[INFO] Indexed {layer_name}: {len(envelopes)} cells, "
+                  f"grid {grid['nx']}x{grid['ny']} @ {grid['cell_size']:.4f} deg")
+    finally:
+        del dataSource
+
+    # meta.json is written last so a partially built sidecar reads as stale
+    tmp_meta = _meta_path(index_dir) + ".tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, _meta_path(index_dir))
+    return meta
+
+
+# ---------------------------------------------------------
+# Query (NumPy only)
+# ---------------------------------------------------------
+
+class QuadIndex:
+    """
+    Memory-mapped view of one indexed grid layer.
+    """
+    def __init__(self, layer_name, grid, arrays):
+        self.layer_name = layer_name
+        self.grid = grid
+        self.envelopes = arrays["envelopes"]
+        self.name_idx = arrays["name_idx"]
+        self.state_idx = arrays["state_idx"]
+        self.names = arrays["names"]
+        self.states = arrays["states"]
+        self.grid_offsets = arrays["grid_offsets"]
+        self.grid_items = arrays["grid_items"]
+
+    @classmethod
+    def load(cls, layer_name="CellGrid_7_5Minute", index_dir=INDEX_DIR,
+             gdb_path=GDB_FILE, check_stale=True):
+        """
+        Memory-map the sidecar for layer_name. Returns None if the sidecar is
+        missing or stale so callers can fall back to the GDB.
+        """
+        if check_stale and is_stale(index_dir, gdb_path, layer_name):
+            return None
+        meta = _read_meta(index_dir)
+        if not meta or layer_name not in meta.get("layers", {}):
+            return None
+        try:
+            arrays = {
+                name: np.load(_array_path(index_dir, layer_name, name), mmap_mode="r")
+                for name in _ARRAYS
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(layer_name, meta["layers"][layer_name]["grid"], arrays)
+
+    def __len__(self):
+        return len(self.envelopes)
+
+    def query_ids(self, bbox: BoundingBox):
+        """Return sorted feature ids whose envelope intersects bbox."""
+        g = self.grid
+        size = g["cell_size"]
+        nx, ny = g["nx"], g["ny"]
+
+        ix0 = int((bbox.xmin - g["origin_x"]) // size)
+        ix1 = int((bbox.xmax - g["origin_x"]) // size)
+        iy0 = int((bbox.ymin - g["origin_y"]) // size)
+        iy1 = int((bbox.ymax - g["origin_y"]) // size)
+        if ix1 < 0 or iy1 < 0 or ix0 >= nx or iy0 >= ny:
+            return np.zeros(0, dtype=np.int32)
+        ix0, ix1 = max(ix0, 0), min(ix1, nx - 1)
+        iy0, iy1 = max(iy0, 0), min(iy1, ny - 1)
+
+        chunks = []
+        offsets = self.grid_offsets
+        for iy in range(iy0, iy1 + 1):
+            row = iy * nx
+            start, end = offsets[row + ix0], offsets[row + ix1 + 1]
+            if end > start:
+                chunks.append(self.grid_items[start:end])
+        if not chunks:
+            return np.zeros(0, dtype=np.int32)
+
+        candidates = np.unique(np.concatenate(chunks))
+        env = self.envelopes[candidates]
+        hit = ((env[:, 0] <= bbox.xmax) & (env[:, 2] >= bbox.xmin) &
+               (env[:, 1] <= bbox.ymax) & (env[:, 3] >= bbox.ymin))
+        return candidates[hit]
+
+    def query(self, bbox):
+        """
+        Return a list of (CELL_NAME, STATE_ALPHA) tuples for cells
+        intersecting bbox, in feature order.
+
+        bbox may also be a PolygonAOI: cells are first selected by its
+        envelope, then refined with a true geometry intersection test.
+        """
+        if isinstance(bbox, BoundingBox):
+            ids = self.query_ids(bbox)
+        else:
+            ids = self.query_ids(bbox.bbox)
+            hit = np.fromiter((bbox.intersects_rect(*self.envelopes[i]) for i in ids),
+                              dtype=bool, count=len(ids))
+            ids = ids[hit]
+        names = self.names[self.name_idx[ids]]
+        states = self.states[self.state_idx[ids]]
+        return [(str(n), str(s)) for n, s in zip(names, states)]
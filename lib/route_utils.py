@@ -0,0 +1,440 @@
+"""
+route_utils.py
+
+Elevation-aware point-to-point routing over a TrailGraph (graph_utils).
+
+RouteEngine densifies every edge's geometry, samples the clipped DEM along
+it in bounded vectorized batches of edges and precomputes per-edge ascent,
+descent and directional walking time (Tobler's hiking function by default). Cost
+profiles turn those attributes into per-arc costs, and routes are found
+with A* using a straight-line lower bound. Arbitrary lon/lat inputs are
+snapped to the nearest graph node through a uniform-grid point index.
+"""
+
+import math
+import heapq
+
+import numpy as np
+
+from .bbox import EARTH_RADIUS_M
+from .graph_utils import haversine_m
+
+# Spacing (metres) at which edge geometry is sampled against the DEM,
+# roughly one 1 arc-second pixel
+DEFAULT_SAMPLE_STEP_M = 30.0
+
+# Densified points per edge_terrain batch, bounding its temporaries
+TERRAIN_CHUNK_POINTS = 1 << 20
+
+
+# ---------------------------------------------------------
+# Cost profiles
+# ---------------------------------------------------------
+
+def tobler_speed_kmh(slope):
+    """Tobler's hiking function: walking speed (km/h) on a slope dh/dx."""
+    return 6.0 * np.exp(-3.5 * np.abs(slope + 0.05))
+
+
+PROFILES = {}
+
+
+def register_profile(name):
+    """
+    Decorator registering a cost profile.
+
+    A profile receives the engine's edge attribute dict (length, ascent,
+    descent, time_fwd, time_bwd, edge_layer, edge_class, layers, classes)
+    and returns (cost_fwd, cost_bwd) arrays: the cost of traversing each
+    edge from edge_u to edge_v and back. Costs must be non-negative.
+    """
+    def decorator(func):
+        PROFILES[name] = func
+        return func
+    return decorator
+
+
+@register_profile("tobler")
+def _tobler_profile(attrs):
+    """Walking time in seconds."""
+    return attrs["time_fwd"], attrs["time_bwd"]
+
+
+@register_profile("distance")
+def _distance_profile(attrs):
+    """Shortest path by length, ignoring terrain."""
+    return attrs["length"], attrs["length"]
+
+
+@register_profile("prefer_trails")
+def _prefer_trails_profile(attrs):
+    """Walking time, with road segments weighted 3x."""
+    penalty = np.ones(len(attrs["length"]), dtype=np.float64)
+    if "Trans_RoadSegment" in attrs["layers"]:
+        penalty[attrs["edge_layer"] == attrs["layers"].index("Trans_RoadSegment")] = 3.0
+    return attrs["time_fwd"] * penalty, attrs["time_bwd"] * penalty
+
+
+# ---------------------------------------------------------
+# Nearest-node index
+# ---------------------------------------------------------
+
+class NodeIndex:
+    """
+    Uniform-grid bucket index over node coordinates, in CSR form like the
+    quad index. Distances are compared on a local equirectangular plane.
+    """
+    def __init__(self, node_xy, nodes_per_cell=4):
+        xy = np.asarray(node_xy, dtype=np.float64)
+        self.xy = xy
+        n = len(xy)
+        self.xmin, self.ymin = (xy.min(axis=0) if n else (0.0, 0.0))
+        xmax, ymax = (xy.max(axis=0) if n else (1.0, 1.0))
+        area = max((xmax - self.xmin) * (ymax - self.ymin), 1e-12)
+        self.cell_size = max(math.sqrt(area * nodes_per_cell / max(n, 1)), 1e-6)
+        self.nx = max(1, int((xmax - self.xmin) // self.cell_size) + 1)
+        self.ny = max(1, int((ymax - self.ymin) // self.cell_size) + 1)
+
+        ix = ((xy[:, 0] - self.xmin) // self.cell_size).astype(np.int64)
+        iy = ((xy[:, 1] - self.ymin) // self.cell_size).astype(np.int64)
+        cell_ids = iy * self.nx + ix
+        self.items = np.argsort(cell_ids, kind="stable").astype(np.int32)
+        self.offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=self.nx * self.ny), out=self.offsets[1:])
+
+    def nearest(self, lon, lat):
+        """Return (node_id, distance_m) of the node closest to lon/lat, or (None, inf)."""
+        if len(self.xy) == 0:
+            return None, math.inf
+        kx = math.cos(math.radians(lat))
+        cx = min(max(int((lon - self.xmin) // self.cell_size), 0), self.nx - 1)
+        cy = min(max(int((lat - self.ymin) // self.cell_size), 0), self.ny - 1)
+
+        best, best_d2 = None, math.inf
+        max_ring = max(self.nx, self.ny)
+        for ring in range(max_ring + 1):
+            # Every unvisited cell is at least (ring - 1) cells away
+            reach = (ring - 1) * self.cell_size * min(kx, 1.0)
+            if best is not None and reach * reach > best_d2:
+                break
+            ids = self._ring(cx, cy, ring)
+            if len(ids) == 0:
+                continue
+            dx = (self.xy[ids, 0] - lon) * kx
+            dy = self.xy[ids, 1] - lat
+            d2 = dx * dx + dy * dy
+            i = int(np.argmin(d2))
+            if d2[i] < best_d2:
+                best, best_d2 = int(ids[i]), float(d2[i])
+
+        node_lon, node_lat = self.xy[best]
+        return best, float(haversine_m(lon, lat, node_lon, node_lat))
+
+    def _ring(self, cx, cy, ring):
+        chunks = []
+        for iy in range(cy - ring, cy + ring + 1):
+            if iy < 0 or iy >= self.ny:
+                continue
+            row = iy * self.nx
+            if abs(iy - cy) == ring:
+                x0, x1 = max(cx - ring, 0), min(cx + ring, self.nx - 1)
+                if x0 <= x1:
+                    chunks.append(self.items[self.offsets[row + x0]:self.offsets[row + x1 + 1]])
+            else:
+                for ix in (cx - ring, cx + ring):
+                    if 0 <= ix < self.nx:
+                        chunks.append(self.items[self.offsets[row + ix]:self.offsets[row + ix + 1]])
+        return np.concatenate(chunks) if chunks else ()
+
+
+# ---------------------------------------------------------
+# Edge terrain attributes
+# ---------------------------------------------------------
+
+def _densify(geom_xy, geom_offsets, step_m):
+    """
+    Insert vertices so no piece of any edge is longer than step_m.
+    Returns (dense_xy, dense_offsets) with the same edge layout.
+    """
+    n_pts = len(geom_xy)
+    if n_pts < 2:
+        return geom_xy, geom_offsets
+    seg = haversine_m(geom_xy[:-1, 0], geom_xy[:-1, 1], geom_xy[1:, 0], geom_xy[1:, 1])
+
+    # Pieces per vertex: ceil(seg / step) for a segment start, 1 for an edge's last vertex
+    pieces = np.ones(n_pts, dtype=np.int64)
+    pieces[:-1] = np.maximum(1, np.ceil(seg / step_m)).astype(np.int64)
+    pieces[geom_offsets[1:] - 1] = 1
+
+    cum = np.concatenate([[0], np.cumsum(pieces)])
+    dense_offsets = cum[geom_offsets]
+    src = np.repeat(np.arange(n_pts), pieces)
+    frac = (np.arange(cum[-1]) - cum[src]) / pieces[src]
+    nxt = np.minimum(src + 1, n_pts - 1)
+    dense_xy = geom_xy[src] + frac[:, None] * (geom_xy[nxt] - geom_xy[src])
+    return dense_xy, dense_offsets
+
+
+def _edge_sums(values, offsets):
+    """Sum per-piece values (piece i joins point i and i + 1) over each edge."""
+    cum = np.concatenate([[0.0], np.cumsum(values)])
+    return cum[offsets[1:] - 1] - cum[offsets[:-1]]
+
+
+def _edge_chunks(geom_offsets, edge_length, step_m, chunk_points):
+    """
+    Split the edges into [start, end) ranges of at most about chunk_points
+    densified points each (a range always holds at least one edge). An
+    edge densifies to at most its vertex count plus length / step_m points.
+    """
+    n_edges = len(geom_offsets) - 1
+    estimate = np.diff(geom_offsets) + np.ceil(np.asarray(edge_length) / step_m)
+    cum = np.cumsum(estimate)
+    chunks = []
+    start = 0
+    while start < n_edges:
+        done = cum[start - 1] if start else 0.0
+        end = int(np.searchsorted(cum, done + chunk_points, side="right"))
+        end = min(max(end, start + 1), n_edges)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _chunk_terrain(geom_xy, geom_offsets, dem_path, step_m, speed):
+    """ascent, descent, time_fwd, time_bwd for one range of edges (see edge_terrain)."""
+    dense_xy, offsets = _densify(geom_xy, geom_offsets, step_m)
+
+    if dem_path:
+        from .dem_utils import sample_dem
+        z = sample_dem(dem_path, dense_xy[:, 0], dense_xy[:, 1]).astype(np.float64)
+    else:
+        z = np.zeros(len(dense_xy))
+
+    if len(dense_xy) > 1:
+        run = haversine_m(dense_xy[:-1, 0], dense_xy[:-1, 1], dense_xy[1:, 0], dense_xy[1:, 1])
+        rise = np.nan_to_num(z[1:] - z[:-1], nan=0.0)
+        across = offsets[1:-1] - 1  # pieces spanning two edges
+        run[across] = 0.0
+        rise[across] = 0.0
+    else:
+        run = rise = np.zeros(0)
+
+    slope = np.divide(rise, run, out=np.zeros_like(rise), where=run > 0)
+    time_fwd = run / (speed(slope) / 3.6)
+    time_bwd = run / (speed(-slope) / 3.6)
+
+    return (_edge_sums(np.maximum(rise, 0.0), offsets),
+            _edge_sums(np.maximum(-rise, 0.0), offsets),
+            _edge_sums(time_fwd, offsets),
+            _edge_sums(time_bwd, offsets))
+
+
+def edge_terrain(graph, dem_path=None, step_m=DEFAULT_SAMPLE_STEP_M, speed=tobler_speed_kmh,
+                 chunk_points=TERRAIN_CHUNK_POINTS):
+    """
+    Per-edge terrain attributes for a TrailGraph.
+
+    Edges are processed in ranges of about chunk_points densified points:
+    each range's geometry is densified to step_m, sampled from the DEM in
+    one vectorized call, and per-piece rise / run are reduced to per-edge
+    sums, so memory stays bounded however large the graph is. Pieces with
+    no elevation (nodata, outside the DEM, or no dem_path) count as flat.
+
+    Returns:
+        dict: length (m), ascent / descent (m, from edge_u to edge_v) and
+            time_fwd / time_bwd (s) arrays, one value per edge.
+    """
+    geom_xy = graph.geom_xy
+    geom_offsets = np.asarray(graph.geom_offsets)
+    length = np.asarray(graph.edge_length, dtype=np.float64)
+    keys = ("ascent", "descent", "time_fwd", "time_bwd")
+    attrs = {key: np.zeros(len(length)) for key in keys}
+
+    for start, end in _edge_chunks(geom_offsets, length, step_m, chunk_points):
+        g0, g1 = geom_offsets[start], geom_offsets[end]
+        sums = _chunk_terrain(np.asarray(geom_xy[g0:g1]), geom_offsets[start:end + 1] - g0,
+                              dem_path, step_m, speed)
+        for key, values in zip(keys, sums):
+            attrs[key][start:end] = values
+
+    return {"length": length, **attrs}
+
+
+# ---------------------------------------------------------
+# Routing
+# ---------------------------------------------------------
+
+class RouteEngine:
+    """
+    A* router over a TrailGraph with DEM-derived edge costs.
+    """
+    def __init__(self, graph, dem_path=None, step_m=DEFAULT_SAMPLE_STEP_M):
+        """
+        Args:
+            graph (TrailGraph): Graph from graph_utils.build_graph / TrailGraph.load.
+            dem_path (str, optional): Clipped DEM (e.g. from fetch_and_clip_dem).
+                Without it all edges are treated as flat.
+            step_m (float, optional): DEM sampling interval along edges.
+        """
+        self.graph = graph
+        self.attrs = edge_terrain(graph, dem_path, step_m)
+        self.attrs.update({
+            "edge_layer": np.asarray(graph.edge_layer),
+            "edge_class": np.asarray(graph.edge_class),
+            "layers": graph.layers,
+            "classes": graph.classes,
+        })
+        self.node_index = NodeIndex(graph.node_xy)
+
+        # Plain lists: scalar indexing in the search loop is much faster
+        # than on NumPy arrays
+        self._indptr = np.asarray(graph.indptr).tolist()
+        self._adj_node = np.asarray(graph.adj_node).tolist()
+        lon = np.radians(np.asarray(graph.node_xy[:, 0]))
+        lat = np.radians(np.asarray(graph.node_xy[:, 1]))
+        self._unit_xyz = (
+            (np.cos(lat) * np.cos(lon)).tolist(),
+            (np.cos(lat) * np.sin(lon)).tolist(),
+            np.sin(lat).tolist(),
+        )
+        self._arc_forward = None
+        self._profiles = {}
+
+    def _arc_costs(self, profile):
+        """Per-arc cost list and the heuristic's cost-per-metre lower bound."""
+        if profile in self._profiles:
+            return self._profiles[profile]
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown cost profile: {profile}")
+
+        g = self.graph
+        adj_edge = np.asarray(g.adj_edge)
+        if self._arc_forward is None:
+            src = np.repeat(np.arange(g.num_nodes), np.diff(np.asarray(g.indptr)))
+            self._arc_forward = np.asarray(g.edge_u)[adj_edge] == src
+
+        cost_fwd, cost_bwd = PROFILES[profile](self.attrs)
+        arc_cost = np.where(self._arc_forward,
+                            np.asarray(cost_fwd, dtype=np.float64)[adj_edge],
+                            np.asarray(cost_bwd, dtype=np.float64)[adj_edge])
+        if (arc_cost < 0).any():
+            raise ValueError(f"Cost profile {profile} produced negative costs.")
+
+        # Straight-line distance never exceeds an edge's length, so the
+        # cheapest cost per metre over all arcs gives an admissible heuristic
+        length = self.attrs["length"][adj_edge]
+        positive = length > 0
+        rate = float((arc_cost[positive] / length[positive]).min()) if positive.any() else 0.0
+
+        self._profiles[profile] = (arc_cost.tolist(), rate)
+        return self._profiles[profile]
+
+    def nearest_node(self, lon, lat):
+        """Snap lon/lat to the nearest graph node. Returns (node_id, distance_m)."""
+        return self.node_index.nearest(lon, lat)
+
+    def shortest_path(self, source, target, profile="tobler"):
+        """
+        A* between two node ids.
+
+        Returns:
+            tuple: (cost, node list, arc index list), or (inf, [], []) if unreachable.
+        """
+        arc_cost, rate = self._arc_costs(profile)
+        indptr, adj_node = self._indptr, self._adj_node
+
+        # Heuristic: chord length between unit-sphere vectors (never longer
+        # than the great-circle distance) times the cheapest cost per metre
+        xs, ys, zs = self._unit_xyz
+        tx, ty, tz = xs[target], ys[target], zs[target]
+        scale = EARTH_RADIUS_M * rate
+        sqrt = math.sqrt
+
+        g_score = {source: 0.0}
+        came_from = {source: (None, None)}
+        closed = set()
+        # Ties on f are broken towards the larger g (the deeper node), which
+        # avoids expanding whole plateaus of equal-cost paths
+        h0 = scale * sqrt((xs[source] - tx) ** 2 + (ys[source] - ty) ** 2 + (zs[source] - tz) ** 2)
+        heap = [(h0, -0.0, source)]
+        push, pop = heapq.heappush, heapq.heappop
+
+        while heap:
+            _, neg_g, node = pop(heap)
+            if node == target:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            g_node = -neg_g
+            for arc in range(indptr[node], indptr[node + 1]):
+                nbr = adj_node[arc]
+                if nbr in closed:
+                    continue
+                g_new = g_node + arc_cost[arc]
+                if g_new < g_score.get(nbr, math.inf):
+                    g_score[nbr] = g_new
+                    came_from[nbr] = (node, arc)
+                    h = scale * sqrt((xs[nbr] - tx) ** 2 + (ys[nbr] - ty) ** 2 + (zs[nbr] - tz) ** 2)
+                    push(heap, (g_new + h, -g_new, nbr))
+        else:
+            return math.inf, [], []
+
+        nodes, arcs = [target], []
+        node = target
+        while came_from[node][0] is not None:
+            node, arc = came_from[node]
+            nodes.append(node)
+            arcs.append(arc)
+        return g_score[target], nodes[::-1], arcs[::-1]
+
+    def route(self, start, end, profile="tobler"):
+        """
+        Route between two (lon, lat) points, snapping each to the nearest node.
+
+        Returns:
+            dict: success, message, cost, length_m, ascent_m, descent_m, time_s,
+                snap distances, node / edge ids and the route coordinates.
+        """
+        source, snap_start = self.nearest_node(*start)
+        target, snap_end = self.nearest_node(*end)
+        if source is None or target is None:
+            return {"success": False, "message": "Graph has no nodes."}
+
+        cost, nodes, arcs = self.shortest_path(source, target, profile)
+        if not nodes:
+            return {"success": False,
+                    "message": f"No route between nodes {source} and {target}."}
+
+        g = self.graph
+        edges = [int(g.adj_edge[a]) for a in arcs]
+        forward = [bool(self._arc_forward[a]) for a in arcs]
+        a = self.attrs
+
+        coords = [tuple(g.node_xy[source])]
+        length = ascent = descent = time_s = 0.0
+        for e, fwd in zip(edges, forward):
+            geom = g.edge_geometry(e)
+            geom = geom if fwd else geom[::-1]
+            coords.extend(map(tuple, geom[1:]))
+            length += a["length"][e]
+            ascent += a["ascent"][e] if fwd else a["descent"][e]
+            descent += a["descent"][e] if fwd else a["ascent"][e]
+            time_s += a["time_fwd"][e] if fwd else a["time_bwd"][e]
+
+        return {
+            "success": True,
+            "message": f"Route found over {len(edges)} edges.",
+            "profile": profile,
+            "cost": float(cost),
+            "length_m": float(length),
+            "ascent_m": float(ascent),
+            "descent_m": float(descent),
+            "time_s": float(time_s),
+            "snap_start_m": snap_start,
+            "snap_end_m": snap_end,
+            "nodes": nodes,
+            "edges": edges,
+            "coordinates": [(float(x), float(y)) for x, y in coords],
+        }
@@ -0,0 +1,422 @@
+"""
+service_utils.py
+
+Long-running preprocessing service. Instead of paying interpreter start-up,
+the osgeo import and the GDB open on every fetch_dem.py / fetch_gpkg.py
+call, one process keeps warm:
+
+  - a QuadResolver (the memory-mapped quad index, or one open GDB handle)
+  - the shared HTTP downloader and its keep-alive connection pool
+  - the cache manifests of the DEM tile and GPKG caches
+
+and accepts AOI jobs over a small JSON HTTP API on a TCP port or a Unix
+socket. Jobs run on a bounded worker pool. A job identical to one already
+queued or running is coalesced onto it, and overlapping jobs never fetch
+the same DEM tile or quad twice (see download_utils.SingleFlight).
+
+API:
+    POST /jobs           {"kind": "dem" | "gpkg", "bbox": [xmin, ymin, xmax, ymax]
+                          | "aoi": <GeoJSON polygon> | "route": <GeoJSON line>,
+                          "buffer_km": 2, ...options}
+                         (dem options include "product", "resolution_m" and
+                          "resampling"; see dem_utils.fetch_and_clip_dem)
+                         -> 202 {"job": {...}, "coalesced": bool}
+    GET  /jobs           -> {"jobs": [...]}
+    GET  /jobs/<id>      -> {...} (status: queued, running, done, failed)
+    GET  /health         -> worker / queue / warm state summary
+    GET  /metrics        -> Prometheus text (metrics_utils)
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import metrics_utils
+from .bbox import BoundingBox
+from .aoi_utils import PolygonAOI, corridor_from_line, aoi_bbox
+from .cache_utils import get_cache
+from .download_utils import get_downloader
+from .dem_utils import (
+    fetch_and_clip_dem, set_gdal_cache, set_remote_cache, DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR
+)
+from .gpkg_utils import (
+    USGSTopoDownloader, QuadResolver, merge_gpkgs, merged_path, GDB_FILE, EXTRACTED_DIR
+)
+from .quad_index import INDEX_DIR
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+
+# Jobs allowed to wait for a worker before submissions are refused (503)
+DEFAULT_MAX_QUEUE = 32
+
+# Finished jobs stay available for polling this long (seconds)
+DEFAULT_JOB_TTL = 3600
+
+JOB_KINDS = ("dem", "gpkg")
+
+# Per-kind request options and their defaults
+_OPTIONS = {
+    "dem": {"cog": False, "engine": "auto", "remote": False, "refresh": False,
+            "product": None, "resolution_m": None, "resampling": "bilinear"},
+    "gpkg": {"merge": False, "merge_layers": None, "refresh": False},
+}
+
+
+# ---------------------------------------------------------
+# Requests
+# ---------------------------------------------------------
+
+def parse_job_request(body):
+    """
+    Validate a POST /jobs body.
+
+    Returns:
+        tuple: (kind, aoi, options, key) where aoi is a BoundingBox or
+            PolygonAOI and key identifies identical requests.
+
+    Raises:
+        ValueError: On a malformed request.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object.")
+    kind = body.get("kind")
+    if kind not in JOB_KINDS:
+        raise ValueError(f"'kind' must be one of {list(JOB_KINDS)}.")
+
+    areas = [k for k in ("bbox", "aoi", "route") if body.get(k) is not None]
+    if len(areas) != 1:
+        raise ValueError("Give exactly one of 'bbox', 'aoi' or 'route'.")
+    if areas[0] == "bbox":
+        coords = body["bbox"]
+        if not isinstance(coords, list) or len(coords) != 4:
+            raise ValueError("'bbox' must be [xmin, ymin, xmax, ymax].")
+        aoi = BoundingBox(*map(float, coords))
+        area_key = ["bbox", list(aoi)]
+    elif areas[0] == "aoi":
+        geometry = body["aoi"].get("geometry", body["aoi"])
+        if geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError("'aoi' must be a GeoJSON Polygon / MultiPolygon.")
+        aoi = PolygonAOI.from_geojson(geometry)
+        area_key = ["aoi", aoi.key]
+    else:
+        geometry = body["route"].get("geometry", body["route"])
+        if geometry.get("type") == "LineString":
+            parts = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiLineString":
+            parts = geometry["coordinates"]
+        else:
+            raise ValueError("'route' must be a GeoJSON LineString / MultiLineString.")
+        buffer_km = float(body.get("buffer_km", 2.0))
+        aoi = corridor_from_line([[tuple(c[:2]) for c in part] for part in parts], buffer_km)
+        area_key = ["route", aoi.key]
+
+    options = {name: body.get(name, default) for name, default in _OPTIONS[kind].items()}
+    key = hashlib.sha1(
+        json.dumps([kind, area_key, options], sort_keys=True).encode()
+    ).hexdigest()
+    return kind, aoi, options, key
+
+
+# ---------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------
+
+class Job:
+    def __init__(self, kind, aoi, options, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.aoi = aoi
+        self.options = options
+        self.key = key
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.coalesced = 0
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "bbox": list(aoi_bbox(self.aoi)),
+            "options": self.options,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "elapsed_s": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+            "coalesced": self.coalesced,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PreprocessService:
+    """
+    Warm state plus a bounded job pool. Use submit() / get() / jobs()
+    directly, or expose it over HTTP with serve().
+    """
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                 download_jobs=4, gdb_path=GDB_FILE, use_index=True, index_dir=INDEX_DIR,
+                 cache_dir=DEFAULT_CACHE_DIR, out_dir=DEFAULT_OUT_DIR,
+                 cache_budget_bytes=None, job_ttl=DEFAULT_JOB_TTL, cache_mb=512,
+                 remote_cache_mb=256):
+        """
+        Args:
+            workers (int, optional): Jobs run concurrently. Defaults to 2.
+            max_queue (int, optional): Jobs allowed to wait for a worker.
+            download_jobs (int, optional): Concurrent downloads within a job.
+            gdb_path (str, optional): National map index GDB.
+            use_index (bool, optional): Prefer the quad index sidecar.
+            index_dir (str, optional): Location of the quad index sidecar.
+            cache_dir (str, optional): DEM tile cache directory.
+            out_dir (str, optional): Directory for clipped DEMs.
+            cache_budget_bytes (int, optional): Disk budget for each cache (and for the clips in out_dir).
+            job_ttl (int, optional): Seconds finished jobs are kept for polling.
+            cache_mb (int, optional): GDAL block cache in MB, shared by all jobs;
+                each warp gets half of it as working memory. Defaults to 512.
+            remote_cache_mb (int, optional): /vsicurl/ block cache in MB for
+                remote jobs, shared by all jobs; also the per-tile read cache.
+                Defaults to 256.
+        """
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.download_jobs = download_jobs
+        self.gdb_path = gdb_path
+        self.cache_dir = cache_dir
+        self.out_dir = out_dir
+        self.job_ttl = job_ttl
+        self.cache_budget_bytes = cache_budget_bytes
+        self.cache_mb = cache_mb
+        self.remote_cache_mb = remote_cache_mb
+
+        # Warm state, shared by every job
+        start = time.perf_counter()
+        self.resolver = QuadResolver(gdb_path, use_index=use_index, index_dir=index_dir)
+        self.downloader = get_downloader()
+        set_gdal_cache(cache_mb)
+        set_remote_cache(remote_cache_mb)
+        self.dem_cache = get_cache(cache_dir, budget_bytes=cache_budget_bytes)
+        self.gpkg_cache = get_cache(EXTRACTED_DIR, budget_bytes=cache_budget_bytes)
+        print(f"[INFO] Service warm in {time.perf_counter() - start:.2f} s "
+              f"(quads from {self.resolver.source}, {self.workers} workers)")
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}  # key -> job, for queued / running jobs
+
+    def submit(self, kind, aoi, options, key):
+        """
+        Queue a job, or return the queued / running job with the same key.
+
+        Returns:
+            tuple: (Job, coalesced)
+
+        Raises:
+            QueueFull: When workers + max_queue jobs are already active.
+        """
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                job.coalesced += 1
+                metrics_utils.count("job_coalesced")
+                return job, True
+            if len(self._active) >= self.workers + self.max_queue:
+                raise QueueFull(f"{len(self._active)} jobs already queued or running.")
+            job = Job(kind, aoi, options, key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._pool.submit(self._run, job)
+        print(f"[INFO] Job {job.id} queued: {kind} {aoi}")
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def health(self):
+        with self._lock:
+            states = [j.status for j in self._jobs.values()]
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "done": states.count("done"),
+            "failed": states.count("failed"),
+            "quad_source": self.resolver.source,
+        }
+
+    def _prune(self):
+        """Forget finished jobs older than job_ttl (caller holds the lock)."""
+        cutoff = time.time() - self.job_ttl
+        for job_id in [i for i, j in self._jobs.items() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            with metrics_utils.timer(f"job_{job.kind}"):
+                job.result = getattr(self, f"_run_{job.kind}")(job.aoi, job.options)
+            job.status = "done"
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+        print(f"[DONE] Job {job.id} {job.status} in {job.finished - job.started:.2f} s")
+
+    def _run_dem(self, aoi, options):
+        dem_path = fetch_and_clip_dem(
+            aoi, cache_dir=self.cache_dir, out_dir=self.out_dir,
+            jobs=self.download_jobs, downloader=self.downloader,
+            refresh=options["refresh"], engine=options["engine"], cache_mb=self.cache_mb,
+            cog=options["cog"], remote=options["remote"], remote_cache_mb=self.remote_cache_mb,
+            product=options["product"],
+            resolution_m=options["resolution_m"], resampling=options["resampling"],
+            clip_budget_bytes=self.cache_budget_bytes
+        )
+        if not dem_path:
+            raise RuntimeError("No DEM produced (no tiles, or tiles failed to download).")
+        return {"dem_path": dem_path}
+
+    def _run_gpkg(self, aoi, options):
+        quads = self.resolver.resolve(aoi)
+        topo = USGSTopoDownloader(
+            bbox=aoi, gdb_path=self.gdb_path, download_workers=self.download_jobs,
+            downloader=self.downloader, refresh=options["refresh"]
+        )
+        # Hold this job's quads until they are merged (see CacheManager.hold)
+        with topo.cache.hold(os.path.basename(topo._quad_paths(*q)[1]) for q in quads):
+            summary = topo.download_quads(quads)
+            if summary["status"] != "SUCCESS":
+                raise RuntimeError(summary.get("message") or summary["status"])
+            if options["merge"] and summary["gpkg_paths"]:
+                summary["merge"] = merge_gpkgs(
+                    summary["gpkg_paths"], merged_path(aoi), aoi=aoi,
+                    layers=options["merge_layers"]
+                )
+        return summary
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+        self.resolver.close()
+
+
+# ---------------------------------------------------------
+# HTTP front end
+# ---------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "BackcountryPreprocess/1"
+    service = None  # set on the per-server subclass
+
+    def _send(self, code, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else (json.dumps(payload) + "\n").encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            self._send(200, self.service.health())
+        elif path == "/metrics":
+            self._send(200, metrics_utils.prometheus_text().encode(),
+                       "text/plain; version=0.0.4")
+        elif path == "/jobs":
+            self._send(200, {"jobs": [j.to_dict() for j in self.service.jobs()]})
+        elif path.startswith("/jobs/"):
+            job = self.service.get(path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "Unknown job."})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {"error": f"No route for GET {path}"})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path != "/jobs":
+            self._send(404, {"error": f"No route for POST {path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"null")
+            kind, aoi, options, key = parse_job_request(body)
+        except (ValueError, TypeError, AttributeError, KeyError, RuntimeError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+            return
+        try:
+            job, coalesced = self.service.submit(kind, aoi, options, key)
+        except QueueFull as e:
+            self._send(503, {"error": str(e)})
+            return
+        self._send(200 if coalesced else 202, {"job": job.to_dict(), "coalesced": coalesced})
+
+    def address_string(self):
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {self.address_string()} {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """
+    Build the HTTP server for a PreprocessService on host:port, or on a
+    Unix socket when socket_path is given (a stale socket file is replaced).
+    """
+    handler = type("Handler", (_Handler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return _UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """Serve the API until interrupted, then drain running jobs."""
+    server = make_server(service, host, port, socket_path)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    print(f"[INFO] Listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Shutting down; waiting for running jobs.")
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        service.shutdown()
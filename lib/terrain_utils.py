@@ -0,0 +1,229 @@
+"""
+terrain_utils.py
+
+Slope, aspect and hillshade from a clipped DEM, computed in one pass.
+
+The DEM is split into block windows; each window is read with a one-pixel
+halo, run through NumPy kernels (Horn's method) in a worker process, and
+the core of the result is written to tiled GeoTIFFs by the parent. Only a
+bounded number of windows is in flight at once, so memory use does not
+depend on the AOI size. Pixel spacing is converted from degrees to metres
+per row, since the DEM stays in EPSG:4326.
+"""
+
+import os
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from .dem_utils import read_elevation, GTIFF_CREATION_OPTIONS
+from .bbox import EARTH_RADIUS_M
+
+PRODUCTS = ("slope", "aspect", "hillshade")
+
+# Output nodata values (matching gdaldem)
+SLOPE_NODATA = -9999.0
+ASPECT_NODATA = -9999.0
+HILLSHADE_NODATA = 0
+
+# Window edge in pixels; a multiple of the 512 px output tiles
+DEFAULT_BLOCK_SIZE = 1024
+
+# The Byte hillshade takes the integer predictor instead of the float one
+BYTE_CREATION_OPTIONS = [o for o in GTIFF_CREATION_OPTIONS
+                         if not o.startswith("PREDICTOR=")] + ["PREDICTOR=2"]
+
+
+# ---------------------------------------------------------
+# Kernels (NumPy only)
+# ---------------------------------------------------------
+
+def pixel_size_m(geotransform, row0, nrows):
+    """
+    Ground pixel size in metres for rows row0..row0+nrows of a lon/lat
+    raster. Returns (dx, dy): dx is a per-row column vector (east-west
+    spacing shrinks with cos(latitude)), dy a scalar.
+    """
+    deg = math.pi / 180.0 * EARTH_RADIUS_M
+    lat = geotransform[3] + (np.arange(row0, row0 + nrows) + 0.5) * geotransform[5]
+    dx = np.abs(geotransform[1]) * deg * np.cos(np.radians(lat))
+    dy = abs(geotransform[5]) * deg
+    return dx[:, None], dy
+
+
+def terrain_kernels(z, dx, dy, products=PRODUCTS, azimuth=315.0, altitude=45.0, z_factor=1.0):
+    """
+    Compute terrain derivatives for the interior of a haloed window.
+
+    Args:
+        z (ndarray): (H + 2) x (W + 2) elevations, NaN for nodata, row 0 to the north.
+        dx (ndarray): H x 1 east-west pixel size in metres per output row.
+        dy (float): North-south pixel size in metres.
+        products (tuple, optional): Any of "slope", "aspect", "hillshade".
+        azimuth, altitude (float, optional): Light direction for the hillshade, in degrees.
+        z_factor (float, optional): Vertical exaggeration.
+
+    Returns:
+        dict: product -> H x W array. Slope and aspect are float32 degrees
+            (aspect clockwise from north, facing downslope); hillshade is uint8.
+    """
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, f = z[1:-1, :-2], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+
+    # Horn's 3x3 gradient; rows run north to south, so dz_north flips sign
+    dz_east = ((c + 2 * f + i) - (a + 2 * d + g)) / (8.0 * dx) * z_factor
+    dz_north = ((a + 2 * b + c) - (g + 2 * h + i)) / (8.0 * dy) * z_factor
+    valid = np.isfinite(dz_east) & np.isfinite(dz_north) & np.isfinite(z[1:-1, 1:-1])
+
+    slope = np.arctan(np.hypot(dz_east, dz_north))
+    aspect = np.mod(np.degrees(np.arctan2(-dz_east, -dz_north)), 360.0)
+    flat = (dz_east == 0) & (dz_north == 0)
+
+    out = {}
+    if "slope" in products:
+        out["slope"] = np.where(valid, np.degrees(slope), SLOPE_NODATA).astype(np.float32)
+    if "aspect" in products:
+        out["aspect"] = np.where(valid & ~flat, aspect, ASPECT_NODATA).astype(np.float32)
+    if "hillshade" in products:
+        alt, az = math.radians(altitude), math.radians(azimuth)
+        shade = (math.sin(alt) * np.cos(slope) +
+                 math.cos(alt) * np.sin(slope) * np.cos(az - np.radians(aspect)))
+        shade = np.clip(np.rint(254 * np.clip(shade, 0.0, 1.0)) + 1, 1, 255)
+        out["hillshade"] = np.where(valid, shade, HILLSHADE_NODATA).astype(np.uint8)
+    return out
+
+
+# ---------------------------------------------------------
+# Windowed, multi-process driver
+# ---------------------------------------------------------
+
+_worker_ds = None
+
+
+def _init_worker(dem_path):
+    """Each worker opens its own handle on the DEM."""
+    global _worker_ds
+    from osgeo import gdal
+    gdal.UseExceptions()
+    _worker_ds = gdal.Open(dem_path)
+
+
+def _read_haloed(ds, x0, y0, w, h):
+    """Read a window plus a one-pixel halo, replicating edges at the raster border."""
+    cols, rows = ds.RasterXSize, ds.RasterYSize
+    rx0, ry0 = max(x0 - 1, 0), max(y0 - 1, 0)
+    rx1, ry1 = min(x0 + w + 1, cols), min(y0 + h + 1, rows)
+    z = read_elevation(ds, rx0, ry0, rx1 - rx0, ry1 - ry0)
+    pad = ((ry0 - (y0 - 1), (y0 + h + 1) - ry1), (rx0 - (x0 - 1), (x0 + w + 1) - rx1))
+    return np.pad(z, pad, mode="edge") if any(p for pair in pad for p in pair) else z
+
+
+def _derive_window(window, products, options):
+    x0, y0, w, h = window
+    ds = _worker_ds
+    z = _read_haloed(ds, x0, y0, w, h)
+    dx, dy = pixel_size_m(ds.GetGeoTransform(), y0, h)
+    return window, terrain_kernels(z, dx, dy, products, **options)
+
+
+def _windows(cols, rows, block_size):
+    for y in range(0, rows, block_size):
+        for x in range(0, cols, block_size):
+            yield x, y, min(block_size, cols - x), min(block_size, rows - y)
+
+
+def terrain_paths(dem_path, out_dir=None, products=PRODUCTS):
+    """Output path per product: '<out_dir>/<dem name>_<product>.tif'."""
+    out_dir = out_dir or os.path.dirname(os.path.abspath(dem_path))
+    stem = os.path.splitext(os.path.basename(dem_path))[0]
+    return {p: os.path.join(out_dir, f"{stem}_{p}.tif") for p in products}
+
+
+def derive_terrain(dem_path, out_dir=None, products=PRODUCTS, processes=None,
+                   block_size=DEFAULT_BLOCK_SIZE, azimuth=315.0, altitude=45.0, z_factor=1.0):
+    """
+    Write slope / aspect / hillshade rasters for a lon/lat DEM.
+
+    Args:
+        dem_path (str): Clipped DEM (e.g. from fetch_and_clip_dem).
+        out_dir (str, optional): Output directory. Defaults to the DEM's directory.
+        products (tuple, optional): Subset of PRODUCTS to compute.
+        processes (int, optional): Worker processes. Defaults to os.cpu_count().
+        block_size (int, optional): Window edge in pixels. Defaults to 1024.
+        azimuth, altitude (float, optional): Hillshade light direction in degrees.
+        z_factor (float, optional): Vertical exaggeration.
+
+    Returns:
+        dict: product -> output GeoTIFF path.
+    """
+    from osgeo import gdal
+    gdal.UseExceptions()
+
+    unknown = set(products) - set(PRODUCTS)
+    if unknown:
+        raise ValueError(f"Unknown terrain products: {sorted(unknown)}")
+    paths = terrain_paths(dem_path, out_dir, products)
+    os.makedirs(os.path.dirname(next(iter(paths.values()))), exist_ok=True)
+    processes = max(1, processes or os.cpu_count() or 1)
+    options = {"azimuth": azimuth, "altitude": altitude, "z_factor": z_factor}
+
+    src = gdal.Open(dem_path)
+    cols, rows = src.RasterXSize, src.RasterYSize
+    driver = gdal.GetDriverByName("GTiff")
+    tmp_paths = {p: path + ".tmp.tif" for p, path in paths.items()}
+    outputs = {}
+    for product, tmp_path in tmp_paths.items():
+        is_shade = product == "hillshade"
+        ds = driver.Create(tmp_path, cols, rows, 1,
+                           gdal.GDT_Byte if is_shade else gdal.GDT_Float32,
+                           options=BYTE_CREATION_OPTIONS if is_shade else GTIFF_CREATION_OPTIONS)
+        ds.SetGeoTransform(src.GetGeoTransform())
+        ds.SetProjection(src.GetProjection())
+        ds.GetRasterBand(1).SetNoDataValue(HILLSHADE_NODATA if is_shade else SLOPE_NODATA)
+        outputs[product] = ds
+    ds = src = None
+
+    start = time.perf_counter()
+    windows = _windows(cols, rows, block_size)
+    total = math.ceil(cols / block_size) * math.ceil(rows / block_size)
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(dem_path,)) as pool:
+            # Keep at most two windows per worker in flight to bound memory
+            pending = set()
+            for window in windows:
+                pending.add(pool.submit(_derive_window, window, tuple(products), options))
+                if len(pending) >= 2 * processes:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    done += _write_results(finished, outputs)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                done += _write_results(finished, outputs)
+
+        for product in outputs:
+            outputs[product].FlushCache()
+        outputs.clear()  # drops the last references, closing the datasets
+        for product, tmp_path in tmp_paths.items():
+            os.replace(tmp_path, paths[product])
+    finally:
+        outputs.clear()
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"[DONE] Wrote {', '.join(products)} for {dem_path} "
+          f"({done}/{total} windows, {processes} processes, {elapsed:.2f} s)")
+    return paths
+
+
+def _write_results(futures, outputs):
+    for future in futures:
+        (x0, y0, _, _), arrays = future.result()
+        for product, arr in arrays.items():
+            outputs[product].GetRasterBand(1).WriteArray(arr, x0, y0)
+    return len(futures)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to compile the MapIndices_National_GDB.gdb grid layers into a
+memory-mappable quad index sidecar.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.quad_index import build_index, is_stale, GDB_FILE, INDEX_DIR, INDEX_LAYERS
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the quad index sidecar from the national Map Index GDB."
+    )
+
+    parser.add_argument(
+        '--gdb',
+        default=GDB_FILE,
+        help=f"Path to the MapIndices_National_GDB.gdb file. Default: {GDB_FILE}"
+    )
+
+    parser.add_argument(
+        '--index-dir',
+        default=INDEX_DIR,
+        help=f"Directory to write the sidecar to. Default: {INDEX_DIR}"
+    )
+
+    parser.add_argument(
+        '--layers',
+        nargs='+',
+        default=INDEX_LAYERS,
+        help=f"Grid layers to index. Default: {' '.join(INDEX_LAYERS)}"
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="Rebuild even if the existing sidecar is up to date."
+    )
+
+    args = parser.parse_args()
+
+    print("--- 🗂️  Building Quad Index ---")
+    print(f"Using GDB: {args.gdb}")
+    print(f"Index Dir: {args.index_dir}")
+
+    if not args.force and not any(is_stale(args.index_dir, args.gdb, layer) for layer in args.layers):
+        print("\n--- ✅  Quad index is already up to date ---")
+        return
+
+    try:
+        meta = build_index(gdb_path=args.gdb, index_dir=args.index_dir, layers=args.layers)
+        print("\n--- ✅  Quad Index Built ---")
+        for layer_name, info in meta["layers"].items():
+            print(f"{layer_name}: {info['count']} cells")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to build the trail / road network graph from the extracted
+Topo GPKG files.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.graph_utils import (
+    build_graph, DEFAULT_LAYERS, EXTRACTED_DIR, GRAPH_DIR, SNAP_TOLERANCE_DEG
+)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a routable trail graph from the extracted Topo GPKGs."
+    )
+
+    parser.add_argument(
+        '--gpkg-dir',
+        default=EXTRACTED_DIR,
+        help=f"Directory of extracted GPKG files. Default: {EXTRACTED_DIR}"
+    )
+
+    parser.add_argument(
+        '--graph-dir',
+        default=GRAPH_DIR,
+        help=f"Directory to write the graph arrays to. Default: {GRAPH_DIR}"
+    )
+
+    parser.add_argument(
+        '--layers',
+        nargs='+',
+        default=list(DEFAULT_LAYERS),
+        help=f"Segment layers to include. Default: {' '.join(DEFAULT_LAYERS)}"
+    )
+
+    parser.add_argument(
+        '--snap-tolerance',
+        type=float,
+        default=SNAP_TOLERANCE_DEG,
+        help=f"Distance in degrees within which endpoints are merged. Default: {SNAP_TOLERANCE_DEG}"
+    )
+
+    args = parser.parse_args()
+
+    print("--- 🥾  Building Trail Graph ---")
+    print(f"GPKG Dir: {args.gpkg_dir}")
+    print(f"Graph Dir: {args.graph_dir}")
+
+    try:
+        layers = {name: DEFAULT_LAYERS.get(name) for name in args.layers}
+        graph = build_graph(args.gpkg_dir, layers=layers, snap_tolerance=args.snap_tolerance)
+        graph.save(args.graph_dir)
+        print("\n--- ✅  Trail Graph Built ---")
+        print(f"Nodes: {graph.num_nodes}, Edges: {graph.num_edges}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
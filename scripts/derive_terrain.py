@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to compute slope, aspect and hillshade rasters from a clipped DEM.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.terrain_utils import derive_terrain, PRODUCTS, DEFAULT_BLOCK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute terrain derivatives (slope, aspect, hillshade) from a DEM."
+    )
+
+    parser.add_argument(
+        'dem',
+        help="Input DEM GeoTIFF (EPSG:4326), e.g. the output of fetch_dem.py."
+    )
+
+    parser.add_argument(
+        '--out-dir',
+        default=None,
+        help="Directory for the output rasters. Default: next to the DEM"
+    )
+
+    parser.add_argument(
+        '--products',
+        nargs='+',
+        choices=PRODUCTS,
+        default=list(PRODUCTS),
+        help=f"Products to compute. Default: {' '.join(PRODUCTS)}"
+    )
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="Number of worker processes. Default: CPU count"
+    )
+
+    parser.add_argument(
+        '--block-size',
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help=f"Processing window size in pixels. Default: {DEFAULT_BLOCK_SIZE}"
+    )
+
+    parser.add_argument(
+        '--azimuth',
+        type=float,
+        default=315.0,
+        help="Hillshade light azimuth in degrees. Default: 315"
+    )
+
+    parser.add_argument(
+        '--altitude',
+        type=float,
+        default=45.0,
+        help="Hillshade light altitude in degrees. Default: 45"
+    )
+
+    parser.add_argument(
+        '--z-factor',
+        type=float,
+        default=1.0,
+        help="Vertical exaggeration. Default: 1"
+    )
+
+    args = parser.parse_args()
+
+    print("--- ⛰️  Deriving Terrain Products ---")
+    print(f"DEM: {args.dem}")
+    print(f"Products: {', '.join(args.products)}")
+
+    try:
+        paths = derive_terrain(
+            args.dem,
+            out_dir=args.out_dir,
+            products=tuple(args.products),
+            processes=args.processes,
+            block_size=args.block_size,
+            azimuth=args.azimuth,
+            altitude=args.altitude,
+            z_factor=args.z_factor
+        )
+        print("\n--- ✅  Terrain Products Complete ---")
+        for product, path in paths.items():
+            print(f"{product}: {path}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
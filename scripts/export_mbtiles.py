@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to export a clipped DEM as an offline hillshade MBTiles pyramid.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.bbox import BoundingBox
+from lib.mbtiles_utils import export_mbtiles
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render a DEM into a web-mercator MBTiles tile pyramid (hillshade / colour ramp)."
+    )
+
+    parser.add_argument(
+        'dem',
+        help="Input DEM GeoTIFF, e.g. the output of fetch_dem.py."
+    )
+
+    parser.add_argument(
+        'out',
+        help="Output .mbtiles file."
+    )
+
+    parser.add_argument(
+        '--bbox',
+        nargs=4,
+        type=float,
+        default=None,
+        metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+        help="Area to tile in WGS84 (Lon/Lat). Default: the DEM extent"
+    )
+
+    parser.add_argument(
+        '--minzoom',
+        type=int,
+        default=8,
+        help="Lowest zoom level. Default: 8"
+    )
+
+    parser.add_argument(
+        '--maxzoom',
+        type=int,
+        default=14,
+        help="Highest zoom level. Default: 14"
+    )
+
+    parser.add_argument(
+        '--color-ramp',
+        action='store_true',
+        help="Blend the hillshade with a hypsometric colour ramp."
+    )
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="Number of render processes. Default: CPU count"
+    )
+
+    args = parser.parse_args()
+
+    bbox = BoundingBox(*args.bbox) if args.bbox else None
+
+    print("--- 🗺️  Exporting MBTiles ---")
+    print(f"DEM: {args.dem}")
+    print(f"Zooms: {args.minzoom}-{args.maxzoom}")
+
+    try:
+        result = export_mbtiles(
+            args.dem,
+            args.out,
+            bbox=bbox,
+            minzoom=args.minzoom,
+            maxzoom=args.maxzoom,
+            color_ramp=args.color_ramp,
+            processes=args.processes
+        )
+        print("\n--- ✅  MBTiles Export Complete ---")
+        print(f"{result['tiles']} tiles ({result['unique_images']} unique) saved to: {result['path']}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to fetch DEMs and Topo GPKG files for many AOIs in one run.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.batch_utils import read_aois, run_batch
+from lib.dem_utils import (
+    DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR, PRODUCTS, DEFAULT_RESAMPLING, RESAMPLING_METHODS
+)
+from lib import metrics_utils
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch and clip DEMs and Topo GPKGs for every AOI in a GeoJSON or CSV file."
+    )
+
+    parser.add_argument(
+        'aoi_file',
+        help="GeoJSON FeatureCollection or CSV (id,xmin,ymin,xmax,ymax) of AOIs."
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory to cache downloaded DEM tiles. Default: {DEFAULT_CACHE_DIR}"
+    )
+
+    parser.add_argument(
+        '--out-dir',
+        default=DEFAULT_OUT_DIR,
+        help=f"Directory to save the clipped DEMs. Default: {DEFAULT_OUT_DIR}"
+    )
+
+    parser.add_argument(
+        '--gdb',
+        default=None,
+        help="Path to the MapIndices_National_GDB.gdb file."
+    )
+
+    parser.add_argument(
+        '--manifest',
+        default=None,
+        help="Where to write the per-AOI result manifest. Default: <out-dir>/batch_manifest.json"
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=8,
+        help="Number of concurrent downloads. Default: 8"
+    )
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="Number of clip worker processes. Default: CPU count"
+    )
+
+    parser.add_argument(
+        '--no-dem',
+        action='store_true',
+        help="Skip DEM download and clipping."
+    )
+
+    parser.add_argument(
+        '--no-gpkg',
+        action='store_true',
+        help="Skip Topo GPKG download."
+    )
+
+    parser.add_argument(
+        '--gdal-cache-mb',
+        type=int,
+        default=512,
+        help="GDAL block cache size in MB; warps get half of it as working memory. Default: 512"
+    )
+
+    parser.add_argument(
+        '--cog',
+        action='store_true',
+        help="Write Cloud-Optimized GeoTIFFs."
+    )
+
+    parser.add_argument(
+        '--product',
+        choices=['auto', *PRODUCTS],
+        default=None,
+        help="DEM product: 1, 13, 1m or auto (coarsest meeting --resolution). Default: auto with --resolution, else 1"
+    )
+
+    parser.add_argument(
+        '--resolution',
+        type=float,
+        metavar='METRES',
+        default=None,
+        help="Output ground resolution in metres; DEMs are resampled to it. Default: native"
+    )
+
+    parser.add_argument(
+        '--resampling',
+        choices=RESAMPLING_METHODS,
+        default=DEFAULT_RESAMPLING,
+        help=f"Resampling method for --resolution / reprojected 1 m tiles. Default: {DEFAULT_RESAMPLING}"
+    )
+
+    parser.add_argument(
+        '--exact',
+        action='store_true',
+        help="Use polygon outlines (not envelopes) for tile/quad selection and as the DEM cutline."
+    )
+
+    parser.add_argument(
+        '--buffer-km',
+        type=float,
+        default=None,
+        help="Buffer line features into route corridors of this half-width (km)."
+    )
+
+    parser.add_argument(
+        '--metrics-json',
+        metavar='FILE',
+        default=None,
+        help="Write per-stage timings, throughput and cache counters to this JSON file."
+    )
+
+    parser.add_argument(
+        '--metrics-prom',
+        metavar='FILE',
+        default=None,
+        help="Write the metrics as a Prometheus textfile (e.g. for the node_exporter textfile collector)."
+    )
+
+    args = parser.parse_args()
+
+    if args.product == 'auto' and not args.resolution:
+        parser.error("--product auto needs --resolution")
+
+    aois = read_aois(args.aoi_file, exact=args.exact, buffer_km=args.buffer_km)
+
+    if args.metrics_json or args.metrics_prom:
+        metrics_utils.enable()
+
+    print("--- 📦  Starting Batch Run ---")
+    print(f"AOI File: {args.aoi_file} ({len(aois)} AOIs)")
+    print(f"Cache Dir: {args.cache_dir}")
+    print(f"Output Dir: {args.out_dir}")
+
+    try:
+        manifest = run_batch(
+            aois,
+            cache_dir=args.cache_dir,
+            out_dir=args.out_dir,
+            jobs=args.jobs,
+            processes=args.processes,
+            dem=not args.no_dem,
+            gpkg=not args.no_gpkg,
+            gdb_path=args.gdb,
+            manifest_path=args.manifest,
+            cache_mb=args.gdal_cache_mb,
+            cog=args.cog,
+            product=args.product,
+            resolution_m=args.resolution,
+            resampling=args.resampling
+        )
+
+        failed = [r["id"] for r in manifest["aois"] if r["status"] != "SUCCESS"]
+        if failed:
+            print(f"\n--- ⚠️  Batch Finished With Problems: {failed} ---")
+        else:
+            print("\n--- ✅  Batch Complete ---")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+    finally:
+        if metrics_utils.is_enabled():
+            metrics_utils.write_reports(args.metrics_json, args.metrics_prom)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
 """
-CLI Script to download and clip USGS 1-arc-second DEM tiles for a given bounding box.
+CLI Script to download and clip USGS DEM tiles (1 arc-second, 1/3 arc-second
+or 1 m) for a given bounding box.
 """
 
 import os
 import sys
 import argparse
+import contextlib
 
 # --- Path Setup ---
 # This block allows the script to be run from anywhere and still find
@@ -18,23 +20,71 @@ sys.path.insert(0, PROJECT_ROOT)
 
 # Now we can import from 'lib'
 from lib.bbox import BoundingBox
+from lib.aoi_utils import load_aoi
 # We need the updated dem_utils, which I'll provide below
-from lib.dem_utils import fetch_and_clip_dem, DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR
+from lib.dem_utils import (
+    fetch_and_clip_dem, plan_tiles, set_gdal_cache, set_remote_cache, DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR,
+    PRODUCTS, DEFAULT_RESAMPLING, RESAMPLING_METHODS
+)
+from lib.plan_utils import summarize, write_plan, EXIT_INSUFFICIENT_DISK
+from lib.cache_utils import gb_to_bytes
+from lib.terrain_utils import derive_terrain
+from lib import metrics_utils
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Fetch and clip USGS 1-arc-second DEM tiles for a Bounding Box."
+        description="Fetch and clip USGS DEM tiles for a Bounding Box."
     )
     
-    parser.add_argument(
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument(
         '--bbox',
-        required=True,
         nargs=4,
         type=float,
         metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
         help="Target bounding box in WGS84 (Lon/Lat). Example: -103.0 42.8 -102.5 43.2"
     )
+    area.add_argument(
+        '--aoi',
+        metavar='FILE',
+        help="GeoJSON polygon AOI; only intersecting tiles/quads are used."
+    )
+    area.add_argument(
+        '--route',
+        metavar='FILE',
+        help="GPX or GeoJSON route; the AOI is a corridor of --buffer-km around it."
+    )
+
+    parser.add_argument(
+        '--buffer-km',
+        type=float,
+        default=2.0,
+        help="Corridor half-width in km for --route. Default: 2"
+    )
     
+    parser.add_argument(
+        '--product',
+        choices=['auto', *PRODUCTS],
+        default=None,
+        help="DEM product: 1 (arc-second, ~30 m), 13 (1/3 arc-second, ~10 m), 1m (where covered) "
+             "or auto (coarsest meeting --resolution). Default: auto with --resolution, else 1"
+    )
+
+    parser.add_argument(
+        '--resolution',
+        type=float,
+        metavar='METRES',
+        default=None,
+        help="Output ground resolution in metres; the DEM is resampled to it. Default: native"
+    )
+
+    parser.add_argument(
+        '--resampling',
+        choices=RESAMPLING_METHODS,
+        default=DEFAULT_RESAMPLING,
+        help=f"Resampling method for --resolution / reprojected 1 m tiles. Default: {DEFAULT_RESAMPLING}"
+    )
+
     parser.add_argument(
         '--cache-dir',
         default=DEFAULT_CACHE_DIR,
@@ -47,26 +97,196 @@ def main():
         help=f"Directory to save the final clipped DEM. Default: {DEFAULT_OUT_DIR}"
     )
 
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=4,
+        help="Number of tiles to download concurrently. Default: 4"
+    )
+
+    parser.add_argument(
+        '--cache-budget-gb',
+        type=float,
+        default=None,
+        help="Disk budget for the cache in GB; least recently used entries are evicted. Default: unbounded"
+    )
+
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help="Revalidate cached files upstream (ETag / Last-Modified) and re-download only changed ones."
+    )
+
+    parser.add_argument(
+        '--engine',
+        choices=['auto', 'gdal', 'subprocess'],
+        default='auto',
+        help="Mosaic/clip engine: in-process GDAL bindings or gdalbuildvrt/gdalwarp. Default: auto"
+    )
+
+    parser.add_argument(
+        '--threads',
+        default="ALL_CPUS",
+        help="Warp worker threads (a number or ALL_CPUS). Default: ALL_CPUS"
+    )
+
+    parser.add_argument(
+        '--gdal-cache-mb',
+        type=int,
+        default=512,
+        help="GDAL block cache size in MB; warps get half of it as working memory. Default: 512"
+    )
+
+    parser.add_argument(
+        '--cog',
+        action='store_true',
+        help="Write a Cloud-Optimized GeoTIFF with internal overviews."
+    )
+
+    parser.add_argument(
+        '--terrain',
+        action='store_true',
+        help="Also write slope, aspect and hillshade rasters next to the clipped DEM."
+    )
+
+    parser.add_argument(
+        '--remote',
+        action='store_true',
+        help="Read only the needed tile blocks over HTTP (/vsicurl/) instead of downloading whole tiles."
+    )
+
+    parser.add_argument(
+        '--remote-cache-mb',
+        type=int,
+        default=256,
+        help="Cache size in MB for --remote reads, per tile and for the process-wide /vsicurl/ block cache. Default: 256"
+    )
+
+    parser.add_argument(
+        '--no-clip-reuse',
+        action='store_true',
+        help="Always warp from the tiles instead of cutting from / extending earlier clips in --out-dir."
+    )
+
+    parser.add_argument(
+        '--clip-budget-gb',
+        type=float,
+        default=None,
+        help="Disk budget for clips in --out-dir in GB; least recently used clips are evicted. Default: unbounded"
+    )
+
+    parser.add_argument(
+        '--plan',
+        nargs='?',
+        const='-',
+        metavar='FILE',
+        default=None,
+        help="Dry run: write a JSON plan (cache hits / misses, bytes to transfer, estimated time, "
+             f"disk check) to FILE or stdout and exit. Exit status {EXIT_INSUFFICIENT_DISK} if it "
+             "would not fit on disk."
+    )
+
+    parser.add_argument(
+        '--preflight',
+        action='store_true',
+        help="Plan first and refuse to start if free disk space is insufficient."
+    )
+
+    parser.add_argument(
+        '--metrics-json',
+        metavar='FILE',
+        default=None,
+        help="Write per-stage timings, throughput and cache counters to this JSON file."
+    )
+
+    parser.add_argument(
+        '--metrics-prom',
+        metavar='FILE',
+        default=None,
+        help="Write the metrics as a Prometheus textfile (e.g. for the node_exporter textfile collector)."
+    )
+
     args = parser.parse_args()
 
-    # Create the BoundingBox object from the CLI args
-    bbox = BoundingBox(*args.bbox)
+    if args.product == 'auto' and not args.resolution:
+        parser.error("--product auto needs --resolution")
+
+    # Create the BoundingBox (or polygon / corridor AOI) from the CLI args
+    if args.bbox:
+        bbox = BoundingBox(*args.bbox)
+    elif args.aoi:
+        bbox = load_aoi(args.aoi)
+    else:
+        bbox = load_aoi(args.route, buffer_km=args.buffer_km)
+
+    if args.plan is not None:
+        try:
+            # Progress goes to stderr so stdout carries only the plan JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                plan = plan_tiles(bbox, cache_dir=args.cache_dir, jobs=args.jobs,
+                                  product=args.product, resolution_m=args.resolution,
+                                  remote=args.remote, out_dir=args.out_dir,
+                                  resampling=args.resampling,
+                                  reuse_clips=not (args.no_clip_reuse or args.refresh))
+                print(f"[PLAN] {summarize(plan)}")
+            write_plan(plan, args.plan)
+        except Exception as e:
+            print(f"\n--- ❌  An Error Occurred ---", file=sys.stderr)
+            print(f"{e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0 if plan["ok"] else EXIT_INSUFFICIENT_DISK)
+
+    if args.metrics_json or args.metrics_prom:
+        metrics_utils.enable()
 
     print("--- 🏔️  Starting USGS DEM Download & Clip ---")
     print(f"Target BBox: {bbox}")
     print(f"Cache Dir: {args.cache_dir}")
     print(f"Output Dir: {args.out_dir}")
+    print(f"Download Jobs: {args.jobs}")
 
     try:
+        set_gdal_cache(args.gdal_cache_mb)
+        if args.remote:
+            set_remote_cache(args.remote_cache_mb)
+
+        if args.preflight:
+            plan = plan_tiles(bbox, cache_dir=args.cache_dir, jobs=args.jobs,
+                              product=args.product, resolution_m=args.resolution,
+                              remote=args.remote, out_dir=args.out_dir,
+                              resampling=args.resampling,
+                              reuse_clips=not (args.no_clip_reuse or args.refresh))
+            print(f"[PLAN] {summarize(plan)}")
+            if not plan["ok"]:
+                print("\n--- ❌  Not Enough Free Disk Space ---")
+                sys.exit(EXIT_INSUFFICIENT_DISK)
+
         final_dem_path = fetch_and_clip_dem(
             bbox=bbox,
             cache_dir=args.cache_dir,
-            out_dir=args.out_dir
+            out_dir=args.out_dir,
+            jobs=args.jobs,
+            cache_budget_bytes=gb_to_bytes(args.cache_budget_gb),
+            refresh=args.refresh,
+            engine=args.engine,
+            num_threads=args.threads,
+            cache_mb=args.gdal_cache_mb,
+            cog=args.cog,
+            remote=args.remote,
+            remote_cache_mb=args.remote_cache_mb,
+            product=args.product,
+            resolution_m=args.resolution,
+            resampling=args.resampling,
+            reuse_clips=not args.no_clip_reuse,
+            clip_budget_bytes=gb_to_bytes(args.clip_budget_gb)
         )
         
         if final_dem_path:
             print(f"\n--- ✅  DEM Process Complete ---")
             print(f"Final clipped DEM saved to: {final_dem_path}")
+            if args.terrain:
+                for product, path in derive_terrain(final_dem_path).items():
+                    print(f"Terrain {product} saved to: {path}")
         else:
             print("\n--- ⚠️  DEM Process Finished (No output) ---")
 
@@ -74,6 +294,9 @@ def main():
         print(f"\n--- ❌  An Error Occurred ---")
         print(f"{e}")
         sys.exit(1)
+    finally:
+        if metrics_utils.is_enabled():
+            metrics_utils.write_reports(args.metrics_json, args.metrics_prom)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,6 +7,7 @@ CLI Script to download USGS Topo GPKG files for a given bounding box.
 import os
 import sys
 import argparse
+import contextlib
 
 # --- Path Setup ---
 # This block allows the script to be run from anywhere and still find
@@ -21,21 +22,42 @@ sys.path.insert(0, PROJECT_ROOT)
 
 # Now we can import from 'lib'
 from lib.bbox import BoundingBox
-from lib.gpkg_utils import USGSTopoDownloader
+from lib.aoi_utils import load_aoi
+from lib.gpkg_utils import USGSTopoDownloader, merge_gpkgs, merged_path
+from lib.cache_utils import gb_to_bytes
+from lib.plan_utils import summarize, write_plan, EXIT_INSUFFICIENT_DISK
+from lib import metrics_utils
 
 def main():
     parser = argparse.ArgumentParser(
         description="Fetch USGS Topo GPKG files intersecting a Bounding Box."
     )
     
-    parser.add_argument(
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument(
         '--bbox',
-        required=True,
         nargs=4,
         type=float,
         metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
         help="Target bounding box in WGS84 (Lon/Lat). Example: -103.0 42.8 -102.5 43.2"
     )
+    area.add_argument(
+        '--aoi',
+        metavar='FILE',
+        help="GeoJSON polygon AOI; only intersecting tiles/quads are used."
+    )
+    area.add_argument(
+        '--route',
+        metavar='FILE',
+        help="GPX or GeoJSON route; the AOI is a corridor of --buffer-km around it."
+    )
+
+    parser.add_argument(
+        '--buffer-km',
+        type=float,
+        default=2.0,
+        help="Corridor half-width in km for --route. Default: 2"
+    )
     
     parser.add_argument(
         '--gdb',
@@ -49,31 +71,174 @@ def main():
         help="Download format (e.g., 'GPKG', 'ShapeFile')."
     )
 
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=8,
+        help="Number of quads to download concurrently. Default: 8"
+    )
+
+    parser.add_argument(
+        '--extract-jobs',
+        type=int,
+        default=2,
+        help="Number of zips to extract concurrently. Default: 2"
+    )
+
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help="Query the GDB directly instead of the precompiled quad index sidecar."
+    )
+
+    parser.add_argument(
+        '--no-stream',
+        action='store_true',
+        help="Save each zip to disk before extracting instead of streaming the GPKG out of it."
+    )
+
+    parser.add_argument(
+        '--keep-zip',
+        action='store_true',
+        help="Keep the downloaded zip files in data/raw/gpkg."
+    )
+
+    parser.add_argument(
+        '--cache-budget-gb',
+        type=float,
+        default=None,
+        help="Disk budget for the cache in GB; least recently used entries are evicted. Default: unbounded"
+    )
+
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help="Revalidate cached files upstream (ETag / Last-Modified) and re-download only changed ones."
+    )
+
+    parser.add_argument(
+        '--merge',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='OUT_GPKG',
+        help="Merge the quads into one AOI-clipped GPKG (default path under data/processed/gpkg)."
+    )
+
+    parser.add_argument(
+        '--merge-layers',
+        nargs='+',
+        default=None,
+        help="Layers to include in the merged GPKG. Default: all layers"
+    )
+
+    parser.add_argument(
+        '--plan',
+        nargs='?',
+        const='-',
+        metavar='FILE',
+        default=None,
+        help="Dry run: write a JSON plan (cache hits / misses, bytes to transfer, estimated time, "
+             f"disk check) to FILE or stdout and exit. Exit status {EXIT_INSUFFICIENT_DISK} if it "
+             "would not fit on disk."
+    )
+
+    parser.add_argument(
+        '--preflight',
+        action='store_true',
+        help="Plan first and refuse to start if free disk space is insufficient."
+    )
+
+    parser.add_argument(
+        '--metrics-json',
+        metavar='FILE',
+        default=None,
+        help="Write per-stage timings, throughput and cache counters to this JSON file."
+    )
+
+    parser.add_argument(
+        '--metrics-prom',
+        metavar='FILE',
+        default=None,
+        help="Write the metrics as a Prometheus textfile (e.g. for the node_exporter textfile collector)."
+    )
+
     args = parser.parse_args()
 
-    # Create the BoundingBox object from the CLI args
-    bbox = BoundingBox(*args.bbox)
+    # Create the BoundingBox (or polygon / corridor AOI) from the CLI args
+    if args.bbox:
+        bbox = BoundingBox(*args.bbox)
+    elif args.aoi:
+        bbox = load_aoi(args.aoi)
+    else:
+        bbox = load_aoi(args.route, buffer_km=args.buffer_km)
+
+    topo_options = dict(
+        bbox=bbox,
+        download_format=args.format,
+        gdb_path=args.gdb,
+        download_workers=args.jobs,
+        extract_workers=args.extract_jobs,
+        use_index=not args.no_index,
+        stream_extract=not args.no_stream,
+        keep_zip=args.keep_zip,
+        cache_budget_bytes=gb_to_bytes(args.cache_budget_gb),
+        refresh=args.refresh
+    )
+
+    if args.plan is not None:
+        try:
+            # Progress goes to stderr so stdout carries only the plan JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                plan = USGSTopoDownloader(**topo_options).plan()
+                print(f"[PLAN] {summarize(plan)}")
+            write_plan(plan, args.plan)
+        except Exception as e:
+            print(f"\n--- ❌  An Error Occurred ---", file=sys.stderr)
+            print(f"{e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0 if plan["ok"] else EXIT_INSUFFICIENT_DISK)
+
+    if args.metrics_json or args.metrics_prom:
+        metrics_utils.enable()
 
     print("--- 🗺️  Starting USGS Topo GPKG Download ---")
     print(f"Target BBox: {bbox}")
     print(f"Using GDB: {args.gdb}")
 
     try:
-        downloader = USGSTopoDownloader(
-            bbox=bbox,
-            download_format=args.format,
-            gdb_path=args.gdb
-        )
+        downloader = USGSTopoDownloader(**topo_options)
+
+        if args.preflight:
+            plan = downloader.plan()
+            print(f"[PLAN] {summarize(plan)}")
+            if not plan["ok"]:
+                print("\n--- ❌  Not Enough Free Disk Space ---")
+                sys.exit(EXIT_INSUFFICIENT_DISK)
         
         results = downloader.download_by_bbox()
         
         print("\n--- ✅  GPKG Download Complete ---")
         print(f"Final Results: {results}")
 
+        if args.merge is not None and results.get("gpkg_paths"):
+            merge = merge_gpkgs(
+                results["gpkg_paths"],
+                args.merge or merged_path(bbox),
+                aoi=bbox,
+                layers=args.merge_layers,
+                readers=args.extract_jobs * 2
+            )
+            print("\n--- ✅  GPKG Merge Complete ---")
+            print(f"Merged GPKG saved to: {merge['path']}")
+
     except Exception as e:
         print(f"\n--- ❌  An Error Occurred ---")
         print(f"{e}")
         sys.exit(1)
+    finally:
+        if metrics_utils.is_enabled():
+            metrics_utils.write_reports(args.metrics_json, args.metrics_prom)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to generate contour lines from a clipped DEM into a GeoPackage.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.contour_utils import generate_contours, DEFAULT_TILE_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate contour lines from a DEM into a GeoPackage."
+    )
+
+    parser.add_argument(
+        'dem',
+        help="Input DEM GeoTIFF, e.g. the output of fetch_dem.py."
+    )
+
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=20.0,
+        help="Contour interval in --units. Default: 20"
+    )
+
+    parser.add_argument(
+        '--index-interval',
+        type=float,
+        default=100.0,
+        help="Index (bold) contour interval in --units; 0 disables. Default: 100"
+    )
+
+    parser.add_argument(
+        '--units',
+        choices=['m', 'ft'],
+        default='m',
+        help="Units of the contour levels. Default: m"
+    )
+
+    parser.add_argument(
+        '--simplify-m',
+        type=float,
+        default=None,
+        help="Simplify lines with this tolerance in metres. Default: no simplification"
+    )
+
+    parser.add_argument(
+        '--out',
+        default=None,
+        help="Output .gpkg path. Default: next to the DEM"
+    )
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help="Number of worker processes. Default: CPU count"
+    )
+
+    parser.add_argument(
+        '--tile-size',
+        type=int,
+        default=DEFAULT_TILE_SIZE,
+        help=f"Tile size in pixels. Default: {DEFAULT_TILE_SIZE}"
+    )
+
+    args = parser.parse_args()
+
+    print("--- 〰️  Generating Contours ---")
+    print(f"DEM: {args.dem}")
+    print(f"Interval: {args.interval:g} {args.units} (index every {args.index_interval:g})")
+
+    try:
+        out_path = generate_contours(
+            args.dem,
+            interval=args.interval,
+            index_interval=args.index_interval,
+            out_path=args.out,
+            units=args.units,
+            simplify_m=args.simplify_m,
+            processes=args.processes,
+            tile_size=args.tile_size
+        )
+        print("\n--- ✅  Contours Complete ---")
+        print(f"Contours saved to: {out_path}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
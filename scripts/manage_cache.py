@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to inspect and maintain the DEM tile and GPKG quad caches.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.cache_utils import CacheManager, gb_to_bytes
+from lib.dem_utils import DEFAULT_CACHE_DIR
+from lib.gpkg_utils import EXTRACTED_DIR
+
+CACHES = {"dem": DEFAULT_CACHE_DIR, "gpkg": EXTRACTED_DIR}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List, pin, unpin or evict entries in the DEM / GPKG caches."
+    )
+
+    parser.add_argument(
+        'cache',
+        choices=sorted(CACHES),
+        help="Which cache to operate on."
+    )
+
+    parser.add_argument(
+        'action',
+        choices=['list', 'pin', 'unpin', 'evict'],
+        help="list entries, pin/unpin named entries, or evict down to --budget-gb."
+    )
+
+    parser.add_argument(
+        'names',
+        nargs='*',
+        help="Cache entry file names for pin/unpin (e.g. n42w072.tif)."
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        default=None,
+        help="Override the cache directory."
+    )
+
+    parser.add_argument(
+        '--budget-gb',
+        type=float,
+        default=None,
+        help="Disk budget in GB for 'evict'."
+    )
+
+    args = parser.parse_args()
+
+    cache = CacheManager(args.cache_dir or CACHES[args.cache])
+
+    if args.action == 'list':
+        for entry in cache.entries():
+            pin = "P" if entry["pinned"] else " "
+            print(f"{pin} {entry['size']/1024**2:10.2f} MB  {entry['name']}  {entry['url'] or ''}")
+        print(f"Total: {cache.total_size()/1024**3:.2f} GB in {cache.cache_dir}")
+
+    elif args.action in ('pin', 'unpin'):
+        if not args.names:
+            parser.error(f"'{args.action}' needs at least one entry name")
+        for name in args.names:
+            if cache.lookup(name) is None:
+                print(f"[WARN] {name} is not in the cache.")
+                continue
+            cache.pin(name, pinned=(args.action == 'pin'))
+            print(f"[INFO] {args.action}ned {name}")
+
+    elif args.action == 'evict':
+        if args.budget_gb is None:
+            parser.error("'evict' needs --budget-gb")
+        evicted = cache.evict(budget_bytes=gb_to_bytes(args.budget_gb))
+        print(f"[INFO] Evicted {len(evicted)} entries.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to route between two points over the trail graph, costing edges
+with the clipped DEM.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.graph_utils import TrailGraph, GRAPH_DIR
+from lib.route_utils import RouteEngine, PROFILES
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find an elevation-aware route between two points on the trail graph."
+    )
+
+    parser.add_argument(
+        '--from',
+        dest='start',
+        required=True,
+        nargs=2,
+        type=float,
+        metavar=('LON', 'LAT'),
+        help="Start point in WGS84 (Lon/Lat)."
+    )
+
+    parser.add_argument(
+        '--to',
+        dest='end',
+        required=True,
+        nargs=2,
+        type=float,
+        metavar=('LON', 'LAT'),
+        help="End point in WGS84 (Lon/Lat)."
+    )
+
+    parser.add_argument(
+        '--graph-dir',
+        default=GRAPH_DIR,
+        help=f"Directory of the built trail graph. Default: {GRAPH_DIR}"
+    )
+
+    parser.add_argument(
+        '--dem',
+        default=None,
+        help="Clipped DEM used for ascent / descent and walking time. Default: treat terrain as flat"
+    )
+
+    parser.add_argument(
+        '--profile',
+        choices=sorted(PROFILES),
+        default='tobler',
+        help="Cost profile. Default: tobler"
+    )
+
+    parser.add_argument(
+        '--out',
+        default=None,
+        help="Write the route as a GeoJSON LineString to this file."
+    )
+
+    args = parser.parse_args()
+
+    print("--- 🧭  Planning Route ---")
+    print(f"Graph Dir: {args.graph_dir}")
+    print(f"From: {args.start}  To: {args.end}")
+
+    try:
+        graph = TrailGraph.load(args.graph_dir)
+        if graph is None:
+            raise RuntimeError(f"No trail graph in {args.graph_dir}; run build_trail_graph.py first.")
+
+        engine = RouteEngine(graph, dem_path=args.dem)
+        result = engine.route(tuple(args.start), tuple(args.end), profile=args.profile)
+        if not result["success"]:
+            print(f"\n--- ⚠️  No Route Found ---")
+            print(result["message"])
+            sys.exit(1)
+
+        if args.out:
+            feature = {
+                "type": "Feature",
+                "properties": {k: result[k] for k in
+                               ("profile", "length_m", "ascent_m", "descent_m", "time_s")},
+                "geometry": {"type": "LineString", "coordinates": result["coordinates"]},
+            }
+            with open(args.out, "w") as f:
+                json.dump(feature, f)
+
+        print("\n--- ✅  Route Found ---")
+        print(f"Distance: {result['length_m'] / 1000:.2f} km")
+        print(f"Ascent / Descent: {result['ascent_m']:.0f} m / {result['descent_m']:.0f} m")
+        print(f"Estimated Time: {result['time_s'] / 3600:.2f} h")
+        if args.out:
+            print(f"Route saved to: {args.out}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to run the offline benchmark suite against a local stand-in for
+the USGS download server and write the timings to JSON.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib.bench_utils import (
+    run_benchmarks, write_results, compare, AOI_SIZES, DEFAULT_DEM_PX, DEFAULT_QUAD_FEATURES
+)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark download / extract / clip / quad lookup against a local USGS stand-in."
+    )
+
+    parser.add_argument(
+        '--out',
+        default=os.path.join(PROJECT_ROOT, 'data', 'bench', 'results.json'),
+        help="Results JSON path. Default: data/bench/results.json"
+    )
+
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        choices=list(AOI_SIZES),
+        default=['small', 'medium', 'large'],
+        help="AOI sizes to run, small to large. Default: small medium large"
+    )
+
+    parser.add_argument(
+        '--groups',
+        nargs='+',
+        choices=['dem', 'gpkg'],
+        default=['dem', 'gpkg'],
+        help="Case groups to run. Default: dem gpkg"
+    )
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help="Timed runs per case (the median is reported). Default: 3"
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=8,
+        help="Concurrent downloads. Default: 8"
+    )
+
+    parser.add_argument(
+        '--work-dir',
+        default=os.path.join(PROJECT_ROOT, 'data', 'bench'),
+        help="Scratch directory; generated server files are kept here and reused. Default: data/bench"
+    )
+
+    parser.add_argument(
+        '--gdb',
+        default=None,
+        help="National map index GDB for the quad lookup / download_by_bbox cases. Default: synthetic quads"
+    )
+
+    parser.add_argument(
+        '--engine',
+        choices=['auto', 'gdal', 'subprocess'],
+        default='auto',
+        help="merge_and_clip engine. Default: auto"
+    )
+
+    parser.add_argument(
+        '--latency-ms',
+        type=float,
+        default=0.0,
+        help="Server delay before every response, in ms. Default: 0"
+    )
+
+    parser.add_argument(
+        '--bandwidth-mbps',
+        type=float,
+        default=None,
+        help="Per-connection bandwidth cap in MB/s. Default: unlimited"
+    )
+
+    parser.add_argument(
+        '--no-range',
+        action='store_true',
+        help="Make the server ignore Range requests."
+    )
+
+    parser.add_argument(
+        '--fail-rate',
+        type=float,
+        default=0.0,
+        help="Fraction of downloads answered with HTTP 503. Default: 0"
+    )
+
+    parser.add_argument(
+        '--drop-rate',
+        type=float,
+        default=0.0,
+        help="Fraction of downloads cut off half way. Default: 0"
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help="Seed for injected failures. Default: 0"
+    )
+
+    parser.add_argument(
+        '--dem-px',
+        type=int,
+        default=DEFAULT_DEM_PX,
+        help=f"Synthetic DEM pixels per degree (3600 matches real tiles). Default: {DEFAULT_DEM_PX}"
+    )
+
+    parser.add_argument(
+        '--quad-features',
+        type=int,
+        default=DEFAULT_QUAD_FEATURES,
+        help=f"Line features per layer in each synthetic quad. Default: {DEFAULT_QUAD_FEATURES}"
+    )
+
+    parser.add_argument(
+        '--compare',
+        metavar='BASELINE_JSON',
+        default=None,
+        help="Compare median times against an earlier results file."
+    )
+
+    args = parser.parse_args()
+
+    print("--- ⏱️  Starting Benchmarks ---")
+    print(f"Sizes: {' '.join(args.sizes)}, Groups: {' '.join(args.groups)}, Repeat: {args.repeat}")
+
+    try:
+        results = run_benchmarks(
+            sizes=args.sizes,
+            work_dir=args.work_dir,
+            repeat=args.repeat,
+            jobs=args.jobs,
+            groups=args.groups,
+            gdb_path=args.gdb,
+            engine=args.engine,
+            server_options={
+                "latency_s": args.latency_ms / 1000.0,
+                "bandwidth_mbps": args.bandwidth_mbps,
+                "range_support": not args.no_range,
+                "fail_rate": args.fail_rate,
+                "drop_rate": args.drop_rate,
+                "seed": args.seed,
+                "dem_px": args.dem_px,
+                "quad_features": args.quad_features,
+            }
+        )
+        write_results(results, args.out)
+        print("\n--- ✅  Benchmarks Complete ---")
+
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            print(f"\nAgainst {args.compare} (commit {baseline.get('commit')}):")
+            for case, aoi, old, new, ratio, flag in compare(baseline, results):
+                print(f"  {case:<28} {aoi:<7} {old:8.3f} s -> {new:8.3f} s  x{ratio:.2f} {flag}")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
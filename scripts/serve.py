@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+CLI Script to run the preprocessing service: a long-running process that
+keeps the quad index / GDB, HTTP pool and cache manifests warm and accepts
+DEM / GPKG jobs over a local HTTP or Unix-socket API.
+"""
+
+import os
+import sys
+import argparse
+
+# --- Path Setup ---
+# This block allows the script to be run from anywhere and still find
+# the 'lib' directory.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
+
+# Now we can import from 'lib'
+from lib import metrics_utils
+from lib.cache_utils import gb_to_bytes
+from lib.dem_utils import DEFAULT_CACHE_DIR, DEFAULT_OUT_DIR
+from lib.gpkg_utils import GDB_FILE
+from lib.service_utils import (
+    PreprocessService, serve, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_WORKERS, DEFAULT_MAX_QUEUE
+)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve DEM / GPKG preprocessing jobs over a local HTTP API."
+    )
+
+    parser.add_argument(
+        '--host',
+        default=DEFAULT_HOST,
+        help=f"Address to listen on. Default: {DEFAULT_HOST}"
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"TCP port to listen on. Default: {DEFAULT_PORT}"
+    )
+
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        default=None,
+        help="Listen on this Unix socket instead of a TCP port."
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Jobs run concurrently. Default: {DEFAULT_WORKERS}"
+    )
+
+    parser.add_argument(
+        '--max-queue',
+        type=int,
+        default=DEFAULT_MAX_QUEUE,
+        help=f"Jobs allowed to wait for a worker before new ones are refused. Default: {DEFAULT_MAX_QUEUE}"
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=4,
+        help="Concurrent downloads within a job. Default: 4"
+    )
+
+    parser.add_argument(
+        '--gdb',
+        default=GDB_FILE,
+        help=f"Path to the MapIndices_National_GDB.gdb file. Default: {GDB_FILE}"
+    )
+
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help="Query the GDB directly instead of the quad index sidecar."
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory to cache downloaded DEM tiles. Default: {DEFAULT_CACHE_DIR}"
+    )
+
+    parser.add_argument(
+        '--out-dir',
+        default=DEFAULT_OUT_DIR,
+        help=f"Directory to save clipped DEMs. Default: {DEFAULT_OUT_DIR}"
+    )
+
+    parser.add_argument(
+        '--cache-budget-gb',
+        type=float,
+        default=None,
+        help="Disk budget per cache in GB; least recently used entries are evicted. Default: unbounded"
+    )
+
+    parser.add_argument(
+        '--gdal-cache-mb',
+        type=int,
+        default=512,
+        help="GDAL block cache size in MB, shared by all jobs; warps get half of it as working memory. Default: 512"
+    )
+
+    parser.add_argument(
+        '--remote-cache-mb',
+        type=int,
+        default=256,
+        help="/vsicurl/ block cache size in MB for remote DEM jobs, shared by all jobs. Default: 256"
+    )
+
+    args = parser.parse_args()
+
+    print("--- 🛰️  Starting Preprocessing Service ---")
+    print(f"Using GDB: {args.gdb}")
+    print(f"Cache Dir: {args.cache_dir}")
+    print(f"Output Dir: {args.out_dir}")
+
+    try:
+        # /metrics serves the same per-stage timings as --metrics-json
+        metrics_utils.enable()
+        service = PreprocessService(
+            workers=args.workers,
+            max_queue=args.max_queue,
+            download_jobs=args.jobs,
+            gdb_path=args.gdb,
+            use_index=not args.no_index,
+            cache_dir=args.cache_dir,
+            out_dir=args.out_dir,
+            cache_budget_bytes=gb_to_bytes(args.cache_budget_gb),
+            cache_mb=args.gdal_cache_mb,
+            remote_cache_mb=args.remote_cache_mb
+        )
+        serve(service, host=args.host, port=args.port, socket_path=args.socket)
+        print("\n--- ✅  Service Stopped ---")
+
+    except Exception as e:
+        print(f"\n--- ❌  An Error Occurred ---")
+        print(f"{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# --- Path Setup ---
+# Lets the tests import 'lib' however pytest is invoked.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# ------------------
@@ -0,0 +1,100 @@
+import itertools
+import os
+
+import pytest
+
+from lib import cache_utils
+from lib.cache_utils import CacheManager
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Strictly increasing time.time() so LRU order is deterministic."""
+    ticks = itertools.count(1000)
+
+    class _Time:
+        @staticmethod
+        def time():
+            return float(next(ticks))
+    monkeypatch.setattr(cache_utils, "time", _Time)
+
+
+def _put(cache, name, size=100):
+    with open(cache.path(name), "wb") as f:
+        f.write(b"\0" * size)
+    cache.record(name)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheManager(str(tmp_path), budget_bytes=250)
+    yield cache
+    cache.close()
+
+
+def test_evict_least_recently_used_first(cache):
+    for name in ("a", "b", "c"):
+        _put(cache, name)
+    cache.lookup("a")  # a is now the most recent
+
+    assert cache.evict() == ["b"]
+    assert not os.path.exists(cache.path("b"))
+    assert cache.get("b") is None
+    assert cache.total_size() == 200
+
+
+def test_evict_skips_pinned_and_protected(cache):
+    for name in ("a", "b", "c", "d"):
+        _put(cache, name)
+    cache.pin("a")
+
+    assert cache.evict(protect={"b"}) == ["c", "d"]
+    assert os.path.exists(cache.path("a")) and os.path.exists(cache.path("b"))
+
+    cache.pin("a", pinned=False)
+    assert cache.evict(budget_bytes=100) == ["a"]
+
+
+def test_evict_without_budget_keeps_everything(tmp_path):
+    cache = CacheManager(str(tmp_path))
+    for name in ("a", "b", "c"):
+        _put(cache, name)
+    assert cache.evict() == []
+    assert cache.total_size() == 300
+    cache.close()
+
+
+def test_lookup_adopts_unmanifested_files(cache):
+    with open(cache.path("old.tif"), "wb") as f:
+        f.write(b"\0" * 42)
+    assert cache.get("old.tif") is None
+
+    assert cache.lookup("old.tif") == cache.path("old.tif")
+    assert cache.get("old.tif")["size"] == 42
+
+
+def test_lookup_drops_stale_entries(cache):
+    _put(cache, "gone")
+    os.remove(cache.path("gone"))
+    assert cache.lookup("gone") is None
+    assert cache.get("gone") is None
+
+    _put(cache, "resized")
+    with open(cache.path("resized"), "ab") as f:
+        f.write(b"\0")
+    assert cache.lookup("resized") is None
+    assert not os.path.exists(cache.path("resized"))
+
+
+def test_evict_skips_held_entries(cache):
+    for name in ("a", "b", "c", "d"):
+        _put(cache, name)
+
+    with cache.hold(["a", "b"]):
+        cache.acquire(["a"])  # a second job holding a
+        assert cache.evict() == ["c", "d"]
+    assert os.path.exists(cache.path("a")) and os.path.exists(cache.path("b"))
+
+    assert cache.evict(budget_bytes=100) == ["b"]
+    cache.release(["a"])
+    assert cache.evict(budget_bytes=0) == ["a"]
@@ -0,0 +1,168 @@
+import itertools
+import os
+
+import pytest
+
+from lib.bbox import BoundingBox
+from lib.dem_utils import ELEVATION_SIDECAR, _register_clip, clip_path
+from lib.clip_index import (
+    ClipIndex, _contains, grid_key, missing_strips, overlap_fraction, snap_to_grid
+)
+
+BBOX = BoundingBox(-105.6, 40.0, -105.5, 40.1)
+
+
+def test_cog_clips_are_named_apart():
+    assert clip_path(BBOX, "out") != clip_path(BBOX, "out", cog=True)
+    assert clip_path(BBOX, "out", cog=True).endswith("_cog.tif")
+
+
+def test_evicted_clip_takes_its_sidecars(tmp_path):
+    out_dir = str(tmp_path)
+    grid = grid_key("1")
+    paths = []
+    for i in range(2):
+        path = os.path.join(out_dir, f"clip{i}.tif")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1000)
+        for sidecar in (ELEVATION_SIDECAR, ELEVATION_SIDECAR + ".json"):
+            with open(path + sidecar, "wb") as f:
+                f.write(b"\0")
+        _register_clip(path, out_dir, grid, 1500,
+                       ((-105.6 + i, 1e-3, 0.0, 40.1, 0.0, -1e-3), 100, 100))
+        paths.append(path)
+
+    assert not os.path.exists(paths[0])
+    assert not os.path.exists(paths[0] + ELEVATION_SIDECAR)
+    assert not os.path.exists(paths[0] + ELEVATION_SIDECAR + ".json")
+    assert os.path.exists(paths[1] + ELEVATION_SIDECAR)
+
+
+def _area(b):
+    return max(0.0, b.xmax - b.xmin) * max(0.0, b.ymax - b.ymin)
+
+
+def _intersection(a, b):
+    return BoundingBox(max(a.xmin, b.xmin), max(a.ymin, b.ymin),
+                       min(a.xmax, b.xmax), min(a.ymax, b.ymax))
+
+
+def _inside(b, x, y):
+    return b.xmin < x < b.xmax and b.ymin < y < b.ymax
+
+
+def test_snap_expands_outward_to_whole_pixels():
+    origin, res = (-106.0, 41.0), (0.25, 0.25)
+    assert snap_to_grid(BoundingBox(-105.9, 40.1, -105.3, 40.6), origin, res) == \
+        BoundingBox(-106.0, 40.0, -105.25, 40.75)
+    # Bounds on (or within rounding of) pixel boundaries stay put
+    aligned = BoundingBox(-105.75, 40.25, -105.5, 40.5)
+    assert snap_to_grid(aligned, origin, res) == aligned
+    nudged = BoundingBox(-105.75 + 1e-9, 40.25 - 1e-9, -105.5 + 1e-9, 40.5 - 1e-9)
+    assert snap_to_grid(nudged, origin, res) == pytest.approx(aligned)
+
+
+def test_snap_to_arc_second_grid():
+    res = (1 / 3600, 1 / 3600)
+    origin = (-106.0 - 0.5 * res[0], 41.0 + 0.5 * res[1])  # pixel-centre registered tile
+    bbox = BoundingBox(-105.6123, 40.0456, -105.5012, 40.1789)
+    snapped = snap_to_grid(bbox, origin, res)
+    assert _contains(snapped, bbox, res)
+    for edge, inner, step, ref in ((snapped.xmin, bbox.xmin, res[0], origin[0]),
+                                   (snapped.xmax, bbox.xmax, res[0], origin[0]),
+                                   (snapped.ymin, bbox.ymin, res[1], origin[1]),
+                                   (snapped.ymax, bbox.ymax, res[1], origin[1])):
+        pixels = (edge - ref) / step
+        assert pixels == pytest.approx(round(pixels), abs=1e-6)
+        assert abs(edge - inner) < step
+
+
+def test_contains_tolerates_rounding_only():
+    res = (1e-3, 1e-3)
+    inner = BoundingBox(-105.6, 40.0, -105.5, 40.1)
+    assert _contains(inner, inner, res)
+    assert _contains(BoundingBox(-105.6 + 1e-12, 40.0, -105.5, 40.1 - 1e-12), inner, res)
+    assert not _contains(BoundingBox(-105.6 + 1e-5, 40.0, -105.5, 40.1), inner, res)
+
+
+def test_overlap_fraction():
+    target = BoundingBox(0, 0, 10, 10)
+    assert overlap_fraction(target, BoundingBox(5, -5, 20, 20)) == pytest.approx(0.5)
+    assert overlap_fraction(target, BoundingBox(-1, -1, 11, 11)) == 1.0
+    assert overlap_fraction(target, BoundingBox(10, 0, 20, 10)) == 0.0  # touching only
+
+
+@pytest.mark.parametrize("covered, sides", [
+    (BoundingBox(-5, -5, 8, 15), 1),    # target sticks out east
+    (BoundingBox(-5, 3, 7, 15), 2),     # south and east
+    (BoundingBox(2, 2, 8, 8), 4),       # all four sides
+    (BoundingBox(-5, 4, 15, 6), 2),     # north and south of a band
+])
+def test_missing_strips_tile_the_uncovered_part(covered, sides):
+    target = BoundingBox(0, 0, 10, 10)
+    strips = missing_strips(target, covered)
+    assert len(strips) == sides
+
+    overlap = _intersection(target, covered)
+    assert sum(_area(s) for s in strips) == pytest.approx(_area(target) - _area(overlap))
+    for a, b in itertools.combinations(strips, 2):
+        assert _area(_intersection(a, b)) == 0
+    for s in strips:
+        assert _area(s) > 0
+        assert _area(_intersection(s, covered)) == 0
+        assert _intersection(s, target) == s
+
+    # Every point of the target is in exactly one of the strips or the covered part
+    for x, y in itertools.product([i + 0.25 for i in range(10)], repeat=2):
+        hits = sum(_inside(s, x, y) for s in strips) + _inside(covered, x, y)
+        assert hits == 1, (x, y)
+
+
+def test_fully_covered_bbox_has_no_strips():
+    assert missing_strips(BoundingBox(0, 0, 10, 10), BoundingBox(-1, -1, 11, 11)) == []
+
+
+def _add_clip(index, name, bounds, grid, res=0.01):
+    with open(os.path.join(index.out_dir, name), "wb") as f:
+        f.write(b"\0")
+    cols = round((bounds[2] - bounds[0]) / res)
+    rows = round((bounds[3] - bounds[1]) / res)
+    index.add(name, grid, (bounds[0], res, 0.0, bounds[3], 0.0, -res), cols, rows)
+
+
+def test_best_source_ranking(tmp_path):
+    grid, other_grid = grid_key("1"), grid_key("13")
+    index = ClipIndex(str(tmp_path))
+    try:
+        # Covers 40 % of BBOX: below MIN_REUSE_OVERLAP
+        _add_clip(index, "small.tif", (-105.6, 40.0, -105.56, 40.1), grid)
+        assert index.best_source(BBOX, grid) == (None, None)
+
+        _add_clip(index, "a.tif", (-105.64, 40.0, -105.54, 40.1), grid)       # 60 %
+        _add_clip(index, "b.tif", (-105.58, 39.9, -105.48, 40.1), grid)       # 80 %
+        kind, clip = index.best_source(BBOX, grid)
+        assert (kind, clip["name"]) == ("partial", "b.tif")
+        assert clip["res"] == pytest.approx((0.01, 0.01))
+        assert clip["bounds"] == pytest.approx((-105.58, 39.9, -105.48, 40.1))
+
+        # A containing clip on another grid is never used for this one
+        _add_clip(index, "other.tif", (-105.7, 39.9, -105.4, 40.2), other_grid)
+        assert index.best_source(BBOX, grid)[1]["name"] == "b.tif"
+        assert index.best_source(BBOX, other_grid)[1]["name"] == "other.tif"
+
+        # Containment beats any partial overlap
+        _add_clip(index, "whole.tif", (-105.7, 39.9, -105.4, 40.2), grid)
+        kind, clip = index.best_source(BBOX, grid)
+        assert (kind, clip["name"]) == ("contained", "whole.tif")
+
+        # exclude skips a clip (e.g. the one being rebuilt)
+        kind, clip = index.best_source(BBOX, grid, exclude="whole.tif")
+        assert (kind, clip["name"]) == ("partial", "b.tif")
+
+        # Rows whose file is gone are dropped
+        os.remove(tmp_path / "b.tif")
+        kind, clip = index.best_source(BBOX, grid, exclude="whole.tif")
+        assert (kind, clip["name"]) == ("partial", "a.tif")
+        assert "b.tif" not in [c["name"] for c in index.candidates(BBOX, grid)]
+    finally:
+        index.close()
@@ -0,0 +1,90 @@
+import numpy as np
+
+from lib.contour_utils import stitch_lines
+
+TOL = 1e-6
+
+
+def _line(*pts):
+    return np.array(pts, dtype=np.float64)
+
+
+def _pts(coords):
+    return [tuple(p) for p in coords]
+
+
+def _same_polyline(coords, expected):
+    """Equal up to direction."""
+    coords = _pts(coords)
+    return coords == expected or coords[::-1] == expected
+
+
+def test_reversed_piece_is_flipped():
+    merged = stitch_lines([
+        (100.0, _line((0, 0), (1, 0))),
+        (100.0, _line((2, 0), (1, 0))),
+    ], TOL)
+    assert len(merged) == 1
+    assert _same_polyline(merged[0][1], [(0, 0), (1, 0), (2, 0)])
+
+
+def test_chain_extended_at_both_ends():
+    # The first piece is in the middle, so the chain grows from its tail and its head
+    merged = stitch_lines([
+        (100.0, _line((1, 0), (1.5, 0.2), (2, 0))),
+        (100.0, _line((3, 0), (2, 0))),
+        (100.0, _line((0, 0), (1, 0))),
+        (100.0, _line((-1, 0), (0, 0))),
+    ], TOL)
+    assert len(merged) == 1
+    assert _same_polyline(merged[0][1], [(-1, 0), (0, 0), (1, 0), (1.5, 0.2), (2, 0), (3, 0)])
+
+
+def test_four_tile_ring_around_a_corner_closes():
+    # A contour ring around the shared corner (1, 1) of four tiles, cut at the seams
+    a, b, c, d = (1, 0.5), (1.5, 1), (1, 1.5), (0.5, 1)
+    merged = stitch_lines([
+        (100.0, _line(a, (1.4, 0.6), b)),   # south-east tile
+        (100.0, _line(c, (1.4, 1.4), b)),   # north-east, other direction
+        (100.0, _line(c, (0.6, 1.4), d)),   # north-west
+        (100.0, _line(a, (0.6, 0.6), d)),   # south-west, other direction
+    ], TOL)
+    assert len(merged) == 1
+    ring = merged[0][1]
+    assert len(ring) == 9
+    assert tuple(ring[0]) == tuple(ring[-1])
+    assert set(_pts(ring)) == {a, b, c, d, (1.4, 0.6), (1.4, 1.4), (0.6, 1.4), (0.6, 0.6)}
+
+
+def test_four_tile_corner_keeps_distinct_levels_and_lines_apart():
+    # Two contours cross the corner region at different levels; a third
+    # line at the same level only touches the corner diagonally
+    merged = stitch_lines([
+        (100.0, _line((0, 1), (1, 1))),
+        (100.0, _line((1, 1), (2, 1))),
+        (120.0, _line((1, 0), (1, 1))),
+        (120.0, _line((1, 1), (1, 2))),
+        (100.0, _line((3, 3), (2, 2))),
+    ], TOL)
+    by_level = sorted((elev, sorted(_pts(c))) for elev, c in merged)
+    assert by_level == [
+        (100.0, [(0, 1), (1, 1), (2, 1)]),
+        (100.0, [(2, 2), (3, 3)]),
+        (120.0, [(1, 0), (1, 1), (1, 2)]),
+    ]
+
+
+def test_endpoints_straddling_a_grid_cell_edge_still_join():
+    # Within tolerance, but on either side of a multiple of tolerance / 2
+    merged = stitch_lines([
+        (100.0, _line((0, 0), (0.5e-3 - 1e-10, 0))),
+        (100.0, _line((0.5e-3 + 1e-10, 0), (1e-2, 0))),
+    ], 1e-3)
+    assert len(merged) == 1
+    assert len(merged[0][1]) == 3
+
+
+def test_unmatched_lines_pass_through():
+    lines = [(100.0, _line((0, 0), (1, 0))), (100.0, _line((5, 5), (6, 6)))]
+    merged = stitch_lines(lines, TOL)
+    assert [(_pts(c)) for _, c in merged] == [_pts(c) for _, c in lines]
@@ -0,0 +1,125 @@
+import contextlib
+
+import pytest
+
+from lib.bbox import BoundingBox
+from lib.dem_utils import (
+    tile_name, tiles_for_bbox, tiles_for_aoi, DEMProduct, OneMeterProduct, get_product
+)
+
+
+def test_tile_name():
+    assert tile_name(42, -72) == "n42w072"
+    assert tile_name(-1, 5) == "s01e005"
+
+
+def test_bbox_tile_is_named_by_nw_corner():
+    # n41w106 spans 40-41°N, 106-105°W
+    assert tiles_for_bbox(BoundingBox(-105.6, 40.0, -105.5, 40.1)) == ["n41w106"]
+    assert tiles_for_bbox(BoundingBox(-105.6, 40.9, -105.5, 40.99)) == ["n41w106"]
+
+
+def test_bbox_spanning_tiles():
+    tiles = tiles_for_bbox(BoundingBox(-106.2, 39.8, -105.5, 40.3))
+    assert sorted(tiles) == ["n40w106", "n40w107", "n41w106", "n41w107"]
+
+
+class _RectAOI:
+    """Stand-in for PolygonAOI (which needs OGR): an envelope plus intersects_rect."""
+    def __init__(self, *bounds):
+        self.bbox = BoundingBox(*bounds)
+
+    def intersects_rect(self, xmin, ymin, xmax, ymax):
+        return (xmin < self.bbox.xmax and xmax > self.bbox.xmin and
+                ymin < self.bbox.ymax and ymax > self.bbox.ymin)
+
+
+def test_aoi_tile_is_named_by_nw_corner():
+    assert tiles_for_aoi(_RectAOI(-105.6, 40.2, -105.5, 40.3)) == ["n41w106"]
+
+
+def test_aoi_tiles_match_bbox_tiles():
+    for bounds in ((-106.2, 39.8, -105.5, 40.3), (-106.0, 40.0, -105.0, 41.0)):
+        assert tiles_for_aoi(BoundingBox(*bounds)) == tiles_for_bbox(BoundingBox(*bounds))
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class _TNMStub:
+    """Downloader stand-in answering TNM Access searches from a list of items, two per page."""
+    timeout = 5
+
+    def __init__(self, items):
+        self.items = items
+        self.session = self
+        self.calls = 0
+
+    def limiter_for(self, url):
+        return contextlib.nullcontext()
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        start = params["offset"]
+        return _Response({"total": len(self.items), "items": self.items[start:start + 2]})
+
+
+def _item(stem, xmin, ymin, project_dir=None):
+    project = project_dir or stem.split("_", 4)[4]
+    return {
+        "downloadURL": f"https://example.test/1m/Projects/{project}/TIFF/{stem}.tif",
+        "boundingBox": {"minX": xmin, "minY": ymin, "maxX": xmin + 0.12, "maxY": ymin + 0.09},
+    }
+
+
+def test_partial_product_fails_at_creation():
+    class NoURL(DEMProduct):
+        name = "test"
+
+        def tiles(self, aoi):
+            return []
+
+    with pytest.raises(TypeError):
+        NoURL()
+    assert get_product("13").url("n41w106").endswith("/13/TIFF/current/n41w106/USGS_13_n41w106.tif")
+
+
+def test_one_meter_cell_and_vintage():
+    cell, vintage = OneMeterProduct._cell_and_vintage("USGS_1M_13_x45y445_CO_DRCOG_2020_B20")
+    assert cell == "13_x45y445"
+    assert vintage == (2020, "CO_DRCOG_2020_B20")
+    assert OneMeterProduct._cell_and_vintage("USGS_1M_13_x45y445_CO_Central")[1][0] == 0
+
+
+def test_one_meter_tiles_keep_newest_project_per_cell():
+    stub = _TNMStub([
+        _item("USGS_1M_13_x45y445_CO_Front_Range_2015", -105.30, 40.10),
+        _item("USGS_1M_13_x45y445_CO_DRCOG_2020_B20", -105.30, 40.10),
+        _item("USGS_1M_13_x46y445_CO_DRCOG_2020_B20", -105.18, 40.10),
+        _item("USGS_1M_13_x47y445_CO_DRCOG_2020_B20", -101.00, 40.10),  # outside the AOI
+        {"downloadURL": "https://example.test/other/USGS_13_n41w106.tif",
+         "boundingBox": {"minX": -106, "minY": 40, "maxX": -105, "maxY": 41}},
+    ])
+    product = OneMeterProduct(api_url="https://example.test/api", downloader=stub)
+    bbox = BoundingBox(-105.3, 40.1, -105.0, 40.2)
+
+    expected = [
+        "USGS_1M_13_x45y445_CO_DRCOG_2020_B20",
+        "USGS_1M_13_x46y445_CO_DRCOG_2020_B20",
+    ]
+    assert product.tiles(bbox) == expected
+    assert stub.calls == 3  # paged two items at a time
+    assert product.tiles(_RectAOI(*bbox)) == expected
+    assert stub.calls == 3  # same envelope, search reused
+    assert product.url("USGS_1M_13_x46y445_CO_DRCOG_2020_B20") == (
+        "https://example.test/1m/Projects/CO_DRCOG_2020_B20/TIFF/"
+        "USGS_1M_13_x46y445_CO_DRCOG_2020_B20.tif"
+    )
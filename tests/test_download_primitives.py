@@ -0,0 +1,183 @@
+import threading
+
+import pytest
+
+from lib import download_utils
+from lib.download_utils import HostLimiter, SingleFlight, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock that time.sleep() advances, so rates are exact."""
+    class _Time:
+        now = 100.0
+        slept = []
+
+        @classmethod
+        def monotonic(cls):
+            return cls.now
+
+        @classmethod
+        def sleep(cls, seconds):
+            cls.slept.append(seconds)
+            cls.now += seconds
+    monkeypatch.setattr(download_utils, "time", _Time)
+    return _Time
+
+
+def test_token_bucket_paces_at_rate(clock):
+    bucket = TokenBucket(4.0, burst=1)
+    start = clock.now
+    for _ in range(9):
+        bucket.acquire()
+    # The first token is there already, the other eight arrive 0.25 s apart
+    assert clock.now - start == pytest.approx(2.0)
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(2.0, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+
+    bucket.acquire()
+    assert sum(clock.slept) == pytest.approx(0.5)
+
+    # Idle time refills the bucket, but never past the burst
+    clock.now += 60
+    clock.slept.clear()
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert sum(clock.slept) == pytest.approx(0.5)
+
+
+def test_token_bucket_zero_rate_is_unlimited(clock):
+    bucket = TokenBucket(0)
+    for _ in range(100):
+        bucket.acquire()
+    assert clock.slept == []
+
+
+def test_host_limiter_caps_in_flight():
+    limiter = HostLimiter(0, max_in_flight=2)
+    release = threading.Event()
+    lock = threading.Lock()
+    inside = []
+    entered = threading.Semaphore(0)
+
+    def request(i):
+        with limiter:
+            with lock:
+                inside.append(i)
+            entered.release()
+            release.wait(10)
+        with lock:
+            inside.remove(i)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for _ in range(2):
+        assert entered.acquire(timeout=10)
+    # The other three stay queued while two are in flight
+    assert not entered.acquire(timeout=0.2)
+    assert len(inside) == 2
+
+    release.set()
+    for t in threads:
+        t.join(10)
+    assert inside == []
+    # Every slot was handed back
+    for _ in range(2):
+        assert limiter._slots.acquire(blocking=False)
+    assert not limiter._slots.acquire(blocking=False)
+
+
+class _ArrivalFlight(SingleFlight):
+    """SingleFlight that counts callers reaching begin(), so tests know when followers are waiting."""
+    def __init__(self):
+        super().__init__("test")
+        self.arrivals = threading.Semaphore(0)
+
+    def begin(self, key):
+        result = super().begin(key)
+        self.arrivals.release()
+        return result
+
+
+def _run_concurrently(flight, n, func):
+    """Start one leader and n - 1 followers on the same key; return their outcomes."""
+    outcomes = [None] * n
+    inside, release = threading.Event(), threading.Event()
+
+    def work():
+        inside.set()
+        release.wait(10)
+        return func()
+
+    def call(i):
+        try:
+            outcomes[i] = ("ok", flight.do("key", work))
+        except Exception as e:
+            outcomes[i] = ("error", e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    threads[0].start()
+    assert inside.wait(10)
+    for t in threads[1:]:
+        t.start()
+    for _ in range(n):
+        assert flight.arrivals.acquire(timeout=10)
+    release.set()
+    for t in threads:
+        t.join(10)
+    return outcomes
+
+
+def test_single_flight_coalesces_concurrent_callers():
+    flight = _ArrivalFlight()
+    calls = []
+
+    def func():
+        calls.append(1)
+        return object()
+
+    outcomes = _run_concurrently(flight, 8, func)
+    assert len(calls) == 1
+    assert {status for status, _ in outcomes} == {"ok"}
+    assert len({id(result) for _, result in outcomes}) == 1
+
+    # A finished flight is not cached: the next call runs again
+    assert flight.do("key", func) is not outcomes[0][1]
+    assert len(calls) == 2
+
+
+def test_single_flight_propagates_error_to_every_waiter():
+    flight = _ArrivalFlight()
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise ValueError("tile gone")
+
+    outcomes = _run_concurrently(flight, 6, func)
+    assert len(calls) == 1
+    assert all(status == "error" for status, _ in outcomes)
+    errors = {id(e) for _, e in outcomes}
+    assert len(errors) == 1 and str(outcomes[0][1]) == "tile gone"
+    assert flight._flights == {}
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    leader_a, is_leader_a = flight.begin("a")
+    leader_b, is_leader_b = flight.begin("b")
+    assert is_leader_a and is_leader_b and leader_a is not leader_b
+    flight.end("a", result="A")
+    flight.end("b", error=KeyError("b"))
+    assert leader_a.wait() == "A"
+    with pytest.raises(KeyError):
+        leader_b.wait()
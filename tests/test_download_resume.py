@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from lib.bench_utils import StandInServer
+from lib.download_utils import Downloader
+
+PAYLOAD = os.urandom(256 * 1024)
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "server"
+    root.mkdir()
+    (root / "blob.bin").write_bytes(PAYLOAD)
+    with StandInServer(str(root)) as s:
+        yield s
+
+
+def _fetch(server, target, retries=3):
+    host = server.url.split("://", 1)[1]
+    downloader = Downloader(rate_limits={host: (0, 4)}, retries=retries)
+    try:
+        return downloader.fetch(f"{server.url}/blob.bin", str(target))
+    finally:
+        downloader.close()
+
+
+def _interrupted_fetch(server, target):
+    """Leave a half-downloaded .part behind, as a killed run would."""
+    server.drop_rate = 1.0
+    assert not _fetch(server, target, retries=0)["success"]
+    server.drop_rate = 0.0
+    assert 0 < os.path.getsize(f"{target}.part") < len(PAYLOAD)
+
+
+def test_fetch_removes_validator_sidecar(server, tmp_path):
+    target = tmp_path / "blob.bin"
+    result = _fetch(server, target)
+    assert result["success"] and not result["resumed"]
+    assert target.read_bytes() == PAYLOAD
+    assert not os.path.exists(f"{target}.part.json")
+
+
+def test_resume_across_runs_uses_saved_validators(server, tmp_path):
+    target = tmp_path / "blob.bin"
+    _interrupted_fetch(server, target)
+    with open(f"{target}.part.json") as f:
+        assert json.load(f)["etag"]
+
+    result = _fetch(server, target)
+    assert result["success"] and result["resumed"]
+    assert target.read_bytes() == PAYLOAD
+    assert server.stats["ranged"] == 1
+
+
+def test_part_without_validators_is_discarded(server, tmp_path):
+    target = tmp_path / "blob.bin"
+    _interrupted_fetch(server, target)
+    os.remove(f"{target}.part.json")
+
+    result = _fetch(server, target)
+    assert result["success"] and not result["resumed"]
+    assert target.read_bytes() == PAYLOAD
+    assert server.stats["ranged"] == 0
+
+
+def test_changed_remote_restarts_from_zero(server, tmp_path):
+    target = tmp_path / "blob.bin"
+    _interrupted_fetch(server, target)
+    with open(f"{target}.part.json", "w") as f:
+        json.dump({"etag": '"stale"', "last_modified": None}, f)
+
+    result = _fetch(server, target)
+    assert result["success"] and not result["resumed"]
+    assert target.read_bytes() == PAYLOAD
@@ -0,0 +1,160 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("osgeo")
+from osgeo import ogr, osr
+
+from lib.aoi_utils import PolygonAOI
+from lib.bbox import BoundingBox
+from lib.gpkg_utils import _read_quad_layer, _sql_literal, merge_gpkgs
+
+TRAILS, WATER = "Trans_TrailSegment", "Hydro_Area"
+BBOX = BoundingBox(-105.6, 40.0, -105.5, 40.1)
+# The south-west half of BBOX
+TRIANGLE = PolygonAOI("POLYGON ((-105.6 40.0, -105.5 40.0, -105.6 40.1, -105.6 40.0))")
+
+RIDGE = "LINESTRING (-105.65 40.05, -105.52 40.05)"
+SPUR = "LINESTRING (-105.56 40.07, -105.54 40.08)"
+
+# Two neighbouring quads; features on their shared edge appear in both
+QUAD_A = {
+    TRAILS: (ogr.wkbLineString, [
+        ("t1", "Ridge", RIDGE),
+        ("t2", "Creek", "LINESTRING (-105.58 40.02, -105.57 40.03)"),
+        (None, "Spur", SPUR),
+    ]),
+    WATER: (ogr.wkbPolygon, [
+        ("w1", "Lake", "POLYGON ((-105.59 40.01, -105.58 40.01, -105.58 40.02, -105.59 40.02, -105.59 40.01))"),
+    ]),
+}
+QUAD_B = {
+    TRAILS: (ogr.wkbLineString, [
+        ("t1", "Ridge", RIDGE),
+        (None, "Spur", SPUR),                                           # exact repeat
+        (None, "Spur", "LINESTRING (-105.54 40.08, -105.53 40.09)"),    # same name, other line
+        ("t3", "Edge", "LINESTRING (-105.53 40.10, -105.53 40.15)"),    # touches BBOX's top edge
+        ("t4", "Away", "LINESTRING (-105.40 40.05, -105.30 40.05)"),
+    ]),
+    WATER: (ogr.wkbPolygon, [
+        # Shares an edge with BBOX's top
+        ("w2", "Marsh", "POLYGON ((-105.52 40.10, -105.51 40.10, -105.51 40.12, -105.52 40.12, -105.52 40.10))"),
+        # Straddles BBOX's east edge
+        ("w3", "Pond", "POLYGON ((-105.51 40.05, -105.45 40.05, -105.45 40.06, -105.51 40.06, -105.51 40.05))"),
+    ]),
+}
+
+
+def _write_gpkg(path, layers):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds = ogr.GetDriverByName("GPKG").CreateDataSource(str(path))
+    for layer_name, (geom_type, rows) in layers.items():
+        layer = ds.CreateLayer(layer_name, srs, geom_type)
+        layer.CreateField(ogr.FieldDefn("permanent_identifier", ogr.OFTString))
+        layer.CreateField(ogr.FieldDefn("name", ogr.OFTString))
+        for pid, name, wkt in rows:
+            feature = ogr.Feature(layer.GetLayerDefn())
+            if pid:
+                feature.SetField("permanent_identifier", pid)
+            feature.SetField("name", name)
+            feature.SetGeometry(ogr.CreateGeometryFromWkt(wkt))
+            layer.CreateFeature(feature)
+    ds = None
+    return str(path)
+
+
+@pytest.fixture
+def quads(tmp_path):
+    return [_write_gpkg(tmp_path / "quad_a.gpkg", QUAD_A),
+            _write_gpkg(tmp_path / "quad_b.gpkg", QUAD_B)]
+
+
+def _read(path):
+    """{layer: [(permanent_identifier, name, geometry type, geometry)]}"""
+    ds = ogr.Open(path)
+    out = {}
+    for i in range(ds.GetLayerCount()):
+        layer = ds.GetLayerByIndex(i)
+        out[layer.GetName()] = [
+            (f.GetField("permanent_identifier"), f.GetField("name"),
+             f.GetGeometryRef().GetGeometryType(), f.GetGeometryRef().Clone())
+            for f in layer
+        ]
+    ds = None
+    return out
+
+
+def _names(rows):
+    return sorted(name for _, name, _, _ in rows)
+
+
+def test_merge_dedupes_by_identifier_and_exact_repeats(quads, tmp_path):
+    out = str(tmp_path / "merged.gpkg")
+    summary = merge_gpkgs(quads, out, readers=2)
+
+    merged = _read(out)
+    assert _names(merged[TRAILS]) == ["Away", "Creek", "Edge", "Ridge", "Spur", "Spur"]
+    assert _names(merged[WATER]) == ["Lake", "Marsh", "Pond"]
+    # t1 by its identifier, the repeated spur because it is an exact copy
+    assert summary["duplicates_skipped"] == 2
+    assert summary["layers"] == {TRAILS: 6, WATER: 3}
+    assert {t for _, _, t, _ in merged[TRAILS]} == {ogr.wkbMultiLineString}
+    assert {t for _, _, t, _ in merged[WATER]} == {ogr.wkbMultiPolygon}
+
+    # The R-tree is built after the bulk load
+    with sqlite3.connect(out) as conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    assert f"rtree_{TRAILS}_geom" in tables and f"rtree_{WATER}_geom" in tables
+
+
+def test_merge_clips_to_bbox_and_drops_edge_touching_parts(quads, tmp_path):
+    out = str(tmp_path / "merged.gpkg")
+    summary = merge_gpkgs(quads, out, aoi=BBOX, readers=2)
+
+    merged = _read(out)
+    # Edge only touches the bbox (a point) and Marsh only shares an edge with
+    # it (a line): neither is written into a line / polygon layer
+    assert _names(merged[TRAILS]) == ["Creek", "Ridge", "Spur", "Spur"]
+    assert _names(merged[WATER]) == ["Lake", "Pond"]
+    assert summary["duplicates_skipped"] == 2
+
+    clip = ogr.CreateGeometryFromWkt(
+        "POLYGON ((-105.6 40.0, -105.5 40.0, -105.5 40.1, -105.6 40.1, -105.6 40.0))").Buffer(1e-9)
+    for layer, geom_type in ((TRAILS, ogr.wkbMultiLineString), (WATER, ogr.wkbMultiPolygon)):
+        for _, name, found_type, geom in merged[layer]:
+            assert found_type == geom_type, name
+            assert geom.Within(clip), name
+    ridge = next(g for _, name, _, g in merged[TRAILS] if name == "Ridge")
+    assert ridge.GetEnvelope()[:2] == pytest.approx((-105.6, -105.52))
+    pond = next(g for _, name, _, g in merged[WATER] if name == "Pond")
+    assert pond.GetArea() == pytest.approx(0.01 * 0.01)
+
+
+def test_merge_clips_to_polygon_aoi(quads, tmp_path):
+    out = str(tmp_path / "merged.gpkg")
+    summary = merge_gpkgs(quads, out, aoi=TRIANGLE, readers=2)
+
+    merged = _read(out)
+    assert _names(merged[TRAILS]) == ["Creek", "Ridge"]
+    assert _names(merged[WATER]) == ["Lake"]
+    assert summary["duplicates_skipped"] == 1
+
+    clip = TRIANGLE.geometry.Buffer(1e-9)
+    for layer in (TRAILS, WATER):
+        for _, name, _, geom in merged[layer]:
+            assert geom.Within(clip), name
+    ridge = next(g for _, name, _, g in merged[TRAILS] if name == "Ridge")
+    assert ridge.Length() == pytest.approx(0.05)
+
+
+def test_unreadable_quad_raises_its_own_error(tmp_path):
+    bad = tmp_path / "broken.gpkg"
+    bad.write_bytes(b"not a geopackage")
+    with pytest.raises(RuntimeError):
+        _read_quad_layer(str(bad), TRAILS, BBOX)
+
+
+def test_sql_literal_escapes_quotes():
+    assert _sql_literal("Trans_TrailSegment") == "'Trans_TrailSegment'"
+    assert _sql_literal("it's") == "'it''s'"
@@ -0,0 +1,46 @@
+import pytest
+
+from lib.bbox import BoundingBox
+from lib.mbtiles_utils import (METATILE, WEB_MERCATOR_HALF, _band_plan, lonlat_to_tile,
+                               metatile_bounds, tile_bounds_mercator, tile_range)
+
+BOULDER = BoundingBox(-105.30, 39.98, -105.25, 40.03)
+
+
+def test_lonlat_to_tile():
+    assert lonlat_to_tile(0.0, 0.0, 1) == (1, 1)
+    assert lonlat_to_tile(-105.27, 40.01, 14) == (3401, 6202)
+
+
+def test_tile_bounds_mercator():
+    assert tile_bounds_mercator(0, 0, 0) == pytest.approx(
+        (-WEB_MERCATOR_HALF, -WEB_MERCATOR_HALF, WEB_MERCATOR_HALF, WEB_MERCATOR_HALF))
+    xmin, ymin, xmax, ymax = tile_bounds_mercator(3401, 6202, 14)
+    assert xmin == pytest.approx(-11.72e6, rel=1e-2)
+    assert ymax == pytest.approx(4.87e6, rel=1e-2)
+
+
+def test_metatile_bounds_cover_their_tiles():
+    zoom = 14
+    x0, y0, x1, y1 = tile_range(BOULDER, zoom)
+    mx, my = x0 // METATILE, y0 // METATILE
+    xmin, ymin, xmax, ymax = metatile_bounds(mx, my, zoom, METATILE)
+
+    # Near Boulder, CO -- not near the origin of the tile grid
+    assert xmin == pytest.approx(-11.72e6, rel=1e-2)
+    assert ymax == pytest.approx(4.87e6, rel=1e-2)
+
+    # The metatile spans exactly the tiles it is labelled with
+    first = tile_bounds_mercator(mx * METATILE, my * METATILE, zoom)
+    last = tile_bounds_mercator(mx * METATILE + METATILE - 1, my * METATILE + METATILE - 1, zoom)
+    assert (xmin, ymax) == pytest.approx((first[0], first[3]))
+    assert (xmax, ymin) == pytest.approx((last[2], last[1]))
+    assert xmin <= tile_bounds_mercator(x0, y0, zoom)[0] < xmax
+
+
+def test_band_plan_covers_every_zoom():
+    covered = []
+    for top, levels in _band_plan(8, 14):
+        assert 2 ** levels <= METATILE
+        covered.extend(range(top - levels, top + 1))
+    assert sorted(covered) == list(range(8, 15))
@@ -0,0 +1,199 @@
+import pytest
+
+from lib import metrics_utils
+from lib.metrics_utils import count, prometheus_text, record, report, timed, timed_iter, timer
+
+MB = 1024 ** 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual clock for perf_counter() and time(); tests advance it explicitly."""
+    class _Time:
+        now = 1000.0
+
+        @classmethod
+        def perf_counter(cls):
+            return cls.now
+
+        @classmethod
+        def time(cls):
+            return cls.now
+
+        @classmethod
+        def advance(cls, seconds):
+            cls.now += seconds
+    monkeypatch.setattr(metrics_utils, "time", _Time)
+    return _Time
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    """Leave the process-wide metrics off and empty for other tests."""
+    yield
+    metrics_utils.disable()
+    metrics_utils._stages.clear()
+    metrics_utils._counters.clear()
+
+
+def test_disabled_is_a_no_op(clock):
+    calls = []
+
+    @timed("stage")
+    def work():
+        calls.append(1)
+        return "result"
+
+    items = [1, 2]
+    assert timer("stage") is metrics_utils._NULL_TIMER
+    with timer("stage") as t:
+        t.add_bytes(10)
+    assert work() == "result" and calls == [1]
+    assert timed_iter("scan", items) is items
+    record("stage", 1.0)
+    count("event")
+    assert report()["stages"] == {} and report()["counters"] == {}
+
+
+def test_enable_clears_earlier_data(clock):
+    metrics_utils.enable()
+    record("stage", 1.0)
+    count("event")
+    metrics_utils.enable()
+    assert report()["stages"] == {} and report()["counters"] == {}
+
+
+def test_timed_counts_failures(clock):
+    metrics_utils.enable()
+
+    @timed("fetch", nbytes=lambda r: r["size"], ok=lambda r: r["success"])
+    def fetch(success, size=100):
+        clock.advance(0.5)
+        return {"success": success, "size": size}
+
+    @timed("fetch")
+    def broken():
+        clock.advance(0.25)
+        raise OSError("connection reset")
+
+    fetch(True)
+    fetch(False, size=999)
+    with pytest.raises(OSError):
+        broken()
+
+    s = report()["stages"]["fetch"]
+    assert s["calls"] == 3 and s["errors"] == 2
+    # Bytes only count for calls that succeeded
+    assert s["bytes"] == 100
+    assert s["total_s"] == pytest.approx(1.25)
+
+
+def test_timer_marks_exceptions_as_errors(clock):
+    metrics_utils.enable()
+    with timer("warp") as t:
+        clock.advance(1.0)
+        t.add_bytes(MB)
+    with pytest.raises(ValueError):
+        with timer("warp"):
+            raise ValueError()
+    s = report()["stages"]["warp"]
+    assert s["calls"] == 2 and s["errors"] == 1 and s["bytes"] == MB
+
+
+def test_timed_iter_counts_only_producer_time(clock):
+    metrics_utils.enable()
+
+    def produce():
+        for i in range(3):
+            clock.advance(1.0)
+            yield i
+
+    consumed = []
+    for item in timed_iter("scan", produce(), event="features"):
+        clock.advance(5.0)  # consumer work is not the stage's
+        consumed.append(item)
+
+    assert consumed == [0, 1, 2]
+    data = report()
+    assert data["stages"]["scan"]["calls"] == 1
+    assert data["stages"]["scan"]["errors"] == 0
+    assert data["stages"]["scan"]["total_s"] == pytest.approx(3.0)
+    assert data["counters"] == {"features": 3}
+
+
+def test_report_percentiles_and_throughput(clock):
+    metrics_utils.enable()
+    # Ten sequential calls of 0.1 .. 1.0 s, 1 MB each
+    for i in range(1, 11):
+        with timer("download") as t:
+            clock.advance(i / 10)
+            t.add_bytes(MB)
+    s = report()["stages"]["download"]
+    assert s["calls"] == 10
+    assert s["mean_ms"] == pytest.approx(550.0)
+    # Linear interpolation between the closest ranks
+    assert s["p50_ms"] == pytest.approx(550.0)
+    assert s["p90_ms"] == pytest.approx(910.0)
+    assert s["p99_ms"] == pytest.approx(991.0)
+    assert s["max_ms"] == pytest.approx(1000.0)
+    assert s["wall_s"] == pytest.approx(5.5)
+    assert s["mb_per_s"] == pytest.approx(10 / 5.5, abs=1e-3)
+
+
+def test_throughput_is_over_wall_time_of_concurrent_calls(clock):
+    metrics_utils.enable()
+    with timer("download", 2 * MB):
+        with timer("download", 2 * MB):
+            clock.advance(2.0)
+    s = report()["stages"]["download"]
+    assert s["total_s"] == pytest.approx(4.0)
+    assert s["wall_s"] == pytest.approx(2.0)
+    assert s["mb_per_s"] == pytest.approx(2.0)
+
+    # No bytes, no throughput
+    with timer("index_query"):
+        clock.advance(1.0)
+    assert report()["stages"]["index_query"]["mb_per_s"] is None
+
+
+def test_prometheus_text_format(clock):
+    metrics_utils.enable()
+    with timer("download", MB):
+        clock.advance(0.5)
+    with timer("index_query"):
+        clock.advance(0.25)
+    count("cache_hit", 3)
+
+    text = prometheus_text()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    p = metrics_utils.PROM_PREFIX
+
+    # Every metric family is announced before its samples
+    for name, kind in (("stage_duration_seconds", "summary"), ("stage_bytes_total", "counter"),
+                       ("stage_errors_total", "counter"),
+                       ("stage_throughput_mb_per_second", "gauge"),
+                       ("events_total", "counter"), ("run_duration_seconds", "gauge")):
+        type_line = f"# TYPE {p}_{name} {kind}"
+        assert type_line in lines
+        samples = [i for i, line in enumerate(lines)
+                   if line.startswith(f"{p}_{name}{{") or line.startswith(f"{p}_{name} ")]
+        assert samples and min(samples) > lines.index(type_line)
+
+    assert f'{p}_stage_duration_seconds{{stage="download",quantile="0.5"}} 0.500000' in lines
+    assert f'{p}_stage_duration_seconds{{stage="download",quantile="0.99"}} 0.500000' in lines
+    assert f'{p}_stage_duration_seconds_sum{{stage="index_query"}} 0.250000' in lines
+    assert f'{p}_stage_duration_seconds_count{{stage="download"}} 1' in lines
+    assert f'{p}_stage_bytes_total{{stage="download"}} {MB}' in lines
+    assert f'{p}_stage_errors_total{{stage="download"}} 0' in lines
+    assert f'{p}_stage_throughput_mb_per_second{{stage="download"}} 2.0' in lines
+    # Stages without bytes have no throughput sample
+    assert not any(line.startswith(f'{p}_stage_throughput_mb_per_second{{stage="index_query"')
+                   for line in lines)
+    assert f'{p}_events_total{{event="cache_hit"}} 3' in lines
+    assert f"{p}_run_duration_seconds 0.75" in lines
+
+    # Sample lines are "name{labels} value" with a numeric value
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
@@ -0,0 +1,173 @@
+import os
+
+import pytest
+
+from lib import plan_utils
+from lib.bbox import BoundingBox
+from lib.bench_utils import StandInServer, use_stand_in
+from lib.cache_utils import CacheManager
+from lib.clip_index import get_clip_index, grid_key
+from lib.dem_utils import plan_tiles
+from lib.download_utils import Downloader
+from lib.plan_utils import build_plan, free_bytes
+
+AOI = BoundingBox(-105.6, 40.0, -105.4, 40.2)
+
+# Files on the stand-in server; "empty" is served with Content-Length: 0,
+# which the planner cannot size
+SIZES = {"a": 300_000, "b": 100_000, "c": 200_000, "empty": 0}
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "server"
+    root.mkdir()
+    for key, size in SIZES.items():
+        (root / f"{key}.tif").write_bytes(b"\0" * size)
+    with StandInServer(str(root)) as s:
+        yield s
+
+
+@pytest.fixture
+def downloader(server):
+    host = server.url.split("://", 1)[1]
+    downloader = Downloader(rate_limits={host: (0, 4)}, retries=0)
+    yield downloader
+    downloader.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheManager(str(tmp_path / "cache"))
+    yield cache
+    cache.close()
+
+
+def _put(cache, name, size):
+    with open(cache.path(name), "wb") as f:
+        f.write(b"\0" * size)
+
+
+def _items(server, cache, keys):
+    return [{"key": key, "url": f"{server.url}/{key}.tif", "cached": cache.contains(f"{key}.tif")}
+            for key in keys]
+
+
+def test_contains_is_read_only(cache):
+    assert not cache.contains("absent.tif")
+
+    # On disk but not in the manifest counts (lookup would adopt it), without adopting it
+    _put(cache, "loose.tif", 10)
+    assert cache.contains("loose.tif")
+    assert cache.get("loose.tif") is None
+
+    _put(cache, "ok.tif", 10)
+    cache.record("ok.tif")
+    before = cache.get("ok.tif")
+    assert cache.contains("ok.tif")
+    assert cache.get("ok.tif") == before  # last access untouched
+
+    # A size mismatch is a miss, but the entry is left for lookup() to drop
+    _put(cache, "ok.tif", 20)
+    assert not cache.contains("ok.tif")
+    assert cache.get("ok.tif") == before
+
+    # A manifest row whose file is gone is a miss and is kept too
+    os.remove(cache.path("ok.tif"))
+    assert not cache.contains("ok.tif")
+    assert cache.get("ok.tif") == before
+
+
+def test_plan_splits_hits_and_sizes_misses(server, downloader, cache):
+    _put(cache, "a.tif", SIZES["a"])
+    cache.record("a.tif")
+    _put(cache, "b.tif", 5)  # truncated copy: re-fetched
+    cache.record("b.tif", size=SIZES["b"])
+
+    items = _items(server, cache, ["a", "b", "c", "empty", "gone"])
+    plan = build_plan("dem", AOI, items, cache.cache_dir, downloader=downloader, jobs=2,
+                      connection_mbps=0.1, reserve_bytes=1000, extra={"product": "test"})
+
+    assert plan["kind"] == "dem" and plan["product"] == "test"
+    assert plan["bbox"] == list(AOI)
+    assert plan["items"] == 5
+    assert plan["cache_hits"] == ["a"]
+    assert plan["cache_misses"] == ["b", "c", "empty", "gone"]
+    assert plan["sizes"] == {"b": SIZES["b"], "c": SIZES["c"]}
+    assert plan["unknown_size"] == ["empty"]
+    assert plan["missing"] == ["gone"]
+    assert plan["errors"] == {}
+
+    # The unsized miss is costed at the mean of the sized ones
+    assert plan["transfer_bytes"] == 300_000 + 150_000
+    # The real run GETs every miss the server still has; planning HEADs each miss once
+    assert plan["requests"] == 3
+    assert server.stats["requests"] == 4
+    # Two connections of 0.1 MB/s, no request-rate limit
+    assert plan["estimated_seconds"] == pytest.approx(450_000 / (0.1e6 * 2), abs=0.1)
+
+    disk = plan["disk"]
+    assert disk["path"] == os.path.abspath(cache.cache_dir)
+    assert disk["reserve_bytes"] == 1000
+    assert disk["required_bytes"] == 450_000 + 1000
+    assert disk["free_bytes"] == pytest.approx(free_bytes(cache.cache_dir), rel=0.01)
+    assert plan["ok"] == (disk["free_bytes"] >= disk["required_bytes"])
+
+
+def test_fully_cached_plan_makes_no_requests(server, downloader, cache):
+    for key in ("a", "b"):
+        _put(cache, f"{key}.tif", SIZES[key])
+    plan = build_plan("dem", AOI, _items(server, cache, ["a", "b"]), cache.cache_dir,
+                      downloader=downloader, reserve_bytes=0)
+    assert plan["cache_hits"] == ["a", "b"] and plan["cache_misses"] == []
+    assert plan["transfer_bytes"] == 0 and plan["requests"] == 0
+    assert plan["estimated_seconds"] == 0
+    assert plan["ok"]
+    assert server.stats["requests"] == 0
+
+
+def test_plan_not_ok_when_disk_is_short(server, downloader, cache, tmp_path):
+    free = free_bytes(str(tmp_path))
+    plan = build_plan("gpkg", AOI, _items(server, cache, ["a", "c"]),
+                      str(tmp_path / "not" / "yet" / "made"), downloader=downloader,
+                      disk_factor=2.5, reserve_bytes=free)
+    assert not plan["ok"]
+    assert plan["disk"]["required_bytes"] == int(500_000 * 2.5) + free
+    # The check runs against the nearest existing parent
+    assert plan["disk"]["free_bytes"] == pytest.approx(free, rel=0.01)
+
+
+def test_remote_and_reused_dem_plans_need_no_transfer(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(plan_utils, "free_bytes", lambda path: 1024 ** 2)
+    bbox = BoundingBox(-105.55, 40.40, -105.50, 40.45)
+    dirs = {"cache_dir": str(tmp_path / "dem"), "out_dir": str(tmp_path / "out"),
+            "reserve_bytes": 0}
+
+    with use_stand_in(server):
+        local = plan_tiles(bbox, **dirs)
+        assert local["cache_misses"] == ["n41w106"] and not local["remote"]
+        assert local["transfer_bytes"] > 1024 ** 2 and not local["ok"]
+
+        # Remote reads still check the tile exists, but download nothing
+        remote = plan_tiles(bbox, remote=True, **dirs)
+        assert remote["remote"] and remote["missing"] == [] and remote["requests"] == 1
+        assert remote["transfer_bytes"] == 0 and remote["disk"]["required_bytes"] == 0
+        assert remote["ok"]
+        # A dry run leaves the output directory alone
+        assert not (tmp_path / "out").exists()
+
+        # An earlier 1 arc-second clip of the whole tile contains the bbox
+        (tmp_path / "out").mkdir()
+        (tmp_path / "out" / "DEM_earlier.tif").write_bytes(b"\0" * 100)
+        get_clip_index(dirs["out_dir"]).add("DEM_earlier.tif", grid_key("1"),
+                                            (-106.0, 1 / 3600, 0.0, 41.0, 0.0, -1 / 3600),
+                                            3600, 3600)
+        requests = server.stats["requests"]
+        reused = plan_tiles(bbox, **dirs)
+        assert reused["reuse_clip"] == "DEM_earlier.tif"
+        assert reused["items"] == 0 and reused["transfer_bytes"] == 0 and reused["ok"]
+        assert server.stats["requests"] == requests
+
+        # Not when reuse is off, or for another product's grid
+        assert plan_tiles(bbox, reuse_clips=False, **dirs)["transfer_bytes"] == local["transfer_bytes"]
+        assert plan_tiles(bbox, product="13", **dirs)["reuse_clip"] is None
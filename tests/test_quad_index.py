@@ -0,0 +1,92 @@
+import sys
+import types
+
+import pytest
+
+from lib.bbox import BoundingBox
+from lib.quad_index import QuadIndex, build_index, is_stale
+
+
+class _Geom:
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self.env = (xmin, xmax, ymin, ymax)
+
+    def GetEnvelope(self):
+        return self.env
+
+
+class _Feature:
+    def __init__(self, name, state, rect):
+        self.fields = {"CELL_NAME": name, "STATE_ALPHA": state}
+        self.geom = _Geom(*rect)
+
+    def GetGeometryRef(self):
+        return self.geom
+
+    def GetField(self, name):
+        return self.fields[name]
+
+
+class _FieldDefn:
+    def __init__(self, name):
+        self.name = name
+
+    def GetName(self):
+        return self.name
+
+
+class _Layer(list):
+    def GetLayerDefn(self):
+        return self
+
+    def GetFieldCount(self):
+        return 2
+
+    def GetFieldDefn(self, i):
+        return _FieldDefn(("CELL_NAME", "STATE_ALPHA")[i])
+
+
+class _DataSource(dict):
+    def GetLayer(self, name):
+        return self.get(name)
+
+
+@pytest.fixture
+def gdb(tmp_path, monkeypatch):
+    """A GDB directory plus a stand-in osgeo.ogr serving two small grid layers."""
+    path = tmp_path / "index.gdb"
+    path.mkdir()
+    (path / "a00000001.gdbtable").write_bytes(b"\0" * 16)
+    source = _DataSource({
+        "CellGrid_7_5Minute": _Layer([_Feature("Ward", "CO", (-105.625, 40.0, -105.5, 40.125))]),
+        "CellGrid_15Minute": _Layer([_Feature("Boulder", "CO", (-105.5, 40.0, -105.25, 40.25))]),
+    })
+    ogr = types.SimpleNamespace(
+        UseExceptions=lambda: None,
+        GetDriverByName=lambda name: types.SimpleNamespace(Open=lambda p, mode: source),
+    )
+    monkeypatch.setitem(sys.modules, "osgeo", types.SimpleNamespace(ogr=ogr))
+    monkeypatch.setitem(sys.modules, "osgeo.ogr", ogr)
+    return str(path)
+
+
+def test_subset_build_keeps_other_layers(gdb, tmp_path):
+    index_dir = str(tmp_path / "qidx")
+    build_index(gdb, index_dir, layers=["CellGrid_7_5Minute", "CellGrid_15Minute"])
+    meta = build_index(gdb, index_dir, layers=["CellGrid_15Minute"])
+
+    assert set(meta["layers"]) == {"CellGrid_7_5Minute", "CellGrid_15Minute"}
+    assert not is_stale(index_dir, gdb, "CellGrid_7_5Minute")
+    index = QuadIndex.load("CellGrid_7_5Minute", index_dir=index_dir, gdb_path=gdb)
+    assert index.query(BoundingBox(-105.6, 40.05, -105.55, 40.1)) == [("Ward", "CO")]
+
+
+def test_subset_build_drops_layers_from_an_older_gdb(gdb, tmp_path):
+    index_dir = str(tmp_path / "qidx")
+    build_index(gdb, index_dir, layers=["CellGrid_7_5Minute"])
+    with open(f"{gdb}/a00000002.gdbtable", "wb") as f:
+        f.write(b"\0")
+
+    meta = build_index(gdb, index_dir, layers=["CellGrid_15Minute"])
+    assert set(meta["layers"]) == {"CellGrid_15Minute"}
+    assert is_stale(index_dir, gdb, "CellGrid_7_5Minute")
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+from lib.bbox import BoundingBox
+from lib.bench_utils import StandInServer, use_stand_in
+from lib.dem_utils import fetch_and_clip_dem, get_product
+
+# A few arc-minutes inside n41w106
+BBOX = BoundingBox(-105.55, 40.40, -105.50, 40.45)
+
+
+@pytest.fixture
+def server(tmp_path):
+    with StandInServer(str(tmp_path / "server")) as s, use_stand_in(s):
+        yield s
+
+
+def _read(path):
+    ds = gdal.Open(path)
+    try:
+        return ds.GetRasterBand(1).ReadAsArray(), ds.GetGeoTransform()
+    finally:
+        ds = None
+
+
+def test_remote_clip_reads_only_the_needed_ranges(server, tmp_path):
+    (tile_key,) = get_product(None).tiles(BBOX)
+    remote_path = fetch_and_clip_dem(
+        BBOX, cache_dir=str(tmp_path / "cache"), out_dir=str(tmp_path / "remote"),
+        remote=True, engine="gdal", reuse_clips=False
+    )
+    assert remote_path and os.path.exists(remote_path)
+
+    # Nothing was downloaded into the tile cache, and GDAL fetched a small
+    # fraction of the tile with range requests
+    cache_dir = tmp_path / "cache"
+    assert not cache_dir.exists() or not list(cache_dir.glob("*.tif"))
+    tile_size = os.path.getsize(server.file_for(
+        f"/StagedProducts/Elevation/1/TIFF/current/{tile_key}/USGS_1_{tile_key}.tif"))
+    assert server.stats["ranged"] > 0
+    assert server.stats["bytes_sent"] < tile_size / 4
+
+    # Same pixels as a clip of the downloaded tile
+    local_path = fetch_and_clip_dem(
+        BBOX, cache_dir=str(tmp_path / "cache"), out_dir=str(tmp_path / "local"),
+        engine="gdal", reuse_clips=False
+    )
+    remote, remote_gt = _read(remote_path)
+    local, local_gt = _read(local_path)
+    assert remote_gt == pytest.approx(local_gt)
+    np.testing.assert_array_equal(remote, local)
@@ -0,0 +1,168 @@
+import heapq
+import math
+
+import numpy as np
+import pytest
+
+from lib import dem_utils
+from lib.graph_utils import TrailGraph, haversine_m
+from lib.route_utils import PROFILES, NodeIndex, RouteEngine, edge_terrain
+
+
+def _grid_graph(n=8, seed=0):
+    """
+    A jittered n x n lattice of nodes ~1 km apart, joined to their right and
+    upper neighbours (some with a bent middle vertex), plus a few diagonals.
+    Half the edges are roads so the profiles disagree.
+    """
+    rng = np.random.default_rng(seed)
+    lon, lat = np.meshgrid(np.arange(n) * 0.012, np.arange(n) * 0.009)
+    node_xy = np.column_stack([lon.ravel() - 105.5, lat.ravel() + 40.0])
+    node_xy += rng.uniform(-0.002, 0.002, node_xy.shape)
+
+    pairs = []
+    for i in range(n):
+        for j in range(n):
+            node = i * n + j
+            if j + 1 < n:
+                pairs.append((node, node + 1))
+            if i + 1 < n:
+                pairs.append((node, node + n))
+            if i + 1 < n and j + 1 < n and rng.random() < 0.2:
+                pairs.append((node, node + n + 1))
+
+    geoms = []
+    for u, v in pairs:
+        pts = [node_xy[u], node_xy[v]]
+        if rng.random() < 0.5:
+            mid = (node_xy[u] + node_xy[v]) / 2 + rng.uniform(-0.002, 0.002, 2)
+            pts.insert(1, mid)
+        geoms.append(np.array(pts))
+
+    edge_u = np.array([u for u, _ in pairs])
+    edge_v = np.array([v for _, v in pairs])
+    geom_offsets = np.concatenate([[0], np.cumsum([len(g) for g in geoms])])
+    geom_xy = np.concatenate(geoms)
+    edge_length = np.array([
+        haversine_m(g[:-1, 0], g[:-1, 1], g[1:, 0], g[1:, 1]).sum() for g in geoms
+    ])
+
+    # CSR adjacency, both directions
+    src = np.concatenate([edge_u, edge_v])
+    dst = np.concatenate([edge_v, edge_u])
+    eid = np.concatenate([np.arange(len(pairs))] * 2)
+    order = np.argsort(src, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n * n))])
+
+    arrays = {
+        "node_xy": node_xy, "indptr": indptr, "adj_node": dst[order], "adj_edge": eid[order],
+        "edge_u": edge_u, "edge_v": edge_v, "edge_length": edge_length,
+        "edge_layer": (np.arange(len(pairs)) % 2).astype(np.int32),
+        "edge_class": np.zeros(len(pairs), dtype=np.int32),
+        "geom_offsets": geom_offsets, "geom_xy": geom_xy,
+    }
+    return TrailGraph(arrays, ["unknown"], ["Trans_TrailSegment", "Trans_RoadSegment"])
+
+
+@pytest.fixture
+def terrain(monkeypatch):
+    """Stand-in for sample_dem: a smooth synthetic surface with a few hundred metres of relief."""
+    def sample_dem(dem_path, lons, lats, method="bilinear"):
+        lons, lats = np.asarray(lons), np.asarray(lats)
+        return (2500 + 300 * np.sin(lons * 300) * np.cos(lats * 250)).astype(np.float32)
+    monkeypatch.setattr(dem_utils, "sample_dem", sample_dem)
+    return "synthetic.tif"
+
+
+def _dijkstra(graph, cost_fwd, cost_bwd, source, target):
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    done = set()
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node == target:
+            return d
+        if node in done:
+            continue
+        done.add(node)
+        start, end = graph.indptr[node], graph.indptr[node + 1]
+        for nbr, edge in zip(graph.adj_node[start:end], graph.adj_edge[start:end]):
+            cost = cost_fwd[edge] if graph.edge_u[edge] == node else cost_bwd[edge]
+            if d + cost < dist.get(nbr, math.inf):
+                dist[nbr] = d + cost
+                heapq.heappush(heap, (d + cost, nbr))
+    return math.inf
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_astar_matches_dijkstra(terrain, profile):
+    graph = _grid_graph()
+    engine = RouteEngine(graph, dem_path=terrain)
+    cost_fwd, cost_bwd = PROFILES[profile](engine.attrs)
+
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(0, graph.num_nodes, (25, 2)):
+        cost, nodes, arcs = engine.shortest_path(int(source), int(target), profile)
+        assert cost == pytest.approx(_dijkstra(graph, cost_fwd, cost_bwd, source, target))
+        assert nodes[0] == source and nodes[-1] == target
+        assert len(arcs) == len(nodes) - 1
+
+
+def test_route_reports_directional_terrain(terrain):
+    graph = _grid_graph()
+    engine = RouteEngine(graph, dem_path=terrain)
+    start, end = tuple(graph.node_xy[0]), tuple(graph.node_xy[-1])
+
+    there = engine.route(start, end)
+    back = engine.route(end, start)
+    assert there["success"] and back["success"]
+    assert there["snap_start_m"] == pytest.approx(0.0, abs=1e-6)
+    assert there["ascent_m"] > 0 and there["descent_m"] > 0
+    # Reversing a route swaps ascent and descent
+    if there["edges"] == back["edges"][::-1]:
+        assert there["ascent_m"] == pytest.approx(back["descent_m"])
+
+
+def test_edge_terrain_chunks_match_one_batch(terrain):
+    graph = _grid_graph()
+    whole = edge_terrain(graph, terrain, chunk_points=1 << 30)
+    for chunk_points in (1, 50, 400):
+        chunked = edge_terrain(graph, terrain, chunk_points=chunk_points)
+        for key, values in whole.items():
+            np.testing.assert_allclose(chunked[key], values, err_msg=key)
+    assert whole["ascent"].sum() > 0
+
+
+def _brute_nearest(xy, lon, lat):
+    d2 = ((xy[:, 0] - lon) * math.cos(math.radians(lat))) ** 2 + (xy[:, 1] - lat) ** 2
+    return d2.min(), d2
+
+
+def test_node_index_matches_brute_force_at_cell_boundaries():
+    rng = np.random.default_rng(2)
+    # Clustered nodes leave many empty cells, so searches have to widen ring by ring
+    xy = np.concatenate([
+        rng.uniform((-106.0, 40.0), (-105.9, 40.1), (300, 2)),
+        rng.uniform((-105.3, 40.6), (-105.2, 40.7), (50, 2)),
+        [(-105.6, 40.35)],
+    ])
+    index = NodeIndex(xy)
+
+    size = index.cell_size
+    queries = []
+    for k in range(0, max(index.nx, index.ny) + 2, 3):
+        for eps in (-1e-9, 0.0, 1e-9):
+            queries.append((index.xmin + k * size + eps, index.ymin + 0.5 * size))
+            queries.append((index.xmin + 0.5 * size, index.ymin + k * size + eps))
+            queries.append((index.xmin + k * size + eps, index.ymin + k * size + eps))
+    queries += [tuple(p) for p in rng.uniform((-106.2, 39.8), (-105.0, 40.9), (200, 2))]
+
+    for lon, lat in queries:
+        node, dist = index.nearest(lon, lat)
+        best_d2, d2 = _brute_nearest(xy, lon, lat)
+        assert d2[node] == pytest.approx(best_d2, rel=1e-12, abs=1e-18)
+        assert dist == pytest.approx(float(haversine_m(lon, lat, *xy[node])))
+
+
+def test_node_index_empty():
+    assert NodeIndex(np.zeros((0, 2))).nearest(-105.0, 40.0) == (None, math.inf)
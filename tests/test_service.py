@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip("osgeo")  # service_utils pulls in gpkg_utils
+
+from lib import service_utils
+from lib.service_utils import PreprocessService, make_server, parse_job_request
+
+
+class _StubResolver:
+    source = "stub"
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """A one-worker, one-slot-queue service whose jobs block until released."""
+    release = threading.Event()
+
+    def run(self, aoi, options):
+        release.wait(10)
+        return {"bbox": list(aoi)}
+
+    monkeypatch.setattr(service_utils, "QuadResolver", _StubResolver)
+    monkeypatch.setattr(service_utils, "EXTRACTED_DIR", str(tmp_path / "gpkg"))
+    monkeypatch.setattr(PreprocessService, "_run_dem", run)
+    monkeypatch.setattr(PreprocessService, "_run_gpkg", run)
+
+    svc = PreprocessService(workers=1, max_queue=1, cache_dir=str(tmp_path / "dem"),
+                            out_dir=str(tmp_path / "out"))
+    server = make_server(svc, port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    svc.url = f"http://127.0.0.1:{server.server_address[1]}"
+    svc.release = release
+    yield svc
+    release.set()
+    server.shutdown()
+    server.server_close()
+    svc.shutdown()
+
+
+def _request(service, method, path, body=None, raw=None):
+    data = raw if raw is not None else (json.dumps(body).encode() if body is not None else None)
+    req = urllib.request.Request(service.url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _dem(xmin, **options):
+    return {"kind": "dem", "bbox": [xmin, 40.0, xmin + 0.1, 40.1], **options}
+
+
+def test_identical_requests_coalesce(service):
+    status, first = _request(service, "POST", "/jobs", _dem(-105.6))
+    assert status == 202 and not first["coalesced"]
+
+    status, second = _request(service, "POST", "/jobs", _dem(-105.6))
+    assert status == 200 and second["coalesced"]
+    assert second["job"]["id"] == first["job"]["id"]
+    assert second["job"]["coalesced"] == 1
+
+    # Different options are a different job
+    status, other = _request(service, "POST", "/jobs", _dem(-105.6, cog=True))
+    assert status == 202 and other["job"]["id"] != first["job"]["id"]
+
+    service.release.set()
+    job_id = first["job"]["id"]
+    for _ in range(200):
+        status, job = _request(service, "GET", f"/jobs/{job_id}")
+        if job["status"] == "done":
+            break
+        time.sleep(0.02)
+    assert job["status"] == "done"
+    assert job["result"] == {"bbox": [-105.6, 40.0, -105.5, 40.1]}
+
+
+def test_requests_beyond_workers_plus_queue_get_503(service):
+    # One running, one queued
+    assert _request(service, "POST", "/jobs", _dem(-105.6))[0] == 202
+    assert _request(service, "POST", "/jobs", _dem(-105.4))[0] == 202
+
+    status, body = _request(service, "POST", "/jobs", _dem(-105.2))
+    assert status == 503 and "error" in body
+    # Coalescing onto an active job still works when full
+    assert _request(service, "POST", "/jobs", _dem(-105.4))[0] == 200
+
+    _, health = _request(service, "GET", "/health")
+    assert health["running"] + health["queued"] == 2
+
+
+@pytest.mark.parametrize("raw", [
+    b"not json",
+    b"[1, 2]",
+    json.dumps({"bbox": [-105.6, 40.0, -105.5, 40.1]}).encode(),
+    json.dumps({"kind": "tiles", "bbox": [-105.6, 40.0, -105.5, 40.1]}).encode(),
+    json.dumps({"kind": "dem"}).encode(),
+    json.dumps({"kind": "dem", "bbox": [-105.6, 40.0, -105.5]}).encode(),
+    json.dumps({"kind": "dem", "bbox": ["a", 40.0, -105.5, 40.1]}).encode(),
+    json.dumps({"kind": "dem", "bbox": [-105.6, 40.0, -105.5, 40.1],
+                "route": {"type": "LineString", "coordinates": [[-105.6, 40.0], [-105.5, 40.1]]}}).encode(),
+    json.dumps({"kind": "gpkg", "aoi": {"type": "Point", "coordinates": [-105.6, 40.0]}}).encode(),
+    json.dumps({"kind": "gpkg", "route": {"type": "Polygon", "coordinates": []}}).encode(),
+])
+def test_malformed_requests_get_400(service, raw):
+    status, body = _request(service, "POST", "/jobs", raw=raw)
+    assert status == 400
+    assert body["error"].startswith("Bad request")
+    assert service.jobs() == []
+
+
+def test_parse_job_request_keys_on_kind_area_and_options():
+    kind, aoi, options, key = parse_job_request(_dem(-105.6))
+    assert kind == "dem" and list(aoi) == [-105.6, 40.0, -105.5, 40.1]
+    assert options["cog"] is False and options["resampling"] == "bilinear"
+    assert parse_job_request(_dem(-105.6))[3] == key
+    assert parse_job_request(_dem(-105.6, engine="gdal"))[3] != key
+    assert parse_job_request({**_dem(-105.6), "kind": "gpkg"})[3] != key
@@ -0,0 +1,98 @@
+import math
+import types
+
+import numpy as np
+import pytest
+
+from lib import terrain_utils
+from lib.bbox import EARTH_RADIUS_M
+from lib.terrain_utils import (
+    PRODUCTS, ASPECT_NODATA, SLOPE_NODATA, _read_haloed, _windows, pixel_size_m, terrain_kernels
+)
+
+# 1 arc-second pixels with the north-west corner at 106°W 45°N
+GEOTRANSFORM = (-106.0, 1 / 3600, 0.0, 45.0, 0.0, -1 / 3600)
+
+
+@pytest.fixture
+def in_memory(monkeypatch):
+    """Serve read_elevation windows from an array, standing in for a GDAL dataset."""
+    def read_elevation(ds, xoff, yoff, xsize, ysize):
+        return ds.z[yoff:yoff + ysize, xoff:xoff + xsize].astype(np.float32)
+    monkeypatch.setattr(terrain_utils, "read_elevation", read_elevation)
+
+    def dataset(z):
+        return types.SimpleNamespace(z=z, RasterYSize=z.shape[0], RasterXSize=z.shape[1])
+    return dataset
+
+
+def _surface(rows, cols, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:rows, 0:cols]
+    z = 2000 + 80 * np.sin(x / 9.0) * np.cos(y / 13.0) + rng.normal(0, 2, (rows, cols))
+    z[5:9, 40:44] = np.nan  # a nodata hole across a window edge
+    return z.astype(np.float32)
+
+
+def _whole(z, products=PRODUCTS):
+    dx, dy = pixel_size_m(GEOTRANSFORM, 0, z.shape[0])
+    return terrain_kernels(np.pad(z, 1, mode="edge"), dx, dy, products)
+
+
+@pytest.mark.parametrize("block_size", [16, 25, 64])
+def test_windows_match_whole_array(in_memory, block_size):
+    z = _surface(70, 90)
+    ds = in_memory(z)
+    expected = _whole(z)
+
+    result = {p: np.zeros_like(a) for p, a in expected.items()}
+    for x0, y0, w, h in _windows(ds.RasterXSize, ds.RasterYSize, block_size):
+        haloed = _read_haloed(ds, x0, y0, w, h)
+        assert haloed.shape == (h + 2, w + 2)
+        dx, dy = pixel_size_m(GEOTRANSFORM, y0, h)
+        for product, values in terrain_kernels(haloed, dx, dy).items():
+            result[product][y0:y0 + h, x0:x0 + w] = values
+
+    for product in PRODUCTS:
+        np.testing.assert_array_equal(result[product], expected[product], err_msg=product)
+    assert (expected["slope"] == SLOPE_NODATA).any()
+
+
+def _plane(rise_east, rise_north, rows=40, cols=40):
+    """A plane with the given rise per metre, on the lon/lat grid of GEOTRANSFORM."""
+    m_per_deg = math.pi / 180.0 * EARTH_RADIUS_M
+    lat = GEOTRANSFORM[3] + (np.arange(rows)[:, None] + 0.5) * GEOTRANSFORM[5]
+    east_m = np.arange(cols)[None, :] * GEOTRANSFORM[1] * m_per_deg * np.cos(np.radians(lat))
+    north_m = (lat - GEOTRANSFORM[3]) * m_per_deg
+    return rise_east * east_m + rise_north * north_m
+
+
+@pytest.mark.parametrize("rise_east, rise_north, aspect", [
+    (math.tan(math.radians(30)), 0.0, 270.0),   # rising to the east, facing west
+    (0.0, math.tan(math.radians(30)), 180.0),   # rising to the north, facing south
+    (-0.25, -0.25, 45.0),                       # falling to the north-east
+])
+def test_inclined_plane_slope_and_aspect(rise_east, rise_north, aspect):
+    z = _plane(rise_east, rise_north)
+    out = _whole(z)
+    core = (slice(1, -1), slice(1, -1))  # edge replication flattens the border
+
+    # East-west spacing changes slightly from row to row, so the surface is a
+    # plane only to within a few thousandths of a degree; dropping the
+    # cos(latitude) scaling would be off by degrees
+    expected_slope = math.degrees(math.atan(math.hypot(rise_east, rise_north)))
+    np.testing.assert_allclose(out["slope"][core], expected_slope, atol=0.01)
+    np.testing.assert_allclose(out["aspect"][core], aspect, atol=0.01)
+
+
+def test_flat_has_no_aspect():
+    out = _whole(np.full((10, 10), 1500.0, dtype=np.float32))
+    assert (out["slope"] == 0).all()
+    assert (out["aspect"] == ASPECT_NODATA).all()
+    assert (out["hillshade"] == round(254 * math.sin(math.radians(45))) + 1).all()
+
+
+def test_pixel_size_shrinks_east_west_with_latitude():
+    dx, dy = pixel_size_m(GEOTRANSFORM, 0, 1)
+    assert dy == pytest.approx(30.8875, abs=1e-4)
+    assert dx[0, 0] == pytest.approx(dy * math.cos(math.radians(45.0)), rel=1e-5)